@@ -0,0 +1,128 @@
+"""
+Microbenchmark for mockup compositing.
+
+Usage:
+    python -m benchmarks.compositing [--iterations 30] [--design-size 800]
+
+Renders mockups of one design in every shirt color and size with the
+previous PIL code path (new canvas, decode, default resize, paste) and
+with ``designs.compositing``, cold (nothing cached) and warm (garment and
+design layer cached). Everything runs on one thread, so mockups per second
+is per core. PNG encoding is left out: both paths pay it equally.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from itertools import product
+
+from .runner import teardown
+
+
+def legacy(path, color, size):
+    """The compositing of ``generate_mockup`` before designs.compositing."""
+    from PIL import Image
+
+    tshirt = Image.new('RGB', (800, 800), color)
+    design_image = Image.open(path)
+    size_factor = {'xs': 0.5, 's': 0.6, 'm': 0.7, 'l': 0.8, 'xl': 0.9, 'xxl': 1.0}.get(size, 0.7)
+    new_width, new_height = int(design_image.width * size_factor), int(design_image.height * size_factor)
+    design_image = design_image.resize((new_width, new_height))
+    position = ((tshirt.width - new_width) // 2, (tshirt.height - new_height) // 3)
+    if design_image.mode == 'RGBA':
+        tshirt.paste(design_image, position, design_image)
+    else:
+        tshirt.paste(design_image, position)
+    return tshirt
+
+
+def engine(path, color, size, width, height):
+    from designs import compositing
+
+    garment = compositing.garment()
+    new_size = compositing.design_size(width, height, size, garment.size)
+    return compositing.render(color, compositing.layer(path, new_size))
+
+
+def clear_caches():
+    from designs import compositing
+
+    compositing.garment.cache_clear()
+    compositing.shirts.clear()
+    compositing.layers.clear()
+
+
+def run(args):
+    import numpy as np
+    from django.conf import settings
+    from PIL import Image, ImageDraw
+
+    from designs.models import Mockup
+
+    side = args.design_size
+    design = Image.new('RGBA', (side, side), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(design)
+    for i in range(12):
+        inset = i * side // 30
+        draw.ellipse((inset, inset, side - inset, side - inset),
+                     fill=(40 + i * 15, 90, 200 - i * 10, 255 - i * 12))
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    path = os.path.join(settings.MEDIA_ROOT, 'compositing.png')
+    design.save(path)
+
+    # Up to --design-size 800 both paths paste at the same size.
+    cases = list(product([color for color, _ in Mockup.COLOR_CHOICES] + ['#1e90ff'],
+                         ['xs', 'm', 'xxl']))
+    paths = {
+        'legacy': lambda color, size: legacy(path, color, size),
+        'cold': lambda color, size: (clear_caches(), engine(path, color, size, side, side))[1],
+        'warm': lambda color, size: engine(path, color, size, side, side),
+    }
+
+    header = f"{'path':<8}{'median ms':>11}{'mockups/s':>11}{'speedup':>9}"
+    print(f'{len(cases)} color/size cases, {side}x{side} RGBA design\n')
+    print(header)
+    print('-' * len(header))
+    baseline = None
+    for label, render in paths.items():
+        render(*cases[0])
+        timings = []
+        for _ in range(args.iterations):
+            for case in cases:
+                started = time.perf_counter()
+                render(*case)
+                timings.append(time.perf_counter() - started)
+        seconds = statistics.median(timings)
+        baseline = baseline or seconds
+        print(f'{label:<8}{seconds * 1000:>11.3f}{1 / seconds:>11.0f}{baseline / seconds:>8.2f}x')
+
+    # Same geometry and colors; only the resampling filter differs.
+    difference = np.abs(np.asarray(legacy(path, 'red', 'm'), dtype=np.int16)
+                        - np.asarray(engine(path, 'red', 'm', side, side), dtype=np.int16))
+    print(f'\nmean absolute difference from legacy: {difference.mean():.3f} / 255')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.compositing',
+                                     description='Benchmark mockup compositing.')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--design-size', type=int, default=800)
+    args = parser.parse_args(argv)
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    import django
+    django.setup()
+
+    from django.conf import settings
+
+    try:
+        return run(args)
+    finally:
+        teardown(settings)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
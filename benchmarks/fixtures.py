@@ -0,0 +1,107 @@
+"""Deterministic seed data for the benchmark suite."""
+
+import random
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from designs.models import Design
+from store.models import (Collection, Customer, Order, OrderItem, Payment,
+                          Product, Review)
+
+WORDS = ['classic', 'vintage', 'cotton', 'retro', 'graphic', 'slim', 'heavy',
+         'organic', 'striped', 'plain', 'neon', 'pastel', 'oversized', 'crew',
+         'v-neck', 'long', 'sleeve', 'tee', 'hoodie', 'tank']
+
+
+class Dataset:
+    """Ids of the rows the scenarios run against."""
+
+    def __init__(self, user, customer, collection, products, order, payment, design):
+        self.user = user
+        self.customer = customer
+        self.collection = collection
+        self.products = products
+        self.order = order
+        self.payment = payment
+        self.design = design
+
+
+def build_dataset(seed=42, collections=20, products=2000, customers=100, orders=300):
+    rng = random.Random(seed)
+    User = get_user_model()
+
+    Collection.objects.bulk_create([
+        Collection(title=f'Collection {i:03d}') for i in range(collections)
+    ])
+    collection_ids = list(Collection.objects.values_list('id', flat=True))
+
+    catalog = [
+        Product(
+            title=' '.join(rng.choice(WORDS) for _ in range(3)).title() + f' {i}',
+            slug=f'product-{i}',
+            description=' '.join(rng.choice(WORDS) for _ in range(12)),
+            unit_price=Decimal(rng.randint(100, 99999)) / 100,
+            inventory=rng.randint(0, 500),
+            collection_id=rng.choice(collection_ids),
+        ) for i in range(products)
+    ]
+    for product in catalog:
+        product.effective_price = product.unit_price
+    Product.objects.bulk_create(catalog, batch_size=500)
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    # The cart and order scenarios reserve and sell these on every iteration.
+    Product.objects.filter(id__in=product_ids[:5]).update(inventory=10 ** 6)
+
+    Review.objects.bulk_create([
+        Review(product_id=rng.choice(product_ids),
+               name=f'Reviewer {i}',
+               description=' '.join(rng.choice(WORDS) for _ in range(20)))
+        for i in range(products // 2)
+    ], batch_size=500)
+
+    # Creating users fires the signal that creates their Customer row.
+    users = [
+        User.objects.create_user(
+            username=f'user{i}', email=f'user{i}@example.com', password='bench',
+            first_name=f'First{i}', last_name=f'Last{i}')
+        for i in range(customers)
+    ]
+    customer_ids = list(Customer.objects.values_list('id', flat=True))
+
+    Order.objects.bulk_create([
+        Order(customer_id=rng.choice(customer_ids)) for _ in range(orders)
+    ], batch_size=500)
+    order_ids = list(Order.objects.values_list('id', flat=True))
+    OrderItem.objects.bulk_create([
+        OrderItem(order_id=order_id,
+                  product_id=rng.choice(product_ids),
+                  quantity=rng.randint(1, 5),
+                  unit_price=Decimal(rng.randint(100, 99999)) / 100)
+        for order_id in order_ids
+        for _ in range(rng.randint(1, 4))
+    ], batch_size=500)
+
+    user = users[0]
+    customer = Customer.objects.get(user=user)
+    order = Order.objects.create(customer=customer)
+    OrderItem.objects.create(order=order, product_id=product_ids[0],
+                             quantity=2, unit_price=Decimal('19.99'))
+    payment = Payment.objects.create(
+        payment_method='paypal', order=order, customer=customer,
+        status='completed', amount=order.total_price,
+        transaction_id='TXN-00000000BE0C', receipt_id='RCPT-000000BE0C')
+
+    design = Design(design_description='Benchmark design', customer=customer,
+                    file_type='png')
+    image = Image.new('RGBA', (600, 600), (rng.randint(0, 255), 40, 90, 255))
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    design.design_file.save('bench.png', ContentFile(buffer.getvalue()))
+
+    return Dataset(user=user, customer=customer, collection=collection_ids[0],
+                   products=product_ids, order=order, payment=payment,
+                   design=design)
@@ -0,0 +1,105 @@
+"""
+Microbenchmark for the JSON renderers on real product and order payloads.
+
+Usage:
+    python -m benchmarks.renderers [--iterations 50]
+
+Each payload is rendered with DRF's JSONRenderer, FastJSONRenderer and
+FastJSONRenderer.iter_render; the outputs must be byte-identical. Reports
+the median time per render, throughput and the peak memory of one render.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from .runner import teardown
+
+
+def measure(render, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        render()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def payloads():
+    from store.models import Order, Product
+    from store.views import OrderViewSet, ProductViewSet
+
+    products = ProductViewSet.row_serializer
+    orders = OrderViewSet.row_serializer
+    return {
+        'product_page': products.many(products.values(Product.objects.order_by('id')[:10])),
+        'product_all': products.many(products.values(Product.objects.order_by('id'))),
+        'order_all': orders.many(orders.values(Order.objects.order_by('id'))),
+    }
+
+
+def run(args):
+    from django.core.management import call_command
+    from rest_framework.renderers import JSONRenderer
+    from store.renderers import FastJSONRenderer
+
+    from .fixtures import build_dataset
+
+    call_command('migrate', verbosity=0)
+    build_dataset(seed=args.seed)
+
+    drf, fast = JSONRenderer(), FastJSONRenderer()
+    renderers = {
+        'drf': lambda data: drf.render(data),
+        'fast': lambda data: fast.render(data),
+        'fast_stream': lambda data: b''.join(fast.iter_render(data)),
+    }
+
+    header = f"{'payload':<14}{'renderer':<13}{'median ms':>11}{'MB/s':>9}{'peak KiB':>10}{'speedup':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, data in payloads().items():
+        expected = drf.render(data)
+        baseline = None
+        for label, render in renderers.items():
+            if render(data) != expected:
+                print(f'{name}: {label} output differs from JSONRenderer')
+                return 1
+            seconds, peak = measure(lambda: render(data), args.iterations)
+            baseline = baseline or seconds
+            print(f'{name:<14}{label:<13}{seconds * 1000:>11.3f}'
+                  f'{len(expected) / seconds / 1e6:>9.1f}{peak / 1024:>10.1f}'
+                  f'{baseline / seconds:>8.2f}x')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.renderers',
+                                     description='Benchmark the JSON renderers.')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    import django
+    django.setup()
+
+    from django.conf import settings
+
+    try:
+        return run(args)
+    finally:
+        teardown(settings)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
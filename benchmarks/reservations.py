@@ -0,0 +1,138 @@
+"""
+Contention benchmark for cart reservations.
+
+Usage:
+    python -m benchmarks.reservations [--workers 8] [--stock 200]
+
+Many workers add one unit of the same product to their own carts until it
+sells out, then check all the carts out concurrently. The run fails if more
+units were reserved or sold than the product had in stock.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import threading
+import time
+
+from .runner import percentile, teardown
+
+
+def hammer(workers, target):
+    """Run ``target(results)`` on ``workers`` threads; returns the merged results."""
+    from django.db import connection
+
+    results, lock = [], threading.Lock()
+    start = threading.Barrier(workers)
+
+    def work():
+        local = []
+        start.wait()
+        try:
+            target(local)
+        finally:
+            connection.close()
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def report(label, results, elapsed):
+    timings = [ms for ms, _ in results]
+    print(f'{label:<10}{len(results):>8}{len(results) / elapsed:>10.0f}'
+          f'{statistics.median(timings):>10.2f}{percentile(timings, 99):>10.2f}'
+          f'{sum(ok for _, ok in results):>8}')
+
+
+def run(args):
+    from django.core.management import call_command
+    from rest_framework.test import APIClient
+
+    from store.models import Product, Reservation
+
+    from .fixtures import build_dataset
+
+    call_command('migrate', verbosity=0)
+    data = build_dataset(seed=args.seed, products=100, orders=10)
+    product_id = data.products[-1]
+    Product.objects.filter(pk=product_id).update(inventory=args.stock, reserved=0)
+    carts, carts_lock = [], threading.Lock()
+
+    def reserve(results):
+        client = APIClient()
+        while True:
+            cart = client.post('/store/carts/').json()['id']
+            started = time.perf_counter()
+            response = client.post(f'/store/carts/{cart}/items/',
+                                   {'product_id': product_id, 'quantity': 1}, format='json')
+            results.append(((time.perf_counter() - started) * 1000, response.status_code == 201))
+            if response.status_code != 201:
+                return
+            with carts_lock:
+                carts.append(cart)
+
+    def checkout(results):
+        client = APIClient()
+        client.force_authenticate(user=data.user)
+        while True:
+            with carts_lock:
+                if not carts:
+                    return
+                cart = carts.pop()
+            started = time.perf_counter()
+            response = client.post('/store/orders/', {'cart_id': cart}, format='json')
+            results.append(((time.perf_counter() - started) * 1000, response.status_code == 200))
+
+    header = f"{'phase':<10}{'requests':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'ok':>8}"
+    print(header)
+    print('-' * len(header))
+    # Signal handlers print to stdout; keep that out of the report.
+    with contextlib.redirect_stdout(io.StringIO()):
+        reserved, reserve_time = hammer(args.workers, reserve)
+        sold, checkout_time = hammer(args.workers, checkout)
+    report('reserve', reserved, reserve_time)
+    report('checkout', sold, checkout_time)
+
+    inventory, held = Product.objects.filter(pk=product_id).values_list('inventory', 'reserved').get()
+    reserved_ok = sum(ok for _, ok in reserved)
+    sold_ok = sum(ok for _, ok in sold)
+    print(f'\nstock {args.stock}: reserved {reserved_ok}, sold {sold_ok}, '
+          f'left {inventory}, still held {held}, reservations {Reservation.objects.count()}')
+    if reserved_ok != args.stock or sold_ok != args.stock or inventory != 0 or held != 0:
+        print('Oversold or lost stock under contention.')
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.reservations',
+                                     description='Benchmark cart reservations under contention.')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    import django
+    django.setup()
+
+    from django.conf import settings
+
+    try:
+        return run(args)
+    finally:
+        teardown(settings)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""
+Benchmark runner for the storefront hot paths.
+
+Usage:
+    python -m benchmarks [--iterations 200] [--output results.json]
+                         [--baseline benchmarks/baseline.json]
+                         [--threshold 0.25] [--only product_list,cart_add]
+
+Every scenario is measured in two passes: a timed pass that records
+latency and the number of SQL queries per request, and a shorter pass
+under tracemalloc that records the peak memory allocated per request
+(tracemalloc slows Python down too much to share a pass with timing).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def make_client(data, authenticated):
+    from rest_framework.test import APIClient
+
+    client = APIClient(raise_request_exception=True)
+    if authenticated:
+        client.force_authenticate(user=data.user)
+    return client
+
+
+def send(client, method, path, payload):
+    if payload is None:
+        response = getattr(client, method)(path)
+    else:
+        response = getattr(client, method)(path, payload, format='json')
+    if response.streaming:
+        # Count the time spent producing a streamed body, too.
+        response.body = b''.join(response.streaming_content)
+    return response
+
+
+def check_status(scenario, response):
+    expected = scenario.expected_status
+    if not isinstance(expected, tuple):
+        expected = (expected,)
+    if response.status_code not in expected:
+        raise RuntimeError(
+            f'{scenario.name}: expected HTTP {expected}, got '
+            f'{response.status_code}: '
+            f'{(response.body if response.streaming else response.content)[:300]!r}')
+
+
+def run_scenario(scenario, data, iterations, warmup, alloc_iterations, seed):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    random.seed(seed)
+    client = make_client(data, scenario.authenticated)
+
+    for _ in range(warmup):
+        check_status(scenario, send(client, *scenario.prepare(client, data)))
+
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        request = scenario.prepare(client, data)
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = send(client, *request)
+            timings.append((time.perf_counter() - start) * 1000)
+        check_status(scenario, response)
+        queries.append(len(captured))
+
+    allocations = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            request = scenario.prepare(client, data)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            send(client, *request)
+            allocations.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': max(queries),
+        'alloc_peak_kib': round(statistics.median(allocations), 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return a list of human readable regressions against ``baseline``."""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p99_ms', 'alloc_peak_kib'):
+            limit = previous[metric] * (1 + threshold)
+            if current[metric] > limit:
+                regressions.append(
+                    f'{name}.{metric}: {current[metric]} > {previous[metric]} '
+                    f'(+{threshold:.0%} allowed)')
+        # Query counts are deterministic, so any increase is a regression.
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f"{name}.queries: {current['queries']} > {previous['queries']}")
+    return regressions
+
+
+def print_table(results):
+    header = f"{'scenario':<20}{'p50 ms':>10}{'p99 ms':>10}{'queries':>9}{'alloc KiB':>11}"
+    print(header)
+    print('-' * len(header))
+    for name, row in results['scenarios'].items():
+        print(f"{name:<20}{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+              f"{row['queries']:>9}{row['alloc_peak_kib']:>11.1f}")
+
+
+def teardown(settings):
+    """Write buffered counters while the database still exists, then delete it."""
+    from likes.counters import flush_all
+    try:
+        flush_all()
+    finally:
+        shutil.rmtree(settings.BENCH_DIR, ignore_errors=True)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Benchmark the storefront hot paths.')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--alloc-iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', help='Comma separated scenario names to run.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE),
+                        help='Baseline JSON to compare against.')
+    parser.add_argument('--no-compare', action='store_true',
+                        help='Skip the comparison against the baseline.')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed relative slowdown before a metric counts as a regression.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    import django
+    django.setup()
+
+    from django.conf import settings
+
+    try:
+        return run(args)
+    finally:
+        teardown(settings)
+
+
+def run(args):
+    import django
+    from django.core.management import call_command
+    from .fixtures import build_dataset
+    from .scenarios import SCENARIOS
+
+    call_command('migrate', verbosity=0)
+    data = build_dataset(seed=args.seed)
+
+    scenarios = SCENARIOS
+    if args.only:
+        wanted = set(args.only.split(','))
+        scenarios = [s for s in SCENARIOS if s.name in wanted]
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': platform.machine(),
+            'seed': args.seed,
+        },
+        'scenarios': {},
+    }
+    for scenario in scenarios:
+        # Signal handlers print to stdout; keep that out of the report.
+        with contextlib.redirect_stdout(io.StringIO()):
+            results['scenarios'][scenario.name] = run_scenario(
+                scenario, data, args.iterations, args.warmup,
+                args.alloc_iterations, args.seed)
+    print_table(results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + '\n')
+
+    baseline_path = Path(args.baseline)
+    if args.no_compare or not baseline_path.exists():
+        return 0
+    regressions = compare(results, json.loads(baseline_path.read_text()), args.threshold)
+    if regressions:
+        print(f'\nRegressions against {baseline_path}:')
+        for line in regressions:
+            print(f'  {line}')
+        return 1
+    print(f'\nNo regressions against {baseline_path}.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
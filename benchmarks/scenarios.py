@@ -0,0 +1,125 @@
+"""
+Request scenarios covering the storefront hot paths.
+
+Each scenario is a name plus a callable that receives the API client and
+the dataset and returns ``(method, path, payload)``. The callable runs
+outside the timed section, so per-iteration setup such as filling a cart
+is not measured.
+"""
+
+from store.models import Cart, CartItem
+
+
+class Scenario:
+    def __init__(self, name, prepare, expected_status=200, authenticated=False):
+        self.name = name
+        self.prepare = prepare
+        self.expected_status = expected_status
+        self.authenticated = authenticated
+
+
+def _new_cart(client, data, items=0):
+    cart = Cart.objects.create()
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product_id, quantity=1)
+        for product_id in data.products[:items]
+    ])
+    return cart
+
+
+def product_list(client, data):
+    return 'get', '/store/products/', None
+
+
+def product_search(client, data):
+    return 'get', '/store/products/?search=vintage', None
+
+
+def product_filter(client, data):
+    return 'get', (f'/store/products/?collection_id={data.collection}'
+                   '&unit_price__gt=100&unit_price__lt=700&ordering=unit_price'), None
+
+
+def collection_list(client, data):
+    return 'get', '/store/collections/', None
+
+
+def cart_create(client, data):
+    return 'post', '/store/carts/', {}
+
+
+def cart_add(client, data):
+    cart = _new_cart(client, data)
+    return 'post', f'/store/carts/{cart.id}/items/', {
+        'product_id': data.products[1], 'quantity': 2}
+
+
+def cart_retrieve(client, data):
+    if not hasattr(data, 'full_cart'):
+        data.full_cart = _new_cart(client, data, items=5)
+    return 'get', f'/store/carts/{data.full_cart.id}/', None
+
+
+def order_create(client, data):
+    cart = _new_cart(client, data, items=3)
+    return 'post', '/store/orders/', {'cart_id': str(cart.id)}
+
+
+def payment_initiate(client, data):
+    return 'post', '/store/payments/initiate/', {
+        'order_id': data.order.id,
+        'payment_method': 'credit_card',
+        'card_number': '4111111111111111',
+        'expiry_month': '12',
+        'expiry_year': '30',
+        'cvv': '123',
+    }
+
+
+def payment_verify(client, data):
+    return 'post', '/store/payments/verify/', {
+        'transaction_id': data.payment.transaction_id}
+
+
+def payment_receipt(client, data):
+    return 'get', f'/store/payments/{data.payment.receipt_id}/', None
+
+
+def mockup_preview(client, data):
+    return 'post', '/designs/mockups/preview/', {
+        'design_id': data.design.id, 'color': 'black', 'size': 'm'}
+
+
+def mockup_image(client, data):
+    # Rendered by the first request and served from the disk cache after.
+    return 'get', f'/designs/mockups/render/?design={data.design.id}&color=black&size=m', None
+
+
+def mockup_render(client, data):
+    # The disk cache is emptied before every request, so each one renders
+    # and encodes the mockup; the garment and design layer stay cached.
+    from designs.mockups import disk_cache
+
+    disk_cache.clear()
+    return 'get', f'/designs/mockups/render/?design={data.design.id}&color=black&size=m', None
+
+
+SCENARIOS = [
+    Scenario('product_list', product_list),
+    Scenario('product_search', product_search),
+    Scenario('product_filter', product_filter),
+    Scenario('collection_list', collection_list),
+    Scenario('cart_create', cart_create, expected_status=201),
+    Scenario('cart_add', cart_add, expected_status=201),
+    Scenario('cart_retrieve', cart_retrieve),
+    Scenario('order_create', order_create, authenticated=True),
+    # The payment gateway is simulated and declines a share of payments,
+    # so both outcomes are accepted here.
+    Scenario('payment_initiate', payment_initiate, expected_status=(200, 400),
+             authenticated=True),
+    Scenario('payment_verify', payment_verify, authenticated=True),
+    Scenario('payment_receipt', payment_receipt, authenticated=True),
+    Scenario('mockup_preview', mockup_preview, authenticated=True),
+    Scenario('mockup_image', mockup_image, authenticated=True),
+    Scenario('mockup_render', mockup_render, authenticated=True),
+]
@@ -0,0 +1,43 @@
+"""
+Settings for the benchmark suite.
+
+Runs the storefront against a throwaway SQLite database and media
+directory so results are reproducible on any machine.
+"""
+
+import tempfile
+from pathlib import Path
+
+from storefront.settings import *  # noqa: F401,F403
+from storefront.settings import INSTALLED_APPS, MIDDLEWARE
+
+BENCH_DIR = Path(tempfile.mkdtemp(prefix='roboshirt-bench-'))
+
+SECRET_KEY = 'benchmark-only-secret-key'
+DEBUG = False
+ALLOWED_HOSTS = ['testserver']
+
+# The debug toolbar instruments every request and would skew the numbers.
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
+MIDDLEWARE = [m for m in MIDDLEWARE if not m.startswith('debug_toolbar.')]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BENCH_DIR / 'bench.sqlite3',
+        # The contention benchmark writes from many threads; take the write
+        # lock when a transaction starts and wait for it instead of failing.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 30},
+    }
+}
+
+MEDIA_ROOT = BENCH_DIR / 'media'
+MOCKUP_CACHE_DIR = BENCH_DIR / 'mockup_cache'
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'root': {'handlers': [], 'level': 'ERROR'},
+}
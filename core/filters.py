@@ -0,0 +1,10 @@
+from django_filters.rest_framework import CharFilter
+from store.filters import ProductFilter
+from store.models import Product
+from tags.models import TaggedItem
+
+class TaggedProductFilter(ProductFilter):
+  tag = CharFilter(method='filter_tag')
+
+  def filter_tag(self, queryset, name, value):
+    return queryset.filter(id__in=TaggedItem.objects.object_ids(Product, value))
@@ -0,0 +1,211 @@
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.middleware import sample
+
+
+class Connection:
+    """A minimal keep-alive HTTP/1.1 client connection on asyncio streams."""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.ssl = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def request(self, method, target, headers, body):
+        return await asyncio.wait_for(
+            self._request(method, target, headers, body), self.timeout)
+
+    async def _request(self, method, target, headers, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl or None)
+        try:
+            lines = [f'{method} {target} HTTP/1.1', f'Host: {self.host}',
+                     f'Content-Length: {len(body)}']
+            lines += [f'{name}: {value}' for name, value in headers.items()]
+            self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+            await self.writer.drain()
+            return await self._read_response(method)
+        except BaseException:
+            self.close()
+            raise
+
+    async def _read_response(self, method):
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            pass
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        else:
+            await self.reader.read()
+            headers['connection'] = 'close'
+
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+class Command(BaseCommand):
+    help = 'Replays a captured traffic log against a running server and reports per-route latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help='NDJSON log written by TrafficCaptureMiddleware.')
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Requests per second to send; 0 sends as fast as possible.')
+        parser.add_argument('--tokens',
+                            help='JSON file mapping identity placeholders to Authorization header values.')
+        parser.add_argument('--limit', type=int, help='Replay at most this many requests.')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--output', help='Write the report as JSON to this file.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.tokens = {}
+        if options['tokens']:
+            with open(options['tokens']) as f:
+                self.tokens = json.load(f)
+        try:
+            with open(options['log']) as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        except OSError as e:
+            raise CommandError(e)
+        if options['limit']:
+            entries = entries[:options['limit']]
+
+        self.stats = defaultdict(
+            lambda: {'requests': 0, 'latencies': [], 'statuses': Counter(), 'errors': 0})
+        self.skipped = 0
+        started = time.monotonic()
+        asyncio.run(self.replay(entries))
+        self.report(time.monotonic() - started)
+
+    def build_request(self, entry):
+        target = entry['path']
+        if entry.get('params'):
+            target += '?' + urlencode(entry['params'])
+        headers = {'Accept': 'application/json', 'Connection': 'keep-alive'}
+        token = self.tokens.get(entry.get('identity'))
+        if token:
+            headers['Authorization'] = token
+        body = b''
+        if entry.get('body') is not None:
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps(sample(entry['body']['json'])).encode()
+        return entry['method'], target, headers, body
+
+    async def replay(self, entries):
+        queue = asyncio.Queue(maxsize=self.options['concurrency'] * 2)
+        workers = [asyncio.create_task(self.worker(queue))
+                   for _ in range(self.options['concurrency'])]
+
+        interval = 1 / self.options['rate'] if self.options['rate'] else 0
+        next_send = time.monotonic()
+        for entry in entries:
+            body = entry.get('body')
+            if isinstance(body, dict) and 'shape' in body:
+                # Uploads are only captured as their shape and can't be replayed.
+                self.skipped += 1
+                continue
+            if interval:
+                next_send += interval
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await queue.put(entry)
+
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    async def worker(self, queue):
+        connection = Connection(self.options['base_url'], self.options['timeout'])
+        while (entry := await queue.get()) is not None:
+            stats = self.stats[(entry['method'], entry.get('route') or entry['path'])]
+            stats['requests'] += 1
+            started = time.perf_counter()
+            try:
+                status = await connection.request(*self.build_request(entry))
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError,
+                    asyncio.IncompleteReadError):
+                stats['errors'] += 1
+                continue
+            stats['latencies'].append((time.perf_counter() - started) * 1000)
+            stats['statuses'][status] += 1
+            if status >= 500:
+                stats['errors'] += 1
+        connection.close()
+
+    def report(self, elapsed):
+        routes = {}
+        total = errors = 0
+        for (method, route), stats in sorted(self.stats.items()):
+            latencies = stats['latencies']
+            count = stats['requests']
+            total += count
+            errors += stats['errors']
+            routes[f'{method} {route}'] = {
+                'requests': count,
+                'error_rate': round(stats['errors'] / count, 4) if count else 0,
+                'client_errors': sum(n for status, n in stats['statuses'].items()
+                                     if 400 <= status < 500),
+                'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+                'p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+                'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+            }
+
+        self.stdout.write(f"{'route':<55}{'reqs':>7}{'err %':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for name, row in routes.items():
+            self.stdout.write(
+                f"{name[:54]:<55}{row['requests']:>7}{row['error_rate'] * 100:>8.2f}"
+                + ''.join(f"{row[key] if row[key] is not None else '-':>9}"
+                          for key in ('p50_ms', 'p95_ms', 'p99_ms')))
+        summary = {
+            'requests': total,
+            'skipped': self.skipped,
+            'seconds': round(elapsed, 2),
+            'throughput_rps': round(total / elapsed, 1) if elapsed else 0,
+            'error_rate': round(errors / total, 4) if total else 0,
+        }
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['requests']} requests in {summary['seconds']}s "
+            f"({summary['throughput_rps']} req/s), error rate "
+            f"{summary['error_rate']:.2%}, {self.skipped} skipped"))
+
+        if self.options['output']:
+            with open(self.options['output'], 'w') as f:
+                json.dump({'summary': summary, 'routes': routes}, f, indent=2)
@@ -0,0 +1,157 @@
+import hashlib
+import hmac
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# Captured bodies keep only their shape: keys, list lengths and JSON types.
+# Replays fill them in with these values, well-formed for the card fields so
+# replayed payments still pass validation.
+SAMPLE_VALUES = {
+    'card_number': '4111111111111111',
+    'cvv': '000',
+    'expiry_month': '12',
+    'expiry_year': '99',
+}
+SAMPLE_TYPES = {'str': 'x', 'int': 1, 'float': 1.0, 'bool': False, 'null': None}
+# Query parameters whose name contains any of these are redacted.
+SENSITIVE_NAMES = ('password', 'token', 'refresh', 'access', 'secret', 'key',
+                   'card', 'cvv', 'expiry')
+REDACTED = '[REDACTED]'
+# Cart ids are UUIDs, and whoever knows one can read and fill the cart.
+UUID = re.compile(r'[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}', re.IGNORECASE)
+
+
+def json_shape(value):
+    """``value`` with every string, number, bool and null replaced by its type."""
+    if isinstance(value, dict):
+        return {key: json_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [json_shape(item) for item in value]
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, str):
+        return 'str'
+    return 'null'
+
+
+def sample(shape, key=None):
+    """A JSON value of ``shape``, as recorded by json_shape."""
+    if isinstance(shape, dict):
+        return {name: sample(item, name) for name, item in shape.items()}
+    if isinstance(shape, list):
+        return [sample(item, key) for item in shape]
+    if isinstance(key, str) and key.lower() in SAMPLE_VALUES:
+        return SAMPLE_VALUES[key.lower()]
+    return SAMPLE_TYPES.get(shape)
+
+
+def sensitive(name):
+    name = name.lower().replace('-', '').replace('_', '')
+    return any(part in name for part in SENSITIVE_NAMES)
+
+
+def pseudonym(match):
+    """A UUID standing in for the matched one: stable, but useless as its key."""
+    value = match.group().replace('-', '').lower()
+    digest = hmac.new(settings.SECRET_KEY.encode(), value.encode(), hashlib.sha256).hexdigest()
+    return str(uuid.UUID(digest[:32]))
+
+
+def redact_ids(value):
+    """``value`` with every UUID in it replaced by its pseudonym."""
+    return UUID.sub(pseudonym, value)
+
+
+def scrub(params):
+    """
+    Query parameters with the values of sensitive-looking names redacted
+    and UUIDs replaced by pseudonyms.
+    """
+    return {key: REDACTED if sensitive(key) else redact_ids(value) for key, value in params.items()}
+
+
+def identity_placeholder(user):
+    """A stable pseudonym for the user, so replays can map it to a token."""
+    if not user or not user.is_authenticated:
+        return None
+    digest = hmac.new(settings.SECRET_KEY.encode(), str(user.pk).encode(),
+                      hashlib.sha256).hexdigest()
+    return f"{'staff' if user.is_staff else 'user'}-{digest[:12]}"
+
+
+class TrafficCaptureMiddleware:
+    """
+    Records a sample of API requests as NDJSON for the replay_traffic
+    command. Bodies are recorded as their shape only: JSON bodies as their
+    keys and value types, form and multipart bodies as their field names
+    and file sizes. UUIDs in paths, such as cart ids, are replaced by
+    pseudonyms, so requests for one cart still group together.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TRAFFIC_CAPTURE_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = settings.TRAFFIC_CAPTURE_SAMPLE_RATE
+        self.prefixes = tuple(settings.TRAFFIC_CAPTURE_PATH_PREFIXES)
+        self.max_body = settings.TRAFFIC_CAPTURE_MAX_BODY
+        self.lock = threading.Lock()
+        self.log = open(settings.TRAFFIC_CAPTURE_PATH, 'a', buffering=1, encoding='utf-8')
+
+    def __call__(self, request):
+        if not request.path.startswith(self.prefixes) or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        # JSON bodies have to be read before the view consumes the stream.
+        body = None
+        if request.content_type == 'application/json':
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            if 0 < length <= self.max_body:
+                try:
+                    body = {'json': json_shape(json.loads(request.body))}
+                except ValueError:
+                    body = None
+
+        started = time.monotonic()
+        response = self.get_response(request)
+        elapsed = time.monotonic() - started
+
+        if body is None and request.content_type in ('multipart/form-data',
+                                                      'application/x-www-form-urlencoded'):
+            body = self.form_shape(request)
+
+        match = request.resolver_match
+        entry = {
+            'ts': round(time.time(), 3),
+            'method': request.method,
+            'route': match.route if match else None,
+            'path': redact_ids(request.path),
+            'params': scrub(request.GET.dict()),
+            'content_type': request.content_type if body is not None else None,
+            'body': body,
+            'identity': identity_placeholder(getattr(request, 'user', None)),
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+        }
+        line = json.dumps(entry, default=str)
+        with self.lock:
+            self.log.write(line + '\n')
+        return response
+
+    def form_shape(self, request):
+        # DRF copies the parsed form data back onto the Django request.
+        shape = {key: 'str' for key in request.POST}
+        for key, upload in request.FILES.items():
+            shape[key] = {'file': upload.content_type, 'size': upload.size}
+        return {'shape': shape}
@@ -1,4 +1,7 @@
-from store.models import Customer
+from rest_framework import serializers
+from store.models import Customer, Product
+from store.serializers import ProductSerializer
+from tags.models import TaggedItem
 from djoser.serializers import UserSerializer as BaseUserSerializer, UserCreateSerializer as BaseUserCreateSerializer
 
 
@@ -10,4 +13,18 @@ class UserCreateSerializer(BaseUserCreateSerializer):
 
 class UserSerializer(BaseUserSerializer):
     class Meta(BaseUserSerializer.Meta):
-        fields = ['id', 'username', 'email', 'first_name', 'last_name']
\ No newline at end of file
+        fields = ['id', 'username', 'email', 'first_name', 'last_name']
+
+
+def product_tags(product_ids):
+    return TaggedItem.objects.labels_for(Product, product_ids)
+
+
+class TaggedProductSerializer(ProductSerializer):
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['tags']
+
+    tags = serializers.SerializerMethodField()
+
+    def get_tags(self, product: Product):
+        return product_tags([product.id])[product.id]
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import time
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+# Where files are written before they are renamed into place.
+INCOMING = '.incoming'
+CONTENT_NAME = re.compile(r'^(?:[^/]+/)?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:\.\w+)?$')
+
+
+class URLSigner(signing.TimestampSigner):
+    """
+    Signs with the time rounded down to ``MEDIA_URL_TTL``, so a URL stays
+    the same, and cacheable by browsers, for that long.
+    """
+
+    def timestamp(self):
+        return signing.b62_encode(int(time.time()) // settings.MEDIA_URL_TTL * settings.MEDIA_URL_TTL)
+
+
+def url_token(value, salt='core.storage.url'):
+    """A token for a URL naming ``value``, proving we handed the URL out recently."""
+    return URLSigner(salt=salt).sign(value)[len(value) + 1:]
+
+
+def valid_url_token(value, token, salt='core.storage.url'):
+    """
+    Whether ``token`` is ``url_token(value, salt)`` and not expired; tokens
+    last one to two ``MEDIA_URL_TTL`` from when they were made.
+    """
+    if not token:
+        return False
+    try:
+        URLSigner(salt=salt).unsign(f'{value}:{token}', max_age=2 * settings.MEDIA_URL_TTL)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+class SignedURLMixin:
+    """
+    File URLs carry a ``token`` for their name, so browsers can load them
+    (``<img src>`` sends no Authorization header) for a limited time.
+    """
+
+    def url(self, name):
+        return f'{super().url(name)}?{urlencode({"token": url_token(name)})}'
+
+
+@deconstructible(path='core.storage.SignedFileSystemStorage')
+class SignedFileSystemStorage(SignedURLMixin, FileSystemStorage):
+    pass
+
+
+@deconstructible(path='core.storage.ContentAddressedStorage')
+class ContentAddressedStorage(SignedURLMixin, FileSystemStorage):
+    """
+    Stores every file under the sha256 of its content, as
+    ``<directory>/<aa>/<bb>/<sha256><extension>`` where ``directory`` is the
+    first part of the requested name (the field's ``upload_to``) and the
+    two levels of hash prefixes keep directories small.
+
+    Content already stored is never written again. New files are written
+    to a temporary file and renamed into place, so a name never refers to
+    a partly written file. Files with the same content share a name, so
+    only delete a file once nothing else refers to it.
+    """
+
+    def content_name(self, name, sha256):
+        directory = name.split('/', 1)[0] if '/' in name else ''
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, sha256[:2], sha256[2:4], sha256 + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # The stored name depends only on the content; see _save.
+        return name
+
+    def _save(self, name, content):
+        # Uploads hashed while streaming (designs.uploads) carry their
+        # sha256, so duplicates of them are not even read.
+        sha256 = getattr(content, 'sha256', None)
+        if sha256 and self.exists(self.content_name(name, sha256)):
+            return self.content_name(name, sha256)
+
+        incoming = self.path(INCOMING)
+        self._make_directory(incoming)
+        fd, temporary = tempfile.mkstemp(dir=incoming)
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    f.write(chunk)
+            stored = self.content_name(name, digest.hexdigest())
+            path = self.path(stored)
+            if os.path.exists(path):
+                os.unlink(temporary)
+                return stored
+            self._make_directory(os.path.dirname(path))
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+        return stored
+
+    def adopt(self, name):
+        """
+        Give the file stored as ``name`` its content name and return that.
+        The old name stays a hard link to it (a copy across file systems)
+        until it is deleted, so nothing referring to it breaks meanwhile.
+        """
+        path = self.path(name)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        stored = self.content_name(name, digest.hexdigest())
+        target = self.path(stored)
+        if stored != name and not os.path.exists(target):
+            incoming = self.path(INCOMING)
+            self._make_directory(incoming)
+            temporary = os.path.join(incoming, f'{uuid4().hex}.tmp')
+            try:
+                os.link(path, temporary)
+            except OSError:
+                shutil.copy2(path, temporary)
+            self._make_directory(os.path.dirname(target))
+            os.replace(temporary, target)
+        return stored
+
+    def _make_directory(self, directory):
+        if self.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+            return
+        old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+        try:
+            os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        finally:
+            os.umask(old_umask)
+
+
+def media_storage():
+    """The storage of uploaded media fields, ``STORAGES['media']``."""
+    return storages['media']
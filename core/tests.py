@@ -1,3 +1,177 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import LiveServerTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from store.models import Cart, Collection, Product
+from tags.models import Tag, TaggedItem
+
+from .middleware import json_shape, sample, scrub
+from .storage import CONTENT_NAME, INCOMING, ContentAddressedStorage
+
+
+class CaptureTestMixin:
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.log = os.path.join(directory, 'traffic.jsonl')
+        settings = override_settings(TRAFFIC_CAPTURE_ENABLED=True, TRAFFIC_CAPTURE_SAMPLE_RATE=1,
+                                     TRAFFIC_CAPTURE_PATH=self.log)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.product = Product.objects.create(
+            title='Shirt', slug='shirt', unit_price=Decimal('10.00'), inventory=10,
+            collection=Collection.objects.create(title='Tees'))
+
+    def captured(self):
+        with open(self.log) as f:
+            return [json.loads(line) for line in f]
+
+
+class TrafficCaptureTests(CaptureTestMixin, TestCase):
+    def test_bodies_are_recorded_as_their_shape(self):
+        # The middleware is loaded with the client's first request.
+        client = APIClient()
+        cart = Cart.objects.create()
+        client.post(f'/store/carts/{cart.id}/items/',
+                    {'product_id': self.product.id, 'quantity': 2}, format='json')
+        client.get('/store/products/', {'search': 'shirt', 'access_token': 'abc'})
+        client.get('/admin/')
+        post, get = self.captured()
+        self.assertEqual(post['body'], {'json': {'product_id': 'int', 'quantity': 'int'}})
+        self.assertEqual(post['status'], 201)
+        self.assertIn('carts', post['route'])
+        self.assertEqual(get['params'], {'search': 'shirt', 'access_token': '[REDACTED]'})
+
+    def test_cart_ids_are_not_recorded(self):
+        client = APIClient()
+        carts = [Cart.objects.create() for _ in range(2)]
+        for cart in carts + carts[:1]:
+            client.get(f'/store/carts/{cart.id}/', {'cart': str(cart.id)})
+        entries = self.captured()
+        log = json.dumps(entries)
+        for cart in carts:
+            self.assertNotIn(str(cart.id), log)
+            self.assertNotIn(cart.id.hex, log)
+        self.assertEqual(entries[0]['path'], entries[2]['path'])
+        self.assertNotEqual(entries[0]['path'], entries[1]['path'])
+        self.assertEqual(entries[0]['params']['cart'], entries[0]['path'].split('/')[3])
+
+
+class ShapeTests(TestCase):
+    def test_samples_have_the_captured_shape(self):
+        body = {'name': 'Sam', 'items': [{'id': 3, 'price': 1.5}], 'gift': False, 'note': None,
+                'card_number': '4000 0000 0000 0002'}
+        shape = json_shape(body)
+        self.assertNotIn('Sam', json.dumps(shape))
+        self.assertEqual(sample(shape), {'name': 'x', 'items': [{'id': 1, 'price': 1.0}], 'gift': False,
+                                         'note': None, 'card_number': '4111111111111111'})
+
+    def test_scrub(self):
+        self.assertEqual(scrub({'userPassword': 'a', 'refresh-token': 'b', 'page': '2'}),
+                         {'userPassword': '[REDACTED]', 'refresh-token': '[REDACTED]', 'page': '2'})
+
+
+class ReplayTests(CaptureTestMixin, LiveServerTestCase):
+    def test_captured_traffic_replays(self):
+        client = APIClient()
+        for page in range(1, 4):
+            client.get('/store/products/', {'page': page})
+        client.post('/store/carts/', {}, format='json')
+        report = os.path.join(os.path.dirname(self.log), 'report.json')
+        call_command('replay_traffic', self.log, base_url=self.live_server_url, concurrency=2,
+                     output=report, stdout=StringIO())
+        with open(report) as f:
+            summary = json.load(f)
+        self.assertEqual(summary['summary']['requests'], 4)
+        self.assertEqual(summary['summary']['error_rate'], 0)
+        self.assertEqual({route: row['requests'] for route, row in summary['routes'].items()},
+                         {'GET store/products/$': 3, 'POST store/carts/$': 1})
+
+
+class TaggedProductTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        collection = Collection.objects.create(title='Tees')
+        self.products = [
+            Product.objects.create(title=f'Shirt {i}', slug=f'shirt-{i}', unit_price=Decimal('10.00'),
+                                   inventory=1, collection=collection)
+            for i in range(6)]
+        content_type = ContentType.objects.get_for_model(Product)
+        cats, music = Tag.objects.create(label='cats'), Tag.objects.create(label='music')
+        for product, tags in zip(self.products, [[cats], [cats, music], [music], [], [], []]):
+            for tag in tags:
+                TaggedItem.objects.create(tag=tag, content_type=content_type, object_id=product.id)
+        # Tags of another model with the same ids are not the products'.
+        TaggedItem.objects.create(tag=music, content_type=ContentType.objects.get_for_model(Collection),
+                                  object_id=self.products[3].id)
+
+    def tags(self, **params):
+        response = self.client.get('/store/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return {item['id']: item['tags'] for item in response.json()['results']}
+
+    def test_products_carry_their_tags(self):
+        first, second = self.products[:2]
+        tags = self.tags()
+        self.assertEqual(tags[first.id], ['cats'])
+        self.assertEqual(tags[second.id], ['cats', 'music'])
+        self.assertEqual(tags[self.products[3].id], [])
+        self.assertEqual(self.client.get(f'/store/products/{second.id}/').json()['tags'], ['cats', 'music'])
+
+    def test_tags_are_loaded_once_per_page(self):
+        self.tags(page_size=1)
+        with self.assertNumQueries(3):
+            self.tags()
+
+    def test_filter_by_tag(self):
+        self.assertEqual(set(self.tags(tag='music')), {self.products[1].id, self.products[2].id})
+        self.assertEqual(set(self.tags(tag='cats', search='Shirt 0')), {self.products[0].id})
+        self.assertEqual(self.tags(tag='dogs'), {})
+
+    def test_labels_for(self):
+        labels = TaggedItem.objects.labels_for(Product, [product.id for product in self.products[:3]])
+        self.assertEqual(dict(labels), {self.products[0].id: ['cats'], self.products[1].id: ['cats', 'music'],
+                                        self.products[2].id: ['music']})
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.root)
+        self.sha256 = hashlib.sha256(b'artwork').hexdigest()
+
+    def test_files_are_named_by_their_content(self):
+        name = self.storage.save('design_uploads/Cat.PNG', ContentFile(b'artwork'))
+        self.assertEqual(name, f'design_uploads/{self.sha256[:2]}/{self.sha256[2:4]}/{self.sha256}.png')
+        self.assertTrue(CONTENT_NAME.match(name))
+        self.assertEqual(self.storage.save('design_uploads/copy.png', ContentFile(b'artwork')), name)
+        self.assertEqual(self.storage.open(name).read(), b'artwork')
+        self.assertEqual(os.listdir(os.path.join(self.root, INCOMING)), [])
+        self.assertIn('?token=', self.storage.url(name))
+
+    def test_hashed_uploads_already_stored_are_not_read(self):
+        name = self.storage.save('design_uploads/a.png', ContentFile(b'artwork'))
+        upload = ContentFile(b'never read')
+        upload.sha256 = self.sha256
+        self.assertEqual(self.storage.save('design_uploads/b.png', upload), name)
+        self.assertEqual(self.storage.open(name).read(), b'artwork')
+
+    def test_adopt_keeps_the_old_name_until_it_is_deleted(self):
+        os.makedirs(os.path.join(self.root, 'templates'))
+        with open(os.path.join(self.root, 'templates', 'old.png'), 'wb') as f:
+            f.write(b'artwork')
+        name = self.storage.adopt('templates/old.png')
+        self.assertEqual(name, f'templates/{self.sha256[:2]}/{self.sha256[2:4]}/{self.sha256}.png')
+        self.assertTrue(os.path.samefile(self.storage.path(name), self.storage.path('templates/old.png')))
+        self.assertEqual(self.storage.adopt(name), name)
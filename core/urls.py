@@ -0,0 +1,9 @@
+from rest_framework.routers import SimpleRouter
+from rest_framework.urlpatterns import format_suffix_patterns
+from . import views
+
+# Mounted ahead of store.urls, so products are served with their tags.
+router = SimpleRouter()
+router.register('products', views.TaggedProductViewSet, basename='products')
+
+urlpatterns = format_suffix_patterns(router.urls)
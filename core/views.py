@@ -1,3 +1,13 @@
-from django.shortcuts import render
+from store.rows import RowSerializer
+from store.views import ProductViewSet
+from .filters import TaggedProductFilter
+from .serializers import TaggedProductSerializer, product_tags
 
-# Create your views here.
+
+class TaggedProductViewSet(ProductViewSet):
+    """ProductViewSet with each product's tags, and filtering by tag."""
+    serializer_class = TaggedProductSerializer
+    row_serializer = RowSerializer(
+        TaggedProductSerializer, computed=ProductViewSet.row_serializer.computed,
+        loaders={'tags': product_tags})
+    filterset_class = TaggedProductFilter
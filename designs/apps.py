@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class DesignsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'designs'
+
+    def ready(self) -> None:
+        import designs.signals.handlers
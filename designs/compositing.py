@@ -0,0 +1,249 @@
+"""
+Mockup compositing with numpy.
+
+A garment is one grayscale shading map with a mask of its shape, loaded
+once. Recoloring it to any color is one table lookup per channel, and a
+design is alpha blended onto it with its premultiplied colors and inverse
+alpha precomputed, so a mockup costs a few array passes instead of a PIL
+decode, resize and paste per request.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageColor
+
+# Bump whenever a change alters rendered pixels; cached mockups are keyed by it.
+VERSION = 1
+
+GARMENT_SIZE = (800, 800)
+SIZE_FACTORS = {'xs': 0.5, 's': 0.6, 'm': 0.7, 'l': 0.8, 'xl': 0.9, 'xxl': 1.0}
+
+# Per process. An 800x800 shirt is about 1.9 MB, so every COLOR_CHOICES
+# shirt fits with room for a few custom colors; a design layer is about
+# 12 bytes per pixel of its visible part.
+SHIRT_CACHE_BYTES = 24 * 1024 * 1024
+LAYER_CACHE_BYTES = 48 * 1024 * 1024
+
+
+class Garment:
+    """
+    The shading map of a garment, already multiplied by its mask, and the
+    white showing around it, as uint8 arrays.
+    """
+
+    def __init__(self, shading, mask=None):
+        self.height, self.width = shading.shape
+        if mask is None:
+            self.shading, self.background = shading.astype(np.uint8), None
+        else:
+            mask = mask.astype(np.uint16)
+            self.shading = (shading.astype(np.uint16) * mask // 255).astype(np.uint8)
+            self.background = (255 - mask).astype(np.uint8)
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @classmethod
+    def open(cls, path):
+        """A grayscale PNG; its alpha channel, if any, is the garment's shape."""
+        with Image.open(path) as image:
+            has_mask = 'A' in image.getbands() or 'transparency' in image.info
+            pixels = np.asarray(image.convert('LA'))
+        return cls(pixels[..., 0], pixels[..., 1] if has_mask else None)
+
+    @classmethod
+    def plain(cls, size=GARMENT_SIZE):
+        """A flat garment covering the whole mockup."""
+        return cls(np.full((size[1], size[0]), 255, dtype=np.uint8))
+
+    def recolor(self, rgb):
+        """
+        The garment in ``rgb`` as an (height, width, 3) uint8 array. Each
+        channel is one lookup of the shading map in a 256 entry table.
+        """
+        pixels = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        levels = np.arange(256, dtype=np.uint16)
+        for channel, value in enumerate(rgb):
+            np.take((levels * value // 255).astype(np.uint8), self.shading, out=pixels[..., channel])
+        if self.background is not None:
+            pixels += self.background[..., None]
+        return pixels
+
+
+class Layer:
+    """
+    A design prepared for blending: cropped to its visible pixels, with
+    its premultiplied colors and inverse alpha precomputed.
+    """
+
+    def __init__(self, image, offset=(0, 0), size=None):
+        pixels = np.asarray(image.convert('RGBA'))
+        alpha = pixels[..., 3:]
+        # Where the crop sits in the scaled design, and the design's size.
+        self.offset = offset
+        self.size = size or image.size
+        self.height, self.width = alpha.shape[:2]
+        self.opaque = bool(alpha.min() == 255)
+        self.color = pixels[..., :3]
+        # color is a view that keeps all of pixels alive.
+        self.nbytes = pixels.nbytes
+        if not self.opaque:
+            self.premultiplied = self.color * alpha.astype(np.uint16)
+            self.inverse_alpha = (255 - alpha).astype(np.uint16)
+            self.nbytes += self.premultiplied.nbytes + self.inverse_alpha.nbytes
+
+    @classmethod
+    def scaled(cls, image, size):
+        """``image`` scaled to ``size``, resampling only its visible part."""
+        image = image.convert('RGBA')
+        box = image.getbbox(alpha_only=True) or (0, 0, 1, 1)
+        scale_x, scale_y = size[0] / image.width, size[1] / image.height
+        left, top = int(box[0] * scale_x), int(box[1] * scale_y)
+        right = max(left + 1, min(size[0], round(box[2] * scale_x)))
+        bottom = max(top + 1, min(size[1], round(box[3] * scale_y)))
+        if (left, top, right, bottom) == (0, 0) + tuple(size) and image.size == tuple(size):
+            return cls(image)
+        return cls(image.resize((right - left, bottom - top), Image.BICUBIC,
+                                box=(left / scale_x, top / scale_y,
+                                     right / scale_x, bottom / scale_y),
+                                reducing_gap=3.0),
+                   offset=(left, top), size=tuple(size))
+
+    def blend(self, base, position):
+        """Blend onto ``base``, an (height, width, 3) uint8 array, in place."""
+        x, y = position[0] + self.offset[0], position[1] + self.offset[1]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + self.width, base.shape[1]), min(y + self.height, base.shape[0])
+        if x0 >= x1 or y0 >= y1:
+            return base
+        inside = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+        if self.opaque:
+            base[y0:y1, x0:x1] = self.color[inside]
+            return base
+        region = base[y0:y1, x0:x1] * self.inverse_alpha[inside]
+        region += self.premultiplied[inside]
+        region += 127
+        base[y0:y1, x0:x1] = np.floor_divide(region, 255, out=region)
+        return base
+
+
+class SizedCache:
+    """
+    A thread-safe LRU mapping that drops its least recently used values
+    once their ``nbytes`` add up to more than ``max_bytes``. A value larger
+    than the whole budget is returned by the caller but never kept.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if value.nbytes > self.max_bytes:
+            return value
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self._entries[key] = value
+            self.nbytes += value.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def parse_color(color):
+    """An RGB tuple from a color name such as ``Mockup.COLOR_CHOICES`` or a hex code."""
+    return ImageColor.getrgb(color)[:3]
+
+
+@lru_cache(maxsize=None)
+def garment(name='tshirt'):
+    """
+    The garment named ``name``, read from ``static/tshirt_templates/<name>.png``
+    or a flat shirt when there is no such shading map.
+    """
+    path = Path(settings.BASE_DIR) / 'static' / 'tshirt_templates' / f'{name}.png'
+    return Garment.open(path) if path.exists() else Garment.plain()
+
+
+shirts = SizedCache(SHIRT_CACHE_BYTES)
+layers = SizedCache(LAYER_CACHE_BYTES)
+
+
+def shirt(name, rgb):
+    """The garment ``name`` recolored to ``rgb``, as a read-only array."""
+    key = (name, tuple(rgb))
+    pixels = shirts.get(key)
+    if pixels is None:
+        pixels = garment(name).recolor(rgb)
+        pixels.flags.writeable = False
+        shirts.put(key, pixels)
+    return pixels
+
+
+def layer(path, size):
+    """The design at ``path`` scaled to ``size``, cached until the file changes."""
+    key = (str(path), os.stat(path).st_mtime_ns, tuple(size))
+    cached = layers.get(key)
+    if cached is None:
+        with Image.open(path) as image:
+            image.draft('RGB', size)
+            cached = layers.put(key, Layer.scaled(image, size))
+    return cached
+
+
+def design_size(width, height, size, garment_size):
+    """
+    The pasted size of a ``width`` x ``height`` design in shirt size
+    ``size``; designs larger than the shirt are fitted onto it.
+    """
+    factor = min(SIZE_FACTORS.get(size, 0.7), garment_size[0] / width, garment_size[1] / height)
+    return max(1, int(width * factor)), max(1, int(height * factor))
+
+
+def render(color, design=None, name='tshirt'):
+    """
+    A mockup as a PIL image: the garment recolored to ``color`` with the
+    ``design`` Layer centered horizontally, a third of the way down.
+    """
+    base = shirt(name, parse_color(color))
+    image = Image.fromarray(base, 'RGB')
+    if design is not None:
+        # Only the design's box is copied and blended; the rest of the
+        # shirt is the read-only cached array.
+        height, width = base.shape[:2]
+        x = (width - design.size[0]) // 2 + design.offset[0]
+        y = (height - design.size[1]) // 3 + design.offset[1]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + design.width, width), min(y + design.height, height)
+        if x0 < x1 and y0 < y1:
+            region = base[y0:y1, x0:x1].copy()
+            design.blend(region, (x - x0 - design.offset[0], y - y0 - design.offset[1]))
+            image.paste(Image.fromarray(region, 'RGB'), (x0, y0))
+    return image
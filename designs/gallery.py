@@ -0,0 +1,50 @@
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Template
+
+VERSION_KEY = 'template-gallery:version:{}'
+ALL = '*'
+
+
+def version(category):
+    """A random token replaced whenever the category's templates change."""
+    key = VERSION_KEY.format(category)
+    token = cache.get(key)
+    if token is None:
+        cache.add(key, uuid4().hex, None)
+        token = cache.get(key)
+    return token
+
+
+def invalidate(*categories):
+    """Drop the cached listings of ``categories`` and the unfiltered ones."""
+    for category in {ALL, *categories} - {None}:
+        cache.set(VERSION_KEY.format(category), uuid4().hex, None)
+
+
+def listing_key(request):
+    """
+    The cache key and ETag of a gallery listing. Listings filtered by one
+    category are only invalidated by changes to that category; any other
+    listing by every change.
+    """
+    category = request.query_params.get('category')
+    if category not in dict(Template.CATEGORY_CHOICES) or \
+            set(request.query_params) - {'category', 'page'}:
+        category = ALL
+    digest = hashlib.sha1('|'.join([
+        version(category), request.accepted_renderer.format,
+        request.build_absolute_uri()]).encode()).hexdigest()
+    return f'template-gallery:{digest}', f'"{digest}"'
+
+
+def cached_listing(key):
+    return cache.get(key)
+
+
+def store_listing(key, data):
+    cache.set(key, data, settings.TEMPLATE_GALLERY_CACHE_TTL)
@@ -0,0 +1,30 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from designs import uploads
+from designs.models import Design
+
+
+class Command(BaseCommand):
+    help = 'Moves design files uploaded before deduplication into shared blobs'
+
+    def handle(self, *args, **options):
+        moved = skipped = 0
+        pending = Design.objects.filter(blob__isnull=True).exclude(design_file='') \
+            .exclude(design_file__isnull=True).order_by('id').values_list('id', 'design_file')
+        for pk, name in pending.iterator():
+            try:
+                with default_storage.open(name) as upload, transaction.atomic():
+                    blob = uploads.attach(upload)
+                    Design.objects.filter(pk=pk).update(
+                        blob=blob, design_file=blob.file.name, file_type=blob.file_type)
+            except (OSError, ValidationError) as e:
+                self.stderr.write(f'Design {pk}: {e}')
+                skipped += 1
+                continue
+            if name != blob.file.name and not Design.objects.filter(design_file=name).exists():
+                default_storage.delete(name)
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved:,} designs into blobs, skipped {skipped:,}'))
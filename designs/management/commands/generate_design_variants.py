@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from designs.models import DesignBlob
+from designs.variants import generate
+
+
+class Command(BaseCommand):
+    help = 'Generates the downscaled variants of design files that have none'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Regenerate the variants of every design file.')
+
+    def handle(self, *args, **options):
+        blobs = DesignBlob.objects.all()
+        if not options['all']:
+            blobs = blobs.filter(variants={})
+        count = 0
+        for blob_id in blobs.order_by('id').values_list('id', flat=True).iterator():
+            generate(blob_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {count:,} design files'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from designs.models import Template
+from designs.variants import generate_thumbnail
+
+
+class Command(BaseCommand):
+    help = 'Generates the gallery thumbnails of templates that have none'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Regenerate the thumbnail of every template.')
+
+    def handle(self, *args, **options):
+        templates = Template.objects.exclude(image='')
+        if not options['all']:
+            templates = templates.filter(thumbnail__isnull=True)
+        count = 0
+        for pk, image in templates.order_by('id').values_list('id', 'image').iterator():
+            if generate_thumbnail(pk, image):
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'Generated {count:,} template thumbnails'))
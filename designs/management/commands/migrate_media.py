@@ -0,0 +1,92 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+
+from core.storage import CONTENT_NAME, ContentAddressedStorage
+from designs.models import DesignBlob
+
+# Rendered mockups are already named by what they show; see designs.mockups.
+KEYED_NAME = re.compile(r'^mockups/v\d+/')
+
+
+def content_fields():
+    """Every ``(model, field)`` stored in a ContentAddressedStorage."""
+    return [(model, field) for model in apps.get_models() for field in model._meta.concrete_fields
+            if isinstance(field, models.FileField)
+            and isinstance(field.storage, ContentAddressedStorage)]
+
+
+class Command(BaseCommand):
+    help = 'Moves media stored before content-addressed storage into it and rewrites the file fields'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=min(32, (os.cpu_count() or 1) * 4),
+                            help='Files hashed and moved at once.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='File names rewritten per UPDATE.')
+
+    def handle(self, *args, **options):
+        fields = content_fields()
+        storage = fields[0][1].storage
+        names = set()
+        for model, field in fields:
+            names.update(model.objects.exclude(**{f'{field.name}__isnull': True})
+                         .exclude(**{field.name: ''})
+                         .values_list(field.name, flat=True).distinct().iterator())
+        pending = sorted(name for name in names
+                         if not CONTENT_NAME.match(name) and not KEYED_NAME.match(name))
+
+        def adopt(name):
+            try:
+                return name, storage.adopt(name)
+            except FileNotFoundError:
+                self.stderr.write(f'Missing: {name}')
+                return name, None
+
+        # Hashing and linking are I/O bound; the rows are rewritten only
+        # once every file is in place under both names.
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            moved = {name: stored for name, stored in executor.map(adopt, pending)
+                     if stored is not None}
+
+        batch_size = options['batch_size']
+        old_names = sorted(moved)
+        rows = 0
+        with transaction.atomic():
+            for model, field in fields:
+                for start in range(0, len(old_names), batch_size):
+                    batch = old_names[start:start + batch_size]
+                    rows += model.objects.filter(**{f'{field.name}__in': batch}).update(**{
+                        field.name: Case(*[When(**{field.name: name}, then=Value(moved[name]))
+                                           for name in batch],
+                                     default=F(field.name), output_field=models.CharField())})
+            # Variants as large as their original are the original file.
+            blobs = []
+            for blob in DesignBlob.objects.exclude(variants={}).only('id', 'variants').iterator():
+                changed = False
+                for variant in blob.variants.values():
+                    if variant['name'] in moved:
+                        variant['name'] = moved[variant['name']]
+                        changed = True
+                if changed:
+                    blobs.append(blob)
+            DesignBlob.objects.bulk_update(blobs, ['variants'], batch_size=batch_size)
+
+        # Rows saved while this ran may still use an old name.
+        unused = set(old_names)
+        for model, field in fields:
+            for start in range(0, len(old_names), batch_size):
+                unused.difference_update(model.objects.filter(
+                    **{f'{field.name}__in': old_names[start:start + batch_size]})
+                    .values_list(field.name, flat=True))
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            list(executor.map(storage.delete, sorted(unused)))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {len(moved):,} files into {len(set(moved.values())):,} content-addressed '
+            f'files and rewrote {rows:,} file fields'))
@@ -0,0 +1,34 @@
+import re
+
+from django.db.models import Q
+
+from .models import Design, Mockup, Template
+
+TEMPLATE_DIRECTORIES = ('templates/', 'template_thumbnails/')
+# Where media is stored under MEDIA_ROOT; nothing else there is served,
+# not even to staff.
+DIRECTORIES = ('design_uploads/', 'design_variants/', 'mockups/') + TEMPLATE_DIRECTORIES
+# Variants and rendered mockups are named after their design blob's sha256.
+BLOB_FILE = re.compile(r'^(?:design_variants|mockups/v\d+)/[0-9a-f]{2}/([0-9a-f]{64})_')
+
+
+def readable(user, name):
+    """
+    Whether ``user`` may download the media file ``name``: template images
+    are public, designs, their variants and mockups belong to the customer
+    owning the design, and staff may read every file in ``DIRECTORIES``.
+    """
+    if not name.startswith(DIRECTORIES):
+        return False
+    if name.startswith(TEMPLATE_DIRECTORIES):
+        return Template.objects.filter(Q(image=name) | Q(thumbnail=name)).exists()
+    if not user.is_authenticated:
+        return False
+    if user.is_staff:
+        return True
+    designs = Design.objects.filter(customer__user=user)
+    match = BLOB_FILE.match(name)
+    if match:
+        return designs.filter(blob__sha256=match.group(1)).exists()
+    return designs.filter(design_file=name).exists() or \
+        Mockup.objects.filter(design__in=designs, mockup_image=name).exists()
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('designs', '0002_design_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='designblob',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
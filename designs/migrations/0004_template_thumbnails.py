@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('designs', '0003_design_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='template',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='template_thumbnails/'),
+        ),
+    ]
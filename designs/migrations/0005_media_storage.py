@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:15
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('designs', '0004_template_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='design',
+            name='design_file',
+            field=models.FileField(blank=True, null=True, storage=core.storage.media_storage, upload_to='design_uploads/'),
+        ),
+        migrations.AlterField(
+            model_name='designblob',
+            name='file',
+            field=models.FileField(storage=core.storage.media_storage, upload_to='design_uploads/'),
+        ),
+        migrations.AlterField(
+            model_name='mockup',
+            name='mockup_image',
+            field=models.ImageField(storage=core.storage.media_storage, upload_to='mockups/'),
+        ),
+        migrations.AlterField(
+            model_name='template',
+            name='image',
+            field=models.ImageField(storage=core.storage.media_storage, upload_to='templates/'),
+        ),
+        migrations.AlterField(
+            model_name='template',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=core.storage.media_storage, upload_to='template_thumbnails/'),
+        ),
+    ]
@@ -0,0 +1,320 @@
+"""
+Rendered mockups, cached by what they show.
+
+A mockup depends only on the design's content, the shirt color and size and
+the renderer, so it is rendered once per ``(sha256, color, size,
+compositing.VERSION)`` into a file named after that key and shared by every
+design with the same content. Bumping ``compositing.VERSION`` moves every
+name, so mockups from an older renderer are never served again.
+
+Mockups only looked at are not stored at all: ``image`` renders them on
+demand, in any format and width, into a bounded least recently used
+cache on local disk.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageDraw, ImageFont
+
+from core.storage import url_token, valid_url_token
+
+from . import compositing, svg
+
+# Seconds a worker may hold a render lock; a lock left by a worker that
+# died is taken over after this long.
+LOCK_TIMEOUT = 60
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+@contextmanager
+def _lock(key):
+    """
+    Hold the lock of ``key``, shared by every worker through the cache;
+    threads of one process queue on a local lock first. The local lock is
+    dropped once nobody waits on it.
+    """
+    with _locks_lock:
+        entry = _locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0], _shared_lock(key):
+            yield
+    finally:
+        with _locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _locks[key]
+
+
+@contextmanager
+def _shared_lock(key):
+    name = f'mockups:lock:{hashlib.sha256(key.encode()).hexdigest()}'
+    token = uuid4().hex
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    delay = 0.01
+    # Past the deadline the holder is presumed dead: render anyway, the
+    # caller writes atomically and checks for the file again first.
+    while not cache.add(name, token, LOCK_TIMEOUT) and time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+    try:
+        yield
+    finally:
+        if cache.get(name) == token:
+            cache.delete(name)
+
+
+def design_layer(design, size):
+    """The design as a compositing Layer for shirt ``size``, read from its smallest adequate variant."""
+    blob = design.blob
+    source = design.design_file.path
+    if blob is not None and blob.width:
+        width, height = blob.width, blob.height
+    else:
+        with Image.open(source) as image:
+            width, height = image.size
+    new_size = compositing.design_size(width, height, size, compositing.garment().size)
+    if blob is not None and blob.width:
+        # Scale down from the smallest variant that is still large enough.
+        name = blob.variant_for(*new_size)
+        if blob.file_type == 'svg' and name == blob.file.name:
+            # Its rasters aren't made yet; draw just this size.
+            with blob.file.open('rb') as f:
+                return compositing.Layer.scaled(svg.rasterize(f.read(), max(new_size)), new_size)
+        source = design.design_file.storage.path(name)
+    return compositing.layer(source, new_size)
+
+
+def render(design, color, size):
+    """The mockup of ``design``; designs that can't be read show their description instead."""
+    if design.design_file:
+        try:
+            return compositing.render(color, design_layer(design, size))
+        except Exception:
+            pass
+    return described(design, color)
+
+
+def described(design, color):
+    """The mockup shown for designs that can't be read: their description on a blank shirt."""
+    tshirt = compositing.render(color)
+    draw = ImageDraw.Draw(tshirt)
+    font = ImageFont.load_default()
+    draw.text((400, 400), design.design_description, fill="black", font=font)
+    return tshirt
+
+
+def png(image):
+    image_io = BytesIO()
+    image.save(image_io, format='PNG')
+    return image_io.getvalue()
+
+
+# Signs the image URLs handed out by MockupViewSet.preview.
+URL_SALT = 'designs.mockups.image'
+
+
+def _image_params(design_id, color, size, format, width):
+    return f'{design_id}:{color}:{size}:{format}:{width or ""}'
+
+
+def image_token(design_id, color, size, format='png', width=None):
+    """
+    A token for the URL of one mockup image. It names every render
+    parameter, so a URL can't be edited into other renders to fill the
+    disk cache.
+    """
+    return url_token(_image_params(design_id, color, size, format, width), salt=URL_SALT)
+
+
+def valid_image_token(token, design_id, color, size, format='png', width=None):
+    return valid_url_token(_image_params(design_id, color, size, format, width), token,
+                           salt=URL_SALT)
+
+FORMATS = {'png': ('PNG', 'image/png'), 'jpeg': ('JPEG', 'image/jpeg'), 'webp': ('WEBP', 'image/webp')}
+
+
+class DiskCache:
+    """
+    Files under ``root`` named by key, deleted least recently used first
+    once they take more than ``max_bytes``. Reading a file marks it used.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Bytes on disk, counted when first needed; other processes writing
+        # to the same directory are caught up with at the next eviction.
+        self._size = None
+
+    def path(self, key, extension):
+        return self.root / key[:2] / f'{key}.{extension}'
+
+    def get(self, key, extension):
+        """The path of a cached file, or None."""
+        path = self.path(key, extension)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, extension, data):
+        """Write a file, atomically, and make room for it. Returns its path."""
+        path = self.path(key, extension)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=path.parent, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self.entries())
+            else:
+                self._size += len(data)
+            full = self._size > self.max_bytes
+        if full:
+            self.evict()
+        return path
+
+    def entries(self):
+        """``(last used, size, path)`` of every cached file."""
+        entries = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.startswith('.'):
+                    continue
+                path = Path(directory) / name
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Delete the least recently used files until the cache is down to 90% of its budget."""
+        with self._lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes * 0.9:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+            self._size = total
+
+    def clear(self):
+        """Delete every cached file."""
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self._size = 0
+
+
+disk_cache = DiskCache(settings.MOCKUP_CACHE_DIR, settings.MOCKUP_CACHE_MAX_BYTES)
+
+
+def content_key(design):
+    """
+    What the mockups of ``design`` depend on besides color and size: its
+    content hash, shared with every design of the same content, or for
+    designs without readable stored content, the design itself.
+    """
+    blob = design.blob if design.blob_id else None
+    if blob is not None and blob.width:
+        return blob.sha256
+    return f'design:{design.pk}:{design.design_file.name}:{design.design_description}'
+
+
+def image_key(design, color, size, format, width):
+    """The cache key, and ETag, of a mockup image."""
+    parts = [compositing.VERSION, content_key(design), color, size, format, width]
+    return hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def image(design, color, size, format='png', width=None):
+    """
+    The path of the mockup image in ``format`` (a ``FORMATS`` key),
+    ``width`` pixels wide or full size, rendered into the disk cache on
+    first use. Concurrent requests for the same image wait for one render.
+    """
+    key = image_key(design, color, size, format, width)
+    path = disk_cache.get(key, format)
+    if path is not None:
+        return path
+    with _lock(key):
+        path = disk_cache.get(key, format)
+        if path is not None:
+            return path
+        mockup = render(design, color, size)
+        if width and width < mockup.width:
+            mockup = mockup.resize((width, round(mockup.height * width / mockup.width)), Image.LANCZOS)
+        encoded = BytesIO()
+        if format == 'jpeg':
+            mockup.save(encoded, format='JPEG', quality=85, optimize=True)
+        else:
+            mockup.save(encoded, format=FORMATS[format][0])
+        return disk_cache.put(key, format, encoded.getvalue())
+
+
+def cache_names(design, color, size):
+    """
+    The file names the mockup is cached under: the render, and the
+    description shown instead when the content can't be read (designs of
+    the same content may be described differently). Empty for designs
+    without stored content.
+    """
+    if design.blob_id is None:
+        return ()
+    sha256 = design.blob.sha256
+    name = f'mockups/v{compositing.VERSION}/{sha256[:2]}/{sha256}_{color}_{size}'
+    description = hashlib.sha256(design.design_description.encode()).hexdigest()[:16]
+    return f'{name}.png', f'{name}_{description}.png'
+
+
+def rendered(design, color, size):
+    """
+    The file name of the mockup, rendered first if it isn't cached yet.
+    Concurrent requests for the same mockup wait for one render. Returns
+    None when the design has no stored content.
+    """
+    names = cache_names(design, color, size)
+    if not names:
+        return None
+    name, fallback = names
+
+    def cached():
+        return next((candidate for candidate in names if default_storage.exists(candidate)), None)
+
+    found = cached()
+    if found is not None:
+        return found
+    with _lock(name):
+        found = cached()
+        if found is not None:
+            return found
+        try:
+            image = compositing.render(color, design_layer(design, size))
+        except Exception:
+            return default_storage.save(fallback, ContentFile(png(described(design, color))))
+        return default_storage.save(name, ContentFile(png(image)))
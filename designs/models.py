@@ -1,18 +1,69 @@
 from django.db import models
+from core.storage import media_storage
 from store.models import Customer
 
 
+class DesignBlob(models.Model):
+    """
+    One stored copy of an uploaded design file, shared by every design with
+    the same content. ``ref_count`` is the number of designs using it; the
+    blob and its file go away when it drops to zero.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='design_uploads/', storage=media_storage)
+    file_type = models.CharField(max_length=10)
+    size = models.PositiveBigIntegerField()
+    width = models.PositiveIntegerField(null=True)
+    height = models.PositiveIntegerField(null=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Downscaled copies, ``{name: {'name': storage name, 'width', 'height'}}``,
+    # filled in by ``designs.variants`` after the upload.
+    variants = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return self.sha256
+
+    def variant_for(self, width, height):
+        """
+        The storage name of the smallest copy at least ``width`` x ``height``.
+        SVGs have only raster copies, so they fall back to the largest one.
+        """
+        adequate = [variant for variant in self.variants.values()
+                    if variant['width'] >= width and variant['height'] >= height]
+        if not adequate:
+            if self.file_type == 'svg' and self.variants:
+                return max(self.variants.values(), key=lambda variant: variant['width'])['name']
+            return self.file.name
+        return min(adequate, key=lambda variant: variant['width'])['name']
+
+
+class DesignManager(models.Manager):
+    def visible_to(self, user):
+        """Designs are private: each customer sees only their own."""
+        if not user or not user.is_authenticated:
+            return self.none()
+        return self.filter(customer__user=user)
+
+
 class Design(models.Model):
+    objects = DesignManager()
     design_description = models.TextField()
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add= True)
-    design_file = models.FileField(upload_to='design_uploads/',null=True, blank=True)
+    design_file = models.FileField(upload_to='design_uploads/', storage=media_storage, null=True, blank=True)
     file_type = models.CharField(max_length=10, choices=[
         ('jpeg', 'JPEG'), 
         ('png', 'PNG'), 
         ('svg', 'SVG')
     ], null=True, blank=True)
+    blob = models.ForeignKey(DesignBlob, on_delete=models.PROTECT, null=True, blank=True,
+                             editable=False, related_name='designs')
     
+    @property
+    def variants(self):
+        return self.blob.variants if self.blob_id else {}
+
     def __str__(self):
         return f"Design {self.id} by {self.customer.first_name or 'Unknown'}"
     
@@ -29,7 +80,10 @@ class Template(models.Model):
     ]
 
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
-    image = models.ImageField(upload_to='templates/')
+    image = models.ImageField(upload_to='templates/', storage=media_storage)
+    # A small copy for the gallery, made by ``designs.variants`` on upload.
+    thumbnail = models.ImageField(upload_to='template_thumbnails/', storage=media_storage,
+                                  null=True, blank=True, editable=False)
     description = models.TextField(blank=True)
 
     def __str__(self):
@@ -61,7 +115,7 @@ class Mockup(models.Model):
     design = models.ForeignKey(Design, on_delete=models.CASCADE, related_name='mockups')
     color = models.CharField(max_length=20, choices=COLOR_CHOICES)
     size = models.CharField(max_length=10, choices=SIZE_CHOICES)
-    mockup_image = models.ImageField(upload_to='mockups/')
+    mockup_image = models.ImageField(upload_to='mockups/', storage=media_storage)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
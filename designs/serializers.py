@@ -1,19 +1,69 @@
 # designs/serializers.py
+from django.db import transaction
 from rest_framework import serializers
+from django.core.files.storage import default_storage
+from . import uploads, variants
 from .models import Design
 from .models import Template
 from .models import Mockup
 
 class DesignSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Design
-        fields = ['id', 'design_description', 'customer', 'created_at', 'design_file', 'file_type']
-        read_only_fields = ['created_at']
+        fields = ['id', 'design_description', 'customer', 'created_at', 'design_file', 'file_type',
+                  'variants']
+        read_only_fields = ['created_at', 'file_type']
+
+    def get_variants(self, design):
+        request = self.context.get('request')
+        urls = {}
+        for name, variant in design.variants.items():
+            url = default_storage.url(variant['name'])
+            urls[name] = request.build_absolute_uri(url) if request is not None else url
+        return urls
+
+    def validate_design_file(self, upload):
+        if upload is not None:
+            uploads.inspect(upload)
+        return upload
+
+    def validate(self, attrs):
+        request = self.context.get('request')
+        if 'design_file' in getattr(request, 'oversized_uploads', ()):
+            raise serializers.ValidationError({'design_file': uploads.too_large().detail})
+        return attrs
+
+    def save_file(self, validated_data):
+        # Identical files are stored once and shared between designs.
+        upload = validated_data.pop('design_file')
+        blob = uploads.attach(upload) if upload is not None else None
+        if blob is not None:
+            variants.schedule(blob)
+        validated_data.update(design_file=blob and blob.file.name, blob=blob,
+                              file_type=blob and blob.file_type)
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            if 'design_file' in validated_data:
+                self.save_file(validated_data)
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        if 'design_file' not in validated_data:
+            return super().update(instance, validated_data)
+        with transaction.atomic():
+            previous_blob_id = instance.blob_id
+            self.save_file(validated_data)
+            instance = super().update(instance, validated_data)
+            uploads.release(previous_blob_id)
+            return instance
 
 class TemplateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Template
-        fields = ['id', 'category', 'image', 'description']
+        fields = ['id', 'category', 'image', 'thumbnail', 'description']
 
 class MockupSerializer(serializers.ModelSerializer):
     class Meta:
@@ -24,4 +74,15 @@ class MockupSerializer(serializers.ModelSerializer):
 class MockupPreviewSerializer(serializers.Serializer):
     design_id = serializers.IntegerField()
     color = serializers.ChoiceField(choices=Mockup.COLOR_CHOICES)
-    size = serializers.ChoiceField(choices=Mockup.SIZE_CHOICES)
\ No newline at end of file
+    size = serializers.ChoiceField(choices=Mockup.SIZE_CHOICES)
+
+class MockupPreviewURLSerializer(MockupPreviewSerializer):
+    format = serializers.ChoiceField(choices=['png', 'jpeg', 'webp'], default='png')
+    width = serializers.IntegerField(min_value=16, max_value=2000, required=False)
+
+class MockupImageSerializer(serializers.Serializer):
+    design = serializers.IntegerField()
+    color = serializers.ChoiceField(choices=Mockup.COLOR_CHOICES)
+    size = serializers.ChoiceField(choices=Mockup.SIZE_CHOICES)
+    format = serializers.ChoiceField(choices=['png', 'jpeg', 'webp'], default='png')
+    width = serializers.IntegerField(min_value=16, max_value=2000, required=False)
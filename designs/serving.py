@@ -0,0 +1,154 @@
+"""
+Serving files from disk with conditional and range requests.
+
+With ``MEDIA_OFFLOAD`` set the transfer is handed to the front proxy
+(nginx ``X-Accel-Redirect`` or Apache/lighttpd ``X-Sendfile``), which
+then answers ranges and revalidation itself, so no worker is held while
+a large file goes out. Otherwise files are returned as FileResponses:
+servers with a ``wsgi.file_wrapper`` (gunicorn, uWSGI) copy them with
+``os.sendfile``, ranges included, and others read them in blocks.
+"""
+
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """
+    ``length`` bytes of an open file from ``start``. It keeps the file's
+    descriptor, so a server's file wrapper can still send it with
+    ``os.sendfile``, bounded by the response's Content-Length.
+    """
+
+    def __init__(self, f, start, length):
+        self.file = f
+        self.remaining = length
+        f.seek(start)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def tell(self):
+        return self.file.tell()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def not_modified(request, etag, modified=None):
+    """
+    Whether the client's copy is still current: by ``If-None-Match`` when
+    it sends one, else by ``If-Modified-Since`` against ``modified``.
+    """
+    matches = request.headers.get('If-None-Match')
+    if matches is not None:
+        return matches.strip() == '*' or etag in [match.strip() for match in matches.split(',')]
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and modified is not None and int(modified) <= since
+
+
+def byte_range(request, size, etag):
+    """
+    The ``(start, end)`` inclusive byte range requested, None for the whole
+    file, or ``False`` when the range can't be satisfied. Only single
+    ranges are served; anything else, including invalid ranges such as
+    ``bytes=5-3``, gets the whole file (RFC 9110, 14.2).
+    """
+    header = request.headers.get('Range')
+    if not header or size == 0:
+        return None
+    # A range of an older copy of the file is no use to the client.
+    if request.headers.get('If-Range', etag) != etag:
+        return None
+    match = BYTE_RANGE.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first and last and int(first) > int(last):
+        return None
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(0, size - int(last)), size - 1
+    if start >= size:
+        return False
+    return start, end
+
+
+def internal_url(path):
+    """The URL of ``path`` in the proxy's internal locations, or None if it has none."""
+    path = os.path.realpath(path)
+    for root, url in ((settings.MOCKUP_CACHE_DIR, settings.MOCKUP_CACHE_OFFLOAD_URL),
+                      (default_storage.location, settings.MEDIA_OFFLOAD_URL)):
+        root = os.path.realpath(root)
+        if path.startswith(root + os.sep):
+            return url + quote(os.path.relpath(path, root).replace(os.sep, '/'))
+    return None
+
+
+def offload(path, content_type, headers):
+    """A response handing ``path`` to the front proxy, or None when it can't take it."""
+    if settings.MEDIA_OFFLOAD == 'x-sendfile':
+        header, value = 'X-Sendfile', os.path.realpath(path)
+    elif settings.MEDIA_OFFLOAD == 'x-accel-redirect':
+        header, value = 'X-Accel-Redirect', internal_url(path)
+        if value is None:
+            return None
+    else:
+        return None
+    response = HttpResponse(content_type=content_type, headers=headers)
+    response[header] = value
+    return response
+
+
+def serve_file(request, path, content_type, etag=None, cache_control='private, no-cache',
+               headers=None):
+    """
+    ``path`` as a response: 304 when the client's copy is still current,
+    206 for a satisfiable ``Range`` request, 416 for an unsatisfiable one
+    and the whole file otherwise. ``etag`` defaults to one made from the
+    file's size and modification time; ``headers`` are added to every
+    response. Raises FileNotFoundError.
+    """
+    stat = os.stat(path)
+    etag = etag or f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {'ETag': etag, 'Cache-Control': cache_control, 'Accept-Ranges': 'bytes',
+               'Last-Modified': http_date(stat.st_mtime), **(headers or {})}
+    if not_modified(request, etag, stat.st_mtime):
+        return HttpResponse(status=304, headers=headers)
+    response = offload(path, content_type, headers)
+    if response is not None:
+        return response
+
+    f = open(path, 'rb')
+    size = os.fstat(f.fileno()).st_size
+    requested = byte_range(request, size, etag)
+    if requested is False:
+        f.close()
+        return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+    if requested is None:
+        response = FileResponse(f, content_type=content_type)
+    else:
+        start, end = requested
+        response = FileResponse(FileRange(f, start, end - start + 1), status=206,
+                                content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    for header, value in headers.items():
+        response[header] = value
+    return response
@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from designs import gallery, uploads, variants
+from designs.models import Design, Template
+
+@receiver(pre_delete, sender=Design)
+def remember_design_blob(sender, instance, **kwargs):
+  # Read it from the row; the instance may predate a file change.
+  instance._blob_id = Design.objects.filter(pk=instance.pk).values_list('blob_id', flat=True).first()
+
+
+@receiver(post_delete, sender=Design)
+def release_design_blob(sender, instance, **kwargs):
+  uploads.release(getattr(instance, '_blob_id', instance.blob_id))
+
+
+@receiver(pre_save, sender=Template)
+def remember_template(sender, instance, **kwargs):
+  instance._previous = None
+  if instance.pk is not None:
+    instance._previous = Template.objects.filter(pk=instance.pk) \
+      .values_list('category', 'image').first()
+
+
+@receiver(post_save, sender=Template)
+def refresh_template_gallery(sender, instance, created, **kwargs):
+  previous = getattr(instance, '_previous', None)
+  gallery.invalidate(instance.category, previous and previous[0])
+  if previous is None or previous[1] != instance.image.name:
+    variants.schedule_thumbnail(instance)
+
+
+@receiver(post_delete, sender=Template)
+def drop_template_from_gallery(sender, instance, **kwargs):
+  gallery.invalidate(instance.category)
+  if instance.thumbnail:
+    name = instance.thumbnail.name
+    transaction.on_commit(lambda: variants.delete_thumbnail(name))
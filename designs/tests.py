@@ -1,3 +1,609 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import urlsplit
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.storage import CONTENT_NAME, media_storage
+from store.models import Customer
+
+from . import compositing, mockups, serving, svg, transcription, variants
+from .models import Design, DesignBlob, Mockup, Template
+
+
+def make_user(username, **fields):
+    return get_user_model().objects.create_user(username, f'{username}@example.com', 'x', **fields)
+
+
+def png(size=(600, 400), color=(200, 30, 60, 255)):
+    buffer = BytesIO()
+    Image.new('RGBA', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 10 10"><circle cx="5" cy="5" r="4"/></svg>'
+
+
+def fan_out_svg(fan=10, levels=5):
+    """``fan`` ** ``levels`` rectangles from a few nested <use> elements."""
+    groups = ['<g id="l0"><rect width="100" height="100"/></g>']
+    for level in range(1, levels + 1):
+        uses = ''.join(f'<use href="#l{level - 1}" x="{i}"/>' for i in range(fan))
+        groups.append(f'<g id="l{level}">{uses}</g>')
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 200 200">'
+            f'<defs>{"".join(groups)}</defs><use href="#l{levels}"/></svg>').encode()
+
+
+def content(response):
+    return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+def path_of(url):
+    """The path and query of an absolute URL from an API response."""
+    parts = urlsplit(url)
+    return f'{parts.path}?{parts.query}' if parts.query else parts.path
+
+
+class MediaTestCase(TestCase):
+    """Stores media and rendered mockups in a temporary directory."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=os.path.join(directory, 'media'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patcher = mock.patch.object(mockups, 'disk_cache', mockups.DiskCache(
+            os.path.join(directory, 'mockup_cache'), 64 * 1024 * 1024))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Variants are generated by the tests that want them, not in the background.
+        patcher = mock.patch.object(variants, 'executor')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = make_user('owner')
+        self.customer = Customer.objects.get(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, data=None, name='design.png', client=None):
+        upload = SimpleUploadedFile(name, data if data is not None else png())
+        return (client or self.client).post('/designs/uploads/', {
+            'design_file': upload, 'design_description': 'A design', 'customer': self.customer.id,
+        }, format='multipart')
+
+    def delete(self, design_id):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.delete(f'/designs/uploads/{design_id}/')
+
+
+class UploadTests(MediaTestCase):
+    def test_identical_uploads_share_a_blob(self):
+        first, second = self.upload(), self.upload()
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        blob = DesignBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual((blob.width, blob.height, blob.file_type), (600, 400, 'png'))
+        self.assertEqual(set(Design.objects.values_list('design_file', flat=True)), {blob.file.name})
+        self.assertNotEqual(self.upload(png(color=(0, 0, 0, 255))).data['design_file'],
+                            first.data['design_file'])
+
+    def test_the_blob_goes_with_its_last_design(self):
+        first, second = self.upload().data['id'], self.upload().data['id']
+        blob = DesignBlob.objects.get()
+        self.assertEqual(self.delete(first).status_code, 204)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(media_storage().exists(blob.file.name))
+
+        self.delete(second)
+        self.assertFalse(DesignBlob.objects.exists())
+        self.assertFalse(media_storage().exists(blob.file.name))
+
+    def test_replacing_the_file_releases_the_old_blob(self):
+        design_id = self.upload().data['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/designs/uploads/{design_id}/', {
+                'design_file': SimpleUploadedFile('new.svg', SVG)}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DesignBlob.objects.get().file_type, 'svg')
+
+    def test_files_that_are_not_designs_are_rejected(self):
+        self.assertEqual(self.upload(b'plain text', name='notes.txt').status_code, 400)
+        self.assertFalse(DesignBlob.objects.exists())
+
+    def test_oversized_uploads_are_rejected(self):
+        with override_settings(DESIGN_UPLOAD_MAX_BYTES=100):
+            response = self.upload()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most', str(response.data))
+        with override_settings(DESIGN_MAX_PIXELS=1000):
+            self.assertEqual(self.upload().status_code, 400)
+        self.assertFalse(DesignBlob.objects.exists())
+
+
+class VariantTests(MediaTestCase):
+    def test_variants_are_scaled_down_copies(self):
+        self.upload()
+        blob = DesignBlob.objects.get()
+        made = variants.generate(blob.id)
+        self.assertEqual(made['thumbnail']['width'], 256)
+        self.assertEqual(made['thumbnail']['height'], 171)
+        # Variants at least as large as the original are the original.
+        self.assertEqual(made['preview']['name'], blob.file.name)
+        self.assertTrue(default_storage.exists(made['thumbnail']['name']))
+        blob.refresh_from_db()
+        self.assertEqual(blob.variants, made)
+        self.assertEqual(blob.variant_for(100, 100), made['thumbnail']['name'])
+        self.assertEqual(blob.variant_for(300, 300), blob.file.name)
+
+    def test_svg_variants_are_rasters(self):
+        self.upload(SVG, name='circle.svg')
+        blob = DesignBlob.objects.get()
+        with override_settings(DESIGN_VARIANTS={'thumbnail': 64, 'preview': 128}):
+            made = variants.generate(blob.id)
+        self.assertEqual({variant['name'].rsplit('.', 1)[1] for variant in made.values()}, {'png'})
+        self.assertEqual((made['preview']['width'], made['preview']['height']), (128, 128))
+
+    def test_variants_of_a_blob_deleted_meanwhile_are_removed(self):
+        self.upload()
+        blob = DesignBlob.objects.get()
+        save = default_storage.save
+
+        def save_while_deleting(name, content):
+            Design.objects.all().delete()
+            DesignBlob.objects.filter(pk=blob.pk).delete()
+            return save(name, content)
+
+        with mock.patch.object(default_storage, 'save', side_effect=save_while_deleting):
+            self.assertEqual(variants.generate(blob.id), {})
+        path = f'design_variants/{blob.sha256[:2]}/{blob.sha256}_thumbnail.png'
+        self.assertFalse(default_storage.exists(path))
+
+
+class GalleryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Template.objects.create(category='movies', image='templates/a.png')
+
+    def test_unchanged_pages_are_not_modified(self):
+        response = self.client.get('/designs/templates/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get('/designs/templates/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_changes_invalidate_the_page(self):
+        etag = self.client.get('/designs/templates/')['ETag']
+        Template.objects.create(category='music', image='templates/b.png')
+        response = self.client.get('/designs/templates/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_pages_of_other_categories_stay_cached(self):
+        etag = self.client.get('/designs/templates/', {'category': 'movies'})['ETag']
+        Template.objects.create(category='music', image='templates/b.png')
+        response = self.client.get('/designs/templates/', {'category': 'movies'},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class CompositingTests(TestCase):
+    def test_recolor(self):
+        shading = np.array([[255, 128]], dtype=np.uint8)
+        pixels = compositing.Garment(shading).recolor((200, 100, 0))
+        self.assertEqual(pixels.tolist(), [[[200, 100, 0], [100, 50, 0]]])
+        # Pixels outside the garment's mask stay white whatever its color.
+        masked = compositing.Garment(shading, np.array([[255, 0]], dtype=np.uint8))
+        self.assertEqual(masked.recolor((200, 100, 0)).tolist(), [[[200, 100, 0], [255, 255, 255]]])
+
+    def test_blend(self):
+        base = np.full((4, 4, 3), 255, dtype=np.uint8)
+        compositing.Layer(Image.new('RGBA', (2, 2), (255, 0, 0, 255))).blend(base, (1, 1))
+        self.assertEqual(base[1, 1].tolist(), [255, 0, 0])
+        self.assertEqual(base[0, 0].tolist(), [255, 255, 255])
+        compositing.Layer(Image.new('RGBA', (4, 4), (0, 0, 0, 128))).blend(base, (0, 0))
+        self.assertEqual(base[0, 0].tolist(), [127, 127, 127])
+        # Layers hanging off the edge are clipped.
+        compositing.Layer(Image.new('RGBA', (4, 4), (0, 0, 255, 255))).blend(base, (3, -3))
+        self.assertEqual(base[0, 3].tolist(), [0, 0, 255])
+        self.assertEqual(base[1, 3].tolist(), [127, 127, 127])
+
+    def test_scaling_keeps_only_the_visible_part(self):
+        image = Image.new('RGBA', (100, 100), (0, 0, 0, 0))
+        image.paste((0, 255, 0, 255), (50, 50, 60, 60))
+        layer = compositing.Layer.scaled(image, (50, 50))
+        self.assertEqual((layer.offset, layer.size), ((25, 25), (50, 50)))
+        self.assertEqual((layer.width, layer.height), (5, 5))
+
+    def test_render(self):
+        image = Image.new('RGBA', (600, 400), (200, 30, 60, 255))
+        size = compositing.design_size(600, 400, 'm', compositing.GARMENT_SIZE)
+        self.assertEqual(size, (420, 280))
+        mockup = compositing.render('blue', compositing.Layer.scaled(image, size))
+        self.assertEqual(mockup.size, compositing.GARMENT_SIZE)
+        self.assertEqual(mockup.getpixel((400, 313)), (200, 30, 60))
+        self.assertEqual(mockup.getpixel((5, 5)), (0, 0, 255))
+        # The cached shirt is left as it was.
+        self.assertEqual(compositing.render('blue').getpixel((400, 313)), (0, 0, 255))
+
+    def test_sized_cache_is_bounded_by_bytes(self):
+        cache = compositing.SizedCache(100)
+        for key in 'abc':
+            cache.put(key, np.zeros(40, dtype=np.uint8))
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual((len(cache), cache.nbytes), (2, 80))
+        cache.get('b')
+        cache.put('d', np.zeros(40, dtype=np.uint8))
+        self.assertIsNone(cache.get('c'))
+        self.assertIsNotNone(cache.get('b'))
+        # Values larger than the whole budget are never kept.
+        cache.put('e', np.zeros(101, dtype=np.uint8))
+        self.assertIsNone(cache.get('e'))
+        self.assertEqual(cache.nbytes, 80)
+
+
+class MockupRenderTests(MediaTestCase):
+    def test_designs_are_rendered_from_their_blob(self):
+        design = Design.objects.get(pk=self.upload().data['id'])
+        mockup = mockups.render(design, 'white', 'm')
+        self.assertEqual(mockup.getpixel((400, 313)), (200, 30, 60))
+        self.assertEqual(mockup.getpixel((5, 5)), (255, 255, 255))
+
+    def test_unreadable_designs_show_their_description(self):
+        design = Design.objects.create(design_description='Cat', customer=self.customer,
+                                       design_file='design_uploads/missing.png')
+        self.assertEqual(mockups.png(mockups.render(design, 'white', 'm')),
+                         mockups.png(mockups.described(design, 'white')))
+
+
+class MockupCacheTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.design_id = self.upload().data['id']
+
+    def test_saving_reuses_the_render(self):
+        data = {'design_id': self.design_id, 'color': 'red', 'size': 'm'}
+        first = self.client.post('/designs/mockups/save/', data, format='json')
+        self.assertEqual(first.status_code, 201)
+        with mock.patch.object(mockups, 'design_layer') as design_layer:
+            second = self.client.post('/designs/mockups/save/', data, format='json')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['mockup_image'], first.data['mockup_image'])
+        design_layer.assert_not_called()
+
+    def test_unreadable_designs_are_rendered_once(self):
+        data = {'design_id': self.design_id, 'color': 'red', 'size': 'm'}
+        with mock.patch.object(mockups, 'design_layer', side_effect=OSError), \
+                mock.patch.object(mockups, 'described', wraps=mockups.described) as described:
+            first = self.client.post('/designs/mockups/save/', data, format='json')
+            second = self.client.post('/designs/mockups/save/', data, format='json')
+        self.assertEqual(second.data['mockup_image'], first.data['mockup_image'])
+        self.assertEqual(described.call_count, 1)
+
+    def test_designs_of_the_same_content_share_a_render(self):
+        other = self.upload().data['id']
+        first = self.client.post('/designs/mockups/save/', {
+            'design_id': self.design_id, 'color': 'red', 'size': 'm'}, format='json')
+        with mock.patch.object(mockups, 'design_layer') as design_layer:
+            second = self.client.post('/designs/mockups/save/', {
+                'design_id': other, 'color': 'red', 'size': 'm'}, format='json')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data['mockup_image'], first.data['mockup_image'])
+        design_layer.assert_not_called()
+        self.assertNotEqual(self.client.post('/designs/mockups/save/', {
+            'design_id': other, 'color': 'blue', 'size': 'm'}, format='json').data['mockup_image'],
+            first.data['mockup_image'])
+
+
+class MockupImageTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.design_id = self.upload().data['id']
+        self.url = f'/designs/mockups/render/?design={self.design_id}&color=red&size=m'
+
+    def test_rendered_once_and_revalidated(self):
+        with mock.patch.object(mockups, 'render', wraps=mockups.render) as render:
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'image/png')
+            self.assertEqual(Image.open(BytesIO(content(response))).size, (800, 800))
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(render.call_count, 1)
+
+    def test_scaled_and_encoded(self):
+        response = self.client.get(f'{self.url}&format=webp&width=200')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(Image.open(BytesIO(content(response))).size, (200, 200))
+        response = self.client.get(f'{self.url}&format=png', HTTP_RANGE='bytes=5-3')
+        self.assertEqual(response.status_code, 200)
+
+    def test_evicted_images_are_rendered_again(self):
+        serve_file = serving.serve_file
+
+        def evict_first(*args, **kwargs):
+            if not evict_first.called:
+                evict_first.called = True
+                mockups.disk_cache.clear()
+            return serve_file(*args, **kwargs)
+
+        evict_first.called = False
+        with mock.patch.object(serving, 'serve_file', side_effect=evict_first):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_only_the_owner_or_a_preview_url(self):
+        stranger = APIClient()
+        stranger.force_authenticate(make_user('stranger'))
+        self.assertEqual(stranger.get(self.url).status_code, 403)
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+
+        preview = self.client.post('/designs/mockups/preview/', {
+            'design_id': self.design_id, 'color': 'red', 'size': 'm'}, format='json')
+        url = path_of(preview.data['mockup_image'])
+        self.assertEqual(APIClient().get(url).status_code, 200)
+        # The token is good for these render parameters only.
+        for changed in (url.replace('color=red', 'color=blue'), url.replace('size=m', 'size=l'),
+                        url.replace('format=png', 'format=webp'), f'{url}&width=100'):
+            with self.subTest(url=changed):
+                self.assertEqual(APIClient().get(changed).status_code, 401)
+        other = self.upload(png(color=(0, 0, 0, 255))).data['id']
+        self.assertEqual(APIClient().get(url.replace(f'design={self.design_id}', f'design={other}'))
+                         .status_code, 401)
+
+    def test_preview_urls_for_a_format_and_width(self):
+        preview = self.client.post('/designs/mockups/preview/', {
+            'design_id': self.design_id, 'color': 'red', 'size': 'm', 'format': 'jpeg',
+            'width': 300}, format='json')
+        url = path_of(preview.data['mockup_image'])
+        response = APIClient().get(url)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(Image.open(BytesIO(content(response))).size, (300, 300))
+        self.assertEqual(APIClient().get(url.replace('width=300', 'width=301')).status_code, 401)
+        self.assertEqual(self.client.post('/designs/mockups/preview/', {
+            'design_id': self.design_id, 'color': 'red', 'size': 'm', 'width': 5000},
+            format='json').status_code, 400)
+
+
+class SVGTests(TestCase):
+    def test_rasterize(self):
+        image = svg.rasterize(SVG, 100)
+        self.assertEqual(image.size, (100, 100))
+        self.assertEqual(image.getpixel((50, 50)), (0, 0, 0, 255))
+        self.assertEqual(image.getpixel((2, 2))[3], 0)
+
+    def test_fan_out_is_bounded(self):
+        with self.assertRaises(svg.SVGError):
+            svg.rasterize(fan_out_svg(), 100)
+        with self.assertRaises(svg.SVGError):
+            svg.check(svg.parse(fan_out_svg()), 100)
+
+    def test_document_types_are_refused_in_any_encoding(self):
+        bomb = ('<?xml version="1.0" encoding="UTF-16"?>'
+                '<!DOCTYPE svg [<!ENTITY a "aaaaaaaaaa"><!ENTITY b "&a;&a;&a;&a;&a;">]>'
+                '<svg xmlns="http://www.w3.org/2000/svg"><text>&b;</text></svg>')
+        for data in (bomb.replace('UTF-16', 'UTF-8').encode(), bomb.encode('utf-16')):
+            with self.subTest(data=data[:8]):
+                with self.assertRaisesMessage(svg.SVGError, 'document type'):
+                    svg.parse(data)
+        self.assertEqual(svg.parse(SVG.decode().encode('utf-16')).tag,
+                         '{http://www.w3.org/2000/svg}svg')
+        for data in (b'<svg', b'<html/>'):
+            with self.subTest(data=data), self.assertRaises(svg.SVGError):
+                svg.parse(data)
+
+
+class SVGUploadTests(MediaTestCase):
+    def test_svgs_that_are_not_artwork_are_rejected(self):
+        self.assertEqual(self.upload(b'<svg><!DOCTYPE x></svg>', name='x.svg').status_code, 400)
+        response = self.upload(fan_out_svg(), name='fan.svg')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('too complex', str(response.data['design_file']))
+        self.assertFalse(DesignBlob.objects.exists())
+        self.assertEqual(self.upload(SVG, name='circle.svg').status_code, 201)
+
+
+class MigrateMediaTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        # Files as they were stored before content addressing.
+        legacy = FileSystemStorage(location=media_storage().location)
+        self.old = legacy.save('design_uploads/cat.png', ContentFile(png()))
+        self.design = Design.objects.create(design_description='Cat', customer=self.customer,
+                                            design_file=self.old)
+        self.blob = DesignBlob.objects.create(
+            sha256='0' * 64, file=self.old, file_type='png', size=1, ref_count=1,
+            variants={'preview': {'name': self.old, 'width': 600, 'height': 400}})
+        self.template = Template.objects.create(
+            category='movies', image=legacy.save('templates/cat.png', ContentFile(png())))
+        self.mockup = Mockup.objects.create(design=self.design, color='red', size='m',
+                                            mockup_image=f'mockups/v1/aa/{"a" * 64}_red_m.png')
+        Template.objects.create(category='music', image='templates/missing.png')
+
+    def migrate(self):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('migrate_media', workers=2, batch_size=1, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_files_are_moved_and_fields_rewritten(self):
+        stdout, stderr = self.migrate()
+        self.assertIn('Moved 2 files into 2 content-addressed files and rewrote 3 file fields', stdout)
+        self.assertIn('Missing: templates/missing.png', stderr)
+
+        self.design.refresh_from_db()
+        self.blob.refresh_from_db()
+        self.template.refresh_from_db()
+        name = self.design.design_file.name
+        self.assertTrue(CONTENT_NAME.match(name))
+        self.assertEqual(self.blob.file.name, name)
+        self.assertEqual(self.blob.variants['preview']['name'], name)
+        self.assertTrue(CONTENT_NAME.match(self.template.image.name))
+        self.assertTrue(media_storage().exists(name))
+        self.assertFalse(media_storage().exists(self.old))
+        self.assertFalse(media_storage().exists('templates/cat.png'))
+        # Rendered mockups are already named by their content.
+        self.mockup.refresh_from_db()
+        self.assertEqual(self.mockup.mockup_image.name, f'mockups/v1/aa/{"a" * 64}_red_m.png')
+
+        self.assertIn('Moved 0 files', self.migrate()[0])
+
+    def test_old_names_still_in_use_are_kept(self):
+        bulk_update = DesignBlob.objects.bulk_update
+
+        def save_meanwhile(*args, **kwargs):
+            Design.objects.create(design_description='Saved meanwhile', customer=self.customer,
+                                  design_file=self.old)
+            return bulk_update(*args, **kwargs)
+
+        with mock.patch.object(DesignBlob.objects, 'bulk_update', side_effect=save_meanwhile):
+            self.migrate()
+        self.assertTrue(media_storage().exists(self.old))
+        self.assertFalse(media_storage().exists('templates/cat.png'))
+
+
+class ServingTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = png()
+        self.url = path_of(self.upload(self.data).data['design_file']).split('?')[0]
+
+    def get(self, **headers):
+        return self.client.get(self.url, **headers)
+
+    def test_whole_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content(response), self.data)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_ranges(self):
+        size = len(self.data)
+        response = self.get(HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{size}')
+        self.assertEqual(content(response), self.data[:10])
+        response = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(content(response), self.data[-5:])
+        response = self.get(HTTP_RANGE=f'bytes=10-{size + 100}')
+        self.assertEqual(response['Content-Range'], f'bytes 10-{size - 1}/{size}')
+
+    def test_unsatisfiable_ranges(self):
+        size = len(self.data)
+        for header in (f'bytes={size}-', 'bytes=-0'):
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+    def test_invalid_and_stale_ranges_get_the_whole_file(self):
+        for headers in ({'HTTP_RANGE': 'bytes=5-3'}, {'HTTP_RANGE': 'bytes=0-1,4-5'},
+                        {'HTTP_RANGE': 'lines=1-2'},
+                        {'HTTP_RANGE': 'bytes=0-9', 'HTTP_IF_RANGE': '"stale"'}):
+            with self.subTest(headers=headers):
+                response = self.get(**headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(content(response), self.data)
+
+
+class MediaAuthorizationTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.signed = path_of(self.upload().data['design_file'])
+        self.unsigned = self.signed.split('?')[0]
+
+    def test_owners_and_staff_may_read(self):
+        self.assertEqual(self.client.get(self.unsigned).status_code, 200)
+        staff = APIClient()
+        staff.force_authenticate(make_user('staff', is_staff=True))
+        self.assertEqual(staff.get(self.unsigned).status_code, 200)
+
+    def test_others_get_not_found(self):
+        stranger = APIClient()
+        stranger.force_authenticate(make_user('stranger'))
+        self.assertEqual(stranger.get(self.unsigned).status_code, 404)
+        self.assertEqual(APIClient().get(self.unsigned).status_code, 404)
+        self.assertEqual(self.client.get('/designs/media/design_uploads/missing.png').status_code, 404)
+        self.assertEqual(self.client.get('/designs/media/../secret.txt').status_code, 404)
+
+    def test_signed_urls_work_without_credentials(self):
+        self.assertEqual(APIClient().get(self.signed).status_code, 200)
+        self.assertEqual(APIClient().get(self.signed[:-2] + 'xx').status_code, 404)
+        with mock.patch('time.time', return_value=10 ** 10):
+            self.assertEqual(APIClient().get(self.signed).status_code, 404)
+
+    def test_svgs_are_sandboxed(self):
+        path = path_of(self.upload(SVG, name='circle.svg').data['design_file'])
+        response = self.client.get(path)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+        self.assertEqual(response['Content-Disposition'], 'attachment')
+
+    def test_only_media_directories_are_served(self):
+        staff = APIClient()
+        staff.force_authenticate(make_user('staff', is_staff=True))
+        other = FileSystemStorage(location=media_storage().location)
+        for name in ('storefront/settings.py', 'generated_image.jpeg'):
+            with self.subTest(name=name):
+                other.save(name, ContentFile(b'SECRET_KEY'))
+                self.assertEqual(staff.get(f'/designs/media/{name}').status_code, 404)
+
+    def test_templates_are_public(self):
+        name = media_storage().save('templates/t.png', SimpleUploadedFile('t.png', png()))
+        Template.objects.create(category='movies', image=name)
+        self.assertEqual(APIClient().get(f'/designs/media/{name}').status_code, 200)
+
+
+@override_settings(TRANSCRIPTION_CACHE_TTL=60)
+@mock.patch.dict(os.environ, {'LEMONFOX_API_KEY': 'test'})
+class TranscriptionTests(TestCase):
+    def recording(self, sha256='a' * 64):
+        upload = SimpleUploadedFile('prompt.mp3', b'audio')
+        upload.sha256 = sha256
+        return upload
+
+    @mock.patch.object(transcription.requests, 'post')
+    def test_recordings_are_transcribed_once(self, post):
+        post.return_value = mock.Mock(status_code=200, json=lambda: {'text': ' A red cat '})
+        self.assertEqual(transcription.transcribe(self.recording()), 'A red cat')
+        self.assertEqual(transcription.transcribe(self.recording()), 'A red cat')
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(cache.get(transcription.cache_key('a' * 64)), 'A red cat')
+
+        transcription.transcribe(self.recording('b' * 64))
+        self.assertEqual(post.call_count, 2)
+
+    @mock.patch.object(transcription.requests, 'post')
+    def test_failures_are_not_cached(self, post):
+        post.return_value = mock.Mock(status_code=502, text='Bad gateway')
+        with self.assertRaises(transcription.TranscriptionError) as raised:
+            transcription.transcribe(self.recording())
+        self.assertEqual(raised.exception.status, 502)
+        post.return_value = mock.Mock(status_code=200, json=lambda: {'text': ''})
+        with self.assertRaises(transcription.TranscriptionError):
+            transcription.transcribe(self.recording())
+        self.assertIsNone(cache.get(transcription.cache_key('a' * 64)))
+        self.assertEqual(post.call_count, 2)
+
+    @override_settings(AUDIO_UPLOAD_MAX_BYTES=10)
+    @mock.patch.object(transcription.requests, 'post')
+    def test_oversized_recordings_are_rejected_unread(self, post):
+        response = APIClient().post('/designs/generate-image/', {
+            'audio': SimpleUploadedFile('prompt.mp3', b'a' * 100)}, format='multipart')
+        self.assertEqual(response.status_code, 413)
+        post.assert_not_called()
@@ -0,0 +1,72 @@
+"""
+Prompts spoken into audio recordings, transcribed by LemonFox's Whisper API.
+
+Recordings are hashed while they stream in and transcriptions are cached by
+that hash, so a recording sent again (clients retry failed generations with
+the same file) is answered from the cache without calling the API.
+"""
+
+import logging
+import os
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from .uploads import DesignUploadHandler
+
+logger = logging.getLogger(__name__)
+
+WHISPER_API_URL = 'https://api.lemonfox.ai/v1/audio/transcriptions'
+# Arabic speech, translated to English.
+WHISPER_OPTIONS = {'language': 'arabic', 'response_format': 'json', 'translate': True}
+# Bump to drop every cached transcription, e.g. when WHISPER_OPTIONS change.
+VERSION = 1
+
+
+class AudioUploadHandler(DesignUploadHandler):
+    """
+    DesignUploadHandler for audio prompts: recordings over
+    ``AUDIO_UPLOAD_MAX_BYTES`` are dropped as soon as they cross the limit.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_bytes = settings.AUDIO_UPLOAD_MAX_BYTES
+
+
+class TranscriptionError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def cache_key(sha256):
+    return f'transcription:v{VERSION}:{sha256}'
+
+
+def transcribe(upload):
+    """
+    The text spoken in ``upload``, from the cache when the same recording
+    was transcribed before. Raises TranscriptionError.
+    """
+    key = cache_key(upload.sha256)
+    text = cache.get(key)
+    if text is not None:
+        return text
+
+    api_key = os.getenv('LEMONFOX_API_KEY')
+    if not api_key:
+        logger.error('LemonFox API key is not set. Please configure the LEMONFOX_API_KEY environment variable.')
+        raise TranscriptionError('Server configuration error', 500)
+    upload.seek(0)
+    response = requests.post(WHISPER_API_URL, headers={'Authorization': f'Bearer {api_key}'},
+                             files={'file': upload}, data=WHISPER_OPTIONS)
+    if response.status_code != 200:
+        logger.error(f'Whisper API error: {response.status_code}, {response.text}')
+        raise TranscriptionError('Failed to process audio file', response.status_code)
+    text = response.json().get('text', '').strip()
+    if not text:
+        raise TranscriptionError('Failed to transcribe audio', 400)
+    cache.set(key, text, settings.TRANSCRIPTION_CACHE_TTL)
+    return text
@@ -0,0 +1,162 @@
+import hashlib
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import F
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+
+from . import svg
+from .models import DesignBlob
+
+CHUNK_SIZE = 64 * 1024
+EXTENSIONS = {'png': 'png', 'jpeg': 'jpg', 'svg': 'svg'}
+IMAGE_FORMATS = {'PNG': 'png', 'JPEG': 'jpeg'}
+SVG_TAG = re.compile(rb'<svg[\s>]')
+
+Inspection = namedtuple('Inspection', ['file_type', 'width', 'height'])
+
+
+class DesignUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams each uploaded file to a temporary file, hashing it on the way,
+    so uploads are never held in memory and never read twice to dedupe.
+    Files over ``DESIGN_UPLOAD_MAX_BYTES`` are dropped as soon as they cross
+    the limit; their field names are left in ``request.oversized_uploads``.
+    """
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_bytes = settings.DESIGN_UPLOAD_MAX_BYTES
+        if request is not None:
+            request.oversized_uploads = []
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            if self.request is not None:
+                self.request.oversized_uploads.append(self.field_name)
+            raise SkipFile
+        self.sha256.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.sha256.hexdigest()
+        return upload
+
+
+def too_large():
+    return ValidationError(f'Design files can be at most '
+                           f'{settings.DESIGN_UPLOAD_MAX_BYTES // (1024 * 1024)} MB.')
+
+
+def digest(upload):
+    """The sha256 of ``upload``, from the upload handler when it has one."""
+    if getattr(upload, 'sha256', None):
+        return upload.sha256
+    sha256 = hashlib.sha256()
+    upload.seek(0)
+    for chunk in upload.chunks(CHUNK_SIZE):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def inspect(upload):
+    """
+    Check that ``upload`` is a PNG, JPEG or SVG within the size limits by
+    its header alone; pixels are never decoded. SVGs are parsed for their
+    size and walked to check they can be drawn at the largest variant
+    size. Raises ValidationError.
+    """
+    if upload.size > settings.DESIGN_UPLOAD_MAX_BYTES:
+        raise too_large()
+    try:
+        # Image.open only parses the header; the pixels load lazily.
+        upload.seek(0)
+        with Image.open(upload) as image:
+            file_type = IMAGE_FORMATS.get(image.format)
+            width, height = image.size
+    except Image.DecompressionBombError:
+        raise ValidationError(f'Designs can be at most {settings.DESIGN_MAX_PIXELS:,} pixels.')
+    except (UnidentifiedImageError, OSError):
+        upload.seek(0)
+        file_type = 'svg' if SVG_TAG.search(upload.read(4096)) else None
+        width = height = None
+        if file_type == 'svg':
+            upload.seek(0)
+            try:
+                root = svg.parse(upload.read())
+                width, height = svg.intrinsic_size(root)
+                svg.check(root, max(settings.DESIGN_VARIANTS.values()))
+            except svg.SVGError as e:
+                raise ValidationError(str(e))
+    finally:
+        upload.seek(0)
+    if file_type is None:
+        raise ValidationError('Upload a PNG, JPEG or SVG file.')
+    if width is not None and width * height > settings.DESIGN_MAX_PIXELS:
+        raise ValidationError(f'Designs can be at most {settings.DESIGN_MAX_PIXELS:,} pixels.')
+    return Inspection(file_type, width, height)
+
+
+def attach(upload):
+    """
+    Store ``upload`` once per distinct content and return its blob with
+    one more reference. Call it inside the transaction saving the design.
+    """
+    inspection = inspect(upload)
+    sha256 = digest(upload)
+    if DesignBlob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1):
+        return DesignBlob.objects.get(sha256=sha256)
+
+    # The storage names files by content and skips content it already has.
+    upload.seek(0)
+    name = DesignBlob._meta.get_field('file').storage.save(
+        f'design_uploads/{sha256}.{EXTENSIONS[inspection.file_type]}', upload)
+    blob, created = DesignBlob.objects.get_or_create(sha256=sha256, defaults={
+        'file': name, 'file_type': inspection.file_type, 'size': upload.size,
+        'width': inspection.width, 'height': inspection.height, 'ref_count': 1})
+    if not created:
+        DesignBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+    return blob
+
+
+def release(blob_id):
+    """
+    Drop a reference to a blob. Once the last one is gone and that commits,
+    the blob, its file and its variants are deleted, unless an upload of the
+    same content took the blob again in the meantime.
+    """
+    if blob_id is None:
+        return
+    DesignBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    if DesignBlob.objects.filter(pk=blob_id, ref_count=0).exists():
+        transaction.on_commit(lambda: delete_orphan(blob_id))
+
+
+def delete_orphan(blob_id):
+    """Delete a blob nobody refers to any more, with its files."""
+    with transaction.atomic():
+        # attach() takes a reference by updating this row, so while it is
+        # locked no upload can come to rely on the files being deleted.
+        orphan = DesignBlob.objects.select_for_update() \
+            .filter(pk=blob_id, ref_count=0).values_list('file', 'variants').first()
+        if orphan is None:
+            return
+        name, variants = orphan
+        DesignBlob._meta.get_field('file').storage.delete(name)
+        for variant in variants.values():
+            if variant['name'] != name:
+                default_storage.delete(variant['name'])
+        DesignBlob.objects.filter(pk=blob_id).delete()
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DesignViewSet, TemplateViewSet, MockupViewSet,GenerateImageView
+from .views import DesignViewSet, TemplateViewSet, MockupViewSet, MockupImageView, MediaView, GenerateImageView
 
 # Create a single router
 router = DefaultRouter()
@@ -9,6 +9,9 @@ router.register('templates', TemplateViewSet, basename='template')
 router.register('mockups', MockupViewSet, basename='mockup')
 
 urlpatterns = [
+    # Ahead of the router, which would take "render" for a mockup id.
+    path('mockups/render/', MockupImageView.as_view(), name='mockup-image'),
     path('', include(router.urls)),
+    path('media/<path:name>', MediaView.as_view(), name='media'),
     path('generate-image/', GenerateImageView.as_view(), name='generate-image'),
 ]
\ No newline at end of file
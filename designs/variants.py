@@ -0,0 +1,138 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image
+
+from . import gallery, svg
+from .models import DesignBlob, Template
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=settings.DESIGN_VARIANT_WORKERS,
+                              thread_name_prefix='design-variants')
+
+
+def schedule(blob):
+    """Generate the variants of ``blob`` in the background once the upload commits."""
+    if blob.variants:
+        return
+    transaction.on_commit(lambda: executor.submit(_run, blob.pk))
+
+
+def _run(blob_id):
+    try:
+        generate(blob_id)
+    except Exception:
+        logger.exception('Generating the variants of design blob %s failed', blob_id)
+    finally:
+        connection.close()
+
+
+def generate(blob_id):
+    """
+    Write the ``DESIGN_VARIANTS`` of a blob, largest first, each scaled down
+    from the one before, and record them on the blob. A variant at least as
+    large as the original is the original file. SVGs are rasterized once,
+    at the largest size, and every variant is a raster. Returns the variants,
+    or nothing when the blob is deleted meanwhile.
+    """
+    blob = DesignBlob.objects.filter(pk=blob_id).first()
+    if blob is None:
+        return {}
+    sizes = sorted(settings.DESIGN_VARIANTS.items(), key=lambda item: -item[1])
+    vector = blob.file_type == 'svg'
+    measured = {}
+    variants = {}
+    with blob.file.open('rb') as f:
+        if vector:
+            data = f.read()
+            original = svg.rasterize(data, sizes[0][1])
+            if not blob.width:
+                # Uploaded before SVGs were measured.
+                measured['width'], measured['height'] = svg.intrinsic_size(svg.parse(data))
+        else:
+            original = Image.open(f)
+            # JPEG can decode straight at a reduced scale.
+            original.draft(None, (sizes[0][1], sizes[0][1]))
+        with original:
+            image = original
+            for name, edge in sizes:
+                if not vector and max(blob.width, blob.height) <= edge:
+                    variants[name] = {'name': blob.file.name, 'width': blob.width, 'height': blob.height}
+                    continue
+                image = image.copy() if image.mode in ('RGB', 'RGBA', 'L', 'LA') else image.convert('RGBA')
+                image.thumbnail((edge, edge), Image.LANCZOS)
+                buffer = BytesIO()
+                image.save(buffer, format='PNG')
+                path = f'design_variants/{blob.sha256[:2]}/{blob.sha256}_{name}.png'
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                path = default_storage.save(path, ContentFile(buffer.getvalue()))
+                variants[name] = {'name': path, 'width': image.width, 'height': image.height}
+    if not DesignBlob.objects.filter(pk=blob_id).update(variants=variants, **measured):
+        # The blob was deleted while its variants were made; nothing else
+        # will ever delete these files.
+        for variant in variants.values():
+            if variant['name'] != blob.file.name:
+                default_storage.delete(variant['name'])
+        return {}
+    return variants
+
+
+def schedule_thumbnail(template):
+    """Make the gallery thumbnail of ``template`` in the background once it commits."""
+    if template.image:
+        transaction.on_commit(lambda: executor.submit(_run_thumbnail, template.pk, template.image.name))
+
+
+def _run_thumbnail(template_id, image_name):
+    try:
+        generate_thumbnail(template_id, image_name)
+    except Exception:
+        logger.exception('Generating the thumbnail of template %s failed', template_id)
+    finally:
+        connection.close()
+
+
+def generate_thumbnail(template_id, image_name):
+    """
+    Write a ``TEMPLATE_THUMBNAIL_SIZE`` thumbnail of a template image and
+    record it, unless the image changed in the meantime.
+    """
+    edge = settings.TEMPLATE_THUMBNAIL_SIZE
+    storage = Template._meta.get_field('thumbnail').storage
+    with Template._meta.get_field('image').storage.open(image_name, 'rb') as f, Image.open(f) as image:
+        image.draft(None, (edge, edge))
+        image = image.copy() if image.mode in ('RGB', 'RGBA', 'L', 'LA') else image.convert('RGBA')
+    image.thumbnail((edge, edge), Image.LANCZOS)
+    buffer = BytesIO()
+    if image.mode in ('RGBA', 'LA'):
+        image.save(buffer, format='PNG', optimize=True)
+        extension = 'png'
+    else:
+        image.save(buffer, format='JPEG', quality=85, optimize=True)
+        extension = 'jpg'
+    path = storage.save(f'template_thumbnails/{template_id}.{extension}',
+                        ContentFile(buffer.getvalue()))
+
+    previous = Template.objects.filter(pk=template_id, image=image_name) \
+        .values_list('thumbnail', 'category').first()
+    if previous is None:
+        delete_thumbnail(path)
+        return None
+    Template.objects.filter(pk=template_id, image=image_name).update(thumbnail=path)
+    if previous[0] and previous[0] != path:
+        delete_thumbnail(previous[0])
+    gallery.invalidate(previous[1])
+    return path
+
+
+def delete_thumbnail(name):
+    """Delete a thumbnail file unless a template still uses it; identical images share one."""
+    if not Template.objects.filter(thumbnail=name).exists():
+        Template._meta.get_field('thumbnail').storage.delete(name)
@@ -1,4 +1,10 @@
+import mimetypes
+from urllib.parse import urlencode
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.viewsets import ModelViewSet  # Import ModelViewSet
@@ -7,16 +13,20 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
 from rest_framework.response import Response
-from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
-from io import BytesIO
 import os
 import requests
 import base64
 from django.core.files.base import ContentFile
 from django.conf import settings
+from . import gallery, media, mockups, serving
 from .models import Design, Template, Mockup
-from .serializers import DesignSerializer, TemplateSerializer, MockupSerializer, MockupPreviewSerializer
+from .serializers import (DesignSerializer, TemplateSerializer, MockupSerializer,
+                          MockupPreviewSerializer, MockupPreviewURLSerializer,
+                          MockupImageSerializer)
+from .transcription import AudioUploadHandler, TranscriptionError, transcribe
+from .uploads import DesignUploadHandler
+from core.storage import CONTENT_NAME, media_storage, valid_url_token
+from store.pagination import DefaultPagination
 from store.models import Customer
 from rest_framework.views import APIView
 
@@ -25,12 +35,15 @@ class DesignViewSet(viewsets.ModelViewSet):
     serializer_class = DesignSerializer
     permission_classes = [IsAuthenticated]
 
+    def initialize_request(self, request, *args, **kwargs):
+        # Stream design files to disk, hashing them on the way, instead of
+        # buffering them in memory.
+        request.upload_handlers = [DesignUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
     def get_queryset(self):
         # Return designs only for the logged-in user
-        customer = Customer.objects.filter(user=self.request.user).first()
-        if customer:
-            return Design.objects.filter(customer=customer)
-        return Design.objects.none()
+        return Design.objects.visible_to(self.request.user).select_related('blob')
 
     def perform_create(self, serializer):
         # Automatically set the customer based on the logged-in user
@@ -48,12 +61,26 @@ class DesignViewSet(viewsets.ModelViewSet):
 
 # Template ViewSet
 class TemplateViewSet(ModelViewSet):
-    queryset = Template.objects.all()
+    queryset = Template.objects.order_by('id')
     serializer_class = TemplateSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['category']  # Filter by category field
     search_fields = ['category']  # Search by category name
+    pagination_class = DefaultPagination
+
+    def list(self, request, *args, **kwargs):
+        # Gallery pages are cached until a template in them changes, and
+        # revalidated with their ETag.
+        key, etag = gallery.listing_key(request)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        data = gallery.cached_listing(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            gallery.store_listing(key, data)
+        return Response(data, headers=headers)
 
 
 # Mockup ViewSet
@@ -69,72 +96,163 @@ class MockupViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='preview')
     def preview(self, request):
+        # Previews are rendered on demand from their URL; nothing is stored
+        # until the customer saves the mockup.
+        serializer = MockupPreviewURLSerializer(data=request.data)
+        if serializer.is_valid():
+            params = serializer.validated_data
+            design, error = owned_design(request, params['design_id'])
+            if error:
+                return error
+            args = (design.id, params['color'], params['size'], params['format'], params.get('width'))
+            query = {'design': design.id, 'color': params['color'], 'size': params['size'],
+                     'format': params['format']}
+            if params.get('width'):
+                query['width'] = params['width']
+            query['token'] = mockups.image_token(*args)
+            return Response({
+                'design': design.id,
+                'color': params['color'],
+                'size': params['size'],
+                'mockup_image': request.build_absolute_uri(
+                    f"{reverse('mockup-image')}?{urlencode(query)}"),
+            }, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'], url_path='save')
+    def save_mockup(self, request):
         serializer = MockupPreviewSerializer(data=request.data)
         if serializer.is_valid():
-            design_id = serializer.validated_data['design_id']
             color = serializer.validated_data['color']
             size = serializer.validated_data['size']
+            design, error = owned_design(request, serializer.validated_data['design_id'])
+            if error:
+                return error
+
+            # Reuse the existing mockup unless the design's content or the
+            # renderer changed since; renders are cached across designs.
+            mockup = Mockup.objects.filter(
+                design=design, color=color, size=size).first()
+            created = mockup is None
+            names = mockups.cache_names(design, color, size)
+            if mockup is None or (names and mockup.mockup_image.name not in names):
+                mockup = generate_mockup(design, color, size, mockup)
+
+            return Response(MockupSerializer(mockup).data,
+                            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
-            design = get_object_or_404(Design, id=design_id)
-            customer = Customer.objects.filter(user=request.user).first()
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            if not customer or design.customer != customer:
-                return Response(
-                    {"error": "You don't have permission to access this design"},
-                    status=status.HTTP_403_FORBIDDEN
-                )
 
-            # Try to get existing mockup or generate a new one
-            mockup, created = Mockup.objects.get_or_create(
-                design=design, color=color, size=size,
-                defaults={'mockup_image': generate_mockup(design, color, size)}
-            )
+class FileView(APIView):
+    """An APIView answering with files rather than rendered data."""
 
-            return Response(MockupSerializer(mockup).data, status=status.HTTP_200_OK)
+    def perform_content_negotiation(self, request, force=False):
+        # Files are served whatever the Accept header asks for, and
+        # ?format= is not a renderer here.
+        return super().perform_content_negotiation(request, force=True)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class MockupImageView(FileView):
+    """
+    A mockup image rendered on demand from its URL: design, color, size,
+    format and width. Images are served from the disk cache once rendered,
+    revalidated by ETag and can be fetched in ranges. The design's owner
+    may fetch them, and so may anyone with a URL from ``preview``, whose
+    token is good for that one color, size, format and width.
+    """
+    permission_classes = [AllowAny]
 
-# Helper Function to Generate Mockups
-def generate_mockup(design, color, size):
-    """Generate a mockup image by overlaying the design on a t-shirt template."""
-    tshirt_template_path = Path(settings.BASE_DIR) / 'static' / 'tshirt_templates' / f'{color}.png'
+    def get(self, request):
+        serializer = MockupImageSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        args = (params['color'], params['size'], params['format'], params.get('width'))
+        if mockups.valid_image_token(request.query_params.get('token'), params['design'], *args):
+            design = get_object_or_404(Design.objects.select_related('blob'), id=params['design'])
+        else:
+            if not request.user.is_authenticated:
+                self.permission_denied(request)
+            design, error = owned_design(request, params['design'])
+            if error:
+                return error
+        args = (design, *args)
+        # The ETag is known without rendering, so revalidation is free.
+        etag = f'"{mockups.image_key(*args)}"'
+        if serving.not_modified(request, etag):
+            return HttpResponse(status=status.HTTP_304_NOT_MODIFIED,
+                                headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+        content_type = mockups.FORMATS[params['format']][1]
+        # The cache may evict the file between finding it and opening it;
+        # it is rendered again then.
+        for _ in range(2):
+            try:
+                return serving.serve_file(request, mockups.image(*args), content_type, etag)
+            except FileNotFoundError:
+                pass
+        return HttpResponse(status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+
+
+class MediaView(FileView):
+    """
+    Media files, to whoever may read them (see ``media.readable``) or has
+    their signed URL from the API. Files missing and files the requester
+    may not read are both 404s, so the names of other customers' files
+    can't be probed.
+    """
+    permission_classes = [AllowAny]
 
-    # Use default white template if the specified color template doesn't exist
-    if not tshirt_template_path.exists():
-        tshirt_template_path = Path(settings.BASE_DIR) / 'static' / 'tshirt_templates' / 'default.png'
+    def get(self, request, name):
+        storage = media_storage()
+        try:
+            path = storage.path(name)
+        except SuspiciousFileOperation:
+            raise Http404
+        if any(part.startswith('.') for part in name.split('/')) or \
+                not name.startswith(media.DIRECTORIES):
+            raise Http404
+        if not valid_url_token(name, request.query_params.get('token')) and \
+                not media.readable(request.user, name):
+            raise Http404
+        # Content-addressed names never change content.
+        cache_control = 'private, max-age=31536000, immutable' if CONTENT_NAME.match(name) \
+            else 'private, no-cache'
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        # SVGs may carry scripts; opened directly, they must not run in our
+        # origin. <img> ignores both headers.
+        headers = {'Content-Security-Policy': 'sandbox', 'Content-Disposition': 'attachment'} \
+            if content_type == 'image/svg+xml' else None
+        try:
+            return serving.serve_file(request, path, content_type, cache_control=cache_control,
+                                      headers=headers)
+        except FileNotFoundError:
+            raise Http404
 
-    try:
-        tshirt = Image.open(tshirt_template_path)
-    except FileNotFoundError:
-        tshirt = Image.new('RGB', (800, 800), color)
 
-    if design.design_file:
-        try:
-            design_image = Image.open(design.design_file.path)
-            size_factor = {'xs': 0.5, 's': 0.6, 'm': 0.7, 'l': 0.8, 'xl': 0.9, 'xxl': 1.0}.get(size, 0.7)
-            new_width, new_height = int(design_image.width * size_factor), int(design_image.height * size_factor)
-            design_image = design_image.resize((new_width, new_height))
-
-            position = ((tshirt.width - new_width) // 2, (tshirt.height - new_height) // 3)
-            if design_image.mode == 'RGBA':
-                tshirt.paste(design_image, position, design_image)
-            else:
-                tshirt.paste(design_image, position)
-        except Exception:
-            draw = ImageDraw.Draw(tshirt)
-            font = ImageFont.load_default()
-            draw.text((400, 400), design.design_description, fill="black", font=font)
-    else:
-        draw = ImageDraw.Draw(tshirt)
-        font = ImageFont.load_default()
-        draw.text((400, 400), design.design_description, fill="black", font=font)
+def owned_design(request, design_id):
+    """The design, if it belongs to the requesting customer, or an error response."""
+    design = get_object_or_404(Design.objects.select_related('blob'), id=design_id)
+    customer = Customer.objects.filter(user=request.user).first()
+    if not customer or design.customer != customer:
+        return design, Response(
+            {"error": "You don't have permission to access this design"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return design, None
 
-    image_io = BytesIO()
-    tshirt.save(image_io, format='PNG')
 
-    mockup = Mockup(design=design, color=color, size=size)
-    mockup.mockup_image.save(f'mockup_{design.id}_{color}_{size}.png', ContentFile(image_io.getvalue()))
+# Helper Function to Generate Mockups
+def generate_mockup(design, color, size, mockup=None):
+    """Point ``mockup``, or a new Mockup, at the rendered design, rendering only what isn't cached."""
+    mockup = mockup or Mockup(design=design, color=color, size=size)
+    name = mockups.rendered(design, color, size)
+    if name is not None:
+        mockup.mockup_image.name = name
+    else:
+        mockup.mockup_image.save(f'mockup_{design.id}_{color}_{size}.png',
+                                 ContentFile(mockups.png(mockups.render(design, color, size))),
+                                 save=False)
     mockup.save()
 
     return mockup
@@ -147,43 +265,24 @@ logger = logging.getLogger(__name__)
 class GenerateImageView(APIView):
     permission_classes = [AllowAny]
 
+    def initialize_request(self, request, *args, **kwargs):
+        # Hash audio prompts while they stream to disk, so recordings sent
+        # again are answered from the transcription cache.
+        request.upload_handlers = [AudioUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
     def post(self, request):
         # Check if an audio file is provided
         audio_file = request.FILES.get("audio")
+        if 'audio' in getattr(request, 'oversized_uploads', ()):
+            return Response({"error": f"Audio files can be at most "
+                                      f"{settings.AUDIO_UPLOAD_MAX_BYTES // (1024 * 1024)} MB"},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
         if audio_file:
-            # LemonFox Whisper API details
-            whisper_api_url = "https://api.lemonfox.ai/v1/audio/transcriptions"
-            whisper_api_key = os.getenv("LEMONFOX_API_KEY")  # Store your API key in an environment variable
-
-            if not whisper_api_key:
-                logger.error("LemonFox API key is not set. Please configure the LEMONFOX_API_KEY environment variable.")
-                return Response({"error": "Server configuration error"}, status=500)
-
-            # Prepare headers and data for the Whisper API request
-            headers = {
-                "Authorization": f"Bearer {whisper_api_key}"
-            }
-            files = {
-                "file": audio_file
-            }
-            data = {
-                "language": "arabic",  # Specify the language
-                "response_format": "json",  # Get the response in JSON format
-                "translate": True  # Enable translation to English
-            }
-
-            # Send the request to the Whisper API
-            
-            whisper_response = requests.post(whisper_api_url, headers=headers, files=files, data=data)
-            print(whisper_response.text)
-            if whisper_response.status_code == 200:
-                # Extract the transcribed text from the response
-                prompt = whisper_response.json().get("text", "").strip()
-                if not prompt:
-                    return Response({"error": "Failed to transcribe audio"}, status=400)
-            else:
-                logger.error(f"Whisper API error: {whisper_response.status_code}, {whisper_response.text}")
-                return Response({"error": "Failed to process audio file"}, status=whisper_response.status_code)
+            try:
+                prompt = transcribe(audio_file)
+            except TranscriptionError as e:
+                return Response({"error": str(e)}, status=e.status)
         else:
             # Get the prompt from the request if no audio file is provided
             prompt = request.data.get("prompt")
@@ -237,6 +336,7 @@ class GenerateImageView(APIView):
 
                 # Save the image to a file
 
+                os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
                 image_path = os.path.join(settings.MEDIA_ROOT, "generated_image.jpeg")
 
                 with open(image_path, "wb") as image_file:
@@ -0,0 +1,159 @@
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, Value, When
+
+from .models import LikeCount, LikedItem
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+_buffers = []
+
+
+def write_counts(deltas):
+    """
+    Add ``{(content_type_id, object_id): delta}`` to the counts table with
+    one INSERT and one UPDATE per content type and batch.
+    """
+    by_type = defaultdict(dict)
+    for (content_type_id, object_id), delta in deltas.items():
+        if delta:
+            by_type[content_type_id][object_id] = delta
+    with transaction.atomic():
+        for content_type_id, objects in by_type.items():
+            ids = sorted(objects)
+            for start in range(0, len(ids), BATCH_SIZE):
+                batch = ids[start:start + BATCH_SIZE]
+                LikeCount.objects.bulk_create(
+                    [LikeCount(content_type_id=content_type_id, object_id=object_id)
+                     for object_id in batch], ignore_conflicts=True)
+                LikeCount.objects \
+                    .filter(content_type_id=content_type_id, object_id__in=batch) \
+                    .update(count=F('count') + Case(
+                        *[When(object_id=object_id, then=Value(objects[object_id]))
+                          for object_id in batch],
+                        default=Value(0)))
+    return sum(len(objects) for objects in by_type.values())
+
+
+class CounterBuffer:
+    """
+    Collects counter deltas in memory and hands them to ``write(deltas)`` in
+    batches, so a burst of likes on one object becomes a single UPDATE per
+    flush instead of a write per like on the same row.
+
+    A background thread flushes every ``interval`` seconds, or sooner once
+    ``max_keys`` objects have pending deltas. With an ``interval`` of 0
+    every delta is written through immediately. Deltas still buffered when
+    a process dies are lost until the counts are rebuilt.
+    """
+
+    def __init__(self, write, interval, max_keys):
+        self.write = write
+        self.interval = interval
+        self.max_keys = max_keys
+        self._deltas = Counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        _buffers.append(self)
+
+    def add(self, content_type_id, object_id, delta):
+        if not self.interval:
+            self.write({(content_type_id, object_id): delta})
+            return
+        with self._lock:
+            self._deltas[content_type_id, object_id] += delta
+            full = len(self._deltas) >= self.max_keys
+            if self._thread is None:
+                self._start()
+        if full:
+            self._wake.set()
+
+    def pending(self, content_type_id, object_ids):
+        """The buffered deltas of ``object_ids``, as ``{object_id: delta}``."""
+        with self._lock:
+            return {object_id: self._deltas[content_type_id, object_id]
+                    for object_id in object_ids
+                    if self._deltas.get((content_type_id, object_id))}
+
+    def flush(self):
+        """Write the buffered deltas. Returns the number of objects written."""
+        with self._lock:
+            deltas, self._deltas = self._deltas, Counter()
+        if not deltas:
+            return 0
+        try:
+            return self.write(deltas)
+        except Exception:
+            # Put them back so the next flush retries.
+            with self._lock:
+                self._deltas.update(deltas)
+            raise
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='counter-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self._flush_at_exit)
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            # The database may be gone already; call flush_all() before
+            # tearing it down.
+            logger.warning('Buffered %s deltas were lost at exit', self.write.__name__)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing %s failed', self.write.__name__)
+            finally:
+                connection.close()
+
+
+def flush_all():
+    """Write the deltas of every CounterBuffer in this process."""
+    for buffer in _buffers:
+        buffer.flush()
+
+
+counters = CounterBuffer(write_counts, settings.LIKES_FLUSH_INTERVAL, settings.LIKES_FLUSH_MAX_KEYS)
+
+
+def like_counts(obj_type, obj_ids):
+    """
+    The like counts of many objects of one model with a single query, as
+    ``{object_id: count}``, including this process's unflushed likes.
+    """
+    content_type = ContentType.objects.get_for_model(obj_type)
+    counts = Counter(dict(LikeCount.objects
+                          .filter(content_type=content_type, object_id__in=obj_ids)
+                          .values_list('object_id', 'count')))
+    counts.update(counters.pending(content_type.pk, obj_ids))
+    return counts
+
+
+def rebuild_like_counts():
+    """Recount the counts table from ``LikedItem``. Returns the number of rows."""
+    counters.flush()
+    rows = LikedItem.objects.order_by() \
+        .values_list('content_type_id', 'object_id').annotate(likes=Count('id'))
+    with transaction.atomic():
+        LikeCount.objects.all().delete()
+        LikeCount.objects.bulk_create(
+            [LikeCount(content_type_id=content_type_id, object_id=object_id, count=likes)
+             for content_type_id, object_id, likes in rows.iterator()],
+            batch_size=BATCH_SIZE)
+    return LikeCount.objects.count()
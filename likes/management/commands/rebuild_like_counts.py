@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from likes.counters import rebuild_like_counts
+
+
+class Command(BaseCommand):
+    help = 'Recounts the like count of every liked object'
+
+    def handle(self, *args, **options):
+        objects = rebuild_like_counts()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt like counts for {objects:,} objects'))
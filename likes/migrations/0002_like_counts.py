@@ -0,0 +1,66 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_likes(apps, schema_editor):
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    duplicates = LikedItem.objects.order_by() \
+        .values('user_id', 'content_type_id', 'object_id') \
+        .annotate(first=Min('id'), likes=Count('id')).filter(likes__gt=1)
+    for row in duplicates:
+        LikedItem.objects.filter(user_id=row['user_id'], content_type_id=row['content_type_id'],
+                                 object_id=row['object_id'], id__gt=row['first']).delete()
+
+
+def count_likes(apps, schema_editor):
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    LikeCount = apps.get_model('likes', 'LikeCount')
+    LikeCount.objects.bulk_create(
+        [LikeCount(content_type_id=row['content_type_id'], object_id=row['object_id'],
+                   count=row['likes'])
+         for row in LikedItem.objects.order_by().values('content_type_id', 'object_id')
+         .annotate(likes=Count('id'))],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('likes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='likeditem',
+            index=models.Index(fields=['content_type', 'object_id'], name='likes_liked_content_7292dd_idx'),
+        ),
+        migrations.RunPython(drop_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='likeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'content_type', 'object_id'), name='unique_like_per_user'),
+        ),
+        migrations.AddField(
+            model_name='likecount',
+            name='content_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+        ),
+        migrations.AddConstraint(
+            model_name='likecount',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='unique_like_count'),
+        ),
+        migrations.RunPython(count_likes, migrations.RunPython.noop),
+    ]
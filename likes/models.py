@@ -4,8 +4,45 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
 
+class LikedItemManager(models.Manager):
+    def liked_by(self, user, obj_type, obj_ids):
+        """The subset of ``obj_ids`` that ``user`` liked, with a single query."""
+        if not user.is_authenticated:
+            return set()
+        content_type = ContentType.objects.get_for_model(obj_type)
+        return set(self.filter(user=user, content_type=content_type, object_id__in=obj_ids)
+                   .values_list('object_id', flat=True))
+
+
 class LikedItem(models.Model):
+    objects = LikedItemManager()
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
+    liked_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'content_type', 'object_id'],
+                                    name='unique_like_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['content_type', 'object_id']),
+        ]
+
+
+class LikeCount(models.Model):
+    """
+    The number of likes of an object. Written behind by ``likes.counters``,
+    so it can trail ``LikedItem`` by one flush interval.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'],
+                                    name='unique_like_count'),
+        ]
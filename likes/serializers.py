@@ -0,0 +1,5 @@
+from rest_framework import serializers
+
+
+class LikeSerializer(serializers.Serializer):
+    object_id = serializers.IntegerField(min_value=1)
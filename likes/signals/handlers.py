@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from likes.counters import counters
+from likes.models import LikedItem
+
+# Count on commit, so rolled back likes never reach the counts table.
+
+@receiver(post_save, sender=LikedItem)
+def count_like(sender, instance, created, **kwargs):
+  if created:
+    transaction.on_commit(lambda: counters.add(instance.content_type_id, instance.object_id, 1))
+
+
+@receiver(post_delete, sender=LikedItem)
+def count_unlike(sender, instance, **kwargs):
+  transaction.on_commit(lambda: counters.add(instance.content_type_id, instance.object_id, -1))
@@ -1,3 +1,128 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from designs.models import Design
+from store.models import Collection, Customer, Product
+
+from .counters import CounterBuffer, counters, rebuild_like_counts, write_counts
+from .models import LikeCount
+
+
+def make_user(username):
+    return get_user_model().objects.create_user(username, f'{username}@example.com', 'x')
+
+
+class LikeTests(TestCase):
+    url = '/likes/store.product/'
+
+    def setUp(self):
+        # Write counts through instead of buffering them for a background flush.
+        patcher = mock.patch.object(counters, 'interval', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = make_user('fan')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(
+            title='Shirt', slug='shirt', unit_price=Decimal('10.00'), inventory=1,
+            collection=Collection.objects.create(title='Tees'))
+
+    def like(self, object_id, client=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return (client or self.client).post(self.url, {'object_id': object_id})
+
+    def summary(self, client=None):
+        return (client or self.client).get(self.url, {'ids': self.product.id}).data
+
+    def test_liking_counts_once_per_user(self):
+        self.assertEqual(self.like(self.product.id).status_code, 201)
+        self.assertEqual(self.like(self.product.id).status_code, 200)
+        self.assertEqual(self.summary(), [{'object_id': self.product.id, 'likes': 1, 'liked': True}])
+        self.assertEqual(self.summary(APIClient()),
+                         [{'object_id': self.product.id, 'likes': 1, 'liked': False}])
+
+    def test_unliking(self):
+        self.like(self.product.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'{self.url}{self.product.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.summary(), [{'object_id': self.product.id, 'likes': 0, 'liked': False}])
+
+    def test_counts_match_a_rebuild(self):
+        other = APIClient()
+        other.force_authenticate(make_user('other'))
+        self.like(self.product.id)
+        self.like(self.product.id, other)
+        content_type = ContentType.objects.get_for_model(Product)
+        self.assertEqual(LikeCount.objects.get(content_type=content_type).count, 2)
+        rebuild_like_counts()
+        self.assertEqual(LikeCount.objects.get(content_type=content_type).count, 2)
+
+    def test_missing_objects_and_models(self):
+        self.assertEqual(self.like(self.product.id + 1).status_code, 404)
+        self.assertEqual(self.client.get('/likes/auth.user/').status_code, 404)
+        self.assertEqual(self.client.get('/likes/core.user/').status_code, 404)
+        self.assertEqual(self.client.get('/likes/STORE.Product/', {'ids': self.product.id}).status_code, 200)
+        self.assertEqual(self.client.get(self.url, {'ids': 'a,b'}).status_code, 400)
+
+    def test_anonymous_users_cannot_like(self):
+        self.assertEqual(APIClient().post(self.url, {'object_id': self.product.id}).status_code, 401)
+
+
+class DesignLikeTests(TestCase):
+    url = '/likes/designs.design/'
+
+    def setUp(self):
+        owner = make_user('owner')
+        self.design = Design.objects.create(design_description='Cat',
+                                            customer=Customer.objects.get(user=owner))
+        self.owner = APIClient()
+        self.owner.force_authenticate(owner)
+        self.stranger = APIClient()
+        self.stranger.force_authenticate(make_user('stranger'))
+
+    def test_only_visible_designs_can_be_liked(self):
+        self.assertEqual(self.stranger.post(self.url, {'object_id': self.design.id}).status_code, 404)
+        self.assertEqual(self.owner.post(self.url, {'object_id': self.design.id}).status_code, 201)
+
+    def test_invisible_designs_are_left_out(self):
+        self.assertEqual(self.stranger.get(self.url, {'ids': self.design.id}).data, [])
+        self.assertEqual(APIClient().get(self.url, {'ids': self.design.id}).data, [])
+        self.assertEqual(len(self.owner.get(self.url, {'ids': self.design.id}).data), 1)
+
+
+class CounterBufferTests(TestCase):
+    def setUp(self):
+        # Flushed by the tests, not by a background thread.
+        patcher = mock.patch.object(CounterBuffer, '_start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.content_type = ContentType.objects.get_for_model(Product)
+
+    def test_deltas_are_merged_until_flushed(self):
+        buffer = CounterBuffer(write_counts, interval=60, max_keys=100)
+        for delta in (1, 1, 1, -1):
+            buffer.add(self.content_type.pk, 7, delta)
+        buffer.add(self.content_type.pk, 8, 1)
+        self.assertFalse(LikeCount.objects.exists())
+        self.assertEqual(buffer.pending(self.content_type.pk, [7, 8, 9]), {7: 2, 8: 1})
+        # One INSERT and one UPDATE, inside a savepoint.
+        with self.assertNumQueries(4):
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(dict(LikeCount.objects.values_list('object_id', 'count')), {7: 2, 8: 1})
+        self.assertEqual(buffer.flush(), 0)
 
-# Create your tests here.
+    def test_failed_writes_are_retried(self):
+        write = mock.Mock(side_effect=[RuntimeError, 1])
+        buffer = CounterBuffer(write, interval=60, max_keys=100)
+        buffer.add(self.content_type.pk, 7, 1)
+        with self.assertRaises(RuntimeError):
+            buffer.flush()
+        buffer.add(self.content_type.pk, 7, 1)
+        buffer.flush()
+        write.assert_called_with({(self.content_type.pk, 7): 2})
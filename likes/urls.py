@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import LikeDetailView, LikeListView
+
+# URLConf
+urlpatterns = [
+    path('<str:model>/', LikeListView.as_view(), name='likes'),
+    path('<str:model>/<int:object_id>/', LikeDetailView.as_view(), name='like-detail'),
+]
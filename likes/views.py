@@ -1,3 +1,94 @@
-from django.shortcuts import render
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .counters import like_counts
+from .models import LikedItem
+from .serializers import LikeSerializer
+
+MAX_IDS = 100
+
+
+def likeable_model(label):
+    """The model named ``app_label.model`` if it may be liked, else 404."""
+    # LIKES_MODELS and app labels are lowercase.
+    label = label.lower()
+    if label not in settings.LIKES_MODELS:
+        raise Http404
+    return apps.get_model(label)
+
+
+def visible_objects(model, user):
+    """
+    The objects of ``model`` that ``user`` may see: those of its manager's
+    ``visible_to(user)`` when it has one, like designs, else all of them.
+    """
+    manager = model._default_manager
+    if hasattr(manager, 'visible_to'):
+        return manager.visible_to(user)
+    return manager.all()
+
+
+def like_summaries(request, model, object_ids):
+    """``[{object_id, likes, liked}]`` for a page of objects, in two queries."""
+    counts = like_counts(model, object_ids)
+    liked = LikedItem.objects.liked_by(request.user, model, object_ids)
+    return [{'object_id': object_id, 'likes': counts[object_id], 'liked': object_id in liked}
+            for object_id in object_ids]
+
+
+class LikeListView(APIView):
+    """
+    GET ``?ids=1,2,3`` returns the like count of each object and whether
+    the current user liked it. POST ``{"object_id": 1}`` likes an object.
+    Objects the user can't see, such as other customers' designs, are
+    treated as missing.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request, model):
+        model = likeable_model(model)
+        try:
+            object_ids = list(dict.fromkeys(
+                int(value) for value in request.query_params.get('ids', '').split(',') if value))
+        except ValueError:
+            raise ValidationError({'ids': 'Expected a comma separated list of ids.'})
+        if len(object_ids) > MAX_IDS:
+            raise ValidationError({'ids': f'At most {MAX_IDS} ids per request.'})
+        if hasattr(model._default_manager, 'visible_to'):
+            # Objects the user can't see are left out, as if they didn't exist.
+            visible = set(visible_objects(model, request.user)
+                          .filter(pk__in=object_ids).values_list('pk', flat=True))
+            object_ids = [object_id for object_id in object_ids if object_id in visible]
+        return Response(like_summaries(request, model, object_ids))
+
+    def post(self, request, model):
+        model = likeable_model(model)
+        serializer = LikeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        object_id = serializer.validated_data['object_id']
+        get_object_or_404(visible_objects(model, request.user), pk=object_id)
+        _, created = LikedItem.objects.get_or_create(
+            user=request.user, content_type=ContentType.objects.get_for_model(model),
+            object_id=object_id)
+        return Response(like_summaries(request, model, [object_id])[0],
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class LikeDetailView(APIView):
+    """DELETE unlikes an object."""
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, model, object_id):
+        model = likeable_model(model)
+        LikedItem.objects.filter(
+            user=request.user, content_type=ContentType.objects.get_for_model(model),
+            object_id=object_id).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
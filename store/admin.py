@@ -1,9 +1,16 @@
 from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.exceptions import PermissionDenied
+from django.db import DatabaseError, transaction
 from django.db.models.aggregates import Count
 from django.db.models.query import QuerySet
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from django.utils.html import format_html, urlencode
-from django.urls import reverse
+from django.urls import path, reverse
 from . import models
+from .bulk import apply_change, read_change_file
+from .forms import ProductBulkChangeForm, ProductBulkUploadForm
 
 
 class InventoryFilter(admin.SimpleListFilter):
@@ -26,7 +33,7 @@ class ProductAdmin(admin.ModelAdmin):
     prepopulated_fields = {
         'slug': ['title']
     }
-    actions = ['clear_inventory']
+    actions = ['clear_inventory', 'bulk_change']
     list_display = ['title', 'unit_price',
                     'inventory_status', 'collection_title']
     list_editable = ['unit_price']
@@ -54,6 +61,100 @@ class ProductAdmin(admin.ModelAdmin):
         )
 
 
+    @admin.action(description='Change prices or inventory')
+    def bulk_change(self, request, queryset):
+        if 'apply' in request.POST:
+            form = ProductBulkChangeForm(request.POST)
+            if form.is_valid():
+                change = apply_change(
+                    queryset, form.cleaned_data['kind'], form.cleaned_data['amount'],
+                    user=request.user, source='admin action')
+                self.message_user(
+                    request,
+                    f'{change.product_count} products were successfully updated.',
+                    messages.SUCCESS
+                )
+                return None
+        else:
+            form = ProductBulkChangeForm()
+
+        return TemplateResponse(request, 'admin/store/product/bulk_change.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Change prices or inventory',
+            'opts': self.model._meta,
+            'form': form,
+            'product_count': queryset.count(),
+            'action': 'bulk_change',
+            'select_across': request.POST.get('select_across'),
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+        })
+
+    def get_urls(self):
+        return [
+            path('bulk-upload/',
+                 self.admin_site.admin_view(self.bulk_upload_view),
+                 name='store_product_bulk_upload'),
+        ] + super().get_urls()
+
+    def bulk_upload_view(self, request):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        preview, errors = [], []
+        form = ProductBulkUploadForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            groups, errors = read_change_file(upload)
+            if not form.cleaned_data['dry_run'] and not errors:
+                updated = 0
+                try:
+                    # All of the file's changes are applied, or none of them.
+                    with transaction.atomic():
+                        for (kind, amount), product_ids in groups.items():
+                            change = apply_change(
+                                models.Product.objects.filter(id__in=product_ids), kind, amount,
+                                user=request.user, source=upload.name)
+                            updated += change.product_count
+                except DatabaseError as e:
+                    errors = [f'No changes were applied: {e}']
+                else:
+                    self.message_user(
+                        request,
+                        f'{len(groups)} changes were applied to {updated} products.',
+                        messages.SUCCESS
+                    )
+                    return redirect('admin:store_product_changelist')
+            labels = dict(models.ProductBulkChange.KIND_CHOICES)
+            preview = [
+                {'label': labels[kind], 'amount': amount,
+                 'count': models.Product.objects.filter(id__in=product_ids).count()}
+                for (kind, amount), product_ids in groups.items()
+            ]
+
+        return TemplateResponse(request, 'admin/store/product/bulk_upload.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Bulk upload price and inventory changes',
+            'opts': self.model._meta,
+            'form': form,
+            'preview': preview,
+            'errors': errors,
+        })
+
+
+@admin.register(models.ProductBulkChange)
+class ProductBulkChangeAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'kind', 'amount', 'product_count', 'user', 'source']
+    list_filter = ['kind', 'created_at']
+    list_select_related = ['user']
+    readonly_fields = ['kind', 'amount', 'product_count', 'product_ids',
+                       'user', 'source', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(models.Collection)
 class CollectionAdmin(admin.ModelAdmin):
     autocomplete_fields = ['featured_product']
@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least, Round
+from django.utils import timezone
+
+from . import facets
+from .models import ProductBulkChange
+from .pricing import refresh_effective_prices
+from .streaming import CSV, read_rows
+
+MIN_PRICE = Decimal('1.00')
+MAX_PRICE = Decimal('9999.99')
+MAX_PERCENT = Decimal('1000')
+MAX_INVENTORY_DELTA = 1_000_000
+
+# Parses amounts the way ProductBulkChangeForm does: finite, at most two
+# decimal places.
+AMOUNT_FIELD = forms.DecimalField(max_digits=10, decimal_places=2)
+
+
+def validate_amount(kind, amount):
+    """Raise ValidationError unless ``amount`` is a change of ``kind`` that can be applied."""
+    if kind == ProductBulkChange.KIND_INVENTORY_DELTA:
+        if amount != amount.to_integral_value():
+            raise ValidationError('Inventory changes must be whole numbers.')
+        if abs(amount) > MAX_INVENTORY_DELTA:
+            raise ValidationError(f'Inventory changes can be at most {MAX_INVENTORY_DELTA:,} units.')
+    elif kind == ProductBulkChange.KIND_PRICE_PERCENT:
+        if not -100 < amount <= MAX_PERCENT:
+            raise ValidationError(f'Percent changes must be above -100 and at most {MAX_PERCENT}.')
+    elif abs(amount) > MAX_PRICE - MIN_PRICE:
+        raise ValidationError(f'Price changes can be at most {MAX_PRICE - MIN_PRICE}.')
+
+
+def change_expressions(kind, amount):
+    """The UPDATE assignments for a bulk change, clamped to valid values."""
+    if kind == ProductBulkChange.KIND_INVENTORY_DELTA:
+        return {'inventory': Greatest(F('inventory') + int(amount), 0)}
+    if kind == ProductBulkChange.KIND_PRICE_PERCENT:
+        price = F('unit_price') * (1 + amount / 100)
+    else:
+        price = F('unit_price') + amount
+    return {'unit_price': Least(Greatest(Round(price, 2), Value(MIN_PRICE)), Value(MAX_PRICE))}
+
+
+def apply_change(queryset, kind, amount, user=None, source=''):
+    """
+    Apply one change to every product in ``queryset`` with a single
+    UPDATE statement and record it as a ProductBulkChange.
+    """
+    with transaction.atomic():
+        product_ids = list(queryset.order_by().values_list('id', flat=True))
+        changes_price = kind != ProductBulkChange.KIND_INVENTORY_DELTA
+        if changes_price:
+            before = facets.product_entries(product_ids, lock=True)
+        updated = queryset.order_by().update(
+            last_update=timezone.now(), **change_expressions(kind, amount))
+        if changes_price:
+            # Prices may have moved between price bands.
+            facets.move(before, facets.product_entries(product_ids))
+            refresh_effective_prices(product_ids)
+        return ProductBulkChange.objects.create(
+            kind=kind, amount=amount, product_count=updated,
+            product_ids=product_ids, user=user, source=source[:255])
+
+
+def read_change_file(lines):
+    """
+    Group the rows of an uploaded change file by change, so each distinct
+    change can be applied with one UPDATE.
+
+    Returns ``({(kind, amount): [product ids]}, [error messages])``.
+    """
+    groups, errors = {}, []
+    kinds = dict(ProductBulkChange.KIND_CHOICES)
+    for number, (row, error) in enumerate(read_rows(lines, CSV), start=1):
+        product = (row or {}).get('product', '').strip()
+        if error or not product.isdigit():
+            errors.append(f'Row {number}: expected a numeric product id.')
+            continue
+        for kind in kinds:
+            value = (row.get(kind) or '').strip()
+            if not value:
+                continue
+            try:
+                amount = AMOUNT_FIELD.clean(value)
+                validate_amount(kind, amount)
+            except ValidationError as e:
+                errors.append(f'Row {number}: {kind} "{value}": {" ".join(e.messages)}')
+                continue
+            groups.setdefault((kind, amount), []).append(int(product))
+    return groups, errors
@@ -0,0 +1,202 @@
+"""
+Row generators for the ``generate_data`` management command.
+
+The functions here take a chunk description and return plain dicts, so
+they can run in worker processes without touching the database; only
+``designs`` writes, its images to the media storage. Each chunk gets its own random generator derived from the
+global seed, the table and the chunk index, so the output is identical
+no matter how many workers produce it or in which order they finish.
+"""
+
+import hashlib
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO
+
+ADJECTIVES = ['Classic', 'Vintage', 'Organic', 'Retro', 'Graphic', 'Slim',
+              'Heavy', 'Striped', 'Plain', 'Neon', 'Pastel', 'Oversized',
+              'Cropped', 'Washed', 'Premium', 'Raglan']
+NOUNS = ['Tee', 'Hoodie', 'Tank', 'Sweatshirt', 'Polo', 'Long Sleeve',
+         'Crewneck', 'Henley', 'Jersey', 'Baseball Tee']
+THEMES = ['Movies', 'Music', 'Quotes', 'Family', 'Gamers', 'Sports', 'Funny',
+          'Spooky', 'Space', 'Cats', 'Retro Wave', 'Mountains']
+FIRST_NAMES = ['Ahmed', 'Sara', 'Omar', 'Mona', 'Youssef', 'Nour', 'Ali',
+               'Laila', 'John', 'Maria', 'Chen', 'Fatima', 'Ivan', 'Aisha']
+LAST_NAMES = ['Hassan', 'Emad', 'Saleh', 'Farouk', 'Smith', 'Garcia', 'Wang',
+              'Khan', 'Petrov', 'Ibrahim', 'Mostafa', 'Nasser']
+LOREM = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+         'tempor incididunt ut labore et dolore magna aliqua').split()
+
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+HISTORY_DAYS = 730
+
+
+def chunk_rng(seed, table, index):
+    return random.Random(f'{seed}:{table}:{index}')
+
+
+def _timestamp(rng):
+    return EPOCH + timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(LOREM) for _ in range(words))
+
+
+def collections(chunk):
+    rng = chunk_rng(chunk['seed'], 'collection', chunk['index'])
+    return [
+        {'id': pk, 'title': f'{rng.choice(THEMES)} {pk}'}
+        for pk in range(chunk['start'], chunk['start'] + chunk['count'])
+    ]
+
+
+def products(chunk):
+    rng = chunk_rng(chunk['seed'], 'product', chunk['index'])
+    first_collection, collection_count = chunk['collections']
+    rows = []
+    for pk in range(chunk['start'], chunk['start'] + chunk['count']):
+        title = f'{rng.choice(ADJECTIVES)} {rng.choice(THEMES)} {rng.choice(NOUNS)}'
+        description = _text(rng, rng.randint(8, 30))
+        # Prices cluster around typical shirt prices with a long tail.
+        unit_price = Decimal(str(round(
+            min(9999.99, max(1.0, rng.lognormvariate(3.2, 0.6))), 2)))
+        rows.append({
+            'id': pk,
+            'title': title,
+            'slug': f"{title.lower().replace(' ', '-')}-{pk}",
+            'description': description,
+            'unit_price': unit_price,
+            # Synthetic products start without promotions.
+            'effective_price': unit_price,
+            'inventory': rng.choice([0, rng.randint(1, 10), rng.randint(10, 1000)]),
+            'collection_id': first_collection + rng.randrange(collection_count),
+        })
+    return rows
+
+
+def customers(chunk):
+    """Users together with their customer profiles, sharing the chunk offsets."""
+    rng = chunk_rng(chunk['seed'], 'customer', chunk['index'])
+    user_rows, customer_rows = [], []
+    for offset in range(chunk['count']):
+        user_id = chunk['start_user'] + chunk['offset'] + offset
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        user_rows.append({
+            'id': user_id,
+            'username': f'synthetic{user_id}',
+            'email': f'synthetic{user_id}@example.com',
+            'first_name': first_name,
+            'last_name': last_name,
+            'password': chunk['password'],
+            'date_joined': _timestamp(rng),
+        })
+        customer_rows.append({
+            'id': chunk['start'] + offset,
+            'user_id': user_id,
+            'phone': f'+20{rng.randrange(10 ** 9, 10 ** 10)}',
+            'birth_date': (EPOCH - timedelta(days=rng.randint(18 * 365, 70 * 365))).date(),
+            'membership': rng.choices('BSG', weights=[80, 15, 5])[0],
+        })
+    return user_rows, customer_rows
+
+
+def orders(chunk):
+    """Orders together with their items."""
+    rng = chunk_rng(chunk['seed'], 'order', chunk['index'])
+    first_customer, customer_count = chunk['customers']
+    first_product, product_count = chunk['products']
+    order_rows, item_rows = [], []
+    for pk in range(chunk['start'], chunk['start'] + chunk['count']):
+        order_rows.append({
+            'id': pk,
+            'customer_id': first_customer + rng.randrange(customer_count),
+            'placed_at': _timestamp(rng),
+            'payment_status': rng.choices('CPF', weights=[85, 10, 5])[0],
+        })
+        for _ in range(rng.randint(1, 2 * chunk['items_per_order'] - 1)):
+            item_rows.append({
+                'order_id': pk,
+                # Skew sales towards the start of the catalog so some
+                # products are clearly more popular than others.
+                'product_id': first_product + min(
+                    product_count - 1, int(rng.paretovariate(1.2)) - 1),
+                'quantity': rng.randint(1, 4),
+                'unit_price': Decimal(rng.randint(500, 9999)) / 100,
+            })
+    return order_rows, item_rows
+
+
+def carts(chunk):
+    # Carts have UUID keys, so offset by the existing row count to keep
+    # repeated runs from generating the same ids.
+    rng = chunk_rng(chunk['seed'], 'cart', chunk['start'])
+    first_product, product_count = chunk['products']
+    cart_rows, item_rows = [], []
+    for _ in range(chunk['count']):
+        cart_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+        cart_rows.append({'id': cart_id, 'created_at': _timestamp(rng)})
+        product_ids = rng.sample(range(product_count), min(product_count, rng.randint(1, 5)))
+        item_rows.extend(
+            {'cart_id': cart_id, 'product_id': first_product + offset,
+             'quantity': rng.randint(1, 3)}
+            for offset in product_ids
+        )
+    return cart_rows, item_rows
+
+
+def designs(chunk):
+    """
+    Design rows together with their blobs. Each design gets a small PNG of
+    its own, saved through the media storage as uploads are.
+    """
+    from django.core.files.base import ContentFile
+    from PIL import Image, ImageDraw
+
+    from core.storage import media_storage
+
+    # Offset by the existing row count, as carts do, so repeated runs draw
+    # new images instead of content already stored.
+    rng = chunk_rng(chunk['seed'], 'design', chunk['start'])
+    first_customer, customer_count = chunk['customers']
+    storage = media_storage()
+    design_rows, blob_rows = [], []
+    for offset in range(chunk['count']):
+        size = chunk['image_size']
+        image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        for _ in range(rng.randint(3, 8)):
+            x0, y0 = rng.randrange(size), rng.randrange(size)
+            x1, y1 = sorted((x0, rng.randrange(size))), sorted((y0, rng.randrange(size)))
+            color = tuple(rng.randrange(256) for _ in range(3)) + (255,)
+            draw.ellipse((x1[0], y1[0], x1[1], y1[1]), fill=color)
+        buffer = BytesIO()
+        image.save(buffer, format='PNG')
+        content = ContentFile(buffer.getvalue())
+        content.sha256 = hashlib.sha256(buffer.getvalue()).hexdigest()
+        name = storage.save(f'design_uploads/{content.sha256}.png', content)
+        created_at = _timestamp(rng)
+        blob_id = chunk['start_blob'] + chunk['offset'] + offset
+        blob_rows.append({
+            'id': blob_id,
+            'sha256': content.sha256,
+            'file': name,
+            'file_type': 'png',
+            'size': content.size,
+            'width': size,
+            'height': size,
+            'ref_count': 1,
+            'created_at': created_at,
+        })
+        design_rows.append({
+            'id': chunk['start'] + offset,
+            'design_description': f'{rng.choice(THEMES)} artwork: {_text(rng, 6)}',
+            'customer_id': first_customer + rng.randrange(customer_count),
+            'created_at': created_at,
+            'design_file': name,
+            'file_type': 'png',
+            'blob_id': blob_id,
+        })
+    return blob_rows, design_rows
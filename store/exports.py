@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+from .models import OrderItem
+
+ORDER_EXPORT_FIELDS = ['id', 'placed_at', 'payment_status', 'customer', 'total', 'items']
+ORDER_ITEM_EXPORT_FIELDS = ['order', 'placed_at', 'payment_status', 'customer',
+                            'product', 'quantity', 'unit_price']
+PAYMENT_EXPORT_FIELDS = ['id', 'order', 'customer', 'payment_method', 'status',
+                         'amount', 'payment_date', 'transaction_id', 'receipt_id']
+
+
+def keyset_chunks(queryset, columns, chunk_size):
+    """
+    Yield ``values_list(*columns)`` rows of ``queryset`` in id order, one
+    query per chunk. ``columns`` must start with ``id``.
+
+    Each chunk starts after the last id of the previous one, so memory stays
+    bounded on every database backend (MySQL drivers buffer the whole
+    result of ``iterator()``) and later chunks don't get slower like
+    OFFSET pages do.
+    """
+    queryset = queryset.order_by('id').values_list(*columns)
+    rows = list(queryset[:chunk_size])
+    while rows:
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        rows = list(queryset.filter(id__gt=rows[-1][0])[:chunk_size])
+
+
+def order_rows(queryset, chunk_size=1000):
+    """Stream orders as dicts keyed by ORDER_EXPORT_FIELDS, items included."""
+    columns = ['id', 'placed_at', 'payment_status', 'customer_id']
+    for chunk in keyset_chunks(queryset, columns, chunk_size):
+        items = defaultdict(list)
+        related = OrderItem.objects.filter(order_id__in=[row[0] for row in chunk]).order_by('id')
+        for order_id, product, quantity, unit_price in related.values_list(
+                'order_id', 'product_id', 'quantity', 'unit_price'):
+            items[order_id].append(
+                {'product': product, 'quantity': quantity, 'unit_price': unit_price})
+        for order_id, placed_at, payment_status, customer in chunk:
+            order_items = items[order_id]
+            yield {
+                'id': order_id,
+                'placed_at': placed_at,
+                'payment_status': payment_status,
+                'customer': customer,
+                'total': sum(item['quantity'] * item['unit_price'] for item in order_items),
+                'items': order_items,
+            }
+
+
+def order_item_rows(orders):
+    """Flatten ``order_rows`` to one row per item for CSV exports."""
+    empty = {'product': None, 'quantity': None, 'unit_price': None}
+    for order in orders:
+        for item in order['items'] or [empty]:
+            yield {
+                'order': order['id'],
+                'placed_at': order['placed_at'],
+                'payment_status': order['payment_status'],
+                'customer': order['customer'],
+                **item,
+            }
+
+
+def payment_rows(queryset, chunk_size=2000):
+    """Stream payments as dicts keyed by PAYMENT_EXPORT_FIELDS."""
+    columns = ['id', 'order_id', 'customer_id'] + PAYMENT_EXPORT_FIELDS[3:]
+    for chunk in keyset_chunks(queryset, columns, chunk_size):
+        for values in chunk:
+            yield dict(zip(PAYMENT_EXPORT_FIELDS, values))
@@ -0,0 +1,164 @@
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
+
+from .models import FacetCount, Product, PromotionFacetCount
+
+# Lower bound of each price band; a band runs up to the next bound.
+PRICE_BANDS = [Decimal(bound) for bound in ('0', '10', '25', '50', '100', '250', '500')]
+
+Promotions = Product.promotions.through
+
+
+def price_band(unit_price):
+    return bisect_right(PRICE_BANDS, Decimal(str(unit_price))) - 1
+
+
+def band_range(band):
+    """``(min, max)`` of a band; ``max`` is exclusive and None for the last band."""
+    upper = PRICE_BANDS[band + 1] if band + 1 < len(PRICE_BANDS) else None
+    return PRICE_BANDS[band], upper
+
+
+def price_band_expression(field='unit_price'):
+    return Case(
+        *[When(**{f'{field}__lt': bound}, then=Value(band))
+          for band, bound in enumerate(PRICE_BANDS[1:])],
+        default=Value(len(PRICE_BANDS) - 1), output_field=IntegerField())
+
+
+def product_entries(product_ids, lock=False):
+    """
+    ``[(collection_id, price band, [promotion ids])]`` for the given products.
+    With ``lock`` the products are locked until the transaction ends.
+    """
+    promotions = defaultdict(list)
+    for product_id, promotion_id in Promotions.objects.filter(
+            product_id__in=product_ids).values_list('product_id', 'promotion_id'):
+        promotions[product_id].append(promotion_id)
+    products = Product.objects.filter(id__in=product_ids)
+    if lock:
+        products = products.select_for_update()
+    return [(collection_id, price_band(unit_price), promotions[pk])
+            for pk, collection_id, unit_price in products.values_list(
+                'id', 'collection_id', 'unit_price')]
+
+
+def _apply(model, fields, deltas):
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    # Make sure every row exists, then adjust each one with an atomic
+    # UPDATE so concurrent writers can't lose counts.
+    model.objects.bulk_create(
+        [model(**dict(zip(fields, key))) for key in deltas], ignore_conflicts=True)
+    for key, delta in deltas.items():
+        model.objects.filter(**dict(zip(fields, key))).update(count=F('count') + delta)
+
+
+def move(before, after):
+    """
+    Move products from their ``before`` to their ``after`` entries, both
+    given as ``product_entries``; products that stay in the same facets
+    cost nothing.
+    """
+    counts, promotion_counts = Counter(), Counter()
+    for entries, sign in ((before, -1), (after, 1)):
+        for collection_id, band, promotions in entries:
+            counts[collection_id, band] += sign
+            for promotion_id in promotions:
+                promotion_counts[promotion_id, collection_id, band] += sign
+    _apply(FacetCount, ['collection_id', 'price_band'], counts)
+    _apply(PromotionFacetCount, ['promotion_id', 'collection_id', 'price_band'],
+           promotion_counts)
+
+
+def adjust(entries, sign):
+    """Add (``sign=1``) or remove (``sign=-1``) products given as ``product_entries``."""
+    if sign > 0:
+        move([], entries)
+    else:
+        move(entries, [])
+
+
+def adjust_promotions(pairs, sign):
+    """Add or remove ``(product_id, promotion_id)`` memberships."""
+    products = dict((pk, (collection_id, price_band(unit_price)))
+                    for pk, collection_id, unit_price in Product.objects.filter(
+                        id__in={product_id for product_id, _ in pairs})
+                    .values_list('id', 'collection_id', 'unit_price'))
+    counts = Counter()
+    for product_id, promotion_id in pairs:
+        if product_id in products:
+            counts[(promotion_id,) + products[product_id]] += sign
+    _apply(PromotionFacetCount, ['promotion_id', 'collection_id', 'price_band'], counts)
+
+
+def rebuild_facets():
+    """Recount both facet tables from the catalog. Returns the number of rows."""
+    band_expression = price_band_expression()
+    promotion_band_expression = price_band_expression('product__unit_price')
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        PromotionFacetCount.objects.all().delete()
+        created = FacetCount.objects.bulk_create(
+            FacetCount(collection_id=collection_id, price_band=band, count=count)
+            for collection_id, band, count in Product.objects.order_by()
+            .annotate(band=band_expression).values('collection_id', 'band')
+            .annotate(count=Count('id')).values_list('collection_id', 'band', 'count'))
+        created += PromotionFacetCount.objects.bulk_create(
+            PromotionFacetCount(promotion_id=promotion_id, collection_id=collection_id,
+                                price_band=band, count=count)
+            for promotion_id, collection_id, band, count in Promotions.objects.order_by()
+            .annotate(band=promotion_band_expression).values('promotion_id', 'product__collection_id', 'band')
+            .annotate(count=Count('id'))
+            .values_list('promotion_id', 'product__collection_id', 'band', 'count'))
+    return len(created)
+
+
+def _facets(collections, bands, promotions):
+    price_bands = []
+    for band, count in bands:
+        lower, upper = band_range(band)
+        price_bands.append({'band': band, 'min': lower, 'max': upper, 'count': count})
+    return {
+        'collections': [{'id': pk, 'count': count} for pk, count in collections],
+        'price_bands': price_bands,
+        'promotions': [{'id': pk, 'count': count} for pk, count in promotions],
+    }
+
+
+def facet_counts(collection_id=None, band=None):
+    """Facet counts from the facet tables, narrowed to a collection and band."""
+    counts = FacetCount.objects.filter(count__gt=0)
+    promotion_counts = PromotionFacetCount.objects.filter(count__gt=0)
+    if collection_id is not None:
+        counts = counts.filter(collection_id=collection_id)
+        promotion_counts = promotion_counts.filter(collection_id=collection_id)
+    if band is not None:
+        counts = counts.filter(price_band=band)
+        promotion_counts = promotion_counts.filter(price_band=band)
+
+    def totals(queryset, field):
+        return queryset.values(field).annotate(total=Sum('count')) \
+            .order_by(field).values_list(field, 'total')
+
+    return _facets(totals(counts, 'collection_id'), totals(counts, 'price_band'),
+                   totals(promotion_counts, 'promotion_id'))
+
+
+def live_facet_counts(queryset):
+    """Facet counts computed from an arbitrary product queryset."""
+    queryset = queryset.order_by()
+
+    def totals(queryset, field):
+        return queryset.values(field).annotate(total=Count('id')) \
+            .order_by(field).values_list(field, 'total')
+
+    return _facets(
+        totals(queryset, 'collection_id'),
+        totals(queryset.annotate(band=price_band_expression()), 'band'),
+        totals(queryset.filter(promotions__isnull=False), 'promotions'))
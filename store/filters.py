@@ -1,10 +1,36 @@
-from django_filters.rest_framework import FilterSet
-from .models import Product
+from django_filters.rest_framework import FilterSet, NumberFilter
+from .facets import PRICE_BANDS, band_range
+from .models import Order, Payment, Product
 
 class ProductFilter(FilterSet):
+  price_band = NumberFilter(method='filter_price_band', min_value=0,
+                            max_value=len(PRICE_BANDS) - 1)
+
+  def filter_price_band(self, queryset, name, value):
+    lower, upper = band_range(int(value))
+    queryset = queryset.filter(unit_price__gte=lower)
+    return queryset if upper is None else queryset.filter(unit_price__lt=upper)
+
   class Meta:
     model = Product
     fields = {
       'collection_id': ['exact'],
       'unit_price': ['gt', 'lt']
-    }
\ No newline at end of file
+    }
+
+class OrderExportFilter(FilterSet):
+  class Meta:
+    model = Order
+    fields = {
+      'placed_at': ['gte', 'lt'],
+      'payment_status': ['exact']
+    }
+
+
+class PaymentExportFilter(FilterSet):
+  class Meta:
+    model = Payment
+    fields = {
+      'payment_date': ['gte', 'lte'],
+      'status': ['exact']
+    }
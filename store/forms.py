@@ -0,0 +1,30 @@
+from django import forms
+
+from .bulk import validate_amount
+from .models import ProductBulkChange
+
+
+class ProductBulkChangeForm(forms.Form):
+    kind = forms.ChoiceField(choices=ProductBulkChange.KIND_CHOICES)
+    amount = forms.DecimalField(
+        max_digits=10, decimal_places=2,
+        help_text='Percent (e.g. -15), price amount (e.g. 2.50) or inventory units (e.g. 100).')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        kind, amount = cleaned_data.get('kind'), cleaned_data.get('amount')
+        if kind and amount is not None:
+            try:
+                validate_amount(kind, amount)
+            except forms.ValidationError as e:
+                self.add_error('amount', e)
+        return cleaned_data
+
+
+class ProductBulkUploadForm(forms.Form):
+    file = forms.FileField(
+        help_text='CSV with a "product" id column and any of the columns '
+                  'price_percent, price_amount and inventory_delta.')
+    dry_run = forms.BooleanField(
+        required=False, initial=True,
+        help_text='Only preview how many products each change would affect.')
@@ -0,0 +1,160 @@
+from itertools import islice
+
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework.exceptions import ValidationError
+
+from . import facets
+from .exports import keyset_chunks
+from .models import Collection, Product
+from .pricing import refresh_effective_prices
+from .serializers import ProductImportSerializer
+
+MAX_REPORTED_ERRORS = 1000
+PRODUCT_EXPORT_FIELDS = ['id', 'title', 'slug', 'description',
+                         'unit_price', 'inventory', 'collection']
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Stream products as dicts keyed by PRODUCT_EXPORT_FIELDS."""
+    columns = PRODUCT_EXPORT_FIELDS[:-1] + ['collection_id']
+    for chunk in keyset_chunks(queryset, columns, chunk_size):
+        for values in chunk:
+            yield dict(zip(PRODUCT_EXPORT_FIELDS, values))
+
+
+class ProductImporter:
+    """
+    Applies a product feed in chunks.
+
+    Rows are validated with ProductImportSerializer, existing products are
+    matched by ``key`` (``id`` or ``slug``) with one query per chunk, and
+    each chunk is written with bulk_create/bulk_update in its own
+    transaction. Invalid rows, ids that match no product and rows the
+    database rejects are reported and skipped; they never abort the rest
+    of the feed.
+    """
+
+    def __init__(self, key='id', chunk_size=1000):
+        if key not in ('id', 'slug'):
+            raise ValueError("key must be 'id' or 'slug'")
+        self.key = key
+        self.chunk_size = chunk_size
+        self.serializer = ProductImportSerializer()
+        self.collection_ids = set()
+        self.collections_by_title = {}
+        for pk, title in Collection.objects.values_list('id', 'title'):
+            self.collection_ids.add(pk)
+            self.collections_by_title.setdefault(title.lower(), pk)
+        self.result = {'rows': 0, 'created': 0, 'updated': 0,
+                       'error_count': 0, 'errors': []}
+
+    def run(self, rows):
+        """Import ``rows``, an iterable of ``(row, parse_error)`` pairs."""
+        numbered = enumerate(rows, start=1)
+        while chunk := list(islice(numbered, self.chunk_size)):
+            self.import_chunk(chunk)
+        return self.result
+
+    def import_chunk(self, chunk):
+        valid = []
+        for number, (row, error) in chunk:
+            self.result['rows'] += 1
+            if error is None:
+                data, error = self.validate(row)
+            if error is not None:
+                self.add_error(number, error)
+                continue
+            valid.append((number, data))
+
+        existing = self.existing_products([data for _, data in valid])
+        to_create, to_update, update_fields = [], [], {'last_update'}
+        now = timezone.now()
+        for number, data in valid:
+            product = existing.get(data.get(self.key))
+            if product is None and self.key == 'id' and 'id' in data:
+                self.add_error(number, {'id': [f'No product with id {data["id"]}.']})
+                continue
+            if self.key == 'slug':
+                # Rows are matched by slug; an id would move the update to another product.
+                data.pop('id', None)
+            if product is None:
+                data.setdefault('slug', slugify(data['title']) or '-')
+                # New products have no promotions yet.
+                to_create.append((number, Product(effective_price=data['unit_price'], **data)))
+            else:
+                for field, value in data.items():
+                    setattr(product, field, value)
+                product.last_update = now
+                update_fields.update(data)
+                to_update.append((number, product))
+        update_fields.discard('id')
+
+        try:
+            self.write(to_create, to_update, update_fields)
+        except (IntegrityError, DataError):
+            # Find the rows the database rejects by writing them one at a time.
+            to_create = [entry for entry in to_create
+                         if self.write_row(entry, update_fields, created=True)]
+            to_update = [entry for entry in to_update
+                         if self.write_row(entry, update_fields, created=False)]
+        self.result['created'] += len(to_create)
+        self.result['updated'] += len(to_update)
+
+    def write(self, to_create, to_update, update_fields):
+        # bulk_create/bulk_update don't send signals, so the facet counts
+        # of the products written are moved here.
+        update_ids = [product.id for _, product in to_update]
+        with transaction.atomic():
+            before = facets.product_entries(update_ids, lock=True)
+            Product.objects.bulk_create([product for _, product in to_create])
+            if to_update:
+                Product.objects.bulk_update([product for _, product in to_update], update_fields)
+                if 'unit_price' in update_fields:
+                    refresh_effective_prices(update_ids)
+            # New products have no promotions yet.
+            after = [(product.collection_id, facets.price_band(product.unit_price), [])
+                     for _, product in to_create]
+            facets.move(before, after + facets.product_entries(update_ids))
+
+    def write_row(self, entry, update_fields, created):
+        number, product = entry
+        if created:
+            # The rolled back bulk_create may have assigned it an id.
+            product.pk = None
+        try:
+            self.write([entry] if created else [], [] if created else [entry], update_fields)
+        except (IntegrityError, DataError) as e:
+            self.add_error(number, {'non_field_errors': [str(e)]})
+            return False
+        return True
+
+    def validate(self, row):
+        # CSV feeds use empty cells for "not provided".
+        row = {key: value for key, value in row.items()
+               if key is not None and value not in ('', None)}
+        try:
+            data = self.serializer.run_validation(row)
+        except ValidationError as e:
+            return None, e.detail
+        collection = data.pop('collection').strip()
+        if collection.isdigit() and int(collection) in self.collection_ids:
+            data['collection_id'] = int(collection)
+        elif collection.lower() in self.collections_by_title:
+            data['collection_id'] = self.collections_by_title[collection.lower()]
+        else:
+            return None, {'collection': [f'Unknown collection "{collection}".']}
+        return dict(data), None
+
+    def existing_products(self, rows):
+        keys = {data[self.key] for data in rows if data.get(self.key)}
+        if not keys:
+            return {}
+        products = Product.objects.filter(**{f'{self.key}__in': keys}).order_by('-id')
+        return {getattr(product, self.key): product for product in products}
+
+    def add_error(self, number, error):
+        self.result['error_count'] += 1
+        if len(self.result['errors']) < MAX_REPORTED_ERRORS:
+            self.result['errors'].append({'row': number, 'errors': error})
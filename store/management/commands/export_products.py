@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from store.models import Product
+from store.streaming import CSV, NDJSON, csv_lines, detect_format, ndjson_lines
+from store.importers import PRODUCT_EXPORT_FIELDS, export_rows
+
+
+class Command(BaseCommand):
+    help = 'Streams the product catalog as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Output file, or - for stdout.')
+        parser.add_argument('--format', choices=[CSV, NDJSON],
+                            help='Defaults to the file extension.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        output = options['format'] or detect_format(path)
+        rows = export_rows(Product.objects.all())
+        lines = csv_lines(PRODUCT_EXPORT_FIELDS, rows) if output == CSV else ndjson_lines(rows)
+
+        out = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        try:
+            out.writelines(lines)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,140 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from designs.models import Design, DesignBlob
+from store import datagen
+from store.facets import rebuild_facets
+from store.models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let generated rows keep their own timestamps instead of "now"."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in saved:
+            field.auto_now_add = auto_now_add
+
+
+def next_id(model):
+    return (model.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = 'Generates synthetic customers, catalog, orders, carts and designs for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--collections', type=int, default=100)
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--customers', type=int, default=10_000)
+        parser.add_argument('--orders', type=int, default=50_000)
+        parser.add_argument('--items-per-order', type=int, default=3,
+                            help='Average number of items per order.')
+        parser.add_argument('--carts', type=int, default=5_000)
+        parser.add_argument('--designs', type=int, default=1_000)
+        parser.add_argument('--image-size', type=int, default=256,
+                            help='Width and height in pixels of generated design images.')
+        parser.add_argument('--chunk-size', type=int, default=5_000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.batch_size = min(options['chunk_size'], 1000)
+        User = get_user_model()
+
+        collection_start = next_id(Collection)
+        product_start = next_id(Product)
+        customer_start = next_id(Customer)
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool, \
+                explicit_timestamps(Order._meta.get_field('placed_at'),
+                                    Cart._meta.get_field('created_at'),
+                                    Design._meta.get_field('created_at'),
+                                    DesignBlob._meta.get_field('created_at')):
+            self.pool = pool
+            self.generate('collections', datagen.collections, Collection,
+                          options['collections'], collection_start)
+            self.generate('products', datagen.products, Product,
+                          options['products'], product_start,
+                          collections=(collection_start, options['collections']))
+            self.generate('customers', datagen.customers, (User, Customer),
+                          options['customers'], customer_start,
+                          start_user=next_id(User),
+                          password=make_password('synthetic'))
+
+            customers = (customer_start, options['customers'])
+            products = (product_start, options['products'])
+            self.generate('orders', datagen.orders, (Order, OrderItem),
+                          options['orders'], next_id(Order),
+                          customers=customers, products=products,
+                          items_per_order=options['items_per_order'])
+            self.generate('carts', datagen.carts, (Cart, CartItem),
+                          options['carts'], Cart.objects.count(), products=products)
+            self.generate('designs', datagen.designs, (DesignBlob, Design),
+                          options['designs'], next_id(Design),
+                          customers=customers, start_blob=next_id(DesignBlob),
+                          image_size=options['image_size'])
+
+        if options['products'] > 0:
+            self.stdout.write(f'facets: {rebuild_facets():,} rows')
+        if options['designs'] > 0:
+            self.stdout.write('Run generate_design_variants to make the designs\' variants.')
+
+    def generate(self, label, generator, models, total, start, **extra):
+        if total <= 0:
+            return
+        chunk_size = self.options['chunk_size']
+        chunks = (
+            dict(extra, seed=self.options['seed'], index=index, offset=offset,
+                 start=start + offset, count=min(chunk_size, total - offset))
+            for index, offset in enumerate(range(0, total, chunk_size))
+        )
+        if not isinstance(models, tuple):
+            models = (models,)
+
+        started = time.monotonic()
+        done = rows_written = 0
+        for result in self.ordered_map(generator, chunks):
+            if len(models) == 1:
+                result = (result,)
+            with transaction.atomic():
+                for model, rows in zip(models, result):
+                    model.objects.bulk_create(
+                        [model(**row) for row in rows], batch_size=self.batch_size)
+                    rows_written += len(rows)
+            done += len(result[0])
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{label}: {done:,}/{total:,} '
+                f'({rows_written / elapsed:,.0f} rows/s)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: wrote {rows_written:,} rows in {time.monotonic() - started:.1f}s'))
+
+    def ordered_map(self, func, items):
+        """
+        Like ``pool.map`` but keeps only a few chunks in flight, so memory
+        stays bounded when the database is slower than the workers.
+        """
+        window = 2 * (self.options['workers'] or 1)
+        pending = deque()
+        for item in items:
+            pending.append(self.pool.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.importers import ProductImporter
+from store.streaming import CSV, NDJSON, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Imports a CSV or NDJSON product feed in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=[CSV, NDJSON],
+                            help='Defaults to the file extension.')
+        parser.add_argument('--key', choices=['id', 'slug'], default='id',
+                            help='Field used to match rows to existing products.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        output = options['format'] or detect_format(path)
+        importer = ProductImporter(key=options['key'], chunk_size=options['chunk_size'])
+        try:
+            with open(path, 'rb') as feed:
+                result = importer.run(read_rows(feed, output))
+        except OSError as e:
+            raise CommandError(e)
+
+        for error in result['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['rows']} rows: {result['created']} created, "
+            f"{result['updated']} updated, {result['error_count']} rejected"))
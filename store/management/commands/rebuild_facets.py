@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = 'Recounts the product facet tables from the catalog'
+
+    def handle(self, *args, **options):
+        rows = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt facets: {rows:,} rows'))
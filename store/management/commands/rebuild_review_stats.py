@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.reviews import rebuild_review_stats
+
+
+class Command(BaseCommand):
+    help = 'Recounts the review summary of every product'
+
+    def handle(self, *args, **options):
+        products = rebuild_review_stats()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt review stats for {products:,} products'))
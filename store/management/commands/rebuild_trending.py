@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.trending import rebuild_trending
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the trending scores from order and like history'
+
+    def handle(self, *args, **options):
+        scores = rebuild_trending()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {scores:,} trending scores'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.pricing import refresh_effective_prices
+
+
+class Command(BaseCommand):
+    help = 'Recomputes every product\'s effective price from its promotions'
+
+    def handle(self, *args, **options):
+        changed = refresh_effective_prices()
+        self.stdout.write(self.style.SUCCESS(f'Updated {changed:,} effective prices'))
@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.reservations import recount, release_expired
+
+
+class Command(BaseCommand):
+    help = 'Gives the stock held by expired cart reservations back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep sweeping every --interval seconds.')
+        parser.add_argument('--interval', type=float,
+                            default=settings.CART_RESERVATION_SWEEP_INTERVAL)
+        parser.add_argument('--recount', action='store_true',
+                            help='Recompute the reserved counters from the reservations first.')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.stdout.write(f'Recounted {recount():,} products')
+        while True:
+            released = release_expired(options['batch_size'])
+            if released or not options['loop']:
+                self.stdout.write(f'Released {released:,} reservations')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
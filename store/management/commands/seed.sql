@@ -18,6 +18,7 @@ insert into
     title,
     description,
     unit_price,
+    effective_price,
     inventory,
     last_update,
     collection_id,
@@ -29,6 +30,7 @@ values
     'Bread Ww Cluster',
     'mus vivamus vestibulum sagittis sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus',
     4.00,
+    4.00,
     11,
     '2020-09-11 00:00:00',
     6,
@@ -39,6 +41,7 @@ values
     'Island Oasis - Raspberry',
     'maecenas tincidunt lacus at velit vivamus vel nulla eget eros elementum pellentesque',
     84.64,
+    84.64,
     40,
     '2020-07-07 00:00:00',
     3,
@@ -49,6 +52,7 @@ values
     'Shrimp - 21/25, Peel And Deviened',
     'nisi volutpat eleifend donec ut dolor morbi vel lectus in quam',
     11.52,
+    11.52,
     29,
     '2021-04-05 00:00:00',
     3,
@@ -59,6 +63,7 @@ values
     'Wood Chips - Regular',
     'posuere cubilia curae nulla dapibus dolor vel est donec odio justo sollicitudin ut',
     73.47,
+    73.47,
     40,
     '2020-07-20 00:00:00',
     5,
@@ -69,6 +74,7 @@ values
     'Lettuce - Mini Greens, Whole',
     'lectus in est risus auctor sed tristique in tempus sit amet sem fusce consequat nulla nisl nunc',
     60.21,
+    60.21,
     56,
     '2020-08-18 00:00:00',
     5,
@@ -79,6 +85,7 @@ values
     'Mustard - Individual Pkg',
     'pellentesque volutpat dui maecenas tristique est et tempus semper est quam pharetra magna',
     76.62,
+    76.62,
     18,
     '2020-10-25 00:00:00',
     6,
@@ -89,6 +96,7 @@ values
     'Turkey Tenderloin Frozen',
     'sit amet erat nulla tempus vivamus in felis eu sapien cursus vestibulum proin eu mi nulla ac enim',
     13.64,
+    13.64,
     48,
     '2020-08-08 00:00:00',
     4,
@@ -99,6 +107,7 @@ values
     'Silicone Parch. 16.3x24.3',
     'faucibus orci luctus et ultrices posuere cubilia curae duis faucibus accumsan odio curabitur convallis duis',
     85.76,
+    85.76,
     55,
     '2021-06-03 00:00:00',
     6,
@@ -109,6 +118,7 @@ values
     'Tomatoes - Cherry, Yellow',
     'sapien cursus vestibulum proin eu mi nulla ac enim in tempor turpis nec euismod scelerisque quam turpis adipiscing',
     30.81,
+    30.81,
     45,
     '2021-03-03 00:00:00',
     5,
@@ -119,6 +129,7 @@ values
     'Sloe Gin - Mcguinness',
     'fringilla rhoncus mauris enim leo rhoncus sed vestibulum sit amet cursus id turpis integer aliquet massa',
     2.82,
+    2.82,
     69,
     '2021-04-18 00:00:00',
     5,
@@ -129,6 +140,7 @@ values
     'Wine - Magnotta - Belpaese',
     'ut massa volutpat convallis morbi odio odio elementum eu interdum eu tincidunt in leo',
     37.72,
+    37.72,
     71,
     '2021-01-19 00:00:00',
     6,
@@ -139,6 +151,7 @@ values
     'Beer - Alexander Kieths, Pale Ale',
     'nisl aenean lectus pellentesque eget nunc donec quis orci eget orci vehicula condimentum curabitur in libero ut massa',
     92.74,
+    92.74,
     55,
     '2020-12-28 00:00:00',
     3,
@@ -149,6 +162,7 @@ values
     'Basil - Thai',
     'rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum',
     50.07,
+    50.07,
     41,
     '2020-07-07 00:00:00',
     6,
@@ -159,6 +173,7 @@ values
     'Tofu - Soft',
     'at vulputate vitae nisl aenean lectus pellentesque eget nunc donec quis orci eget orci vehicula',
     88.70,
+    88.70,
     24,
     '2020-08-29 00:00:00',
     4,
@@ -169,6 +184,7 @@ values
     'Mayonnaise - Individual Pkg',
     'id luctus nec molestie sed justo pellentesque viverra pede ac diam cras pellentesque volutpat dui maecenas tristique est et',
     81.81,
+    81.81,
     35,
     '2020-07-25 00:00:00',
     4,
@@ -179,6 +195,7 @@ values
     'Sauce - Hollandaise',
     'blandit lacinia erat vestibulum sed magna at nunc commodo placerat praesent blandit nam nulla integer pede',
     9.09,
+    9.09,
     63,
     '2020-07-16 00:00:00',
     6,
@@ -189,6 +206,7 @@ values
     'Salt - Rock, Course',
     'congue etiam justo etiam pretium iaculis justo in hac habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla ut',
     41.53,
+    41.53,
     60,
     '2021-03-05 00:00:00',
     3,
@@ -199,6 +217,7 @@ values
     'Beef - Ox Tail, Frozen',
     'donec pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis sapien sapien',
     80.97,
+    80.97,
     85,
     '2020-07-26 00:00:00',
     4,
@@ -209,6 +228,7 @@ values
     'Schnappes - Peach, Walkers',
     'phasellus in felis donec semper sapien a libero nam dui proin leo odio porttitor id consequat in',
     81.97,
+    81.97,
     10,
     '2021-05-14 00:00:00',
     5,
@@ -219,6 +239,7 @@ values
     'Cheese - Parmesan Cubes',
     'ut nunc vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae mauris viverra',
     32.94,
+    32.94,
     97,
     '2020-08-12 00:00:00',
     3,
@@ -229,6 +250,7 @@ values
     'Sweet Pea Sprouts',
     'lectus aliquam sit amet diam in magna bibendum imperdiet nullam',
     31.93,
+    31.93,
     49,
     '2021-01-14 00:00:00',
     5,
@@ -239,6 +261,7 @@ values
     'Straw - Regular',
     'nec nisi vulputate nonummy maecenas tincidunt lacus at velit vivamus vel',
     76.59,
+    76.59,
     56,
     '2020-11-13 00:00:00',
     5,
@@ -249,6 +272,7 @@ values
     'Peach - Fresh',
     'feugiat et eros vestibulum ac est lacinia nisi venenatis tristique fusce congue diam id ornare imperdiet sapien',
     2.95,
+    2.95,
     63,
     '2021-01-22 00:00:00',
     6,
@@ -259,6 +283,7 @@ values
     'Chinese Foods - Pepper Beef',
     'nec nisi volutpat eleifend donec ut dolor morbi vel lectus in quam fringilla rhoncus mauris',
     86.30,
+    86.30,
     64,
     '2020-10-31 00:00:00',
     3,
@@ -269,6 +294,7 @@ values
     'Guava',
     'erat eros viverra eget congue eget semper rutrum nulla nunc purus phasellus in felis donec semper sapien a',
     17.53,
+    17.53,
     96,
     '2021-05-05 00:00:00',
     4,
@@ -279,6 +305,7 @@ values
     'Tendrils - Baby Pea, Organic',
     'lacus at velit vivamus vel nulla eget eros elementum pellentesque quisque porta volutpat erat',
     18.18,
+    18.18,
     0,
     '2021-03-24 00:00:00',
     3,
@@ -289,6 +316,7 @@ values
     'Sugar - Brown',
     'lobortis sapien sapien non mi integer ac neque duis bibendum morbi non quam nec dui',
     65.01,
+    65.01,
     84,
     '2020-10-24 00:00:00',
     5,
@@ -299,6 +327,7 @@ values
     'Oil - Pumpkinseed',
     'cursus vestibulum proin eu mi nulla ac enim in tempor turpis nec euismod scelerisque quam turpis',
     86.27,
+    86.27,
     90,
     '2021-02-11 00:00:00',
     5,
@@ -309,6 +338,7 @@ values
     'Beef - Tongue, Cooked',
     'sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat in congue etiam justo',
     73.48,
+    73.48,
     82,
     '2021-02-07 00:00:00',
     6,
@@ -319,6 +349,7 @@ values
     'Goat - Leg',
     'vehicula condimentum curabitur in libero ut massa volutpat convallis morbi odio odio elementum eu interdum eu tincidunt in',
     83.98,
+    83.98,
     66,
     '2021-03-01 00:00:00',
     4,
@@ -329,6 +360,7 @@ values
     'Orange Roughy 4/6 Oz',
     'id sapien in sapien iaculis congue vivamus metus arcu adipiscing molestie',
     99.48,
+    99.48,
     79,
     '2021-05-26 00:00:00',
     5,
@@ -339,6 +371,7 @@ values
     'Lemons',
     'et ultrices posuere cubilia curae donec pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit',
     29.08,
+    29.08,
     83,
     '2021-06-03 00:00:00',
     5,
@@ -349,6 +382,7 @@ values
     'Turnip - Mini',
     'id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat',
     13.93,
+    13.93,
     8,
     '2021-03-23 00:00:00',
     6,
@@ -359,6 +393,7 @@ values
     'Hinge W Undercut',
     'in quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices',
     20.24,
+    20.24,
     45,
     '2020-08-23 00:00:00',
     3,
@@ -369,6 +404,7 @@ values
     'Cheese - Mozzarella',
     'nam ultrices libero non mattis pulvinar nulla pede ullamcorper augue a suscipit nulla',
     34.71,
+    34.71,
     76,
     '2020-10-13 00:00:00',
     3,
@@ -379,6 +415,7 @@ values
     'Basil - Fresh',
     'pede libero quis orci nullam molestie nibh in lectus pellentesque at nulla suspendisse potenti cras in purus eu',
     11.80,
+    11.80,
     2,
     '2021-06-07 00:00:00',
     4,
@@ -389,6 +426,7 @@ values
     'Pastry - Choclate Baked',
     'rutrum at lorem integer tincidunt ante vel ipsum praesent blandit lacinia erat vestibulum sed magna at',
     61.87,
+    61.87,
     12,
     '2020-11-17 00:00:00',
     3,
@@ -399,6 +437,7 @@ values
     'Vol Au Vents',
     'non mauris morbi non lectus aliquam sit amet diam in',
     81.78,
+    81.78,
     98,
     '2021-04-29 00:00:00',
     5,
@@ -409,6 +448,7 @@ values
     'Tomatoes - Roma',
     'turpis a pede posuere nonummy integer non velit donec diam neque vestibulum eget vulputate ut ultrices vel augue vestibulum',
     29.81,
+    29.81,
     61,
     '2020-09-04 00:00:00',
     4,
@@ -419,6 +459,7 @@ values
     'Bread - Hamburger Buns',
     'vel nulla eget eros elementum pellentesque quisque porta volutpat erat quisque erat eros viverra eget congue eget',
     51.39,
+    51.39,
     8,
     '2021-04-07 00:00:00',
     5,
@@ -429,6 +470,7 @@ values
     'Cheese - Cambozola',
     'vitae quam suspendisse potenti nullam porttitor lacus at turpis donec posuere metus vitae ipsum aliquam non mauris morbi non',
     64.20,
+    64.20,
     54,
     '2020-12-22 00:00:00',
     3,
@@ -439,6 +481,7 @@ values
     'Cup - 4oz Translucent',
     'mattis odio donec vitae nisi nam ultrices libero non mattis pulvinar nulla pede ullamcorper augue a',
     71.97,
+    71.97,
     52,
     '2020-08-29 00:00:00',
     5,
@@ -449,6 +492,7 @@ values
     'Macaroons - Two Bite Choc',
     'tincidunt in leo maecenas pulvinar lobortis est phasellus sit amet erat nulla tempus vivamus in felis eu sapien',
     14.87,
+    14.87,
     38,
     '2021-05-15 00:00:00',
     6,
@@ -459,6 +503,7 @@ values
     'Vinegar - Raspberry',
     'platea dictumst maecenas ut massa quis augue luctus tincidunt nulla mollis molestie',
     52.43,
+    52.43,
     88,
     '2021-02-10 00:00:00',
     6,
@@ -469,6 +514,7 @@ values
     'Cake - Night And Day Choclate',
     'magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis sapien sapien non mi integer',
     84.60,
+    84.60,
     93,
     '2020-09-26 00:00:00',
     3,
@@ -479,6 +525,7 @@ values
     'Wine - Domaine Boyar Royal',
     'ut volutpat sapien arcu sed augue aliquam erat volutpat in congue etiam justo etiam',
     39.61,
+    39.61,
     92,
     '2020-07-14 00:00:00',
     6,
@@ -489,6 +536,7 @@ values
     'Sword Pick Asst',
     'nibh in hac habitasse platea dictumst aliquam augue quam sollicitudin vitae consectetuer eget rutrum at lorem integer',
     75.08,
+    75.08,
     15,
     '2021-04-28 00:00:00',
     3,
@@ -499,6 +547,7 @@ values
     'Sage - Ground',
     'ligula suspendisse ornare consequat lectus in est risus auctor sed tristique in tempus sit amet sem fusce consequat nulla nisl',
     16.75,
+    16.75,
     94,
     '2021-06-06 00:00:00',
     6,
@@ -509,6 +558,7 @@ values
     'Muffin Mix - Chocolate Chip',
     'ullamcorper purus sit amet nulla quisque arcu libero rutrum ac lobortis vel',
     93.49,
+    93.49,
     16,
     '2020-07-07 00:00:00',
     3,
@@ -519,6 +569,7 @@ values
     'Tia Maria',
     'morbi a ipsum integer a nibh in quis justo maecenas rhoncus aliquam',
     69.22,
+    69.22,
     14,
     '2020-06-11 00:00:00',
     4,
@@ -529,6 +580,7 @@ values
     'Apple - Fuji',
     'in lectus pellentesque at nulla suspendisse potenti cras in purus eu magna vulputate luctus cum sociis natoque penatibus',
     20.42,
+    20.42,
     94,
     '2021-05-05 00:00:00',
     3,
@@ -539,6 +591,7 @@ values
     'Veal - Tenderloin, Untrimmed',
     'cubilia curae donec pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis sapien',
     89.46,
+    89.46,
     44,
     '2020-06-14 00:00:00',
     4,
@@ -549,6 +602,7 @@ values
     'Mushroom - Crimini',
     'ut massa quis augue luctus tincidunt nulla mollis molestie lorem quisque ut erat curabitur',
     42.13,
+    42.13,
     58,
     '2021-01-19 00:00:00',
     3,
@@ -559,6 +613,7 @@ values
     'Parsley Italian - Fresh',
     'rhoncus mauris enim leo rhoncus sed vestibulum sit amet cursus id turpis',
     85.92,
+    85.92,
     93,
     '2021-04-24 00:00:00',
     3,
@@ -569,6 +624,7 @@ values
     'Tart - Pecan Butter Squares',
     'in porttitor pede justo eu massa donec dapibus duis at velit eu est congue elementum in hac habitasse platea dictumst',
     91.98,
+    91.98,
     43,
     '2020-09-06 00:00:00',
     4,
@@ -579,6 +635,7 @@ values
     'Vinegar - Tarragon',
     'orci vehicula condimentum curabitur in libero ut massa volutpat convallis morbi odio odio elementum eu interdum',
     7.30,
+    7.30,
     60,
     '2021-05-09 00:00:00',
     5,
@@ -589,6 +646,7 @@ values
     'Beef - Tender Tips',
     'nullam molestie nibh in lectus pellentesque at nulla suspendisse potenti cras in purus eu magna vulputate luctus cum',
     8.83,
+    8.83,
     5,
     '2021-01-01 00:00:00',
     3,
@@ -599,6 +657,7 @@ values
     'Chicken - Whole Roasting',
     'id lobortis convallis tortor risus dapibus augue vel accumsan tellus nisi eu orci',
     47.43,
+    47.43,
     11,
     '2021-04-07 00:00:00',
     3,
@@ -609,6 +668,7 @@ values
     'Water - Tonic',
     'sit amet eleifend pede libero quis orci nullam molestie nibh',
     36.84,
+    36.84,
     13,
     '2020-08-14 00:00:00',
     6,
@@ -619,6 +679,7 @@ values
     'Shrimp - Tiger 21/25',
     'nibh in hac habitasse platea dictumst aliquam augue quam sollicitudin vitae consectetuer eget rutrum at lorem integer',
     64.38,
+    64.38,
     100,
     '2020-07-21 00:00:00',
     4,
@@ -629,6 +690,7 @@ values
     'Hagen Daza - Dk Choocolate',
     'sit amet sapien dignissim vestibulum vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere',
     37.63,
+    37.63,
     43,
     '2020-09-25 00:00:00',
     6,
@@ -639,6 +701,7 @@ values
     'Grenadillo',
     'lorem ipsum dolor sit amet consectetuer adipiscing elit proin risus praesent lectus vestibulum quam sapien varius',
     14.57,
+    14.57,
     34,
     '2020-10-14 00:00:00',
     6,
@@ -649,6 +712,7 @@ values
     'Coffee - 10oz Cup 92961',
     'quam fringilla rhoncus mauris enim leo rhoncus sed vestibulum sit amet',
     26.36,
+    26.36,
     34,
     '2020-09-22 00:00:00',
     5,
@@ -659,6 +723,7 @@ values
     'Seabream Whole Farmed',
     'interdum eu tincidunt in leo maecenas pulvinar lobortis est phasellus sit amet erat nulla tempus vivamus in felis',
     59.91,
+    59.91,
     32,
     '2021-02-13 00:00:00',
     5,
@@ -669,6 +734,7 @@ values
     'Coconut Milk - Unsweetened',
     'felis eu sapien cursus vestibulum proin eu mi nulla ac enim in tempor turpis nec euismod scelerisque',
     79.79,
+    79.79,
     12,
     '2021-03-10 00:00:00',
     4,
@@ -679,6 +745,7 @@ values
     'Soap - Mr.clean Floor Soap',
     'consectetuer eget rutrum at lorem integer tincidunt ante vel ipsum praesent blandit lacinia erat vestibulum',
     38.03,
+    38.03,
     31,
     '2020-06-13 00:00:00',
     5,
@@ -689,6 +756,7 @@ values
     'Cheese - Cambozola',
     'tincidunt ante vel ipsum praesent blandit lacinia erat vestibulum sed magna at nunc',
     19.49,
+    19.49,
     33,
     '2021-01-13 00:00:00',
     5,
@@ -699,6 +767,7 @@ values
     'Soup Campbells Mexicali Tortilla',
     'pulvinar sed nisl nunc rhoncus dui vel sem sed sagittis nam congue risus semper porta volutpat',
     93.16,
+    93.16,
     7,
     '2021-04-14 00:00:00',
     5,
@@ -709,6 +778,7 @@ values
     'Apron',
     'amet eleifend pede libero quis orci nullam molestie nibh in lectus pellentesque at nulla suspendisse',
     4.66,
+    4.66,
     6,
     '2021-02-10 00:00:00',
     4,
@@ -719,6 +789,7 @@ values
     'Wine - Penfolds Koonuga Hill',
     'aenean auctor gravida sem praesent id massa id nisl venenatis lacinia aenean sit amet justo morbi ut',
     1.27,
+    1.27,
     15,
     '2020-12-10 00:00:00',
     3,
@@ -729,6 +800,7 @@ values
     'Milk - Chocolate 250 Ml',
     'gravida sem praesent id massa id nisl venenatis lacinia aenean sit amet justo morbi ut odio cras',
     1.88,
+    1.88,
     25,
     '2020-08-19 00:00:00',
     5,
@@ -739,6 +811,7 @@ values
     'Beer - Paulaner Hefeweisse',
     'lobortis convallis tortor risus dapibus augue vel accumsan tellus nisi eu orci',
     36.96,
+    36.96,
     43,
     '2020-10-10 00:00:00',
     4,
@@ -749,6 +822,7 @@ values
     'Chocolate - Feathers',
     'ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae mauris',
     65.35,
+    65.35,
     50,
     '2020-11-02 00:00:00',
     4,
@@ -759,6 +833,7 @@ values
     'Club Soda - Schweppes, 355 Ml',
     'duis bibendum felis sed interdum venenatis turpis enim blandit mi in porttitor pede justo eu massa donec dapibus duis at',
     90.39,
+    90.39,
     72,
     '2021-04-13 00:00:00',
     3,
@@ -769,6 +844,7 @@ values
     'Corn Kernels - Frozen',
     'odio cras mi pede malesuada in imperdiet et commodo vulputate justo in blandit ultrices enim lorem ipsum',
     98.61,
+    98.61,
     53,
     '2020-10-12 00:00:00',
     4,
@@ -779,6 +855,7 @@ values
     'Cheese Cloth No 60',
     'posuere metus vitae ipsum aliquam non mauris morbi non lectus aliquam sit amet',
     66.25,
+    66.25,
     72,
     '2020-12-08 00:00:00',
     3,
@@ -789,6 +866,7 @@ values
     'Chips - Assorted',
     'nascetur ridiculus mus vivamus vestibulum sagittis sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus',
     86.36,
+    86.36,
     93,
     '2020-07-06 00:00:00',
     3,
@@ -799,6 +877,7 @@ values
     'Bagelers',
     'eget eleifend luctus ultricies eu nibh quisque id justo sit amet sapien dignissim',
     82.37,
+    82.37,
     39,
     '2020-08-29 00:00:00',
     4,
@@ -809,6 +888,7 @@ values
     'Corn - Cream, Canned',
     'in consequat ut nulla sed accumsan felis ut at dolor quis odio consequat varius integer ac leo pellentesque',
     85.46,
+    85.46,
     24,
     '2021-05-13 00:00:00',
     3,
@@ -819,6 +899,7 @@ values
     'Bread - Raisin',
     'donec diam neque vestibulum eget vulputate ut ultrices vel augue vestibulum ante ipsum primis',
     8.70,
+    8.70,
     70,
     '2020-07-09 00:00:00',
     4,
@@ -829,6 +910,7 @@ values
     'Soup - Campbells',
     'turpis integer aliquet massa id lobortis convallis tortor risus dapibus augue vel accumsan tellus nisi eu orci',
     8.13,
+    8.13,
     29,
     '2020-12-15 00:00:00',
     5,
@@ -839,6 +921,7 @@ values
     'Ecolab - Hobart Washarm End Cap',
     'placerat praesent blandit nam nulla integer pede justo lacinia eget tincidunt',
     83.36,
+    83.36,
     67,
     '2020-10-25 00:00:00',
     5,
@@ -849,6 +932,7 @@ values
     'Asparagus - White, Canned',
     'in porttitor pede justo eu massa donec dapibus duis at velit eu est congue elementum in hac habitasse platea dictumst',
     71.01,
+    71.01,
     17,
     '2020-07-27 00:00:00',
     3,
@@ -859,6 +943,7 @@ values
     'Muffin Mix - Lemon Cranberry',
     'ipsum praesent blandit lacinia erat vestibulum sed magna at nunc commodo placerat praesent blandit nam nulla integer pede justo',
     47.63,
+    47.63,
     11,
     '2020-12-23 00:00:00',
     6,
@@ -869,6 +954,7 @@ values
     'Shrimp - 16/20, Peeled Deviened',
     'parturient montes nascetur ridiculus mus etiam vel augue vestibulum rutrum rutrum neque aenean auctor',
     1.08,
+    1.08,
     58,
     '2021-06-07 00:00:00',
     5,
@@ -879,6 +965,7 @@ values
     'Soda Water - Club Soda, 355 Ml',
     'faucibus accumsan odio curabitur convallis duis consequat dui nec nisi volutpat eleifend donec ut dolor morbi vel lectus',
     90.06,
+    90.06,
     88,
     '2021-05-04 00:00:00',
     3,
@@ -889,6 +976,7 @@ values
     'Napkin White - Starched',
     'quam nec dui luctus rutrum nulla tellus in sagittis dui',
     30.95,
+    30.95,
     52,
     '2020-10-10 00:00:00',
     5,
@@ -899,6 +987,7 @@ values
     'Beer - Steamwhistle',
     'nulla justo aliquam quis turpis eget elit sodales scelerisque mauris sit amet',
     11.89,
+    11.89,
     59,
     '2020-06-20 00:00:00',
     3,
@@ -909,6 +998,7 @@ values
     'Pail For Lid 1537',
     'in ante vestibulum ante ipsum primis in faucibus orci luctus et ultrices',
     35.85,
+    35.85,
     92,
     '2020-10-11 00:00:00',
     6,
@@ -919,6 +1009,7 @@ values
     'Chinese Foods - Chicken Wing',
     'purus eu magna vulputate luctus cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus',
     28.87,
+    28.87,
     48,
     '2020-12-28 00:00:00',
     3,
@@ -929,6 +1020,7 @@ values
     'Spice - Montreal Steak Spice',
     'donec dapibus duis at velit eu est congue elementum in',
     35.71,
+    35.71,
     32,
     '2021-05-15 00:00:00',
     5,
@@ -939,6 +1031,7 @@ values
     'Juice - Grapefruit, 341 Ml',
     'vestibulum proin eu mi nulla ac enim in tempor turpis nec',
     33.37,
+    33.37,
     26,
     '2020-07-16 00:00:00',
     5,
@@ -949,6 +1042,7 @@ values
     'Wine - Wyndham Estate Bin 777',
     'pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est risus auctor sed tristique in tempus',
     3.34,
+    3.34,
     87,
     '2020-12-29 00:00:00',
     5,
@@ -959,6 +1053,7 @@ values
     'Water - Mineral, Natural',
     'pretium quis lectus suspendisse potenti in eleifend quam a odio in hac',
     61.59,
+    61.59,
     71,
     '2020-07-16 00:00:00',
     5,
@@ -969,6 +1064,7 @@ values
     'Chicken - Leg, Boneless',
     'eget semper rutrum nulla nunc purus phasellus in felis donec semper sapien a libero nam dui proin',
     84.83,
+    84.83,
     15,
     '2020-06-21 00:00:00',
     3,
@@ -979,6 +1075,7 @@ values
     'Sunflower Seed Raw',
     'volutpat dui maecenas tristique est et tempus semper est quam pharetra magna ac consequat',
     28.16,
+    28.16,
     2,
     '2020-10-19 00:00:00',
     3,
@@ -989,6 +1086,7 @@ values
     'Energy Drink Bawls',
     'risus praesent lectus vestibulum quam sapien varius ut blandit non',
     87.65,
+    87.65,
     31,
     '2021-02-23 00:00:00',
     6,
@@ -999,6 +1097,7 @@ values
     'Tarragon - Primerba, Paste',
     'non quam nec dui luctus rutrum nulla tellus in sagittis',
     20.87,
+    20.87,
     38,
     '2020-08-11 00:00:00',
     3,
@@ -1009,6 +1108,7 @@ values
     'Table Cloth 62x120 Colour',
     'et ultrices posuere cubilia curae duis faucibus accumsan odio curabitur convallis',
     27.91,
+    27.91,
     96,
     '2021-03-20 00:00:00',
     3,
@@ -1019,6 +1119,7 @@ values
     'Lamb - Loin Chops',
     'praesent id massa id nisl venenatis lacinia aenean sit amet justo',
     87.47,
+    87.47,
     40,
     '2021-02-20 00:00:00',
     3,
@@ -1029,6 +1130,7 @@ values
     'Sherry - Dry',
     'morbi ut odio cras mi pede malesuada in imperdiet et commodo vulputate justo in blandit',
     70.52,
+    70.52,
     32,
     '2020-06-27 00:00:00',
     6,
@@ -1039,6 +1141,7 @@ values
     'Chickensplit Half',
     'congue diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat in congue',
     93.81,
+    93.81,
     66,
     '2021-03-02 00:00:00',
     4,
@@ -1049,6 +1152,7 @@ values
     'Tea - Orange Pekoe',
     'vel enim sit amet nunc viverra dapibus nulla suscipit ligula in lacus',
     12.71,
+    12.71,
     77,
     '2020-07-12 00:00:00',
     3,
@@ -1059,6 +1163,7 @@ values
     'Sauce - Caesar Dressing',
     'orci luctus et ultrices posuere cubilia curae donec pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis',
     98.89,
+    98.89,
     62,
     '2020-09-03 00:00:00',
     3,
@@ -1069,6 +1174,7 @@ values
     'Rice - Brown',
     'lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum id luctus nec molestie sed justo pellentesque viverra',
     83.88,
+    83.88,
     24,
     '2020-06-20 00:00:00',
     6,
@@ -1079,6 +1185,7 @@ values
     'Soup - Knorr, Ministrone',
     'rutrum rutrum neque aenean auctor gravida sem praesent id massa id nisl venenatis lacinia',
     4.88,
+    4.88,
     22,
     '2020-07-30 00:00:00',
     5,
@@ -1089,6 +1196,7 @@ values
     'Wine - Cotes Du Rhone Parallele',
     'risus dapibus augue vel accumsan tellus nisi eu orci mauris lacinia sapien quis libero nullam',
     13.89,
+    13.89,
     10,
     '2021-04-13 00:00:00',
     3,
@@ -1099,6 +1207,7 @@ values
     'Chips Potato All Dressed - 43g',
     'faucibus accumsan odio curabitur convallis duis consequat dui nec nisi',
     35.65,
+    35.65,
     13,
     '2020-10-23 00:00:00',
     3,
@@ -1109,6 +1218,7 @@ values
     'Sugar - Crumb',
     'aliquet at feugiat non pretium quis lectus suspendisse potenti in eleifend quam a odio in hac habitasse platea',
     5.07,
+    5.07,
     95,
     '2021-01-08 00:00:00',
     3,
@@ -1119,6 +1229,7 @@ values
     'Ice Cream - Strawberry',
     'posuere felis sed lacus morbi sem mauris laoreet ut rhoncus aliquet pulvinar sed nisl nunc rhoncus dui vel',
     22.63,
+    22.63,
     7,
     '2021-04-06 00:00:00',
     4,
@@ -1129,6 +1240,7 @@ values
     'Paper Cocktail Umberlla 80 - 180',
     'sit amet justo morbi ut odio cras mi pede malesuada in imperdiet et commodo vulputate',
     94.11,
+    94.11,
     94,
     '2021-04-14 00:00:00',
     3,
@@ -1139,6 +1251,7 @@ values
     'Salmon - Canned',
     'est quam pharetra magna ac consequat metus sapien ut nunc vestibulum ante ipsum primis in faucibus orci luctus et',
     80.67,
+    80.67,
     59,
     '2021-02-26 00:00:00',
     6,
@@ -1149,6 +1262,7 @@ values
     'Seedlings - Buckwheat, Organic',
     'vulputate ut ultrices vel augue vestibulum ante ipsum primis in faucibus',
     44.29,
+    44.29,
     80,
     '2020-08-14 00:00:00',
     5,
@@ -1159,6 +1273,7 @@ values
     'Cheese - Brie, Triple Creme',
     'sed magna at nunc commodo placerat praesent blandit nam nulla integer pede justo lacinia eget tincidunt eget tempus',
     46.60,
+    46.60,
     66,
     '2020-08-06 00:00:00',
     3,
@@ -1169,6 +1284,7 @@ values
     'Phyllo Dough',
     'risus dapibus augue vel accumsan tellus nisi eu orci mauris lacinia sapien quis libero nullam sit amet turpis elementum ligula',
     35.53,
+    35.53,
     45,
     '2021-02-03 00:00:00',
     3,
@@ -1179,6 +1295,7 @@ values
     'Pastry - Banana Muffin - Mini',
     'vivamus tortor duis mattis egestas metus aenean fermentum donec ut mauris eget massa',
     85.57,
+    85.57,
     59,
     '2020-12-29 00:00:00',
     4,
@@ -1189,6 +1306,7 @@ values
     'Jameson - Irish Whiskey',
     'non mattis pulvinar nulla pede ullamcorper augue a suscipit nulla elit ac nulla sed vel',
     65.52,
+    65.52,
     97,
     '2020-11-25 00:00:00',
     3,
@@ -1199,6 +1317,7 @@ values
     'Praline Paste',
     'in sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at vulputate vitae nisl aenean lectus pellentesque eget nunc donec',
     57.27,
+    57.27,
     3,
     '2021-04-02 00:00:00',
     3,
@@ -1209,6 +1328,7 @@ values
     'Flour - Fast / Rapid',
     'suspendisse potenti nullam porttitor lacus at turpis donec posuere metus vitae',
     77.83,
+    77.83,
     79,
     '2020-11-03 00:00:00',
     5,
@@ -1219,6 +1339,7 @@ values
     'Sausage - Meat',
     'enim in tempor turpis nec euismod scelerisque quam turpis adipiscing lorem',
     49.77,
+    49.77,
     44,
     '2020-06-22 00:00:00',
     6,
@@ -1229,6 +1350,7 @@ values
     'Wine - Vovray Sec Domaine Huet',
     'tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl ut',
     2.20,
+    2.20,
     84,
     '2021-01-11 00:00:00',
     4,
@@ -1239,6 +1361,7 @@ values
     'Ecolab - Hand Soap Form Antibac',
     'amet eros suspendisse accumsan tortor quis turpis sed ante vivamus tortor duis mattis egestas metus aenean fermentum donec ut',
     44.58,
+    44.58,
     96,
     '2020-09-17 00:00:00',
     4,
@@ -1249,6 +1372,7 @@ values
     'Melon - Honey Dew',
     'quam pede lobortis ligula sit amet eleifend pede libero quis orci nullam molestie nibh in lectus pellentesque at nulla suspendisse',
     57.94,
+    57.94,
     55,
     '2021-04-24 00:00:00',
     4,
@@ -1259,6 +1383,7 @@ values
     'Dill - Primerba, Paste',
     'ac neque duis bibendum morbi non quam nec dui luctus rutrum nulla tellus in sagittis dui vel nisl',
     97.81,
+    97.81,
     72,
     '2020-11-11 00:00:00',
     6,
@@ -1269,6 +1394,7 @@ values
     'Pork - Ham, Virginia',
     'sapien in sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at vulputate vitae nisl aenean lectus',
     97.58,
+    97.58,
     74,
     '2021-03-06 00:00:00',
     3,
@@ -1279,6 +1405,7 @@ values
     'Pasta - Cannelloni, Sheets, Fresh',
     'mauris morbi non lectus aliquam sit amet diam in magna bibendum imperdiet nullam orci pede venenatis',
     86.27,
+    86.27,
     5,
     '2021-01-20 00:00:00',
     3,
@@ -1289,6 +1416,7 @@ values
     'Apple - Macintosh',
     'volutpat in congue etiam justo etiam pretium iaculis justo in hac habitasse platea dictumst etiam faucibus',
     19.96,
+    19.96,
     45,
     '2021-01-07 00:00:00',
     6,
@@ -1299,6 +1427,7 @@ values
     'Vodka - Moskovskaya',
     'ac tellus semper interdum mauris ullamcorper purus sit amet nulla quisque arcu libero rutrum ac lobortis',
     43.45,
+    43.45,
     74,
     '2021-04-19 00:00:00',
     6,
@@ -1309,6 +1438,7 @@ values
     'Curry Powder',
     'vitae consectetuer eget rutrum at lorem integer tincidunt ante vel ipsum',
     32.31,
+    32.31,
     42,
     '2021-01-30 00:00:00',
     4,
@@ -1319,6 +1449,7 @@ values
     'Sauce - Vodka Blush',
     'a suscipit nulla elit ac nulla sed vel enim sit amet nunc viverra dapibus',
     53.31,
+    53.31,
     27,
     '2020-07-20 00:00:00',
     6,
@@ -1329,6 +1460,7 @@ values
     'Venison - Ground',
     'vel nisl duis ac nibh fusce lacus purus aliquet at feugiat non pretium quis lectus suspendisse potenti in',
     15.76,
+    15.76,
     26,
     '2021-05-13 00:00:00',
     4,
@@ -1339,6 +1471,7 @@ values
     'Doilies - 8, Paper',
     'maecenas tincidunt lacus at velit vivamus vel nulla eget eros elementum pellentesque quisque porta volutpat erat quisque erat eros',
     46.59,
+    46.59,
     79,
     '2020-09-09 00:00:00',
     6,
@@ -1349,6 +1482,7 @@ values
     'Vaccum Bag - 14x20',
     'vestibulum proin eu mi nulla ac enim in tempor turpis nec euismod scelerisque quam turpis adipiscing lorem vitae',
     57.26,
+    57.26,
     15,
     '2021-01-08 00:00:00',
     6,
@@ -1359,6 +1493,7 @@ values
     'Gherkin',
     'nunc vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere',
     8.68,
+    8.68,
     94,
     '2020-08-20 00:00:00',
     3,
@@ -1369,6 +1504,7 @@ values
     'Water - Mineral, Natural',
     'morbi odio odio elementum eu interdum eu tincidunt in leo',
     58.27,
+    58.27,
     17,
     '2021-05-13 00:00:00',
     3,
@@ -1379,6 +1515,7 @@ values
     'Ecolab - Solid Fusion',
     'magna at nunc commodo placerat praesent blandit nam nulla integer',
     94.84,
+    94.84,
     71,
     '2021-03-22 00:00:00',
     5,
@@ -1389,6 +1526,7 @@ values
     'Bar - Sweet And Salty Chocolate',
     'erat volutpat in congue etiam justo etiam pretium iaculis justo in hac habitasse platea dictumst etiam faucibus cursus',
     50.15,
+    50.15,
     46,
     '2020-07-03 00:00:00',
     3,
@@ -1399,6 +1537,7 @@ values
     'Spice - Peppercorn Melange',
     'dapibus augue vel accumsan tellus nisi eu orci mauris lacinia',
     86.52,
+    86.52,
     58,
     '2020-12-29 00:00:00',
     4,
@@ -1409,6 +1548,7 @@ values
     'Chicken Breast Wing On',
     'fusce posuere felis sed lacus morbi sem mauris laoreet ut rhoncus aliquet',
     42.81,
+    42.81,
     31,
     '2020-06-21 00:00:00',
     5,
@@ -1419,6 +1559,7 @@ values
     'Sauce - Roasted Red Pepper',
     'pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat in congue etiam justo etiam pretium',
     39.14,
+    39.14,
     35,
     '2021-01-13 00:00:00',
     5,
@@ -1429,6 +1570,7 @@ values
     'Mackerel Whole Fresh',
     'at nibh in hac habitasse platea dictumst aliquam augue quam sollicitudin vitae consectetuer eget rutrum at lorem integer tincidunt ante',
     24.36,
+    24.36,
     98,
     '2021-02-08 00:00:00',
     3,
@@ -1439,6 +1581,7 @@ values
     'Glass Clear 8 Oz',
     'in lacus curabitur at ipsum ac tellus semper interdum mauris ullamcorper purus sit amet nulla quisque arcu',
     4.34,
+    4.34,
     97,
     '2020-08-11 00:00:00',
     6,
@@ -1449,6 +1592,7 @@ values
     'Soup - Campbells, Spinach Crm',
     'diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat',
     15.47,
+    15.47,
     18,
     '2021-01-03 00:00:00',
     3,
@@ -1459,6 +1603,7 @@ values
     'Pork Salted Bellies',
     'morbi a ipsum integer a nibh in quis justo maecenas rhoncus',
     61.50,
+    61.50,
     50,
     '2021-04-14 00:00:00',
     6,
@@ -1469,6 +1614,7 @@ values
     'Juice - Pineapple, 48 Oz',
     'accumsan odio curabitur convallis duis consequat dui nec nisi volutpat eleifend donec ut dolor morbi vel lectus in',
     73.24,
+    73.24,
     31,
     '2020-09-08 00:00:00',
     4,
@@ -1479,6 +1625,7 @@ values
     'Cheese - Comtomme',
     'fermentum justo nec condimentum neque sapien placerat ante nulla justo',
     20.58,
+    20.58,
     65,
     '2020-11-27 00:00:00',
     6,
@@ -1489,6 +1636,7 @@ values
     'Cookie Dough - Peanut Butter',
     'consequat nulla nisl nunc nisl duis bibendum felis sed interdum',
     49.25,
+    49.25,
     71,
     '2020-07-14 00:00:00',
     5,
@@ -1499,6 +1647,7 @@ values
     'Paste - Black Olive',
     'sit amet justo morbi ut odio cras mi pede malesuada',
     55.51,
+    55.51,
     49,
     '2020-10-17 00:00:00',
     3,
@@ -1509,6 +1658,7 @@ values
     'Lettuce - Treviso',
     'malesuada in imperdiet et commodo vulputate justo in blandit ultrices enim lorem ipsum dolor',
     56.29,
+    56.29,
     92,
     '2020-08-21 00:00:00',
     3,
@@ -1519,6 +1669,7 @@ values
     'Tea - Lemon Green Tea',
     'commodo placerat praesent blandit nam nulla integer pede justo lacinia eget tincidunt eget tempus vel pede morbi porttitor lorem id',
     70.09,
+    70.09,
     10,
     '2020-09-16 00:00:00',
     3,
@@ -1529,6 +1680,7 @@ values
     'Lettuce - Curly Endive',
     'maecenas pulvinar lobortis est phasellus sit amet erat nulla tempus vivamus in felis eu sapien',
     60.41,
+    60.41,
     27,
     '2021-04-19 00:00:00',
     5,
@@ -1539,6 +1691,7 @@ values
     'Vinegar - Balsamic',
     'eget elit sodales scelerisque mauris sit amet eros suspendisse accumsan tortor quis',
     8.40,
+    8.40,
     15,
     '2020-07-17 00:00:00',
     6,
@@ -1549,6 +1702,7 @@ values
     'Cheese - Brie Roitelet',
     'in purus eu magna vulputate luctus cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus',
     80.45,
+    80.45,
     69,
     '2021-06-07 00:00:00',
     4,
@@ -1559,6 +1713,7 @@ values
     'Tomatoes - Diced, Canned',
     'justo in hac habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla ut erat id mauris vulputate elementum',
     47.43,
+    47.43,
     41,
     '2020-07-31 00:00:00',
     4,
@@ -1569,6 +1724,7 @@ values
     'Muffin Mix - Morning Glory',
     'tellus semper interdum mauris ullamcorper purus sit amet nulla quisque arcu libero rutrum ac lobortis',
     62.77,
+    62.77,
     56,
     '2020-09-05 00:00:00',
     3,
@@ -1579,6 +1735,7 @@ values
     'Yogurt - Cherry, 175 Gr',
     'mi integer ac neque duis bibendum morbi non quam nec dui luctus rutrum nulla tellus in',
     27.78,
+    27.78,
     86,
     '2020-08-18 00:00:00',
     6,
@@ -1589,6 +1746,7 @@ values
     'Food Colouring - Green',
     'dignissim vestibulum vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae nulla dapibus',
     69.86,
+    69.86,
     29,
     '2020-09-25 00:00:00',
     4,
@@ -1599,6 +1757,7 @@ values
     'Eel Fresh',
     'primis in faucibus orci luctus et ultrices posuere cubilia curae nulla dapibus',
     40.25,
+    40.25,
     28,
     '2021-02-06 00:00:00',
     5,
@@ -1609,6 +1768,7 @@ values
     'Lemonade - Strawberry, 591 Ml',
     'justo in hac habitasse platea dictumst etiam faucibus cursus urna',
     7.04,
+    7.04,
     7,
     '2020-10-02 00:00:00',
     6,
@@ -1619,6 +1779,7 @@ values
     'Cod - Salted, Boneless',
     'magnis dis parturient montes nascetur ridiculus mus vivamus vestibulum sagittis sapien',
     37.31,
+    37.31,
     91,
     '2021-01-25 00:00:00',
     4,
@@ -1629,6 +1790,7 @@ values
     'Jam - Strawberry, 20 Ml Jar',
     'elementum nullam varius nulla facilisi cras non velit nec nisi vulputate nonummy',
     25.74,
+    25.74,
     10,
     '2020-08-10 00:00:00',
     3,
@@ -1639,6 +1801,7 @@ values
     'Veal - Inside Round / Top, Lean',
     'ultricies eu nibh quisque id justo sit amet sapien dignissim vestibulum vestibulum ante ipsum primis in faucibus orci luctus et',
     72.51,
+    72.51,
     85,
     '2021-05-19 00:00:00',
     6,
@@ -1649,6 +1812,7 @@ values
     'Lemonade - Pineapple Passion',
     'nec molestie sed justo pellentesque viverra pede ac diam cras pellentesque volutpat dui maecenas tristique',
     14.67,
+    14.67,
     8,
     '2021-04-23 00:00:00',
     3,
@@ -1659,6 +1823,7 @@ values
     'Peach - Fresh',
     'non sodales sed tincidunt eu felis fusce posuere felis sed lacus morbi',
     74.71,
+    74.71,
     51,
     '2021-06-08 00:00:00',
     5,
@@ -1669,6 +1834,7 @@ values
     'Garlic',
     'nascetur ridiculus mus etiam vel augue vestibulum rutrum rutrum neque aenean auctor gravida sem praesent id massa id',
     85.06,
+    85.06,
     64,
     '2021-01-18 00:00:00',
     4,
@@ -1679,6 +1845,7 @@ values
     'Artichoke - Fresh',
     'pede malesuada in imperdiet et commodo vulputate justo in blandit ultrices enim lorem ipsum dolor sit amet consectetuer adipiscing',
     70.35,
+    70.35,
     100,
     '2020-09-27 00:00:00',
     6,
@@ -1689,6 +1856,7 @@ values
     'Sauce - Thousand Island',
     'orci luctus et ultrices posuere cubilia curae donec pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis',
     35.45,
+    35.45,
     64,
     '2021-03-02 00:00:00',
     3,
@@ -1699,6 +1867,7 @@ values
     'Sparkling Wine - Rose, Freixenet',
     'augue quam sollicitudin vitae consectetuer eget rutrum at lorem integer tincidunt ante vel ipsum praesent blandit lacinia erat vestibulum sed',
     73.38,
+    73.38,
     45,
     '2020-11-28 00:00:00',
     4,
@@ -1709,6 +1878,7 @@ values
     'Cheese - Cheddar, Medium',
     'tempus sit amet sem fusce consequat nulla nisl nunc nisl duis',
     80.33,
+    80.33,
     95,
     '2020-11-09 00:00:00',
     3,
@@ -1719,6 +1889,7 @@ values
     'Yeast Dry - Fleischman',
     'adipiscing elit proin interdum mauris non ligula pellentesque ultrices phasellus id sapien in sapien',
     46.37,
+    46.37,
     39,
     '2020-06-17 00:00:00',
     4,
@@ -1729,6 +1900,7 @@ values
     'Chips - Potato Jalapeno',
     'augue vel accumsan tellus nisi eu orci mauris lacinia sapien quis libero nullam sit amet turpis',
     30.96,
+    30.96,
     9,
     '2021-03-07 00:00:00',
     4,
@@ -1739,6 +1911,7 @@ values
     'Shallots',
     'sit amet consectetuer adipiscing elit proin risus praesent lectus vestibulum quam sapien varius ut blandit non interdum in ante',
     84.84,
+    84.84,
     87,
     '2021-02-25 00:00:00',
     4,
@@ -1749,6 +1922,7 @@ values
     'Coke - Diet, 355 Ml',
     'eget elit sodales scelerisque mauris sit amet eros suspendisse accumsan tortor quis turpis sed ante vivamus tortor duis',
     89.46,
+    89.46,
     52,
     '2020-07-20 00:00:00',
     3,
@@ -1759,6 +1933,7 @@ values
     'Pernod',
     'condimentum id luctus nec molestie sed justo pellentesque viverra pede ac diam cras pellentesque volutpat dui maecenas tristique est',
     68.59,
+    68.59,
     78,
     '2021-05-24 00:00:00',
     5,
@@ -1769,6 +1944,7 @@ values
     'Pate - Cognac',
     'eu est congue elementum in hac habitasse platea dictumst morbi',
     87.37,
+    87.37,
     3,
     '2021-05-06 00:00:00',
     6,
@@ -1779,6 +1955,7 @@ values
     'Wine - Penfolds Koonuga Hill',
     'vestibulum sit amet cursus id turpis integer aliquet massa id',
     43.99,
+    43.99,
     34,
     '2020-08-03 00:00:00',
     5,
@@ -1789,6 +1966,7 @@ values
     'Shrimp - Tiger 21/25',
     'massa quis augue luctus tincidunt nulla mollis molestie lorem quisque ut erat',
     59.91,
+    59.91,
     4,
     '2020-07-23 00:00:00',
     3,
@@ -1799,6 +1977,7 @@ values
     'Watercress',
     'blandit non interdum in ante vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia',
     25.40,
+    25.40,
     94,
     '2021-04-14 00:00:00',
     4,
@@ -1809,6 +1988,7 @@ values
     'Flour - Chickpea',
     'nonummy maecenas tincidunt lacus at velit vivamus vel nulla eget eros elementum',
     11.58,
+    11.58,
     20,
     '2021-05-25 00:00:00',
     6,
@@ -1819,6 +1999,7 @@ values
     'Tea Leaves - Oolong',
     'varius ut blandit non interdum in ante vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia',
     9.86,
+    9.86,
     92,
     '2021-03-14 00:00:00',
     4,
@@ -1829,6 +2010,7 @@ values
     'Wine - Hardys Bankside Shiraz',
     'vivamus metus arcu adipiscing molestie hendrerit at vulputate vitae nisl aenean lectus pellentesque eget nunc',
     98.46,
+    98.46,
     69,
     '2020-12-29 00:00:00',
     3,
@@ -1839,6 +2021,7 @@ values
     'Magnotta - Bel Paese White',
     'mattis pulvinar nulla pede ullamcorper augue a suscipit nulla elit',
     87.08,
+    87.08,
     65,
     '2021-04-24 00:00:00',
     5,
@@ -1849,6 +2032,7 @@ values
     'Beef - Montreal Smoked Brisket',
     'vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia',
     65.66,
+    65.66,
     68,
     '2021-02-25 00:00:00',
     5,
@@ -1859,6 +2043,7 @@ values
     'Doilies - 7, Paper',
     'nunc purus phasellus in felis donec semper sapien a libero nam dui proin leo odio porttitor id consequat in',
     6.42,
+    6.42,
     9,
     '2021-05-09 00:00:00',
     4,
@@ -1869,6 +2054,7 @@ values
     'Venison - Striploin',
     'vulputate luctus cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus vivamus vestibulum sagittis sapien cum sociis',
     85.15,
+    85.15,
     88,
     '2021-02-20 00:00:00',
     6,
@@ -1879,6 +2065,7 @@ values
     'Turnip - Mini',
     'ultrices aliquet maecenas leo odio condimentum id luctus nec molestie sed justo pellentesque',
     80.88,
+    80.88,
     67,
     '2021-02-06 00:00:00',
     6,
@@ -1889,6 +2076,7 @@ values
     'Peach - Halves',
     'non interdum in ante vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae duis faucibus',
     12.87,
+    12.87,
     76,
     '2021-01-01 00:00:00',
     3,
@@ -1899,6 +2087,7 @@ values
     'Glaze - Clear',
     'quam a odio in hac habitasse platea dictumst maecenas ut massa',
     19.86,
+    19.86,
     1,
     '2020-11-12 00:00:00',
     3,
@@ -1909,6 +2098,7 @@ values
     'Wine - Red, Concha Y Toro',
     'tellus semper interdum mauris ullamcorper purus sit amet nulla quisque arcu libero rutrum ac lobortis vel dapibus',
     65.45,
+    65.45,
     24,
     '2020-11-01 00:00:00',
     5,
@@ -1919,6 +2109,7 @@ values
     'Wine - Ej Gallo Sonoma',
     'parturient montes nascetur ridiculus mus etiam vel augue vestibulum rutrum rutrum neque aenean auctor',
     91.58,
+    91.58,
     6,
     '2021-02-17 00:00:00',
     4,
@@ -1929,6 +2120,7 @@ values
     'Pickles - Gherkins',
     'lectus pellentesque at nulla suspendisse potenti cras in purus eu magna vulputate luctus cum sociis natoque penatibus et magnis dis',
     68.10,
+    68.10,
     18,
     '2020-12-12 00:00:00',
     3,
@@ -1939,6 +2131,7 @@ values
     'Butter Sweet',
     'fusce congue diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu',
     39.80,
+    39.80,
     72,
     '2020-10-04 00:00:00',
     6,
@@ -1949,6 +2142,7 @@ values
     'Onions - Red Pearl',
     'magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis sapien sapien non mi integer',
     35.52,
+    35.52,
     51,
     '2021-05-31 00:00:00',
     3,
@@ -1959,6 +2153,7 @@ values
     'Seedlings - Mix, Organic',
     'aliquet massa id lobortis convallis tortor risus dapibus augue vel accumsan tellus nisi eu orci mauris',
     6.23,
+    6.23,
     51,
     '2020-11-29 00:00:00',
     5,
@@ -1969,6 +2164,7 @@ values
     'Bread - Calabrese Baguette',
     'enim blandit mi in porttitor pede justo eu massa donec dapibus duis at velit eu est congue',
     80.51,
+    80.51,
     43,
     '2020-07-18 00:00:00',
     3,
@@ -1979,6 +2175,7 @@ values
     'Lamb - Loin Chops',
     'libero nam dui proin leo odio porttitor id consequat in consequat ut nulla sed accumsan',
     94.45,
+    94.45,
     2,
     '2020-08-07 00:00:00',
     5,
@@ -1989,6 +2186,7 @@ values
     'Peas Snow',
     'egestas metus aenean fermentum donec ut mauris eget massa tempor convallis nulla neque libero convallis eget eleifend',
     18.05,
+    18.05,
     93,
     '2021-06-07 00:00:00',
     5,
@@ -1999,6 +2197,7 @@ values
     'Blueberries',
     'a pede posuere nonummy integer non velit donec diam neque vestibulum eget vulputate ut ultrices vel augue vestibulum ante',
     74.23,
+    74.23,
     11,
     '2021-06-06 00:00:00',
     5,
@@ -2009,6 +2208,7 @@ values
     'Cookie - Dough Variety',
     'parturient montes nascetur ridiculus mus etiam vel augue vestibulum rutrum rutrum neque aenean auctor gravida sem praesent id',
     37.39,
+    37.39,
     79,
     '2021-04-17 00:00:00',
     4,
@@ -2019,6 +2219,7 @@ values
     'Extract - Almond',
     'nisi venenatis tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien',
     9.97,
+    9.97,
     86,
     '2021-02-14 00:00:00',
     5,
@@ -2029,6 +2230,7 @@ values
     'Pastry - Banana Muffin - Mini',
     'convallis eget eleifend luctus ultricies eu nibh quisque id justo sit amet sapien dignissim vestibulum vestibulum ante',
     34.27,
+    34.27,
     98,
     '2021-03-05 00:00:00',
     4,
@@ -2039,6 +2241,7 @@ values
     'Food Colouring - Orange',
     'quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum id luctus nec',
     74.11,
+    74.11,
     20,
     '2021-01-31 00:00:00',
     5,
@@ -2049,6 +2252,7 @@ values
     'Split Peas - Green, Dry',
     'lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum id luctus nec',
     2.51,
+    2.51,
     77,
     '2020-08-02 00:00:00',
     4,
@@ -2059,6 +2263,7 @@ values
     'Lid Coffee Cup 8oz Blk',
     'mauris vulputate elementum nullam varius nulla facilisi cras non velit nec nisi vulputate nonummy maecenas tincidunt',
     26.97,
+    26.97,
     71,
     '2020-08-27 00:00:00',
     3,
@@ -2069,6 +2274,7 @@ values
     'Truffle Cups Green',
     'proin at turpis a pede posuere nonummy integer non velit donec diam neque vestibulum',
     88.95,
+    88.95,
     38,
     '2021-01-20 00:00:00',
     3,
@@ -2079,6 +2285,7 @@ values
     'Cheese - Sheep Milk',
     'risus semper porta volutpat quam pede lobortis ligula sit amet eleifend pede libero quis orci nullam molestie nibh in',
     64.43,
+    64.43,
     87,
     '2020-11-21 00:00:00',
     3,
@@ -2089,6 +2296,7 @@ values
     'Oil - Shortening - All - Purpose',
     'ultrices posuere cubilia curae mauris viverra diam vitae quam suspendisse potenti nullam porttitor lacus at turpis donec posuere',
     68.52,
+    68.52,
     78,
     '2021-06-09 00:00:00',
     6,
@@ -2099,6 +2307,7 @@ values
     'Pepper - Chillies, Crushed',
     'ultrices aliquet maecenas leo odio condimentum id luctus nec molestie',
     17.08,
+    17.08,
     77,
     '2020-11-08 00:00:00',
     5,
@@ -2109,6 +2318,7 @@ values
     'Chicken - Whole Roasting',
     'duis bibendum felis sed interdum venenatis turpis enim blandit mi in porttitor pede',
     95.44,
+    95.44,
     9,
     '2021-05-06 00:00:00',
     5,
@@ -2119,6 +2329,7 @@ values
     'Wiberg Cure',
     'vel est donec odio justo sollicitudin ut suscipit a feugiat et eros vestibulum ac est lacinia nisi venenatis',
     52.18,
+    52.18,
     6,
     '2021-04-09 00:00:00',
     6,
@@ -2129,6 +2340,7 @@ values
     'Cleaner - Lime Away',
     'ultrices posuere cubilia curae duis faucibus accumsan odio curabitur convallis duis consequat dui',
     78.25,
+    78.25,
     95,
     '2020-09-06 00:00:00',
     6,
@@ -2139,6 +2351,7 @@ values
     'Puree - Kiwi',
     'ac tellus semper interdum mauris ullamcorper purus sit amet nulla',
     49.93,
+    49.93,
     80,
     '2020-09-11 00:00:00',
     4,
@@ -2149,6 +2362,7 @@ values
     'Pineapple - Canned, Rings',
     'ultrices posuere cubilia curae duis faucibus accumsan odio curabitur convallis duis consequat dui nec nisi',
     19.07,
+    19.07,
     23,
     '2020-07-19 00:00:00',
     3,
@@ -2159,6 +2373,7 @@ values
     'Turkey - Oven Roast Breast',
     'adipiscing elit proin risus praesent lectus vestibulum quam sapien varius ut blandit non interdum in',
     85.71,
+    85.71,
     10,
     '2021-03-31 00:00:00',
     3,
@@ -2169,6 +2384,7 @@ values
     'Hand Towel',
     'suspendisse ornare consequat lectus in est risus auctor sed tristique in tempus sit amet sem fusce consequat nulla nisl',
     36.16,
+    36.16,
     54,
     '2020-09-25 00:00:00',
     4,
@@ -2179,6 +2395,7 @@ values
     'Pork - Sausage, Medium',
     'vitae quam suspendisse potenti nullam porttitor lacus at turpis donec',
     68.06,
+    68.06,
     25,
     '2020-10-31 00:00:00',
     3,
@@ -2189,6 +2406,7 @@ values
     'Cheese Cloth No 100',
     'id justo sit amet sapien dignissim vestibulum vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia',
     11.95,
+    11.95,
     52,
     '2020-12-31 00:00:00',
     3,
@@ -2199,6 +2417,7 @@ values
     'Sobe - Tropical Energy',
     'purus eu magna vulputate luctus cum sociis natoque penatibus et magnis dis parturient',
     24.26,
+    24.26,
     34,
     '2021-04-07 00:00:00',
     6,
@@ -2209,6 +2428,7 @@ values
     'Beef - Rib Roast, Capless',
     'accumsan felis ut at dolor quis odio consequat varius integer ac leo pellentesque ultrices mattis odio donec',
     85.39,
+    85.39,
     41,
     '2020-10-28 00:00:00',
     5,
@@ -2219,6 +2439,7 @@ values
     'Beans - Turtle, Black, Dry',
     'turpis sed ante vivamus tortor duis mattis egestas metus aenean fermentum donec',
     40.72,
+    40.72,
     30,
     '2020-09-23 00:00:00',
     6,
@@ -2229,6 +2450,7 @@ values
     'Cookie - Oatmeal',
     'vestibulum vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae nulla dapibus dolor vel est donec',
     55.05,
+    55.05,
     33,
     '2021-03-08 00:00:00',
     4,
@@ -2239,6 +2461,7 @@ values
     'Lettuce - Escarole',
     'donec pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis sapien sapien non mi integer ac',
     94.97,
+    94.97,
     46,
     '2020-11-13 00:00:00',
     5,
@@ -2249,6 +2472,7 @@ values
     'Bread - Bistro White',
     'scelerisque mauris sit amet eros suspendisse accumsan tortor quis turpis sed ante vivamus tortor',
     36.65,
+    36.65,
     30,
     '2021-04-14 00:00:00',
     3,
@@ -2259,6 +2483,7 @@ values
     'English Muffin',
     'sit amet consectetuer adipiscing elit proin interdum mauris non ligula pellentesque ultrices',
     99.65,
+    99.65,
     46,
     '2021-05-24 00:00:00',
     6,
@@ -2269,6 +2494,7 @@ values
     'Table Cloth 54x54 White',
     'ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat in congue',
     37.58,
+    37.58,
     54,
     '2021-03-19 00:00:00',
     3,
@@ -2279,6 +2505,7 @@ values
     'Melon - Watermelon, Seedless',
     'sodales sed tincidunt eu felis fusce posuere felis sed lacus morbi sem mauris laoreet ut rhoncus aliquet pulvinar',
     57.44,
+    57.44,
     26,
     '2021-05-15 00:00:00',
     3,
@@ -2289,6 +2516,7 @@ values
     'Dill Weed - Dry',
     'nulla nisl nunc nisl duis bibendum felis sed interdum venenatis turpis enim blandit',
     99.51,
+    99.51,
     40,
     '2020-10-26 00:00:00',
     3,
@@ -2299,6 +2527,7 @@ values
     'Pepper Squash',
     'pellentesque quisque porta volutpat erat quisque erat eros viverra eget congue eget semper rutrum',
     11.07,
+    11.07,
     45,
     '2021-02-14 00:00:00',
     5,
@@ -2309,6 +2538,7 @@ values
     'Flavouring - Orange',
     'elit sodales scelerisque mauris sit amet eros suspendisse accumsan tortor quis turpis sed ante vivamus tortor duis',
     6.83,
+    6.83,
     95,
     '2021-04-06 00:00:00',
     5,
@@ -2319,6 +2549,7 @@ values
     'Spice - Peppercorn Melange',
     'felis ut at dolor quis odio consequat varius integer ac leo pellentesque ultrices',
     56.29,
+    56.29,
     49,
     '2021-05-13 00:00:00',
     5,
@@ -2329,6 +2560,7 @@ values
     'Sprouts - Onion',
     'augue quam sollicitudin vitae consectetuer eget rutrum at lorem integer tincidunt ante vel ipsum praesent blandit lacinia erat',
     5.68,
+    5.68,
     67,
     '2021-01-14 00:00:00',
     4,
@@ -2339,6 +2571,7 @@ values
     'Wine - Magnotta - Cab Franc',
     'lacinia aenean sit amet justo morbi ut odio cras mi pede malesuada in imperdiet et commodo vulputate justo in blandit',
     52.31,
+    52.31,
     50,
     '2020-11-21 00:00:00',
     4,
@@ -2349,6 +2582,7 @@ values
     'Cup - 6oz, Foam',
     'imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat in',
     92.28,
+    92.28,
     97,
     '2021-04-02 00:00:00',
     6,
@@ -2359,6 +2593,7 @@ values
     'Cake - Dulce De Leche',
     'dui vel sem sed sagittis nam congue risus semper porta volutpat quam pede lobortis ligula sit amet',
     6.62,
+    6.62,
     54,
     '2021-02-01 00:00:00',
     3,
@@ -2369,6 +2604,7 @@ values
     'Greens Mustard',
     'dignissim vestibulum vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae nulla dapibus dolor vel',
     67.25,
+    67.25,
     74,
     '2020-11-28 00:00:00',
     3,
@@ -2379,6 +2615,7 @@ values
     'Kiwano',
     'volutpat erat quisque erat eros viverra eget congue eget semper rutrum nulla nunc purus phasellus in',
     27.60,
+    27.60,
     13,
     '2020-10-22 00:00:00',
     6,
@@ -2389,6 +2626,7 @@ values
     'Carbonated Water - Wildberry',
     'vestibulum vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae nulla',
     54.57,
+    54.57,
     22,
     '2020-12-24 00:00:00',
     6,
@@ -2399,6 +2637,7 @@ values
     'Cheese - St. Paulin',
     'convallis nunc proin at turpis a pede posuere nonummy integer non velit donec diam neque vestibulum eget vulputate ut',
     23.35,
+    23.35,
     98,
     '2020-08-11 00:00:00',
     3,
@@ -2409,6 +2648,7 @@ values
     'Wine - Jaboulet Cotes Du Rhone',
     'eget nunc donec quis orci eget orci vehicula condimentum curabitur in libero ut massa volutpat',
     14.43,
+    14.43,
     48,
     '2020-07-13 00:00:00',
     5,
@@ -2419,6 +2659,7 @@ values
     'Pie Box - Cello Window 2.5',
     'ullamcorper augue a suscipit nulla elit ac nulla sed vel enim sit',
     46.42,
+    46.42,
     94,
     '2021-03-30 00:00:00',
     4,
@@ -2429,6 +2670,7 @@ values
     'Brandy - Bar',
     'pellentesque ultrices mattis odio donec vitae nisi nam ultrices libero non mattis pulvinar nulla pede ullamcorper augue',
     72.33,
+    72.33,
     96,
     '2020-09-08 00:00:00',
     4,
@@ -2439,6 +2681,7 @@ values
     'Veal - Slab Bacon',
     'ut ultrices vel augue vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae donec pharetra magna',
     74.61,
+    74.61,
     69,
     '2020-11-07 00:00:00',
     3,
@@ -2449,6 +2692,7 @@ values
     'Duck - Whole',
     'orci luctus et ultrices posuere cubilia curae donec pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin',
     25.38,
+    25.38,
     73,
     '2021-05-16 00:00:00',
     4,
@@ -2459,6 +2703,7 @@ values
     'Bagelers',
     'id pretium iaculis diam erat fermentum justo nec condimentum neque sapien',
     57.79,
+    57.79,
     92,
     '2020-08-28 00:00:00',
     4,
@@ -2469,6 +2714,7 @@ values
     'Pepper - Pablano',
     'porttitor lacus at turpis donec posuere metus vitae ipsum aliquam',
     62.55,
+    62.55,
     71,
     '2021-04-19 00:00:00',
     6,
@@ -2479,6 +2725,7 @@ values
     'Mustard - Seed',
     'ut dolor morbi vel lectus in quam fringilla rhoncus mauris enim leo rhoncus sed vestibulum sit',
     88.31,
+    88.31,
     65,
     '2021-02-08 00:00:00',
     4,
@@ -2489,6 +2736,7 @@ values
     'Strawberries',
     'libero nullam sit amet turpis elementum ligula vehicula consequat morbi a ipsum',
     43.48,
+    43.48,
     97,
     '2020-11-12 00:00:00',
     3,
@@ -2499,6 +2747,7 @@ values
     'Cup - Translucent 7 Oz Clear',
     'dictumst morbi vestibulum velit id pretium iaculis diam erat fermentum justo nec condimentum neque sapien placerat ante nulla',
     54.28,
+    54.28,
     78,
     '2021-02-11 00:00:00',
     6,
@@ -2509,6 +2758,7 @@ values
     'Jameson Irish Whiskey',
     'bibendum imperdiet nullam orci pede venenatis non sodales sed tincidunt eu felis',
     52.91,
+    52.91,
     54,
     '2021-02-17 00:00:00',
     4,
@@ -2519,6 +2769,7 @@ values
     'Beef - Eye Of Round',
     'magna at nunc commodo placerat praesent blandit nam nulla integer pede justo',
     48.84,
+    48.84,
     7,
     '2020-10-22 00:00:00',
     3,
@@ -2529,6 +2780,7 @@ values
     'The Pop Shoppe - Grape',
     'mauris non ligula pellentesque ultrices phasellus id sapien in sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at vulputate',
     18.35,
+    18.35,
     5,
     '2021-04-01 00:00:00',
     6,
@@ -2539,6 +2791,7 @@ values
     'Cheese - Cheddar, Medium',
     'enim in tempor turpis nec euismod scelerisque quam turpis adipiscing lorem vitae mattis nibh ligula nec sem duis aliquam convallis',
     92.34,
+    92.34,
     85,
     '2020-06-10 00:00:00',
     3,
@@ -2549,6 +2802,7 @@ values
     'Tomatoes Tear Drop Yellow',
     'pellentesque at nulla suspendisse potenti cras in purus eu magna vulputate luctus cum sociis natoque penatibus et magnis dis',
     10.60,
+    10.60,
     0,
     '2021-02-08 00:00:00',
     3,
@@ -2559,6 +2813,7 @@ values
     'Extract Vanilla Pure',
     'mauris lacinia sapien quis libero nullam sit amet turpis elementum ligula vehicula consequat morbi a ipsum integer a nibh',
     10.05,
+    10.05,
     87,
     '2021-01-22 00:00:00',
     6,
@@ -2569,6 +2824,7 @@ values
     'Ham - Smoked, Bone - In',
     'vel est donec odio justo sollicitudin ut suscipit a feugiat et eros vestibulum ac est lacinia',
     83.75,
+    83.75,
     93,
     '2020-12-29 00:00:00',
     3,
@@ -2579,6 +2835,7 @@ values
     'Burger Veggie',
     'vel enim sit amet nunc viverra dapibus nulla suscipit ligula in lacus curabitur at',
     53.73,
+    53.73,
     44,
     '2020-10-09 00:00:00',
     3,
@@ -2589,6 +2846,7 @@ values
     'Appetizer - Sausage Rolls',
     'at velit eu est congue elementum in hac habitasse platea dictumst morbi vestibulum velit id',
     96.43,
+    96.43,
     84,
     '2021-01-14 00:00:00',
     5,
@@ -2599,6 +2857,7 @@ values
     'Wine - Magnotta - Pinot Gris Sr',
     'nec nisi volutpat eleifend donec ut dolor morbi vel lectus in quam fringilla rhoncus mauris',
     26.42,
+    26.42,
     2,
     '2021-02-17 00:00:00',
     4,
@@ -2609,6 +2868,7 @@ values
     'Melon - Watermelon Yellow',
     'sit amet justo morbi ut odio cras mi pede malesuada in',
     60.34,
+    60.34,
     15,
     '2021-04-09 00:00:00',
     6,
@@ -2619,6 +2879,7 @@ values
     'Cheese - Brie, Triple Creme',
     'tempus sit amet sem fusce consequat nulla nisl nunc nisl duis bibendum felis sed interdum venenatis turpis enim',
     17.75,
+    17.75,
     88,
     '2021-05-25 00:00:00',
     4,
@@ -2629,6 +2890,7 @@ values
     'Table Cloth 54x72 White',
     'turpis a pede posuere nonummy integer non velit donec diam neque vestibulum eget',
     44.88,
+    44.88,
     48,
     '2020-07-07 00:00:00',
     4,
@@ -2639,6 +2901,7 @@ values
     'Chocolate Bar - Oh Henry',
     'in lacus curabitur at ipsum ac tellus semper interdum mauris ullamcorper purus sit amet nulla quisque arcu',
     67.60,
+    67.60,
     99,
     '2020-07-16 00:00:00',
     5,
@@ -2649,6 +2912,7 @@ values
     'Cheese - Camembert',
     'semper porta volutpat quam pede lobortis ligula sit amet eleifend',
     23.20,
+    23.20,
     27,
     '2021-01-20 00:00:00',
     5,
@@ -2659,6 +2923,7 @@ values
     'Soup - Campbells, Spinach Crm',
     'a odio in hac habitasse platea dictumst maecenas ut massa quis augue luctus tincidunt nulla',
     31.98,
+    31.98,
     100,
     '2021-05-13 00:00:00',
     3,
@@ -2669,6 +2934,7 @@ values
     'Tea - Herbal Orange Spice',
     'a nibh in quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla',
     80.89,
+    80.89,
     86,
     '2021-03-03 00:00:00',
     5,
@@ -2679,6 +2945,7 @@ values
     'Berry Brulee',
     'praesent id massa id nisl venenatis lacinia aenean sit amet justo',
     37.42,
+    37.42,
     5,
     '2021-05-21 00:00:00',
     4,
@@ -2689,6 +2956,7 @@ values
     'Bar - Sweet And Salty Chocolate',
     'orci mauris lacinia sapien quis libero nullam sit amet turpis elementum ligula vehicula consequat morbi',
     22.84,
+    22.84,
     26,
     '2020-12-21 00:00:00',
     5,
@@ -2699,6 +2967,7 @@ values
     'Gherkin',
     'at nulla suspendisse potenti cras in purus eu magna vulputate luctus cum sociis natoque penatibus et magnis dis parturient montes',
     57.02,
+    57.02,
     86,
     '2021-04-16 00:00:00',
     4,
@@ -2709,6 +2978,7 @@ values
     'Lady Fingers',
     'vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae donec pharetra magna vestibulum aliquet',
     75.55,
+    75.55,
     59,
     '2020-08-07 00:00:00',
     5,
@@ -2719,6 +2989,7 @@ values
     'Beer - Upper Canada Light',
     'maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum',
     40.14,
+    40.14,
     56,
     '2020-12-07 00:00:00',
     5,
@@ -2729,6 +3000,7 @@ values
     'Cocoa Powder - Dutched',
     'est congue elementum in hac habitasse platea dictumst morbi vestibulum velit',
     13.36,
+    13.36,
     84,
     '2021-05-01 00:00:00',
     4,
@@ -2739,6 +3011,7 @@ values
     'Spice - Montreal Steak Spice',
     'morbi sem mauris laoreet ut rhoncus aliquet pulvinar sed nisl nunc rhoncus',
     45.15,
+    45.15,
     81,
     '2020-11-29 00:00:00',
     5,
@@ -2749,6 +3022,7 @@ values
     'Jicama',
     'in faucibus orci luctus et ultrices posuere cubilia curae nulla dapibus dolor',
     47.77,
+    47.77,
     92,
     '2021-03-29 00:00:00',
     4,
@@ -2759,6 +3033,7 @@ values
     'Bar Mix - Lime',
     'sed vel enim sit amet nunc viverra dapibus nulla suscipit ligula in lacus curabitur at ipsum ac tellus semper',
     49.72,
+    49.72,
     80,
     '2020-10-10 00:00:00',
     6,
@@ -2769,6 +3044,7 @@ values
     'Macaroons - Two Bite Choc',
     'rutrum at lorem integer tincidunt ante vel ipsum praesent blandit lacinia erat vestibulum sed magna at',
     80.59,
+    80.59,
     50,
     '2021-05-23 00:00:00',
     5,
@@ -2779,6 +3055,7 @@ values
     'Bandage - Fexible 1x3',
     'nulla ut erat id mauris vulputate elementum nullam varius nulla facilisi cras non',
     63.84,
+    63.84,
     93,
     '2021-05-15 00:00:00',
     6,
@@ -2789,6 +3066,7 @@ values
     'V8 - Tropical Blend',
     'in tempus sit amet sem fusce consequat nulla nisl nunc nisl duis bibendum felis sed interdum',
     87.59,
+    87.59,
     70,
     '2020-12-29 00:00:00',
     6,
@@ -2799,6 +3077,7 @@ values
     'Yoplait Drink',
     'tortor sollicitudin mi sit amet lobortis sapien sapien non mi integer ac neque duis bibendum morbi non',
     59.28,
+    59.28,
     16,
     '2020-08-03 00:00:00',
     4,
@@ -2809,6 +3088,7 @@ values
     'Sugar - Invert',
     'primis in faucibus orci luctus et ultrices posuere cubilia curae nulla dapibus dolor',
     69.37,
+    69.37,
     87,
     '2020-06-28 00:00:00',
     5,
@@ -2819,6 +3099,7 @@ values
     'Doilies - 10, Paper',
     'mattis pulvinar nulla pede ullamcorper augue a suscipit nulla elit ac nulla',
     99.19,
+    99.19,
     24,
     '2021-05-08 00:00:00',
     4,
@@ -2829,6 +3110,7 @@ values
     'Shrimp, Dried, Small / Lb',
     'in sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at vulputate vitae nisl aenean lectus pellentesque eget nunc donec',
     24.32,
+    24.32,
     34,
     '2020-08-29 00:00:00',
     3,
@@ -2839,6 +3121,7 @@ values
     'Vinegar - Tarragon',
     'auctor gravida sem praesent id massa id nisl venenatis lacinia aenean sit amet justo morbi ut odio',
     16.87,
+    16.87,
     63,
     '2021-05-17 00:00:00',
     5,
@@ -2849,6 +3132,7 @@ values
     'Cheese - La Sauvagine',
     'ut ultrices vel augue vestibulum ante ipsum primis in faucibus orci luctus et',
     82.33,
+    82.33,
     81,
     '2021-01-31 00:00:00',
     3,
@@ -2859,6 +3143,7 @@ values
     'Yucca',
     'erat tortor sollicitudin mi sit amet lobortis sapien sapien non mi integer ac neque duis bibendum morbi non quam',
     14.26,
+    14.26,
     67,
     '2020-10-19 00:00:00',
     4,
@@ -2869,6 +3154,7 @@ values
     'Beef - Shank',
     'at velit vivamus vel nulla eget eros elementum pellentesque quisque porta volutpat erat quisque erat eros viverra',
     18.74,
+    18.74,
     25,
     '2020-11-03 00:00:00',
     4,
@@ -2879,6 +3165,7 @@ values
     'Potatoes - Mini White 3 Oz',
     'sed magna at nunc commodo placerat praesent blandit nam nulla integer pede justo lacinia',
     4.00,
+    4.00,
     13,
     '2020-12-24 00:00:00',
     5,
@@ -2889,6 +3176,7 @@ values
     'Cup - 6oz, Foam',
     'sagittis sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus',
     2.83,
+    2.83,
     38,
     '2021-01-11 00:00:00',
     5,
@@ -2899,6 +3187,7 @@ values
     'Allspice - Jamaican',
     'rhoncus aliquet pulvinar sed nisl nunc rhoncus dui vel sem sed sagittis',
     46.53,
+    46.53,
     71,
     '2021-04-05 00:00:00',
     4,
@@ -2909,6 +3198,7 @@ values
     'Spice - Peppercorn Melange',
     'ut rhoncus aliquet pulvinar sed nisl nunc rhoncus dui vel sem',
     32.25,
+    32.25,
     8,
     '2021-02-24 00:00:00',
     5,
@@ -2919,6 +3209,7 @@ values
     'Ham Black Forest',
     'a odio in hac habitasse platea dictumst maecenas ut massa quis augue luctus tincidunt nulla mollis molestie',
     2.97,
+    2.97,
     68,
     '2020-12-13 00:00:00',
     6,
@@ -2929,6 +3220,7 @@ values
     'Chocolate - Chips Compound',
     'interdum venenatis turpis enim blandit mi in porttitor pede justo eu massa donec dapibus duis at velit eu est',
     10.59,
+    10.59,
     95,
     '2020-08-11 00:00:00',
     5,
@@ -2939,6 +3231,7 @@ values
     'Lamb - Shanks',
     'accumsan tellus nisi eu orci mauris lacinia sapien quis libero nullam sit amet turpis elementum',
     85.78,
+    85.78,
     91,
     '2021-05-30 00:00:00',
     3,
@@ -2949,6 +3242,7 @@ values
     'Wine - Chianti Classico Riserva',
     'cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus vivamus vestibulum',
     42.08,
+    42.08,
     82,
     '2021-01-20 00:00:00',
     6,
@@ -2959,6 +3253,7 @@ values
     'Coffee - Colombian, Portioned',
     'felis donec semper sapien a libero nam dui proin leo odio porttitor id consequat in consequat ut nulla sed',
     5.99,
+    5.99,
     48,
     '2020-08-15 00:00:00',
     3,
@@ -2969,6 +3264,7 @@ values
     'Pasta - Fettuccine, Egg, Fresh',
     'sed accumsan felis ut at dolor quis odio consequat varius integer ac leo pellentesque ultrices mattis',
     12.85,
+    12.85,
     16,
     '2020-06-12 00:00:00',
     6,
@@ -2979,6 +3275,7 @@ values
     'Tequila Rose Cream Liquor',
     'molestie lorem quisque ut erat curabitur gravida nisi at nibh in hac',
     94.35,
+    94.35,
     28,
     '2020-12-03 00:00:00',
     3,
@@ -2989,6 +3286,7 @@ values
     'Eggwhite Frozen',
     'faucibus orci luctus et ultrices posuere cubilia curae donec pharetra magna vestibulum aliquet ultrices erat',
     64.40,
+    64.40,
     80,
     '2021-02-24 00:00:00',
     5,
@@ -2999,6 +3297,7 @@ values
     'Pate - Liver',
     'sed tincidunt eu felis fusce posuere felis sed lacus morbi sem mauris laoreet ut rhoncus aliquet pulvinar sed nisl nunc',
     87.14,
+    87.14,
     86,
     '2021-03-26 00:00:00',
     4,
@@ -3009,6 +3308,7 @@ values
     'Thyme - Fresh',
     'lectus vestibulum quam sapien varius ut blandit non interdum in ante vestibulum ante ipsum primis',
     13.95,
+    13.95,
     80,
     '2020-10-30 00:00:00',
     5,
@@ -3019,6 +3319,7 @@ values
     'Ice Cream - Strawberry',
     'purus sit amet nulla quisque arcu libero rutrum ac lobortis vel dapibus at diam nam',
     78.47,
+    78.47,
     75,
     '2020-11-13 00:00:00',
     6,
@@ -3029,6 +3330,7 @@ values
     'Steampan - Lid For Half Size',
     'ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae mauris viverra diam vitae quam',
     29.54,
+    29.54,
     95,
     '2020-07-30 00:00:00',
     4,
@@ -3039,6 +3341,7 @@ values
     'Oats Large Flake',
     'fusce lacus purus aliquet at feugiat non pretium quis lectus suspendisse potenti in eleifend quam a odio',
     99.60,
+    99.60,
     100,
     '2020-08-02 00:00:00',
     3,
@@ -3049,6 +3352,7 @@ values
     'Mcguinness - Blue Curacao',
     'convallis eget eleifend luctus ultricies eu nibh quisque id justo sit amet sapien dignissim',
     30.76,
+    30.76,
     42,
     '2020-08-22 00:00:00',
     5,
@@ -3059,6 +3363,7 @@ values
     'Sauce - Salsa',
     'a nibh in quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum',
     82.29,
+    82.29,
     24,
     '2020-12-09 00:00:00',
     5,
@@ -3069,6 +3374,7 @@ values
     'Frangelico',
     'ante ipsum primis in faucibus orci luctus et ultrices posuere',
     8.45,
+    8.45,
     20,
     '2021-04-12 00:00:00',
     5,
@@ -3079,6 +3385,7 @@ values
     'Wine - Blue Nun Qualitatswein',
     'neque aenean auctor gravida sem praesent id massa id nisl venenatis lacinia aenean sit amet justo',
     67.43,
+    67.43,
     65,
     '2020-07-17 00:00:00',
     4,
@@ -3089,6 +3396,7 @@ values
     'Bread - Calabrese Baguette',
     'est donec odio justo sollicitudin ut suscipit a feugiat et eros vestibulum ac est',
     40.96,
+    40.96,
     5,
     '2020-11-04 00:00:00',
     5,
@@ -3099,6 +3407,7 @@ values
     'Soup - Campbells',
     'nulla suscipit ligula in lacus curabitur at ipsum ac tellus semper interdum mauris ullamcorper purus sit amet',
     70.29,
+    70.29,
     81,
     '2021-05-08 00:00:00',
     4,
@@ -3109,6 +3418,7 @@ values
     'Doilies - 8, Paper',
     'pretium iaculis diam erat fermentum justo nec condimentum neque sapien placerat ante nulla justo',
     49.70,
+    49.70,
     80,
     '2021-04-30 00:00:00',
     4,
@@ -3119,6 +3429,7 @@ values
     'Taro Leaves',
     'diam cras pellentesque volutpat dui maecenas tristique est et tempus',
     64.75,
+    64.75,
     87,
     '2020-12-12 00:00:00',
     5,
@@ -3129,6 +3440,7 @@ values
     'Tumeric',
     'volutpat erat quisque erat eros viverra eget congue eget semper rutrum',
     17.35,
+    17.35,
     70,
     '2020-07-25 00:00:00',
     6,
@@ -3139,6 +3451,7 @@ values
     'Coconut - Creamed, Pure',
     'justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet',
     52.81,
+    52.81,
     80,
     '2021-03-02 00:00:00',
     5,
@@ -3149,6 +3462,7 @@ values
     'Bread - Olive Dinner Roll',
     'ultrices posuere cubilia curae donec pharetra magna vestibulum aliquet ultrices erat tortor',
     88.96,
+    88.96,
     61,
     '2021-02-12 00:00:00',
     3,
@@ -3159,6 +3473,7 @@ values
     'Wine - Fat Bastard Merlot',
     'nisi eu orci mauris lacinia sapien quis libero nullam sit amet turpis elementum ligula vehicula consequat morbi a ipsum integer',
     73.55,
+    73.55,
     14,
     '2020-12-04 00:00:00',
     3,
@@ -3169,6 +3484,7 @@ values
     'Beef - Tenderloin',
     'nibh in quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas leo',
     52.03,
+    52.03,
     10,
     '2020-08-02 00:00:00',
     3,
@@ -3179,6 +3495,7 @@ values
     'Bread - White Epi Baguette',
     'morbi non lectus aliquam sit amet diam in magna bibendum imperdiet nullam orci pede venenatis non sodales sed tincidunt eu',
     2.21,
+    2.21,
     48,
     '2021-05-03 00:00:00',
     6,
@@ -3189,6 +3506,7 @@ values
     'Soup - Campbells, Creamy',
     'hac habitasse platea dictumst maecenas ut massa quis augue luctus',
     14.16,
+    14.16,
     67,
     '2020-10-20 00:00:00',
     3,
@@ -3199,6 +3517,7 @@ values
     'Dasheen',
     'donec dapibus duis at velit eu est congue elementum in hac habitasse',
     33.04,
+    33.04,
     88,
     '2021-02-18 00:00:00',
     3,
@@ -3209,6 +3528,7 @@ values
     'Towel - Roll White',
     'mauris morbi non lectus aliquam sit amet diam in magna bibendum imperdiet nullam orci',
     36.51,
+    36.51,
     11,
     '2021-01-30 00:00:00',
     6,
@@ -3219,6 +3539,7 @@ values
     'Juice - Orange 1.89l',
     'elit proin risus praesent lectus vestibulum quam sapien varius ut blandit',
     85.16,
+    85.16,
     7,
     '2021-02-12 00:00:00',
     3,
@@ -3229,6 +3550,7 @@ values
     'Vermouth - White, Cinzano',
     'molestie lorem quisque ut erat curabitur gravida nisi at nibh in hac habitasse platea dictumst aliquam augue',
     46.15,
+    46.15,
     35,
     '2020-09-13 00:00:00',
     5,
@@ -3239,6 +3561,7 @@ values
     'Bread - French Baquette',
     'mi in porttitor pede justo eu massa donec dapibus duis at velit eu est congue elementum in hac',
     30.31,
+    30.31,
     38,
     '2020-08-24 00:00:00',
     5,
@@ -3249,6 +3572,7 @@ values
     'Chinese Foods - Plain Fried Rice',
     'pulvinar lobortis est phasellus sit amet erat nulla tempus vivamus in felis eu sapien cursus vestibulum proin eu',
     24.39,
+    24.39,
     6,
     '2021-02-07 00:00:00',
     4,
@@ -3259,6 +3583,7 @@ values
     'Sausage - Chorizo',
     'magnis dis parturient montes nascetur ridiculus mus vivamus vestibulum sagittis sapien cum sociis natoque penatibus et magnis',
     72.17,
+    72.17,
     62,
     '2021-03-31 00:00:00',
     6,
@@ -3269,6 +3594,7 @@ values
     'Lotus Root',
     'mi nulla ac enim in tempor turpis nec euismod scelerisque quam turpis',
     16.48,
+    16.48,
     55,
     '2021-03-12 00:00:00',
     3,
@@ -3279,6 +3605,7 @@ values
     'Ecolab - Solid Fusion',
     'at turpis a pede posuere nonummy integer non velit donec diam neque vestibulum eget vulputate',
     78.05,
+    78.05,
     98,
     '2021-03-17 00:00:00',
     5,
@@ -3289,6 +3616,7 @@ values
     'Chicken - Thigh, Bone In',
     'nunc nisl duis bibendum felis sed interdum venenatis turpis enim blandit mi in porttitor pede justo eu',
     61.95,
+    61.95,
     100,
     '2020-08-15 00:00:00',
     6,
@@ -3299,6 +3627,7 @@ values
     'Pepper - Red Chili',
     'suscipit ligula in lacus curabitur at ipsum ac tellus semper interdum mauris ullamcorper purus',
     5.21,
+    5.21,
     96,
     '2020-09-12 00:00:00',
     4,
@@ -3309,6 +3638,7 @@ values
     'Soup - Beef, Base Mix',
     'amet nunc viverra dapibus nulla suscipit ligula in lacus curabitur at ipsum ac tellus',
     41.99,
+    41.99,
     89,
     '2020-10-20 00:00:00',
     6,
@@ -3319,6 +3649,7 @@ values
     'Wine - Magnotta - Cab Franc',
     'ut erat curabitur gravida nisi at nibh in hac habitasse platea dictumst aliquam augue quam',
     13.21,
+    13.21,
     43,
     '2021-05-16 00:00:00',
     6,
@@ -3329,6 +3660,7 @@ values
     'Red Currant Jelly',
     'at velit vivamus vel nulla eget eros elementum pellentesque quisque porta volutpat erat quisque erat',
     44.53,
+    44.53,
     95,
     '2020-07-08 00:00:00',
     6,
@@ -3339,6 +3671,7 @@ values
     'Soup - Knorr, Country Bean',
     'consequat metus sapien ut nunc vestibulum ante ipsum primis in',
     75.74,
+    75.74,
     54,
     '2021-02-20 00:00:00',
     3,
@@ -3349,6 +3682,7 @@ values
     'Cafe Royale',
     'bibendum imperdiet nullam orci pede venenatis non sodales sed tincidunt eu felis fusce posuere felis sed lacus',
     77.72,
+    77.72,
     73,
     '2021-01-27 00:00:00',
     4,
@@ -3359,6 +3693,7 @@ values
     'Napkin White',
     'sit amet nulla quisque arcu libero rutrum ac lobortis vel dapibus at',
     41.16,
+    41.16,
     75,
     '2021-05-24 00:00:00',
     5,
@@ -3369,6 +3704,7 @@ values
     'Cheese - Provolone',
     'pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat in congue etiam justo etiam pretium iaculis justo in',
     54.32,
+    54.32,
     19,
     '2021-02-04 00:00:00',
     3,
@@ -3379,6 +3715,7 @@ values
     'Vermacelli - Sprinkles, Assorted',
     'id mauris vulputate elementum nullam varius nulla facilisi cras non velit nec nisi vulputate nonummy maecenas tincidunt lacus at',
     33.79,
+    33.79,
     46,
     '2020-06-10 00:00:00',
     6,
@@ -3389,6 +3726,7 @@ values
     'Creme De Cacao White',
     'condimentum neque sapien placerat ante nulla justo aliquam quis turpis eget elit sodales',
     30.59,
+    30.59,
     29,
     '2020-10-29 00:00:00',
     5,
@@ -3399,6 +3737,7 @@ values
     'Mushroom - Lg - Cello',
     'nec sem duis aliquam convallis nunc proin at turpis a pede posuere nonummy integer non velit donec diam neque vestibulum',
     29.11,
+    29.11,
     29,
     '2021-05-23 00:00:00',
     4,
@@ -3409,6 +3748,7 @@ values
     'Assorted Desserts',
     'phasellus id sapien in sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at vulputate',
     16.77,
+    16.77,
     97,
     '2020-06-23 00:00:00',
     6,
@@ -3419,6 +3759,7 @@ values
     'Pork - Suckling Pig',
     'nascetur ridiculus mus vivamus vestibulum sagittis sapien cum sociis natoque penatibus et magnis dis',
     76.52,
+    76.52,
     73,
     '2021-02-17 00:00:00',
     4,
@@ -3429,6 +3770,7 @@ values
     'Wine - Hardys Bankside Shiraz',
     'dui vel nisl duis ac nibh fusce lacus purus aliquet at feugiat non pretium quis lectus suspendisse potenti',
     65.85,
+    65.85,
     72,
     '2020-10-04 00:00:00',
     4,
@@ -3439,6 +3781,7 @@ values
     'Tart Shells - Savory, 3',
     'rutrum nulla tellus in sagittis dui vel nisl duis ac nibh fusce lacus purus aliquet at feugiat non',
     64.88,
+    64.88,
     44,
     '2020-08-26 00:00:00',
     3,
@@ -3449,6 +3792,7 @@ values
     'Cheese - Gouda',
     'pretium quis lectus suspendisse potenti in eleifend quam a odio in hac habitasse platea dictumst maecenas ut massa quis',
     98.07,
+    98.07,
     44,
     '2021-03-11 00:00:00',
     4,
@@ -3459,6 +3803,7 @@ values
     'Beef - Tenderloin - Aa',
     'ligula sit amet eleifend pede libero quis orci nullam molestie nibh in lectus pellentesque',
     36.69,
+    36.69,
     9,
     '2020-11-28 00:00:00',
     4,
@@ -3469,6 +3814,7 @@ values
     'Pork - Ham, Virginia',
     'consequat morbi a ipsum integer a nibh in quis justo maecenas',
     58.53,
+    58.53,
     79,
     '2021-03-01 00:00:00',
     6,
@@ -3479,6 +3825,7 @@ values
     'Lid Tray - 16in Dome',
     'accumsan tortor quis turpis sed ante vivamus tortor duis mattis egestas metus aenean',
     30.96,
+    30.96,
     32,
     '2021-01-29 00:00:00',
     6,
@@ -3489,6 +3836,7 @@ values
     'Beer - Corona',
     'morbi a ipsum integer a nibh in quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices',
     93.68,
+    93.68,
     84,
     '2020-06-14 00:00:00',
     5,
@@ -3499,6 +3847,7 @@ values
     'Milkettes - 2%',
     'dui luctus rutrum nulla tellus in sagittis dui vel nisl duis ac nibh fusce lacus purus aliquet at feugiat non',
     86.05,
+    86.05,
     64,
     '2020-09-23 00:00:00',
     3,
@@ -3509,6 +3858,7 @@ values
     'Five Alive Citrus',
     'orci pede venenatis non sodales sed tincidunt eu felis fusce',
     27.86,
+    27.86,
     59,
     '2021-05-12 00:00:00',
     4,
@@ -3519,6 +3869,7 @@ values
     'Pasta - Canelloni, Single Serve',
     'nunc viverra dapibus nulla suscipit ligula in lacus curabitur at ipsum ac tellus semper interdum',
     20.21,
+    20.21,
     19,
     '2020-08-27 00:00:00',
     5,
@@ -3529,6 +3880,7 @@ values
     'Juice - Cranberry 284ml',
     'placerat praesent blandit nam nulla integer pede justo lacinia eget tincidunt eget tempus vel pede',
     13.05,
+    13.05,
     56,
     '2021-05-11 00:00:00',
     5,
@@ -3539,6 +3891,7 @@ values
     'Wine - Vineland Estate Semi - Dry',
     'tempor convallis nulla neque libero convallis eget eleifend luctus ultricies eu nibh quisque',
     33.35,
+    33.35,
     71,
     '2021-05-18 00:00:00',
     3,
@@ -3549,6 +3902,7 @@ values
     'Syrup - Monin - Passion Fruit',
     'non velit donec diam neque vestibulum eget vulputate ut ultrices vel augue vestibulum',
     64.58,
+    64.58,
     56,
     '2020-09-25 00:00:00',
     5,
@@ -3559,6 +3913,7 @@ values
     'Marsala - Sperone, Fine, D.o.c.',
     'congue etiam justo etiam pretium iaculis justo in hac habitasse platea dictumst etiam faucibus cursus urna ut tellus',
     71.21,
+    71.21,
     80,
     '2021-04-09 00:00:00',
     4,
@@ -3569,6 +3924,7 @@ values
     'Bowl 12 Oz - Showcase 92012',
     'quis lectus suspendisse potenti in eleifend quam a odio in',
     7.67,
+    7.67,
     33,
     '2020-07-20 00:00:00',
     6,
@@ -3579,6 +3935,7 @@ values
     'Cod - Salted, Boneless',
     'est risus auctor sed tristique in tempus sit amet sem fusce consequat',
     26.71,
+    26.71,
     12,
     '2020-07-28 00:00:00',
     5,
@@ -3589,6 +3946,7 @@ values
     'Lemonade - Kiwi, 591 Ml',
     'tincidunt nulla mollis molestie lorem quisque ut erat curabitur gravida nisi at nibh in hac habitasse',
     43.40,
+    43.40,
     41,
     '2020-10-11 00:00:00',
     5,
@@ -3599,6 +3957,7 @@ values
     'Yeast Dry - Fleischman',
     'tellus nulla ut erat id mauris vulputate elementum nullam varius nulla facilisi cras non velit nec nisi vulputate nonummy maecenas',
     44.77,
+    44.77,
     32,
     '2020-08-19 00:00:00',
     4,
@@ -3609,6 +3968,7 @@ values
     'Beef - Striploin',
     'sapien non mi integer ac neque duis bibendum morbi non quam nec dui luctus',
     77.01,
+    77.01,
     95,
     '2021-05-13 00:00:00',
     4,
@@ -3619,6 +3979,7 @@ values
     'Plate Pie Foil',
     'lorem quisque ut erat curabitur gravida nisi at nibh in hac habitasse',
     6.97,
+    6.97,
     84,
     '2020-08-05 00:00:00',
     5,
@@ -3629,6 +3990,7 @@ values
     'Madeira',
     'maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum id luctus',
     28.66,
+    28.66,
     89,
     '2020-11-30 00:00:00',
     4,
@@ -3639,6 +4001,7 @@ values
     'Broccoli - Fresh',
     'morbi sem mauris laoreet ut rhoncus aliquet pulvinar sed nisl nunc rhoncus',
     84.58,
+    84.58,
     93,
     '2020-11-20 00:00:00',
     4,
@@ -3649,6 +4012,7 @@ values
     'Wine - Rubyport',
     'turpis enim blandit mi in porttitor pede justo eu massa donec dapibus duis at velit eu',
     98.70,
+    98.70,
     92,
     '2020-08-10 00:00:00',
     4,
@@ -3659,6 +4023,7 @@ values
     'Bread Base - Italian',
     'lobortis convallis tortor risus dapibus augue vel accumsan tellus nisi',
     19.74,
+    19.74,
     28,
     '2021-06-03 00:00:00',
     6,
@@ -3669,6 +4034,7 @@ values
     'Flour - Corn, Fine',
     'curae donec pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis sapien sapien non mi integer',
     32.55,
+    32.55,
     68,
     '2021-04-02 00:00:00',
     5,
@@ -3679,6 +4045,7 @@ values
     'Bread Cranberry Foccacia',
     'nulla pede ullamcorper augue a suscipit nulla elit ac nulla sed',
     95.08,
+    95.08,
     76,
     '2020-10-24 00:00:00',
     3,
@@ -3689,6 +4056,7 @@ values
     'Lettuce - Boston Bib - Organic',
     'elit sodales scelerisque mauris sit amet eros suspendisse accumsan tortor quis turpis sed ante vivamus',
     41.65,
+    41.65,
     31,
     '2021-03-17 00:00:00',
     4,
@@ -3699,6 +4067,7 @@ values
     'Beef - Tenderlion, Center Cut',
     'quam suspendisse potenti nullam porttitor lacus at turpis donec posuere metus vitae ipsum aliquam non mauris morbi non lectus',
     3.45,
+    3.45,
     36,
     '2020-09-08 00:00:00',
     5,
@@ -3709,6 +4078,7 @@ values
     'Squeeze Bottle',
     'consequat metus sapien ut nunc vestibulum ante ipsum primis in faucibus orci luctus et ultrices',
     75.90,
+    75.90,
     17,
     '2020-12-27 00:00:00',
     5,
@@ -3719,6 +4089,7 @@ values
     'Muffin - Zero Transfat',
     'quis augue luctus tincidunt nulla mollis molestie lorem quisque ut erat curabitur gravida nisi at',
     15.91,
+    15.91,
     65,
     '2020-07-21 00:00:00',
     6,
@@ -3729,6 +4100,7 @@ values
     'Worcestershire Sauce',
     'cubilia curae mauris viverra diam vitae quam suspendisse potenti nullam porttitor lacus',
     45.93,
+    45.93,
     61,
     '2020-12-06 00:00:00',
     5,
@@ -3739,6 +4111,7 @@ values
     'Lid Coffee Cup 8oz Blk',
     'sit amet erat nulla tempus vivamus in felis eu sapien cursus',
     52.14,
+    52.14,
     21,
     '2021-02-18 00:00:00',
     3,
@@ -3749,6 +4122,7 @@ values
     'Yoplait Drink',
     'eu tincidunt in leo maecenas pulvinar lobortis est phasellus sit',
     20.55,
+    20.55,
     67,
     '2021-04-18 00:00:00',
     6,
@@ -3759,6 +4133,7 @@ values
     'Sausage - Liver',
     'lacus at turpis donec posuere metus vitae ipsum aliquam non mauris morbi',
     58.67,
+    58.67,
     39,
     '2020-10-20 00:00:00',
     4,
@@ -3769,6 +4144,7 @@ values
     'Snapple Lemon Tea',
     'interdum mauris non ligula pellentesque ultrices phasellus id sapien in sapien iaculis congue vivamus metus arcu adipiscing molestie',
     42.45,
+    42.45,
     43,
     '2020-11-02 00:00:00',
     4,
@@ -3779,6 +4155,7 @@ values
     'Salmon - Atlantic, No Skin',
     'dis parturient montes nascetur ridiculus mus vivamus vestibulum sagittis sapien cum sociis natoque penatibus',
     38.85,
+    38.85,
     15,
     '2020-10-31 00:00:00',
     3,
@@ -3789,6 +4166,7 @@ values
     'Black Currants',
     'accumsan tortor quis turpis sed ante vivamus tortor duis mattis egestas metus aenean',
     76.68,
+    76.68,
     63,
     '2020-09-21 00:00:00',
     4,
@@ -3799,6 +4177,7 @@ values
     'Food Colouring - Red',
     'rutrum at lorem integer tincidunt ante vel ipsum praesent blandit lacinia erat vestibulum',
     52.70,
+    52.70,
     87,
     '2020-08-17 00:00:00',
     4,
@@ -3809,6 +4188,7 @@ values
     'Chocolate - White',
     'id lobortis convallis tortor risus dapibus augue vel accumsan tellus nisi eu orci mauris lacinia sapien quis libero nullam sit',
     1.92,
+    1.92,
     69,
     '2021-04-02 00:00:00',
     4,
@@ -3819,6 +4199,7 @@ values
     'Calaloo',
     'urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat',
     8.55,
+    8.55,
     76,
     '2020-08-03 00:00:00',
     5,
@@ -3829,6 +4210,7 @@ values
     'Cherries - Fresh',
     'nulla nunc purus phasellus in felis donec semper sapien a',
     31.41,
+    31.41,
     45,
     '2020-09-04 00:00:00',
     3,
@@ -3839,6 +4221,7 @@ values
     'Muffin Orange Individual',
     'justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum id luctus nec',
     54.18,
+    54.18,
     13,
     '2020-07-09 00:00:00',
     3,
@@ -3849,6 +4232,7 @@ values
     'Soup - French Can Pea',
     'sed ante vivamus tortor duis mattis egestas metus aenean fermentum donec ut mauris eget massa tempor convallis nulla',
     76.57,
+    76.57,
     85,
     '2021-04-17 00:00:00',
     4,
@@ -3859,6 +4243,7 @@ values
     'Nectarines',
     'arcu sed augue aliquam erat volutpat in congue etiam justo etiam pretium iaculis',
     11.16,
+    11.16,
     30,
     '2020-10-26 00:00:00',
     4,
@@ -3869,6 +4254,7 @@ values
     'Shrimp - 21/25, Peel And Deviened',
     'lacus at velit vivamus vel nulla eget eros elementum pellentesque quisque porta volutpat erat quisque erat',
     68.55,
+    68.55,
     65,
     '2020-11-14 00:00:00',
     5,
@@ -3879,6 +4265,7 @@ values
     'Salmon - Smoked, Sliced',
     'suspendisse potenti in eleifend quam a odio in hac habitasse platea dictumst maecenas ut massa quis augue luctus tincidunt nulla',
     50.50,
+    50.50,
     100,
     '2021-03-27 00:00:00',
     3,
@@ -3889,6 +4276,7 @@ values
     'Quail - Jumbo Boneless',
     'ligula vehicula consequat morbi a ipsum integer a nibh in quis justo maecenas rhoncus aliquam lacus',
     20.37,
+    20.37,
     97,
     '2020-08-19 00:00:00',
     4,
@@ -3899,6 +4287,7 @@ values
     'Water - Spring Water, 355 Ml',
     'diam neque vestibulum eget vulputate ut ultrices vel augue vestibulum ante ipsum primis in faucibus orci luctus et',
     11.69,
+    11.69,
     75,
     '2021-02-04 00:00:00',
     4,
@@ -3909,6 +4298,7 @@ values
     'Pastry - Choclate Baked',
     'purus phasellus in felis donec semper sapien a libero nam dui proin leo odio porttitor id consequat in consequat',
     70.65,
+    70.65,
     11,
     '2020-12-27 00:00:00',
     3,
@@ -3919,6 +4309,7 @@ values
     'Banana Turning',
     'ligula sit amet eleifend pede libero quis orci nullam molestie nibh in lectus pellentesque',
     17.12,
+    17.12,
     36,
     '2020-12-24 00:00:00',
     5,
@@ -3929,6 +4320,7 @@ values
     'Flavouring Vanilla Artificial',
     'sapien placerat ante nulla justo aliquam quis turpis eget elit sodales scelerisque mauris sit amet eros suspendisse accumsan tortor',
     9.47,
+    9.47,
     59,
     '2021-01-21 00:00:00',
     3,
@@ -3939,6 +4331,7 @@ values
     'Lotus Rootlets - Canned',
     'pede justo lacinia eget tincidunt eget tempus vel pede morbi',
     72.76,
+    72.76,
     8,
     '2021-05-06 00:00:00',
     5,
@@ -3949,6 +4342,7 @@ values
     'Filter - Coffee',
     'convallis morbi odio odio elementum eu interdum eu tincidunt in leo maecenas pulvinar lobortis est phasellus sit amet erat',
     85.17,
+    85.17,
     51,
     '2021-04-10 00:00:00',
     4,
@@ -3959,6 +4353,7 @@ values
     'Appetizer - Smoked Salmon / Dill',
     'pellentesque at nulla suspendisse potenti cras in purus eu magna vulputate',
     32.16,
+    32.16,
     11,
     '2020-11-08 00:00:00',
     5,
@@ -3969,6 +4364,7 @@ values
     'Macaroons - Two Bite Choc',
     'eleifend pede libero quis orci nullam molestie nibh in lectus pellentesque at nulla suspendisse potenti cras',
     68.07,
+    68.07,
     19,
     '2020-08-08 00:00:00',
     3,
@@ -3979,6 +4375,7 @@ values
     'Lamb - Bones',
     'pellentesque ultrices phasellus id sapien in sapien iaculis congue vivamus metus arcu adipiscing',
     36.67,
+    36.67,
     24,
     '2021-05-13 00:00:00',
     6,
@@ -3989,6 +4386,7 @@ values
     'Mousse - Mango',
     'nunc commodo placerat praesent blandit nam nulla integer pede justo lacinia eget tincidunt eget tempus vel pede morbi porttitor lorem',
     84.22,
+    84.22,
     91,
     '2020-08-03 00:00:00',
     3,
@@ -3999,6 +4397,7 @@ values
     'Truffle Shells - Semi - Sweet',
     'maecenas pulvinar lobortis est phasellus sit amet erat nulla tempus vivamus in felis eu sapien',
     72.09,
+    72.09,
     19,
     '2020-08-17 00:00:00',
     5,
@@ -4009,6 +4408,7 @@ values
     'Pork - Tenderloin, Frozen',
     'eu felis fusce posuere felis sed lacus morbi sem mauris',
     52.90,
+    52.90,
     8,
     '2020-10-29 00:00:00',
     4,
@@ -4019,6 +4419,7 @@ values
     'Chilli Paste, Ginger Garlic',
     'hac habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla ut erat id mauris vulputate elementum nullam',
     50.47,
+    50.47,
     3,
     '2021-03-12 00:00:00',
     3,
@@ -4029,6 +4430,7 @@ values
     'Creme De Menth - White',
     'in sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at vulputate vitae nisl aenean lectus pellentesque eget nunc donec',
     23.97,
+    23.97,
     49,
     '2021-01-05 00:00:00',
     5,
@@ -4039,6 +4441,7 @@ values
     'Thyme - Dried',
     'semper interdum mauris ullamcorper purus sit amet nulla quisque arcu libero rutrum ac lobortis',
     85.99,
+    85.99,
     96,
     '2020-11-26 00:00:00',
     4,
@@ -4049,6 +4452,7 @@ values
     'Pasta - Lasagna, Dry',
     'eget congue eget semper rutrum nulla nunc purus phasellus in felis donec semper sapien',
     37.80,
+    37.80,
     49,
     '2020-11-12 00:00:00',
     4,
@@ -4059,6 +4463,7 @@ values
     'Eggplant Italian',
     'lacus at velit vivamus vel nulla eget eros elementum pellentesque quisque porta volutpat erat quisque',
     80.68,
+    80.68,
     52,
     '2021-05-13 00:00:00',
     5,
@@ -4069,6 +4474,7 @@ values
     'V8 - Vegetable Cocktail',
     'ipsum integer a nibh in quis justo maecenas rhoncus aliquam lacus morbi',
     26.62,
+    26.62,
     14,
     '2021-04-16 00:00:00',
     3,
@@ -4079,6 +4485,7 @@ values
     'Tray - 16in Rnd Blk',
     'nisi nam ultrices libero non mattis pulvinar nulla pede ullamcorper augue a suscipit nulla elit',
     20.69,
+    20.69,
     46,
     '2021-04-09 00:00:00',
     6,
@@ -4089,6 +4496,7 @@ values
     'Juice Peach Nectar',
     'risus dapibus augue vel accumsan tellus nisi eu orci mauris lacinia sapien quis libero nullam sit',
     47.08,
+    47.08,
     11,
     '2020-11-07 00:00:00',
     4,
@@ -4099,6 +4507,7 @@ values
     'Shrimp - Baby, Warm Water',
     'magna bibendum imperdiet nullam orci pede venenatis non sodales sed tincidunt eu felis fusce posuere felis sed',
     21.07,
+    21.07,
     14,
     '2021-04-10 00:00:00',
     6,
@@ -4109,6 +4518,7 @@ values
     'Chicken - Whole Fryers',
     'ac lobortis vel dapibus at diam nam tristique tortor eu',
     60.39,
+    60.39,
     59,
     '2020-09-25 00:00:00',
     6,
@@ -4119,6 +4529,7 @@ values
     'Gatorade - Orange',
     'ridiculus mus etiam vel augue vestibulum rutrum rutrum neque aenean auctor gravida sem praesent id massa id nisl venenatis lacinia',
     98.40,
+    98.40,
     58,
     '2020-11-18 00:00:00',
     5,
@@ -4129,6 +4540,7 @@ values
     'Fib N9 - Prague Powder',
     'morbi sem mauris laoreet ut rhoncus aliquet pulvinar sed nisl nunc rhoncus',
     53.53,
+    53.53,
     91,
     '2020-11-21 00:00:00',
     5,
@@ -4139,6 +4551,7 @@ values
     'Mushroom - Enoki, Fresh',
     'adipiscing lorem vitae mattis nibh ligula nec sem duis aliquam convallis nunc proin at',
     39.73,
+    39.73,
     44,
     '2021-03-23 00:00:00',
     5,
@@ -4149,6 +4562,7 @@ values
     'Sauce - Hp',
     'aliquet at feugiat non pretium quis lectus suspendisse potenti in eleifend quam a odio in hac habitasse platea',
     57.26,
+    57.26,
     35,
     '2021-01-23 00:00:00',
     4,
@@ -4159,6 +4573,7 @@ values
     'Beer - Paulaner Hefeweisse',
     'duis consequat dui nec nisi volutpat eleifend donec ut dolor',
     95.30,
+    95.30,
     68,
     '2020-12-15 00:00:00',
     3,
@@ -4169,6 +4584,7 @@ values
     'Nut - Pecan, Halves',
     'fusce posuere felis sed lacus morbi sem mauris laoreet ut rhoncus',
     81.11,
+    81.11,
     48,
     '2021-05-16 00:00:00',
     4,
@@ -4179,6 +4595,7 @@ values
     'Vodka - Smirnoff',
     'proin risus praesent lectus vestibulum quam sapien varius ut blandit non interdum in ante vestibulum ante ipsum primis',
     24.05,
+    24.05,
     62,
     '2020-08-07 00:00:00',
     3,
@@ -4189,6 +4606,7 @@ values
     'Wine - Port Late Bottled Vintage',
     'suscipit ligula in lacus curabitur at ipsum ac tellus semper interdum mauris ullamcorper purus sit amet nulla',
     27.91,
+    27.91,
     95,
     '2021-04-25 00:00:00',
     6,
@@ -4199,6 +4617,7 @@ values
     'Kiwi Gold Zespri',
     'id pretium iaculis diam erat fermentum justo nec condimentum neque sapien placerat ante nulla justo aliquam quis turpis eget',
     28.83,
+    28.83,
     92,
     '2020-12-31 00:00:00',
     3,
@@ -4209,6 +4628,7 @@ values
     'Soup - Chicken And Wild Rice',
     'primis in faucibus orci luctus et ultrices posuere cubilia curae duis faucibus accumsan odio curabitur convallis duis consequat dui',
     74.76,
+    74.76,
     96,
     '2020-12-04 00:00:00',
     5,
@@ -4219,6 +4639,7 @@ values
     'Cream Of Tartar',
     'suspendisse accumsan tortor quis turpis sed ante vivamus tortor duis mattis egestas metus aenean fermentum',
     4.22,
+    4.22,
     42,
     '2021-02-15 00:00:00',
     3,
@@ -4229,6 +4650,7 @@ values
     'Pasta - Cheese / Spinach Bauletti',
     'lacinia eget tincidunt eget tempus vel pede morbi porttitor lorem id ligula suspendisse ornare',
     81.91,
+    81.91,
     12,
     '2020-10-23 00:00:00',
     3,
@@ -4239,6 +4661,7 @@ values
     'Yucca',
     'augue aliquam erat volutpat in congue etiam justo etiam pretium iaculis',
     7.39,
+    7.39,
     34,
     '2020-09-13 00:00:00',
     4,
@@ -4249,6 +4672,7 @@ values
     'Zucchini - Yellow',
     'in magna bibendum imperdiet nullam orci pede venenatis non sodales sed tincidunt eu felis',
     55.25,
+    55.25,
     83,
     '2020-07-31 00:00:00',
     6,
@@ -4259,6 +4683,7 @@ values
     'Transfer Sheets',
     'ligula pellentesque ultrices phasellus id sapien in sapien iaculis congue vivamus',
     91.43,
+    91.43,
     95,
     '2021-01-26 00:00:00',
     6,
@@ -4269,6 +4694,7 @@ values
     'Beef - Cooked, Corned',
     'ut mauris eget massa tempor convallis nulla neque libero convallis eget eleifend luctus ultricies eu nibh quisque id justo sit',
     24.65,
+    24.65,
     65,
     '2021-01-02 00:00:00',
     6,
@@ -4279,6 +4705,7 @@ values
     'Bar Bran Honey Nut',
     'ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae nulla',
     68.49,
+    68.49,
     30,
     '2021-04-14 00:00:00',
     6,
@@ -4289,6 +4716,7 @@ values
     'Quail - Whole, Bone - In',
     'eros vestibulum ac est lacinia nisi venenatis tristique fusce congue diam id ornare',
     41.85,
+    41.85,
     30,
     '2021-01-11 00:00:00',
     6,
@@ -4299,6 +4727,7 @@ values
     'Pepper - Julienne, Frozen',
     'tincidunt in leo maecenas pulvinar lobortis est phasellus sit amet erat nulla tempus',
     22.56,
+    22.56,
     65,
     '2021-05-14 00:00:00',
     5,
@@ -4309,6 +4738,7 @@ values
     'Radish - Pickled',
     'mus vivamus vestibulum sagittis sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam vel',
     91.52,
+    91.52,
     79,
     '2020-12-09 00:00:00',
     5,
@@ -4319,6 +4749,7 @@ values
     'Chocolate Eclairs',
     'dictumst etiam faucibus cursus urna ut tellus nulla ut erat id mauris vulputate elementum nullam',
     75.55,
+    75.55,
     30,
     '2021-05-11 00:00:00',
     5,
@@ -4329,6 +4760,7 @@ values
     'Godiva White Chocolate',
     'velit id pretium iaculis diam erat fermentum justo nec condimentum neque sapien placerat ante nulla justo aliquam quis',
     36.17,
+    36.17,
     73,
     '2020-09-08 00:00:00',
     5,
@@ -4339,6 +4771,7 @@ values
     'Sauce - Soya, Light',
     'congue diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien',
     81.10,
+    81.10,
     48,
     '2021-04-24 00:00:00',
     6,
@@ -4349,6 +4782,7 @@ values
     'Sherry - Dry',
     'natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam vel augue',
     78.54,
+    78.54,
     9,
     '2020-12-18 00:00:00',
     5,
@@ -4359,6 +4793,7 @@ values
     'Potatoes - Peeled',
     'at turpis donec posuere metus vitae ipsum aliquam non mauris morbi non lectus aliquam sit amet diam',
     82.59,
+    82.59,
     76,
     '2021-02-02 00:00:00',
     6,
@@ -4369,6 +4804,7 @@ values
     'Wine - Two Oceans Cabernet',
     'nulla suscipit ligula in lacus curabitur at ipsum ac tellus semper interdum',
     33.55,
+    33.55,
     86,
     '2020-10-16 00:00:00',
     4,
@@ -4379,6 +4815,7 @@ values
     'Appetizer - Southwestern',
     'amet sem fusce consequat nulla nisl nunc nisl duis bibendum felis sed interdum venenatis turpis enim blandit mi in porttitor',
     38.94,
+    38.94,
     77,
     '2021-04-27 00:00:00',
     4,
@@ -4389,6 +4826,7 @@ values
     'Wine - Penfolds Koonuga Hill',
     'luctus ultricies eu nibh quisque id justo sit amet sapien dignissim vestibulum vestibulum ante ipsum primis in faucibus orci luctus',
     50.05,
+    50.05,
     11,
     '2021-01-22 00:00:00',
     5,
@@ -4399,6 +4837,7 @@ values
     'Appetizer - Shrimp Puff',
     'viverra dapibus nulla suscipit ligula in lacus curabitur at ipsum ac tellus semper interdum',
     65.45,
+    65.45,
     30,
     '2020-12-04 00:00:00',
     4,
@@ -4409,6 +4848,7 @@ values
     'Isomalt',
     'sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam vel augue vestibulum',
     33.57,
+    33.57,
     93,
     '2020-09-06 00:00:00',
     5,
@@ -4419,6 +4859,7 @@ values
     'Beans - Soya Bean',
     'id turpis integer aliquet massa id lobortis convallis tortor risus',
     88.40,
+    88.40,
     29,
     '2021-05-20 00:00:00',
     4,
@@ -4429,6 +4870,7 @@ values
     'Beef - Shank',
     'volutpat in congue etiam justo etiam pretium iaculis justo in hac habitasse platea',
     58.80,
+    58.80,
     99,
     '2020-10-19 00:00:00',
     3,
@@ -4439,6 +4881,7 @@ values
     'Oil - Shortening - All - Purpose',
     'congue vivamus metus arcu adipiscing molestie hendrerit at vulputate vitae nisl aenean lectus pellentesque eget nunc donec',
     15.47,
+    15.47,
     51,
     '2021-01-27 00:00:00',
     3,
@@ -4449,6 +4892,7 @@ values
     'Pepper - Chilli Seeds Mild',
     'nisi volutpat eleifend donec ut dolor morbi vel lectus in quam fringilla',
     39.69,
+    39.69,
     35,
     '2020-10-03 00:00:00',
     6,
@@ -4459,6 +4903,7 @@ values
     'Pasta - Fusili, Dry',
     'pretium iaculis diam erat fermentum justo nec condimentum neque sapien placerat ante',
     17.95,
+    17.95,
     19,
     '2020-11-17 00:00:00',
     3,
@@ -4469,6 +4914,7 @@ values
     'Flower - Leather Leaf Fern',
     'bibendum imperdiet nullam orci pede venenatis non sodales sed tincidunt eu felis fusce posuere felis sed lacus morbi sem',
     69.96,
+    69.96,
     83,
     '2021-01-24 00:00:00',
     5,
@@ -4479,6 +4925,7 @@ values
     'Black Currants',
     'lacus purus aliquet at feugiat non pretium quis lectus suspendisse',
     8.73,
+    8.73,
     8,
     '2020-07-28 00:00:00',
     6,
@@ -4489,6 +4936,7 @@ values
     'Sword Pick Asst',
     'ut massa quis augue luctus tincidunt nulla mollis molestie lorem quisque ut erat curabitur gravida nisi',
     32.29,
+    32.29,
     16,
     '2021-01-21 00:00:00',
     5,
@@ -4499,6 +4947,7 @@ values
     'Soup - Campbells, Lentil',
     'nascetur ridiculus mus vivamus vestibulum sagittis sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam',
     48.58,
+    48.58,
     76,
     '2021-01-27 00:00:00',
     5,
@@ -4509,6 +4958,7 @@ values
     'Roe - Lump Fish, Red',
     'non mauris morbi non lectus aliquam sit amet diam in magna bibendum imperdiet nullam',
     84.19,
+    84.19,
     65,
     '2021-04-04 00:00:00',
     4,
@@ -4519,6 +4969,7 @@ values
     'Sauce - Demi Glace',
     'ante vivamus tortor duis mattis egestas metus aenean fermentum donec ut mauris eget massa',
     81.03,
+    81.03,
     90,
     '2020-09-09 00:00:00',
     4,
@@ -4529,6 +4980,7 @@ values
     'Coffee Cup 8oz 5338cd',
     'vestibulum ac est lacinia nisi venenatis tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl',
     73.11,
+    73.11,
     71,
     '2021-02-15 00:00:00',
     6,
@@ -4539,6 +4991,7 @@ values
     'Salmon - Smoked, Sliced',
     'rutrum rutrum neque aenean auctor gravida sem praesent id massa id nisl venenatis lacinia aenean sit amet justo morbi',
     30.55,
+    30.55,
     11,
     '2020-10-09 00:00:00',
     4,
@@ -4549,6 +5002,7 @@ values
     'Veal - Osso Bucco',
     'ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat in congue etiam justo',
     93.75,
+    93.75,
     23,
     '2020-10-31 00:00:00',
     4,
@@ -4559,6 +5013,7 @@ values
     'Sole - Dover, Whole, Fresh',
     'nunc donec quis orci eget orci vehicula condimentum curabitur in libero',
     14.14,
+    14.14,
     29,
     '2021-06-05 00:00:00',
     6,
@@ -4569,6 +5024,7 @@ values
     'Vaccum Bag - 14x20',
     'libero nam dui proin leo odio porttitor id consequat in consequat ut nulla sed',
     56.18,
+    56.18,
     92,
     '2021-03-26 00:00:00',
     3,
@@ -4579,6 +5035,7 @@ values
     'Sausage - Liver',
     'adipiscing elit proin risus praesent lectus vestibulum quam sapien varius ut blandit non interdum in ante vestibulum ante ipsum primis',
     87.44,
+    87.44,
     25,
     '2020-08-01 00:00:00',
     6,
@@ -4589,6 +5046,7 @@ values
     'Wine - Magnotta, White',
     'diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien',
     96.03,
+    96.03,
     34,
     '2021-01-30 00:00:00',
     5,
@@ -4599,6 +5057,7 @@ values
     'Ham - Virginia',
     'hac habitasse platea dictumst aliquam augue quam sollicitudin vitae consectetuer eget rutrum at lorem',
     93.87,
+    93.87,
     87,
     '2021-04-08 00:00:00',
     4,
@@ -4609,6 +5068,7 @@ values
     'Onion - Dried',
     'semper porta volutpat quam pede lobortis ligula sit amet eleifend',
     5.80,
+    5.80,
     5,
     '2020-09-24 00:00:00',
     4,
@@ -4619,6 +5079,7 @@ values
     'Coffee - Decafenated',
     'mi sit amet lobortis sapien sapien non mi integer ac neque duis bibendum morbi non quam',
     35.38,
+    35.38,
     32,
     '2020-09-29 00:00:00',
     3,
@@ -4629,6 +5090,7 @@ values
     'Sauce - Plum',
     'platea dictumst etiam faucibus cursus urna ut tellus nulla ut erat id mauris vulputate elementum nullam',
     8.77,
+    8.77,
     35,
     '2020-07-03 00:00:00',
     4,
@@ -4639,6 +5101,7 @@ values
     'Yogurt - Raspberry, 175 Gr',
     'habitasse platea dictumst morbi vestibulum velit id pretium iaculis diam erat fermentum justo nec condimentum neque',
     74.58,
+    74.58,
     100,
     '2020-12-08 00:00:00',
     4,
@@ -4649,6 +5112,7 @@ values
     'Orange - Tangerine',
     'ut ultrices vel augue vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae donec pharetra',
     91.78,
+    91.78,
     85,
     '2020-06-19 00:00:00',
     5,
@@ -4659,6 +5123,7 @@ values
     'Chicken - Soup Base',
     'nunc rhoncus dui vel sem sed sagittis nam congue risus semper porta volutpat quam pede lobortis ligula',
     11.88,
+    11.88,
     55,
     '2020-08-20 00:00:00',
     4,
@@ -4669,6 +5134,7 @@ values
     'Ecolab - Lime - A - Way 4/4 L',
     'nunc viverra dapibus nulla suscipit ligula in lacus curabitur at ipsum ac tellus semper interdum',
     88.85,
+    88.85,
     93,
     '2021-05-27 00:00:00',
     3,
@@ -4679,6 +5145,7 @@ values
     'Cheese - Parmigiano Reggiano',
     'morbi non lectus aliquam sit amet diam in magna bibendum imperdiet nullam orci pede venenatis non',
     77.72,
+    77.72,
     82,
     '2020-08-17 00:00:00',
     3,
@@ -4689,6 +5156,7 @@ values
     'Beef - Chuck, Boneless',
     'viverra eget congue eget semper rutrum nulla nunc purus phasellus in felis donec',
     85.88,
+    85.88,
     22,
     '2020-10-21 00:00:00',
     5,
@@ -4699,6 +5167,7 @@ values
     'Raisin - Golden',
     'duis consequat dui nec nisi volutpat eleifend donec ut dolor morbi vel lectus in quam fringilla rhoncus mauris enim',
     94.29,
+    94.29,
     51,
     '2020-12-04 00:00:00',
     4,
@@ -4709,6 +5178,7 @@ values
     'Molasses - Fancy',
     'ut odio cras mi pede malesuada in imperdiet et commodo vulputate',
     1.13,
+    1.13,
     8,
     '2021-02-25 00:00:00',
     3,
@@ -4719,6 +5189,7 @@ values
     'Pork - Ground',
     'vel nisl duis ac nibh fusce lacus purus aliquet at feugiat non pretium quis lectus',
     96.62,
+    96.62,
     34,
     '2020-07-19 00:00:00',
     6,
@@ -4729,6 +5200,7 @@ values
     'Bread - White, Unsliced',
     'donec posuere metus vitae ipsum aliquam non mauris morbi non lectus aliquam sit amet diam in magna',
     83.52,
+    83.52,
     51,
     '2021-01-17 00:00:00',
     4,
@@ -4739,6 +5211,7 @@ values
     'Versatainer Nc - 8288',
     'dictumst aliquam augue quam sollicitudin vitae consectetuer eget rutrum at lorem integer tincidunt ante vel ipsum praesent blandit lacinia',
     23.04,
+    23.04,
     81,
     '2020-07-13 00:00:00',
     5,
@@ -4749,6 +5222,7 @@ values
     'Lambcasing',
     'nulla tempus vivamus in felis eu sapien cursus vestibulum proin eu mi nulla ac enim in',
     78.97,
+    78.97,
     70,
     '2020-06-16 00:00:00',
     6,
@@ -4759,6 +5233,7 @@ values
     'Beef - Ox Tongue',
     'augue quam sollicitudin vitae consectetuer eget rutrum at lorem integer tincidunt ante vel ipsum praesent blandit lacinia erat',
     27.92,
+    27.92,
     79,
     '2020-11-05 00:00:00',
     4,
@@ -4769,6 +5244,7 @@ values
     'Pepper - Green, Chili',
     'eu tincidunt in leo maecenas pulvinar lobortis est phasellus sit amet erat nulla tempus vivamus in',
     95.20,
+    95.20,
     61,
     '2021-01-13 00:00:00',
     6,
@@ -4779,6 +5255,7 @@ values
     'Beer - Tetleys',
     'dapibus augue vel accumsan tellus nisi eu orci mauris lacinia',
     34.41,
+    34.41,
     16,
     '2020-12-14 00:00:00',
     3,
@@ -4789,6 +5266,7 @@ values
     'Yogurt - Cherry, 175 Gr',
     'phasellus in felis donec semper sapien a libero nam dui proin leo odio porttitor id consequat in consequat ut',
     52.89,
+    52.89,
     80,
     '2020-08-05 00:00:00',
     3,
@@ -4799,6 +5277,7 @@ values
     'Sole - Fillet',
     'interdum venenatis turpis enim blandit mi in porttitor pede justo eu massa donec dapibus duis at velit eu',
     28.28,
+    28.28,
     35,
     '2021-04-26 00:00:00',
     5,
@@ -4809,6 +5288,7 @@ values
     'Turnip - White, Organic',
     'sit amet nulla quisque arcu libero rutrum ac lobortis vel dapibus at diam nam tristique',
     50.07,
+    50.07,
     25,
     '2021-02-09 00:00:00',
     5,
@@ -4819,6 +5299,7 @@ values
     'Dip - Tapenade',
     'tellus in sagittis dui vel nisl duis ac nibh fusce lacus purus aliquet at feugiat non pretium',
     45.11,
+    45.11,
     41,
     '2020-08-11 00:00:00',
     6,
@@ -4829,6 +5310,7 @@ values
     'Coffee - 10oz Cup 92961',
     'maecenas tincidunt lacus at velit vivamus vel nulla eget eros',
     21.42,
+    21.42,
     93,
     '2021-05-01 00:00:00',
     4,
@@ -4839,6 +5321,7 @@ values
     'Pasta - Elbows, Macaroni, Dry',
     'faucibus accumsan odio curabitur convallis duis consequat dui nec nisi volutpat eleifend donec ut dolor morbi vel lectus',
     37.30,
+    37.30,
     87,
     '2021-04-08 00:00:00',
     6,
@@ -4849,6 +5332,7 @@ values
     'Wine - White, Colubia Cresh',
     'lacinia sapien quis libero nullam sit amet turpis elementum ligula vehicula consequat morbi a',
     1.59,
+    1.59,
     42,
     '2020-06-24 00:00:00',
     4,
@@ -4859,6 +5343,7 @@ values
     'Soup - Beef Conomme, Dry',
     'ac enim in tempor turpis nec euismod scelerisque quam turpis adipiscing lorem vitae mattis nibh ligula nec',
     92.54,
+    92.54,
     75,
     '2021-01-05 00:00:00',
     4,
@@ -4869,6 +5354,7 @@ values
     'Soup - Campbells Mushroom',
     'eu felis fusce posuere felis sed lacus morbi sem mauris laoreet ut rhoncus',
     32.67,
+    32.67,
     17,
     '2020-09-27 00:00:00',
     4,
@@ -4879,6 +5365,7 @@ values
     'Potatoes - Mini Red',
     'purus phasellus in felis donec semper sapien a libero nam dui proin leo odio porttitor id consequat in',
     57.24,
+    57.24,
     21,
     '2021-03-14 00:00:00',
     5,
@@ -4889,6 +5376,7 @@ values
     'Cheese - Havarti, Salsa',
     'blandit non interdum in ante vestibulum ante ipsum primis in',
     31.03,
+    31.03,
     75,
     '2020-12-06 00:00:00',
     6,
@@ -4899,6 +5387,7 @@ values
     'Shrimp - 21/25, Peel And Deviened',
     'sed tristique in tempus sit amet sem fusce consequat nulla',
     83.12,
+    83.12,
     20,
     '2020-07-09 00:00:00',
     4,
@@ -4909,6 +5398,7 @@ values
     'Propel Sport Drink',
     'aliquam convallis nunc proin at turpis a pede posuere nonummy integer non velit donec diam neque vestibulum',
     50.37,
+    50.37,
     18,
     '2020-08-03 00:00:00',
     4,
@@ -4919,6 +5409,7 @@ values
     'Chicken - White Meat With Tender',
     'vestibulum sit amet cursus id turpis integer aliquet massa id lobortis convallis',
     39.47,
+    39.47,
     64,
     '2020-12-23 00:00:00',
     6,
@@ -4929,6 +5420,7 @@ values
     'Guinea Fowl',
     'erat fermentum justo nec condimentum neque sapien placerat ante nulla justo aliquam quis turpis',
     84.54,
+    84.54,
     43,
     '2020-11-04 00:00:00',
     5,
@@ -4939,6 +5431,7 @@ values
     'Bowl 12 Oz - Showcase 92012',
     'praesent blandit lacinia erat vestibulum sed magna at nunc commodo',
     29.71,
+    29.71,
     13,
     '2021-02-04 00:00:00',
     4,
@@ -4949,6 +5442,7 @@ values
     'Yeast Dry - Fermipan',
     'libero ut massa volutpat convallis morbi odio odio elementum eu interdum eu tincidunt in leo',
     10.79,
+    10.79,
     86,
     '2021-05-11 00:00:00',
     3,
@@ -4959,6 +5453,7 @@ values
     'Mushroom - Chantrelle, Fresh',
     'amet eleifend pede libero quis orci nullam molestie nibh in lectus pellentesque at nulla suspendisse potenti cras',
     23.61,
+    23.61,
     39,
     '2020-09-12 00:00:00',
     5,
@@ -4969,6 +5464,7 @@ values
     'Beer - Steamwhistle',
     'sagittis nam congue risus semper porta volutpat quam pede lobortis ligula sit',
     7.39,
+    7.39,
     82,
     '2021-03-12 00:00:00',
     4,
@@ -4979,6 +5475,7 @@ values
     'Lettuce - Belgian Endive',
     'libero quis orci nullam molestie nibh in lectus pellentesque at nulla suspendisse potenti cras in purus eu magna vulputate',
     40.96,
+    40.96,
     59,
     '2020-09-30 00:00:00',
     3,
@@ -4989,6 +5486,7 @@ values
     'Jello - Assorted',
     'in libero ut massa volutpat convallis morbi odio odio elementum eu interdum eu',
     13.53,
+    13.53,
     97,
     '2021-02-22 00:00:00',
     5,
@@ -4999,6 +5497,7 @@ values
     'Garlic Powder',
     'morbi vestibulum velit id pretium iaculis diam erat fermentum justo nec',
     2.19,
+    2.19,
     3,
     '2020-08-27 00:00:00',
     6,
@@ -5009,6 +5508,7 @@ values
     'Pickle - Dill',
     'sagittis sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam',
     31.52,
+    31.52,
     77,
     '2020-09-20 00:00:00',
     6,
@@ -5019,6 +5519,7 @@ values
     'Flour Dark Rye',
     'at turpis a pede posuere nonummy integer non velit donec diam neque vestibulum eget vulputate ut ultrices vel',
     37.41,
+    37.41,
     75,
     '2020-10-22 00:00:00',
     5,
@@ -5029,6 +5530,7 @@ values
     'Compound - Pear',
     'potenti cras in purus eu magna vulputate luctus cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus',
     93.42,
+    93.42,
     51,
     '2021-06-07 00:00:00',
     6,
@@ -5039,6 +5541,7 @@ values
     'Cookie Chocolate Chip With',
     'libero convallis eget eleifend luctus ultricies eu nibh quisque id justo sit amet',
     66.30,
+    66.30,
     29,
     '2020-07-25 00:00:00',
     3,
@@ -5049,6 +5552,7 @@ values
     'Cloves - Ground',
     'nulla nunc purus phasellus in felis donec semper sapien a libero',
     26.06,
+    26.06,
     15,
     '2020-11-08 00:00:00',
     5,
@@ -5059,6 +5563,7 @@ values
     'Sauce - Thousand Island',
     'congue eget semper rutrum nulla nunc purus phasellus in felis donec semper sapien a',
     60.11,
+    60.11,
     46,
     '2020-09-27 00:00:00',
     4,
@@ -5069,6 +5574,7 @@ values
     'Yogurt - Assorted Pack',
     'suspendisse accumsan tortor quis turpis sed ante vivamus tortor duis mattis egestas metus aenean fermentum',
     12.44,
+    12.44,
     67,
     '2020-07-25 00:00:00',
     3,
@@ -5079,6 +5585,7 @@ values
     'Dooleys Toffee',
     'hac habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla',
     71.19,
+    71.19,
     52,
     '2021-05-26 00:00:00',
     6,
@@ -5089,6 +5596,7 @@ values
     'Marzipan 50/50',
     'felis fusce posuere felis sed lacus morbi sem mauris laoreet ut rhoncus aliquet pulvinar sed nisl nunc rhoncus',
     89.05,
+    89.05,
     58,
     '2021-03-25 00:00:00',
     3,
@@ -5099,6 +5607,7 @@ values
     'Flavouring - Raspberry',
     'tincidunt eget tempus vel pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est',
     72.89,
+    72.89,
     40,
     '2021-02-28 00:00:00',
     6,
@@ -5109,6 +5618,7 @@ values
     'Lamb - Bones',
     'aenean lectus pellentesque eget nunc donec quis orci eget orci vehicula condimentum curabitur in libero ut massa',
     1.44,
+    1.44,
     80,
     '2021-04-09 00:00:00',
     5,
@@ -5119,6 +5629,7 @@ values
     'Pineapple - Canned, Rings',
     'aliquam sit amet diam in magna bibendum imperdiet nullam orci pede venenatis non sodales sed',
     14.96,
+    14.96,
     77,
     '2021-04-04 00:00:00',
     3,
@@ -5129,6 +5640,7 @@ values
     'Chicken - Whole Roasting',
     'sagittis nam congue risus semper porta volutpat quam pede lobortis ligula',
     54.87,
+    54.87,
     44,
     '2021-02-10 00:00:00',
     4,
@@ -5139,6 +5651,7 @@ values
     'Scallops - U - 10',
     'blandit non interdum in ante vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae',
     88.21,
+    88.21,
     100,
     '2021-04-25 00:00:00',
     4,
@@ -5149,6 +5662,7 @@ values
     'Container - Clear 32 Oz',
     'quis augue luctus tincidunt nulla mollis molestie lorem quisque ut erat curabitur gravida nisi at nibh in hac habitasse platea',
     5.78,
+    5.78,
     30,
     '2021-03-04 00:00:00',
     6,
@@ -5159,6 +5673,7 @@ values
     'Juice - Orange 1.89l',
     'eu mi nulla ac enim in tempor turpis nec euismod scelerisque quam turpis adipiscing lorem vitae mattis',
     54.45,
+    54.45,
     65,
     '2020-10-04 00:00:00',
     4,
@@ -5169,6 +5684,7 @@ values
     'Sparkling Wine - Rose, Freixenet',
     'justo sollicitudin ut suscipit a feugiat et eros vestibulum ac est lacinia nisi venenatis tristique fusce congue',
     95.18,
+    95.18,
     44,
     '2020-12-24 00:00:00',
     3,
@@ -5179,6 +5695,7 @@ values
     'Sultanas',
     'maecenas tincidunt lacus at velit vivamus vel nulla eget eros elementum',
     48.75,
+    48.75,
     64,
     '2020-08-27 00:00:00',
     3,
@@ -5189,6 +5706,7 @@ values
     'Pasta - Cheese / Spinach Bauletti',
     'primis in faucibus orci luctus et ultrices posuere cubilia curae donec',
     93.85,
+    93.85,
     21,
     '2021-03-28 00:00:00',
     4,
@@ -5199,6 +5717,7 @@ values
     'Tart - Pecan Butter Squares',
     'ultrices posuere cubilia curae nulla dapibus dolor vel est donec odio justo sollicitudin',
     4.75,
+    4.75,
     43,
     '2021-04-23 00:00:00',
     4,
@@ -5209,6 +5728,7 @@ values
     'Tarts Assorted',
     'pulvinar nulla pede ullamcorper augue a suscipit nulla elit ac nulla',
     68.34,
+    68.34,
     87,
     '2021-04-21 00:00:00',
     6,
@@ -5219,6 +5739,7 @@ values
     'Appetizer - Asian Shrimp Roll',
     'massa id lobortis convallis tortor risus dapibus augue vel accumsan',
     92.58,
+    92.58,
     47,
     '2021-03-15 00:00:00',
     6,
@@ -5229,6 +5750,7 @@ values
     'Pork - Smoked Back Bacon',
     'primis in faucibus orci luctus et ultrices posuere cubilia curae nulla dapibus dolor vel est donec odio justo sollicitudin',
     14.00,
+    14.00,
     1,
     '2021-05-13 00:00:00',
     5,
@@ -5239,6 +5761,7 @@ values
     'Vodka - Smirnoff',
     'justo morbi ut odio cras mi pede malesuada in imperdiet et commodo vulputate justo in',
     66.15,
+    66.15,
     38,
     '2020-09-15 00:00:00',
     4,
@@ -5249,6 +5772,7 @@ values
     'Cake - Miini Cheesecake Cherry',
     'potenti nullam porttitor lacus at turpis donec posuere metus vitae ipsum aliquam non',
     57.35,
+    57.35,
     37,
     '2020-11-19 00:00:00',
     6,
@@ -5259,6 +5783,7 @@ values
     'Tia Maria',
     'dapibus duis at velit eu est congue elementum in hac habitasse platea dictumst morbi vestibulum velit id pretium iaculis diam',
     57.76,
+    57.76,
     82,
     '2021-01-29 00:00:00',
     6,
@@ -5269,6 +5794,7 @@ values
     'Banana Turning',
     'augue vel accumsan tellus nisi eu orci mauris lacinia sapien quis libero nullam sit amet turpis elementum',
     90.39,
+    90.39,
     64,
     '2020-07-10 00:00:00',
     6,
@@ -5279,6 +5805,7 @@ values
     'Rice - Brown',
     'eget vulputate ut ultrices vel augue vestibulum ante ipsum primis',
     57.03,
+    57.03,
     54,
     '2020-10-04 00:00:00',
     5,
@@ -5289,6 +5816,7 @@ values
     'Potatoes - Fingerling 4 Oz',
     'commodo placerat praesent blandit nam nulla integer pede justo lacinia eget tincidunt eget tempus vel pede morbi porttitor lorem',
     32.99,
+    32.99,
     89,
     '2021-02-07 00:00:00',
     6,
@@ -5299,6 +5827,7 @@ values
     'Shrimp - Tiger 21/25',
     'fermentum justo nec condimentum neque sapien placerat ante nulla justo aliquam quis turpis eget elit sodales scelerisque mauris',
     79.68,
+    79.68,
     71,
     '2021-03-27 00:00:00',
     6,
@@ -5309,6 +5838,7 @@ values
     'Lamb - Shanks',
     'proin risus praesent lectus vestibulum quam sapien varius ut blandit non interdum in ante vestibulum ante ipsum primis in faucibus',
     17.39,
+    17.39,
     29,
     '2020-07-01 00:00:00',
     6,
@@ -5319,6 +5849,7 @@ values
     'Wine - Red, Cabernet Merlot',
     'platea dictumst aliquam augue quam sollicitudin vitae consectetuer eget rutrum at lorem integer tincidunt ante vel ipsum',
     89.73,
+    89.73,
     57,
     '2020-12-11 00:00:00',
     4,
@@ -5329,6 +5860,7 @@ values
     'Bread - Sour Batard',
     'mauris non ligula pellentesque ultrices phasellus id sapien in sapien',
     57.33,
+    57.33,
     6,
     '2021-05-04 00:00:00',
     3,
@@ -5339,6 +5871,7 @@ values
     'Ginger - Crystalized',
     'turpis adipiscing lorem vitae mattis nibh ligula nec sem duis aliquam convallis nunc proin at turpis a',
     8.17,
+    8.17,
     88,
     '2020-08-25 00:00:00',
     3,
@@ -5349,6 +5882,7 @@ values
     'Eggplant - Asian',
     'lectus in est risus auctor sed tristique in tempus sit amet sem',
     50.50,
+    50.50,
     69,
     '2020-12-26 00:00:00',
     3,
@@ -5359,6 +5893,7 @@ values
     'Wine - Malbec Trapiche Reserve',
     'dapibus duis at velit eu est congue elementum in hac habitasse platea dictumst',
     90.41,
+    90.41,
     61,
     '2020-11-10 00:00:00',
     5,
@@ -5369,6 +5904,7 @@ values
     'Coffee Cup 16oz Foam',
     'justo lacinia eget tincidunt eget tempus vel pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est risus',
     2.94,
+    2.94,
     82,
     '2021-02-04 00:00:00',
     6,
@@ -5379,6 +5915,7 @@ values
     'Coconut Milk - Unsweetened',
     'ut volutpat sapien arcu sed augue aliquam erat volutpat in congue etiam justo etiam',
     66.22,
+    66.22,
     90,
     '2020-11-09 00:00:00',
     6,
@@ -5389,6 +5926,7 @@ values
     'Squid Ink',
     'suspendisse potenti nullam porttitor lacus at turpis donec posuere metus vitae ipsum aliquam',
     32.21,
+    32.21,
     65,
     '2020-06-20 00:00:00',
     3,
@@ -5399,6 +5937,7 @@ values
     'Wine - Bouchard La Vignee Pinot',
     'habitasse platea dictumst morbi vestibulum velit id pretium iaculis diam erat fermentum justo nec condimentum',
     90.55,
+    90.55,
     70,
     '2020-06-24 00:00:00',
     6,
@@ -5409,6 +5948,7 @@ values
     'Guinea Fowl',
     'nonummy maecenas tincidunt lacus at velit vivamus vel nulla eget eros elementum pellentesque',
     4.85,
+    4.85,
     97,
     '2020-08-02 00:00:00',
     3,
@@ -5419,6 +5959,7 @@ values
     'Remy Red',
     'justo morbi ut odio cras mi pede malesuada in imperdiet et commodo vulputate',
     67.10,
+    67.10,
     41,
     '2021-04-05 00:00:00',
     6,
@@ -5429,6 +5970,7 @@ values
     'Cookie Dough - Chocolate Chip',
     'erat fermentum justo nec condimentum neque sapien placerat ante nulla justo',
     16.48,
+    16.48,
     11,
     '2020-09-09 00:00:00',
     3,
@@ -5439,6 +5981,7 @@ values
     'Fennel',
     'non ligula pellentesque ultrices phasellus id sapien in sapien iaculis',
     2.73,
+    2.73,
     15,
     '2021-01-15 00:00:00',
     4,
@@ -5449,6 +5992,7 @@ values
     'Nacho Chips',
     'massa tempor convallis nulla neque libero convallis eget eleifend luctus ultricies eu nibh',
     57.42,
+    57.42,
     97,
     '2021-04-09 00:00:00',
     6,
@@ -5459,6 +6003,7 @@ values
     'Sugar - Invert',
     'eu magna vulputate luctus cum sociis natoque penatibus et magnis dis parturient montes',
     23.54,
+    23.54,
     77,
     '2020-12-25 00:00:00',
     6,
@@ -5469,6 +6014,7 @@ values
     'Tarts Assorted',
     'vitae ipsum aliquam non mauris morbi non lectus aliquam sit amet diam in magna',
     79.79,
+    79.79,
     51,
     '2020-11-02 00:00:00',
     3,
@@ -5479,6 +6025,7 @@ values
     'Mushroom Morel Fresh',
     'in congue etiam justo etiam pretium iaculis justo in hac habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla',
     27.00,
+    27.00,
     52,
     '2020-10-21 00:00:00',
     3,
@@ -5489,6 +6036,7 @@ values
     'Hersey Shakes',
     'sem fusce consequat nulla nisl nunc nisl duis bibendum felis sed interdum venenatis turpis',
     47.61,
+    47.61,
     23,
     '2020-12-19 00:00:00',
     6,
@@ -5499,6 +6047,7 @@ values
     'Tomatoes - Heirloom',
     'semper rutrum nulla nunc purus phasellus in felis donec semper sapien a libero nam dui proin',
     74.60,
+    74.60,
     84,
     '2021-01-14 00:00:00',
     5,
@@ -5509,6 +6058,7 @@ values
     'Tea - Herbal Orange Spice',
     'vel pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est risus auctor sed tristique in',
     68.15,
+    68.15,
     1,
     '2021-04-13 00:00:00',
     3,
@@ -5519,6 +6069,7 @@ values
     'Pork - Bacon Cooked Slcd',
     'nonummy integer non velit donec diam neque vestibulum eget vulputate ut ultrices vel augue vestibulum ante ipsum primis in faucibus',
     2.24,
+    2.24,
     94,
     '2020-09-04 00:00:00',
     6,
@@ -5529,6 +6080,7 @@ values
     'Mint - Fresh',
     'rhoncus sed vestibulum sit amet cursus id turpis integer aliquet massa id lobortis convallis tortor risus dapibus augue',
     84.18,
+    84.18,
     45,
     '2020-10-01 00:00:00',
     5,
@@ -5539,6 +6091,7 @@ values
     'Bread - Bistro Sour',
     'nibh in hac habitasse platea dictumst aliquam augue quam sollicitudin vitae consectetuer',
     99.35,
+    99.35,
     69,
     '2021-01-13 00:00:00',
     3,
@@ -5549,6 +6102,7 @@ values
     'Wine - Magnotta - Red, Baco',
     'vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae donec pharetra magna vestibulum aliquet ultrices',
     27.60,
+    27.60,
     71,
     '2021-02-14 00:00:00',
     5,
@@ -5559,6 +6113,7 @@ values
     'Chicken - Leg, Fresh',
     'leo odio condimentum id luctus nec molestie sed justo pellentesque viverra pede ac diam',
     11.50,
+    11.50,
     2,
     '2021-06-02 00:00:00',
     4,
@@ -5569,6 +6124,7 @@ values
     'Soup - French Onion, Dry',
     'libero non mattis pulvinar nulla pede ullamcorper augue a suscipit nulla elit ac nulla sed vel enim sit amet nunc',
     66.46,
+    66.46,
     37,
     '2021-01-24 00:00:00',
     6,
@@ -5579,6 +6135,7 @@ values
     'Sachet',
     'faucibus cursus urna ut tellus nulla ut erat id mauris',
     74.35,
+    74.35,
     81,
     '2021-03-21 00:00:00',
     3,
@@ -5589,6 +6146,7 @@ values
     'Carrots - Purple, Organic',
     'eu interdum eu tincidunt in leo maecenas pulvinar lobortis est phasellus sit amet erat nulla tempus vivamus in felis',
     12.34,
+    12.34,
     48,
     '2021-06-02 00:00:00',
     5,
@@ -5599,6 +6157,7 @@ values
     'Yogurt - Raspberry, 175 Gr',
     'sodales sed tincidunt eu felis fusce posuere felis sed lacus morbi sem mauris laoreet',
     73.13,
+    73.13,
     32,
     '2021-05-07 00:00:00',
     6,
@@ -5609,6 +6168,7 @@ values
     'Chocolate - Chips Compound',
     'consequat dui nec nisi volutpat eleifend donec ut dolor morbi vel lectus in quam fringilla rhoncus mauris enim',
     91.36,
+    91.36,
     13,
     '2020-11-17 00:00:00',
     4,
@@ -5619,6 +6179,7 @@ values
     'Sponge Cake Mix - Chocolate',
     'aliquet pulvinar sed nisl nunc rhoncus dui vel sem sed sagittis nam congue risus semper porta volutpat quam pede',
     77.66,
+    77.66,
     75,
     '2020-07-28 00:00:00',
     4,
@@ -5629,6 +6190,7 @@ values
     'Flower - Potmums',
     'justo in hac habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla ut erat id',
     62.42,
+    62.42,
     82,
     '2020-09-22 00:00:00',
     5,
@@ -5639,6 +6201,7 @@ values
     'Glass Clear 7 Oz Xl',
     'sed lacus morbi sem mauris laoreet ut rhoncus aliquet pulvinar sed nisl nunc rhoncus',
     97.10,
+    97.10,
     97,
     '2020-11-03 00:00:00',
     4,
@@ -5649,6 +6212,7 @@ values
     'Flour - Strong Pizza',
     'justo morbi ut odio cras mi pede malesuada in imperdiet et commodo',
     2.22,
+    2.22,
     15,
     '2020-08-01 00:00:00',
     6,
@@ -5659,6 +6223,7 @@ values
     'Glass Clear 7 Oz Xl',
     'tellus nulla ut erat id mauris vulputate elementum nullam varius nulla facilisi cras non velit',
     45.75,
+    45.75,
     85,
     '2020-09-28 00:00:00',
     5,
@@ -5669,6 +6234,7 @@ values
     'Taro Leaves',
     'rutrum nulla nunc purus phasellus in felis donec semper sapien a libero',
     56.91,
+    56.91,
     58,
     '2020-12-01 00:00:00',
     3,
@@ -5679,6 +6245,7 @@ values
     'Bread Bowl Plain',
     'eu nibh quisque id justo sit amet sapien dignissim vestibulum vestibulum ante ipsum primis in faucibus orci luctus et',
     11.53,
+    11.53,
     77,
     '2021-04-04 00:00:00',
     5,
@@ -5689,6 +6256,7 @@ values
     'Cheese - Cambozola',
     'nibh fusce lacus purus aliquet at feugiat non pretium quis lectus suspendisse potenti in eleifend',
     52.08,
+    52.08,
     44,
     '2020-07-02 00:00:00',
     6,
@@ -5699,6 +6267,7 @@ values
     'Lettuce - Spring Mix',
     'dignissim vestibulum vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae nulla',
     14.24,
+    14.24,
     50,
     '2020-08-29 00:00:00',
     5,
@@ -5709,6 +6278,7 @@ values
     'Crab - Claws, 26 - 30',
     'congue risus semper porta volutpat quam pede lobortis ligula sit amet eleifend pede libero',
     60.21,
+    60.21,
     78,
     '2021-02-22 00:00:00',
     3,
@@ -5719,6 +6289,7 @@ values
     'Stock - Chicken, White',
     'velit eu est congue elementum in hac habitasse platea dictumst',
     48.55,
+    48.55,
     24,
     '2021-04-15 00:00:00',
     6,
@@ -5729,6 +6300,7 @@ values
     'Latex Rubber Gloves Size 9',
     'proin risus praesent lectus vestibulum quam sapien varius ut blandit non interdum in ante vestibulum ante ipsum',
     1.13,
+    1.13,
     44,
     '2021-01-19 00:00:00',
     3,
@@ -5739,6 +6311,7 @@ values
     'Wine - White Cab Sauv.on',
     'amet turpis elementum ligula vehicula consequat morbi a ipsum integer a nibh in',
     34.66,
+    34.66,
     27,
     '2020-12-06 00:00:00',
     6,
@@ -5749,6 +6322,7 @@ values
     'Cheese - Brie, Cups 125g',
     'nisl aenean lectus pellentesque eget nunc donec quis orci eget orci vehicula condimentum curabitur',
     36.30,
+    36.30,
     32,
     '2020-06-12 00:00:00',
     5,
@@ -5759,6 +6333,7 @@ values
     'Flour - All Purpose',
     'faucibus orci luctus et ultrices posuere cubilia curae mauris viverra diam',
     5.11,
+    5.11,
     41,
     '2021-03-28 00:00:00',
     4,
@@ -5769,6 +6344,7 @@ values
     'Lemon Balm - Fresh',
     'quis orci eget orci vehicula condimentum curabitur in libero ut massa volutpat convallis morbi odio odio',
     24.68,
+    24.68,
     64,
     '2021-04-24 00:00:00',
     3,
@@ -5779,6 +6355,7 @@ values
     'Tomatoes - Roma',
     'congue elementum in hac habitasse platea dictumst morbi vestibulum velit id pretium',
     10.38,
+    10.38,
     89,
     '2020-07-05 00:00:00',
     4,
@@ -5789,6 +6366,7 @@ values
     'Soup - Campbells, Classic Chix',
     'eu sapien cursus vestibulum proin eu mi nulla ac enim in tempor turpis nec euismod scelerisque quam turpis adipiscing lorem',
     24.59,
+    24.59,
     48,
     '2020-12-10 00:00:00',
     5,
@@ -5799,6 +6377,7 @@ values
     'Beer - Upper Canada Light',
     'erat quisque erat eros viverra eget congue eget semper rutrum nulla nunc purus phasellus in felis donec semper',
     98.21,
+    98.21,
     66,
     '2020-10-11 00:00:00',
     4,
@@ -5809,6 +6388,7 @@ values
     'Hersey Shakes',
     'at nulla suspendisse potenti cras in purus eu magna vulputate luctus',
     79.61,
+    79.61,
     74,
     '2020-09-16 00:00:00',
     5,
@@ -5819,6 +6399,7 @@ values
     'Extract - Rum',
     'lobortis ligula sit amet eleifend pede libero quis orci nullam molestie nibh in',
     23.37,
+    23.37,
     62,
     '2021-03-02 00:00:00',
     3,
@@ -5829,6 +6410,7 @@ values
     'Yams',
     'elit ac nulla sed vel enim sit amet nunc viverra dapibus nulla suscipit ligula in lacus curabitur at ipsum',
     12.88,
+    12.88,
     40,
     '2020-10-05 00:00:00',
     4,
@@ -5839,6 +6421,7 @@ values
     'Water - Spring 1.5lit',
     'vestibulum sit amet cursus id turpis integer aliquet massa id lobortis convallis tortor risus dapibus augue vel accumsan',
     99.96,
+    99.96,
     49,
     '2021-03-18 00:00:00',
     4,
@@ -5849,6 +6432,7 @@ values
     'Skirt - 24 Foot',
     'eget elit sodales scelerisque mauris sit amet eros suspendisse accumsan tortor quis turpis sed ante vivamus tortor duis',
     92.67,
+    92.67,
     7,
     '2021-03-20 00:00:00',
     5,
@@ -5859,6 +6443,7 @@ values
     'Flour Dark Rye',
     'nibh quisque id justo sit amet sapien dignissim vestibulum vestibulum ante ipsum primis in',
     52.70,
+    52.70,
     69,
     '2020-08-17 00:00:00',
     6,
@@ -5869,6 +6454,7 @@ values
     'Coffee - Almond Amaretto',
     'lacinia nisi venenatis tristique fusce congue diam id ornare imperdiet sapien urna',
     97.09,
+    97.09,
     82,
     '2020-09-17 00:00:00',
     4,
@@ -5879,6 +6465,7 @@ values
     'Bread - Rolls, Rye',
     'erat nulla tempus vivamus in felis eu sapien cursus vestibulum proin eu mi',
     80.76,
+    80.76,
     76,
     '2021-02-01 00:00:00',
     4,
@@ -5889,6 +6476,7 @@ values
     'Salmon - Fillets',
     'euismod scelerisque quam turpis adipiscing lorem vitae mattis nibh ligula nec sem duis aliquam convallis nunc proin at turpis',
     68.90,
+    68.90,
     8,
     '2021-03-12 00:00:00',
     3,
@@ -5899,6 +6487,7 @@ values
     'Cheese - Brick With Onion',
     'nulla suscipit ligula in lacus curabitur at ipsum ac tellus semper interdum mauris ullamcorper purus sit amet nulla',
     52.21,
+    52.21,
     63,
     '2020-07-31 00:00:00',
     6,
@@ -5909,6 +6498,7 @@ values
     'Tray - 16in Rnd Blk',
     'libero ut massa volutpat convallis morbi odio odio elementum eu interdum eu tincidunt in leo maecenas pulvinar lobortis',
     32.03,
+    32.03,
     89,
     '2021-04-15 00:00:00',
     5,
@@ -5919,6 +6509,7 @@ values
     'Pike - Frozen Fillet',
     'consequat nulla nisl nunc nisl duis bibendum felis sed interdum venenatis turpis enim blandit mi in porttitor pede',
     6.97,
+    6.97,
     5,
     '2021-01-12 00:00:00',
     3,
@@ -5929,6 +6520,7 @@ values
     'Kirsch - Schloss',
     'dui vel nisl duis ac nibh fusce lacus purus aliquet at feugiat',
     42.90,
+    42.90,
     44,
     '2021-03-09 00:00:00',
     6,
@@ -5939,6 +6531,7 @@ values
     'Ham - Procutinni',
     'ante nulla justo aliquam quis turpis eget elit sodales scelerisque mauris sit amet eros suspendisse accumsan tortor',
     41.48,
+    41.48,
     56,
     '2020-08-29 00:00:00',
     5,
@@ -5949,6 +6542,7 @@ values
     'Lettuce - Curly Endive',
     'lacus curabitur at ipsum ac tellus semper interdum mauris ullamcorper purus sit',
     2.38,
+    2.38,
     74,
     '2020-10-14 00:00:00',
     4,
@@ -5959,6 +6553,7 @@ values
     'Black Currants',
     'morbi non quam nec dui luctus rutrum nulla tellus in sagittis dui vel nisl duis ac nibh fusce lacus purus',
     17.39,
+    17.39,
     52,
     '2021-05-24 00:00:00',
     6,
@@ -5969,6 +6564,7 @@ values
     'Doilies - 5, Paper',
     'vestibulum rutrum rutrum neque aenean auctor gravida sem praesent id massa id nisl venenatis lacinia aenean sit amet justo morbi',
     1.06,
+    1.06,
     86,
     '2020-07-15 00:00:00',
     6,
@@ -5979,6 +6575,7 @@ values
     'Gelatine Powder',
     'congue elementum in hac habitasse platea dictumst morbi vestibulum velit id pretium iaculis diam erat',
     60.24,
+    60.24,
     100,
     '2020-08-11 00:00:00',
     6,
@@ -5989,6 +6586,7 @@ values
     'Noodles - Steamed Chow Mein',
     'venenatis tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed',
     10.56,
+    10.56,
     49,
     '2021-03-02 00:00:00',
     5,
@@ -5999,6 +6597,7 @@ values
     'Yogurt - Raspberry, 175 Gr',
     'mi integer ac neque duis bibendum morbi non quam nec dui luctus rutrum nulla tellus in sagittis dui vel',
     9.79,
+    9.79,
     35,
     '2020-09-23 00:00:00',
     4,
@@ -6009,6 +6608,7 @@ values
     'Tarts Assorted',
     'neque vestibulum eget vulputate ut ultrices vel augue vestibulum ante ipsum primis in faucibus orci luctus',
     84.04,
+    84.04,
     27,
     '2020-09-04 00:00:00',
     4,
@@ -6019,6 +6619,7 @@ values
     'Icecream - Dstk Super Cone',
     'pede lobortis ligula sit amet eleifend pede libero quis orci',
     50.84,
+    50.84,
     96,
     '2020-11-30 00:00:00',
     3,
@@ -6029,6 +6630,7 @@ values
     'Wine - Rhine Riesling Wolf Blass',
     'ultrices mattis odio donec vitae nisi nam ultrices libero non mattis pulvinar nulla pede ullamcorper augue',
     11.87,
+    11.87,
     17,
     '2021-04-27 00:00:00',
     3,
@@ -6039,6 +6641,7 @@ values
     'Beans - Fine',
     'sit amet eleifend pede libero quis orci nullam molestie nibh in lectus pellentesque at nulla',
     54.25,
+    54.25,
     84,
     '2021-01-09 00:00:00',
     4,
@@ -6049,6 +6652,7 @@ values
     'Wine - Cousino Macul Antiguas',
     'purus sit amet nulla quisque arcu libero rutrum ac lobortis vel dapibus',
     33.22,
+    33.22,
     48,
     '2020-12-12 00:00:00',
     4,
@@ -6059,6 +6663,7 @@ values
     'Appetizer - Sausage Rolls',
     'luctus et ultrices posuere cubilia curae mauris viverra diam vitae',
     91.63,
+    91.63,
     13,
     '2020-06-18 00:00:00',
     6,
@@ -6069,6 +6674,7 @@ values
     'Russian Prince',
     'donec posuere metus vitae ipsum aliquam non mauris morbi non lectus aliquam sit amet diam',
     72.46,
+    72.46,
     49,
     '2020-08-25 00:00:00',
     6,
@@ -6079,6 +6685,7 @@ values
     'Cabbage - Nappa',
     'quisque ut erat curabitur gravida nisi at nibh in hac habitasse platea dictumst aliquam augue quam sollicitudin vitae',
     74.35,
+    74.35,
     2,
     '2021-04-13 00:00:00',
     4,
@@ -6089,6 +6696,7 @@ values
     'Syrup - Monin - Passion Fruit',
     'quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum id luctus nec',
     14.17,
+    14.17,
     55,
     '2020-06-10 00:00:00',
     4,
@@ -6099,6 +6707,7 @@ values
     'Jack Daniels',
     'vestibulum vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae nulla',
     63.09,
+    63.09,
     30,
     '2020-10-25 00:00:00',
     4,
@@ -6109,6 +6718,7 @@ values
     'Beef - Ground, Extra Lean, Fresh',
     'mauris non ligula pellentesque ultrices phasellus id sapien in sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at',
     88.73,
+    88.73,
     35,
     '2021-04-12 00:00:00',
     6,
@@ -6119,6 +6729,7 @@ values
     'Icecream - Dstk Cml And Fdg',
     'ut suscipit a feugiat et eros vestibulum ac est lacinia nisi venenatis tristique fusce congue diam id ornare imperdiet sapien',
     78.11,
+    78.11,
     81,
     '2020-11-13 00:00:00',
     3,
@@ -6129,6 +6740,7 @@ values
     'Beer - Muskoka Cream Ale',
     'diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat',
     95.62,
+    95.62,
     10,
     '2021-02-15 00:00:00',
     5,
@@ -6139,6 +6751,7 @@ values
     'Wine - Acient Coast Caberne',
     'massa id lobortis convallis tortor risus dapibus augue vel accumsan tellus nisi eu orci mauris lacinia',
     86.89,
+    86.89,
     7,
     '2020-10-04 00:00:00',
     6,
@@ -6149,6 +6762,7 @@ values
     'Shrimp - Baby, Warm Water',
     'nulla nisl nunc nisl duis bibendum felis sed interdum venenatis turpis enim blandit mi',
     37.16,
+    37.16,
     33,
     '2020-07-26 00:00:00',
     5,
@@ -6159,6 +6773,7 @@ values
     'Quiche Assorted',
     'sed augue aliquam erat volutpat in congue etiam justo etiam pretium iaculis justo in hac',
     25.19,
+    25.19,
     57,
     '2021-05-03 00:00:00',
     6,
@@ -6169,6 +6784,7 @@ values
     'Appetizer - Sausage Rolls',
     'rhoncus sed vestibulum sit amet cursus id turpis integer aliquet massa id lobortis convallis tortor risus dapibus augue vel accumsan',
     93.60,
+    93.60,
     94,
     '2021-04-02 00:00:00',
     4,
@@ -6179,6 +6795,7 @@ values
     'Ecolab - Ster Bac',
     'donec semper sapien a libero nam dui proin leo odio porttitor id consequat',
     93.16,
+    93.16,
     79,
     '2020-12-05 00:00:00',
     6,
@@ -6189,6 +6806,7 @@ values
     'Olives - Black, Pitted',
     'ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae nulla dapibus dolor vel est',
     67.08,
+    67.08,
     76,
     '2021-06-04 00:00:00',
     3,
@@ -6199,6 +6817,7 @@ values
     'Napkin - Beverge, White 2 - Ply',
     'non ligula pellentesque ultrices phasellus id sapien in sapien iaculis congue vivamus metus arcu',
     73.73,
+    73.73,
     36,
     '2020-11-27 00:00:00',
     4,
@@ -6209,6 +6828,7 @@ values
     'Wine - Charddonnay Errazuriz',
     'faucibus orci luctus et ultrices posuere cubilia curae mauris viverra diam vitae quam suspendisse potenti nullam',
     16.29,
+    16.29,
     33,
     '2020-09-02 00:00:00',
     5,
@@ -6219,6 +6839,7 @@ values
     'Oil - Safflower',
     'orci luctus et ultrices posuere cubilia curae nulla dapibus dolor vel',
     7.67,
+    7.67,
     95,
     '2021-06-08 00:00:00',
     4,
@@ -6229,6 +6850,7 @@ values
     'Bread - Dark Rye',
     'pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat',
     65.31,
+    65.31,
     77,
     '2021-05-31 00:00:00',
     6,
@@ -6239,6 +6861,7 @@ values
     'Ginger - Ground',
     'ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae',
     71.12,
+    71.12,
     14,
     '2020-07-12 00:00:00',
     3,
@@ -6249,6 +6872,7 @@ values
     'Cucumber - English',
     'cubilia curae nulla dapibus dolor vel est donec odio justo sollicitudin ut suscipit a feugiat et',
     82.68,
+    82.68,
     68,
     '2021-01-19 00:00:00',
     5,
@@ -6259,6 +6883,7 @@ values
     'Sterno - Chafing Dish Fuel',
     'mauris eget massa tempor convallis nulla neque libero convallis eget eleifend luctus',
     52.77,
+    52.77,
     48,
     '2021-01-20 00:00:00',
     4,
@@ -6269,6 +6894,7 @@ values
     'Soup - Knorr, Chicken Noodle',
     'ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae nulla dapibus dolor vel est donec',
     50.07,
+    50.07,
     30,
     '2021-04-23 00:00:00',
     3,
@@ -6279,6 +6905,7 @@ values
     'Rum - Light, Captain Morgan',
     'tellus in sagittis dui vel nisl duis ac nibh fusce lacus purus aliquet at feugiat non',
     90.20,
+    90.20,
     52,
     '2020-11-17 00:00:00',
     5,
@@ -6289,6 +6916,7 @@ values
     'Wine - Zinfandel California 2002',
     'hac habitasse platea dictumst morbi vestibulum velit id pretium iaculis diam erat fermentum justo nec condimentum',
     55.71,
+    55.71,
     38,
     '2020-07-04 00:00:00',
     4,
@@ -6299,6 +6927,7 @@ values
     'Pasta - Linguini, Dry',
     'ac consequat metus sapien ut nunc vestibulum ante ipsum primis in faucibus',
     78.66,
+    78.66,
     35,
     '2020-09-30 00:00:00',
     4,
@@ -6309,6 +6938,7 @@ values
     'Juice Peach Nectar',
     'elementum pellentesque quisque porta volutpat erat quisque erat eros viverra eget congue eget semper',
     25.05,
+    25.05,
     66,
     '2020-06-21 00:00:00',
     3,
@@ -6319,6 +6949,7 @@ values
     'Beef - Roasted, Cooked',
     'eros elementum pellentesque quisque porta volutpat erat quisque erat eros viverra eget congue eget semper',
     81.59,
+    81.59,
     13,
     '2021-02-13 00:00:00',
     4,
@@ -6329,6 +6960,7 @@ values
     'Icecream Cone - Areo Chocolate',
     'vitae ipsum aliquam non mauris morbi non lectus aliquam sit amet diam in magna bibendum imperdiet nullam',
     82.33,
+    82.33,
     89,
     '2020-09-14 00:00:00',
     5,
@@ -6339,6 +6971,7 @@ values
     'Wine - Maipo Valle Cabernet',
     'eget nunc donec quis orci eget orci vehicula condimentum curabitur',
     16.52,
+    16.52,
     92,
     '2020-06-14 00:00:00',
     3,
@@ -6349,6 +6982,7 @@ values
     'Lamb Rack Frenched Australian',
     'et ultrices posuere cubilia curae duis faucibus accumsan odio curabitur convallis duis consequat',
     95.50,
+    95.50,
     12,
     '2021-01-07 00:00:00',
     4,
@@ -6359,6 +6993,7 @@ values
     'Wine - Spumante Bambino White',
     'praesent blandit lacinia erat vestibulum sed magna at nunc commodo placerat',
     99.09,
+    99.09,
     30,
     '2021-02-06 00:00:00',
     5,
@@ -6369,6 +7004,7 @@ values
     'Sauce - White, Mix',
     'ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae duis faucibus accumsan odio curabitur convallis duis consequat dui',
     90.02,
+    90.02,
     54,
     '2021-05-22 00:00:00',
     3,
@@ -6379,6 +7015,7 @@ values
     'Calypso - Black Cherry Lemonade',
     'nullam orci pede venenatis non sodales sed tincidunt eu felis fusce',
     28.12,
+    28.12,
     42,
     '2021-01-12 00:00:00',
     5,
@@ -6389,6 +7026,7 @@ values
     'Flour - Strong Pizza',
     'rhoncus sed vestibulum sit amet cursus id turpis integer aliquet massa id lobortis convallis tortor',
     10.05,
+    10.05,
     85,
     '2021-04-15 00:00:00',
     6,
@@ -6399,6 +7037,7 @@ values
     'Ecolab - Hand Soap Form Antibac',
     'nisl venenatis lacinia aenean sit amet justo morbi ut odio cras mi pede malesuada in imperdiet et',
     89.15,
+    89.15,
     74,
     '2021-05-31 00:00:00',
     4,
@@ -6409,6 +7048,7 @@ values
     'Nori Sea Weed',
     'imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat in congue etiam justo etiam',
     82.66,
+    82.66,
     91,
     '2021-03-05 00:00:00',
     6,
@@ -6419,6 +7059,7 @@ values
     'Bread - Calabrese Baguette',
     'ac nulla sed vel enim sit amet nunc viverra dapibus nulla suscipit ligula in lacus curabitur at ipsum ac',
     25.38,
+    25.38,
     43,
     '2020-10-03 00:00:00',
     5,
@@ -6429,6 +7070,7 @@ values
     'Tea - Earl Grey',
     'nibh ligula nec sem duis aliquam convallis nunc proin at turpis a pede posuere',
     95.08,
+    95.08,
     31,
     '2020-09-13 00:00:00',
     3,
@@ -6439,6 +7081,7 @@ values
     'Capicola - Hot',
     'ac est lacinia nisi venenatis tristique fusce congue diam id',
     90.60,
+    90.60,
     55,
     '2020-06-27 00:00:00',
     3,
@@ -6449,6 +7092,7 @@ values
     'Chinese Foods - Chicken',
     'sapien a libero nam dui proin leo odio porttitor id consequat in consequat ut nulla sed accumsan felis ut',
     4.77,
+    4.77,
     76,
     '2020-12-19 00:00:00',
     6,
@@ -6459,6 +7103,7 @@ values
     'Bread - French Stick',
     'convallis morbi odio odio elementum eu interdum eu tincidunt in leo maecenas pulvinar lobortis est phasellus',
     94.19,
+    94.19,
     21,
     '2021-04-02 00:00:00',
     5,
@@ -6469,6 +7114,7 @@ values
     'Sprouts - Onion',
     'nunc proin at turpis a pede posuere nonummy integer non velit donec diam neque vestibulum eget',
     80.48,
+    80.48,
     64,
     '2020-07-06 00:00:00',
     5,
@@ -6479,6 +7125,7 @@ values
     'Pastry - French Mini Assorted',
     'lacus at velit vivamus vel nulla eget eros elementum pellentesque quisque porta volutpat',
     53.14,
+    53.14,
     42,
     '2020-10-31 00:00:00',
     6,
@@ -6489,6 +7136,7 @@ values
     'Star Anise, Whole',
     'luctus et ultrices posuere cubilia curae duis faucibus accumsan odio curabitur',
     23.01,
+    23.01,
     78,
     '2020-06-13 00:00:00',
     5,
@@ -6499,6 +7147,7 @@ values
     '7up Diet, 355 Ml',
     'tincidunt eget tempus vel pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est',
     79.07,
+    79.07,
     82,
     '2020-07-16 00:00:00',
     5,
@@ -6509,6 +7158,7 @@ values
     'Rabbit - Saddles',
     'cubilia curae donec pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis sapien sapien non',
     93.25,
+    93.25,
     69,
     '2021-02-08 00:00:00',
     4,
@@ -6519,6 +7169,7 @@ values
     'Sour Puss - Tangerine',
     'cursus id turpis integer aliquet massa id lobortis convallis tortor risus dapibus augue vel accumsan tellus nisi eu orci mauris',
     40.35,
+    40.35,
     89,
     '2021-01-11 00:00:00',
     6,
@@ -6529,6 +7180,7 @@ values
     'Potato - Sweet',
     'et ultrices posuere cubilia curae nulla dapibus dolor vel est donec odio justo sollicitudin',
     85.45,
+    85.45,
     82,
     '2021-02-12 00:00:00',
     4,
@@ -6539,6 +7191,7 @@ values
     'Nantucket - Kiwi Berry Cktl.',
     'morbi ut odio cras mi pede malesuada in imperdiet et commodo vulputate justo in blandit ultrices',
     59.74,
+    59.74,
     98,
     '2020-09-07 00:00:00',
     6,
@@ -6549,6 +7202,7 @@ values
     'Wine - Ej Gallo Sierra Valley',
     'nulla suspendisse potenti cras in purus eu magna vulputate luctus cum sociis natoque penatibus et magnis',
     28.12,
+    28.12,
     21,
     '2021-02-16 00:00:00',
     5,
@@ -6559,6 +7213,7 @@ values
     'Onions - Red Pearl',
     'semper rutrum nulla nunc purus phasellus in felis donec semper sapien',
     2.23,
+    2.23,
     93,
     '2021-05-01 00:00:00',
     5,
@@ -6569,6 +7224,7 @@ values
     'Soy Protein',
     'in hac habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla ut erat id mauris vulputate elementum nullam',
     94.42,
+    94.42,
     14,
     '2020-08-07 00:00:00',
     4,
@@ -6579,6 +7235,7 @@ values
     'Sauce - Marinara',
     'enim sit amet nunc viverra dapibus nulla suscipit ligula in lacus curabitur',
     5.62,
+    5.62,
     14,
     '2020-11-06 00:00:00',
     4,
@@ -6589,6 +7246,7 @@ values
     'Salt - Sea',
     'justo morbi ut odio cras mi pede malesuada in imperdiet',
     25.91,
+    25.91,
     95,
     '2020-11-25 00:00:00',
     3,
@@ -6599,6 +7257,7 @@ values
     'Wine - Jafflin Bourgongone',
     'erat curabitur gravida nisi at nibh in hac habitasse platea dictumst aliquam augue quam sollicitudin vitae consectetuer eget',
     91.01,
+    91.01,
     21,
     '2020-10-09 00:00:00',
     4,
@@ -6609,6 +7268,7 @@ values
     'Hot Choc Vending',
     'sit amet nulla quisque arcu libero rutrum ac lobortis vel dapibus at diam nam',
     52.05,
+    52.05,
     76,
     '2020-09-06 00:00:00',
     4,
@@ -6619,6 +7279,7 @@ values
     'Amaretto',
     'tempor convallis nulla neque libero convallis eget eleifend luctus ultricies eu nibh quisque id',
     96.34,
+    96.34,
     57,
     '2020-06-19 00:00:00',
     4,
@@ -6629,6 +7290,7 @@ values
     'Garlic - Primerba, Paste',
     'pede justo eu massa donec dapibus duis at velit eu est congue elementum in hac habitasse platea dictumst morbi',
     16.36,
+    16.36,
     31,
     '2020-09-19 00:00:00',
     4,
@@ -6639,6 +7301,7 @@ values
     'Ecolab Silver Fusion',
     'eu interdum eu tincidunt in leo maecenas pulvinar lobortis est phasellus sit amet erat nulla',
     88.79,
+    88.79,
     83,
     '2020-08-01 00:00:00',
     3,
@@ -6649,6 +7312,7 @@ values
     'Raisin - Golden',
     'nisl ut volutpat sapien arcu sed augue aliquam erat volutpat in congue etiam',
     58.76,
+    58.76,
     97,
     '2020-08-25 00:00:00',
     5,
@@ -6659,6 +7323,7 @@ values
     'Lettuce - Sea / Sea Asparagus',
     'orci luctus et ultrices posuere cubilia curae duis faucibus accumsan odio curabitur convallis duis consequat dui nec',
     41.73,
+    41.73,
     8,
     '2020-09-12 00:00:00',
     5,
@@ -6669,6 +7334,7 @@ values
     'Wine - Red, Gamay Noir',
     'tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat',
     6.72,
+    6.72,
     23,
     '2020-06-18 00:00:00',
     3,
@@ -6679,6 +7345,7 @@ values
     'Coffee - Decafenated',
     'sed vel enim sit amet nunc viverra dapibus nulla suscipit ligula',
     21.93,
+    21.93,
     74,
     '2020-07-09 00:00:00',
     5,
@@ -6689,6 +7356,7 @@ values
     'Mix - Cocktail Strawberry Daiquiri',
     'pellentesque eget nunc donec quis orci eget orci vehicula condimentum curabitur in libero ut massa volutpat convallis',
     52.74,
+    52.74,
     53,
     '2021-06-08 00:00:00',
     6,
@@ -6699,6 +7367,7 @@ values
     'Carbonated Water - Strawberry',
     'cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam vel augue vestibulum rutrum rutrum neque',
     40.86,
+    40.86,
     44,
     '2021-05-27 00:00:00',
     3,
@@ -6709,6 +7378,7 @@ values
     'Pepper - Red Bell',
     'turpis donec posuere metus vitae ipsum aliquam non mauris morbi non lectus aliquam sit amet',
     25.64,
+    25.64,
     41,
     '2020-07-12 00:00:00',
     6,
@@ -6719,6 +7389,7 @@ values
     'Ham - Black Forest',
     'et eros vestibulum ac est lacinia nisi venenatis tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl ut',
     87.40,
+    87.40,
     56,
     '2021-05-19 00:00:00',
     3,
@@ -6729,6 +7400,7 @@ values
     'Cakes Assorted',
     'et tempus semper est quam pharetra magna ac consequat metus sapien ut nunc vestibulum ante ipsum primis',
     31.81,
+    31.81,
     79,
     '2020-08-03 00:00:00',
     5,
@@ -6739,6 +7411,7 @@ values
     'Wine - Domaine Boyar Royal',
     'congue etiam justo etiam pretium iaculis justo in hac habitasse platea dictumst etiam',
     25.10,
+    25.10,
     31,
     '2021-05-23 00:00:00',
     3,
@@ -6749,6 +7422,7 @@ values
     'Cheese - Brie,danish',
     'elementum pellentesque quisque porta volutpat erat quisque erat eros viverra eget congue eget semper',
     91.06,
+    91.06,
     42,
     '2020-12-13 00:00:00',
     6,
@@ -6759,6 +7433,7 @@ values
     'Bread - Kimel Stick Poly',
     'in congue etiam justo etiam pretium iaculis justo in hac habitasse platea dictumst etiam faucibus cursus',
     79.45,
+    79.45,
     60,
     '2021-02-09 00:00:00',
     6,
@@ -6769,6 +7444,7 @@ values
     'Tomato - Green',
     'integer tincidunt ante vel ipsum praesent blandit lacinia erat vestibulum sed magna at nunc commodo placerat',
     38.98,
+    38.98,
     18,
     '2020-10-01 00:00:00',
     4,
@@ -6779,6 +7455,7 @@ values
     'Extract - Lemon',
     'suspendisse potenti in eleifend quam a odio in hac habitasse',
     78.16,
+    78.16,
     5,
     '2021-05-04 00:00:00',
     6,
@@ -6789,6 +7466,7 @@ values
     'Tea - Orange Pekoe',
     'id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat',
     13.80,
+    13.80,
     5,
     '2021-04-09 00:00:00',
     6,
@@ -6799,6 +7477,7 @@ values
     'Langers - Mango Nectar',
     'mauris eget massa tempor convallis nulla neque libero convallis eget eleifend luctus ultricies eu nibh quisque id justo sit amet',
     75.50,
+    75.50,
     24,
     '2020-12-08 00:00:00',
     6,
@@ -6809,6 +7488,7 @@ values
     'Apple - Delicious, Red',
     'primis in faucibus orci luctus et ultrices posuere cubilia curae duis faucibus accumsan odio curabitur convallis duis',
     74.54,
+    74.54,
     58,
     '2020-06-20 00:00:00',
     6,
@@ -6819,6 +7499,7 @@ values
     'Cleaner - Bleach',
     'duis at velit eu est congue elementum in hac habitasse platea dictumst morbi vestibulum velit id pretium iaculis diam',
     59.18,
+    59.18,
     88,
     '2021-04-28 00:00:00',
     5,
@@ -6829,6 +7510,7 @@ values
     'Spinach - Packaged',
     'tellus semper interdum mauris ullamcorper purus sit amet nulla quisque arcu libero rutrum ac lobortis vel dapibus',
     24.33,
+    24.33,
     13,
     '2021-06-06 00:00:00',
     3,
@@ -6839,6 +7521,7 @@ values
     'Bacardi Breezer - Strawberry',
     'in hac habitasse platea dictumst maecenas ut massa quis augue luctus tincidunt nulla mollis molestie',
     37.22,
+    37.22,
     97,
     '2021-05-29 00:00:00',
     6,
@@ -6849,6 +7532,7 @@ values
     'Sobe - Green Tea',
     'dui luctus rutrum nulla tellus in sagittis dui vel nisl duis ac nibh fusce',
     52.08,
+    52.08,
     13,
     '2020-08-29 00:00:00',
     5,
@@ -6859,6 +7543,7 @@ values
     'Butter - Salted, Micro',
     'convallis tortor risus dapibus augue vel accumsan tellus nisi eu orci mauris lacinia',
     14.83,
+    14.83,
     68,
     '2021-05-04 00:00:00',
     6,
@@ -6869,6 +7554,7 @@ values
     'Spic And Span All Purpose',
     'et ultrices posuere cubilia curae mauris viverra diam vitae quam suspendisse potenti nullam porttitor',
     5.57,
+    5.57,
     77,
     '2021-01-19 00:00:00',
     5,
@@ -6879,6 +7565,7 @@ values
     'Milkettes - 2%',
     'vel augue vestibulum rutrum rutrum neque aenean auctor gravida sem praesent id massa id nisl',
     11.77,
+    11.77,
     32,
     '2021-06-06 00:00:00',
     6,
@@ -6889,6 +7576,7 @@ values
     'Quail Eggs - Canned',
     'donec pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis sapien sapien non mi integer ac neque',
     72.23,
+    72.23,
     82,
     '2020-12-07 00:00:00',
     6,
@@ -6899,6 +7587,7 @@ values
     'Soap - Pine Sol Floor Cleaner',
     'quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices',
     97.73,
+    97.73,
     0,
     '2021-04-12 00:00:00',
     4,
@@ -6909,6 +7598,7 @@ values
     'Pail - 15l White, With Handle',
     'praesent lectus vestibulum quam sapien varius ut blandit non interdum in',
     73.84,
+    73.84,
     49,
     '2020-08-17 00:00:00',
     3,
@@ -6919,6 +7609,7 @@ values
     'Flounder - Fresh',
     'ligula nec sem duis aliquam convallis nunc proin at turpis a pede posuere nonummy integer non velit donec diam',
     47.02,
+    47.02,
     23,
     '2020-11-28 00:00:00',
     4,
@@ -6929,6 +7620,7 @@ values
     'Vol Au Vents',
     'congue eget semper rutrum nulla nunc purus phasellus in felis donec semper sapien a',
     25.05,
+    25.05,
     52,
     '2020-06-11 00:00:00',
     3,
@@ -6939,6 +7631,7 @@ values
     'Tea - Honey Green Tea',
     'nascetur ridiculus mus vivamus vestibulum sagittis sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus',
     9.78,
+    9.78,
     93,
     '2021-03-28 00:00:00',
     3,
@@ -6949,6 +7642,7 @@ values
     'Nectarines',
     'velit vivamus vel nulla eget eros elementum pellentesque quisque porta volutpat',
     53.85,
+    53.85,
     11,
     '2021-05-23 00:00:00',
     6,
@@ -6959,6 +7653,7 @@ values
     'Bagels Poppyseed',
     'id luctus nec molestie sed justo pellentesque viverra pede ac diam cras pellentesque volutpat dui maecenas tristique est et',
     77.76,
+    77.76,
     52,
     '2020-07-28 00:00:00',
     5,
@@ -6969,6 +7664,7 @@ values
     'Table Cloth 53x69 White',
     'habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla',
     92.17,
+    92.17,
     67,
     '2021-01-03 00:00:00',
     3,
@@ -6979,6 +7675,7 @@ values
     'Wine - Balbach Riverside',
     'purus phasellus in felis donec semper sapien a libero nam dui proin',
     45.95,
+    45.95,
     47,
     '2020-10-24 00:00:00',
     4,
@@ -6989,6 +7686,7 @@ values
     'Bread Country Roll',
     'nulla elit ac nulla sed vel enim sit amet nunc viverra dapibus nulla suscipit ligula',
     48.85,
+    48.85,
     46,
     '2020-07-07 00:00:00',
     3,
@@ -6999,6 +7697,7 @@ values
     'Wine - Tio Pepe Sherry Fino',
     'odio curabitur convallis duis consequat dui nec nisi volutpat eleifend donec ut dolor morbi vel lectus in quam',
     58.48,
+    58.48,
     75,
     '2020-11-02 00:00:00',
     5,
@@ -7009,6 +7708,7 @@ values
     'Curry Paste - Madras',
     'nisi venenatis tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed',
     50.49,
+    50.49,
     14,
     '2020-07-15 00:00:00',
     6,
@@ -7019,6 +7719,7 @@ values
     'Lime Cordial - Roses',
     'ligula in lacus curabitur at ipsum ac tellus semper interdum mauris ullamcorper purus sit',
     4.09,
+    4.09,
     98,
     '2020-07-20 00:00:00',
     5,
@@ -7029,6 +7730,7 @@ values
     'Fish - Halibut, Cold Smoked',
     'congue diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed',
     4.66,
+    4.66,
     44,
     '2020-11-18 00:00:00',
     4,
@@ -7039,6 +7741,7 @@ values
     'Veal - Ground',
     'ut nunc vestibulum ante ipsum primis in faucibus orci luctus et',
     61.72,
+    61.72,
     36,
     '2020-09-10 00:00:00',
     5,
@@ -7049,6 +7752,7 @@ values
     'Marsala - Sperone, Fine, D.o.c.',
     'viverra diam vitae quam suspendisse potenti nullam porttitor lacus at turpis donec posuere metus vitae',
     75.52,
+    75.52,
     94,
     '2020-11-26 00:00:00',
     3,
@@ -7059,6 +7763,7 @@ values
     'Tabasco Sauce, 2 Oz',
     'praesent blandit nam nulla integer pede justo lacinia eget tincidunt eget',
     47.85,
+    47.85,
     76,
     '2020-12-17 00:00:00',
     3,
@@ -7069,6 +7774,7 @@ values
     'Uniform Linen Charge',
     'rhoncus sed vestibulum sit amet cursus id turpis integer aliquet massa id lobortis convallis tortor risus dapibus augue',
     53.02,
+    53.02,
     4,
     '2020-09-14 00:00:00',
     5,
@@ -7079,6 +7785,7 @@ values
     'Soup - Campbells Beef Noodle',
     'pellentesque ultrices mattis odio donec vitae nisi nam ultrices libero non mattis pulvinar nulla',
     28.68,
+    28.68,
     41,
     '2020-08-26 00:00:00',
     4,
@@ -7089,6 +7796,7 @@ values
     'Salmon - Atlantic, No Skin',
     'metus arcu adipiscing molestie hendrerit at vulputate vitae nisl aenean',
     23.02,
+    23.02,
     44,
     '2020-11-26 00:00:00',
     3,
@@ -7099,6 +7807,7 @@ values
     'Rice - Jasmine Sented',
     'dictumst maecenas ut massa quis augue luctus tincidunt nulla mollis molestie lorem quisque ut erat curabitur gravida nisi at nibh',
     5.20,
+    5.20,
     58,
     '2020-09-15 00:00:00',
     6,
@@ -7109,6 +7818,7 @@ values
     'Wine La Vielle Ferme Cote Du',
     'rhoncus mauris enim leo rhoncus sed vestibulum sit amet cursus id turpis integer aliquet massa',
     23.11,
+    23.11,
     28,
     '2020-11-02 00:00:00',
     6,
@@ -7119,6 +7829,7 @@ values
     'Juice - Apple, 341 Ml',
     'risus dapibus augue vel accumsan tellus nisi eu orci mauris lacinia sapien quis',
     73.52,
+    73.52,
     35,
     '2020-07-18 00:00:00',
     4,
@@ -7129,6 +7840,7 @@ values
     'Lemon Balm - Fresh',
     'pulvinar nulla pede ullamcorper augue a suscipit nulla elit ac nulla sed vel enim sit amet nunc viverra dapibus',
     66.85,
+    66.85,
     68,
     '2020-09-04 00:00:00',
     6,
@@ -7139,6 +7851,7 @@ values
     'Garlic - Primerba, Paste',
     'sed ante vivamus tortor duis mattis egestas metus aenean fermentum donec',
     22.25,
+    22.25,
     89,
     '2020-07-08 00:00:00',
     5,
@@ -7149,6 +7862,7 @@ values
     'Chocolate - Milk, Callets',
     'sagittis sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam vel',
     15.33,
+    15.33,
     75,
     '2020-07-17 00:00:00',
     6,
@@ -7159,6 +7873,7 @@ values
     'Dill Weed - Dry',
     'faucibus orci luctus et ultrices posuere cubilia curae mauris viverra diam vitae',
     32.07,
+    32.07,
     72,
     '2021-01-26 00:00:00',
     3,
@@ -7169,6 +7884,7 @@ values
     'Beef - Montreal Smoked Brisket',
     'elit proin interdum mauris non ligula pellentesque ultrices phasellus id sapien in sapien iaculis congue vivamus metus arcu adipiscing',
     68.72,
+    68.72,
     7,
     '2020-11-05 00:00:00',
     5,
@@ -7179,6 +7895,7 @@ values
     'Vaccum Bag - 14x20',
     'erat quisque erat eros viverra eget congue eget semper rutrum nulla nunc purus phasellus',
     41.39,
+    41.39,
     17,
     '2021-04-13 00:00:00',
     6,
@@ -7189,6 +7906,7 @@ values
     'Soap - Mr.clean Floor Soap',
     'lectus vestibulum quam sapien varius ut blandit non interdum in ante vestibulum ante ipsum',
     98.67,
+    98.67,
     4,
     '2020-07-29 00:00:00',
     6,
@@ -7199,6 +7917,7 @@ values
     'Sauce - Apple, Unsweetened',
     'mauris vulputate elementum nullam varius nulla facilisi cras non velit',
     35.30,
+    35.30,
     12,
     '2020-12-27 00:00:00',
     4,
@@ -7209,6 +7928,7 @@ values
     'Crush - Grape, 355 Ml',
     'nulla sed vel enim sit amet nunc viverra dapibus nulla suscipit ligula in lacus curabitur at ipsum ac',
     2.04,
+    2.04,
     49,
     '2020-12-14 00:00:00',
     4,
@@ -7219,6 +7939,7 @@ values
     'Cornstarch',
     'vestibulum eget vulputate ut ultrices vel augue vestibulum ante ipsum',
     58.32,
+    58.32,
     4,
     '2020-08-26 00:00:00',
     3,
@@ -7229,6 +7950,7 @@ values
     'Dip - Tapenade',
     'platea dictumst aliquam augue quam sollicitudin vitae consectetuer eget rutrum at',
     81.86,
+    81.86,
     91,
     '2021-02-22 00:00:00',
     6,
@@ -7239,6 +7961,7 @@ values
     'Chicken - Livers',
     'in ante vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae duis faucibus',
     19.45,
+    19.45,
     44,
     '2021-03-26 00:00:00',
     4,
@@ -7249,6 +7972,7 @@ values
     'Wine - Casillero Deldiablo',
     'quam pede lobortis ligula sit amet eleifend pede libero quis orci nullam molestie nibh in lectus',
     30.36,
+    30.36,
     17,
     '2021-04-06 00:00:00',
     4,
@@ -7259,6 +7983,7 @@ values
     'Lambcasing',
     'pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est risus auctor sed tristique in tempus sit amet',
     55.42,
+    55.42,
     76,
     '2020-10-27 00:00:00',
     6,
@@ -7269,6 +7994,7 @@ values
     'Salmon Steak - Cohoe 8 Oz',
     'sapien a libero nam dui proin leo odio porttitor id consequat in',
     38.96,
+    38.96,
     21,
     '2020-09-10 00:00:00',
     6,
@@ -7279,6 +8005,7 @@ values
     'Cheese - Fontina',
     'praesent blandit lacinia erat vestibulum sed magna at nunc commodo placerat praesent blandit nam nulla integer pede justo lacinia',
     22.05,
+    22.05,
     85,
     '2021-03-25 00:00:00',
     4,
@@ -7289,6 +8016,7 @@ values
     'Pails With Lids',
     'nulla tempus vivamus in felis eu sapien cursus vestibulum proin eu mi nulla ac enim in tempor turpis nec',
     3.75,
+    3.75,
     52,
     '2020-10-04 00:00:00',
     5,
@@ -7299,6 +8027,7 @@ values
     'Pork - Smoked Kassler',
     'duis bibendum morbi non quam nec dui luctus rutrum nulla tellus in sagittis dui vel nisl duis',
     30.41,
+    30.41,
     4,
     '2021-01-18 00:00:00',
     3,
@@ -7309,6 +8038,7 @@ values
     'Juice - Cranberry, 341 Ml',
     'in blandit ultrices enim lorem ipsum dolor sit amet consectetuer adipiscing elit proin interdum mauris non',
     3.74,
+    3.74,
     48,
     '2020-12-19 00:00:00',
     5,
@@ -7319,6 +8049,7 @@ values
     'Lettuce - Red Leaf',
     'sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam vel augue',
     62.54,
+    62.54,
     39,
     '2021-02-25 00:00:00',
     4,
@@ -7329,6 +8060,7 @@ values
     'Garbag Bags - Black',
     'convallis nulla neque libero convallis eget eleifend luctus ultricies eu nibh quisque id justo sit amet sapien dignissim vestibulum vestibulum',
     10.00,
+    10.00,
     83,
     '2020-12-30 00:00:00',
     3,
@@ -7339,6 +8071,7 @@ values
     'Mustard - Individual Pkg',
     'dui proin leo odio porttitor id consequat in consequat ut nulla sed',
     39.85,
+    39.85,
     82,
     '2020-08-09 00:00:00',
     6,
@@ -7349,6 +8082,7 @@ values
     'Wine - White, Gewurtzraminer',
     'sapien non mi integer ac neque duis bibendum morbi non quam',
     20.81,
+    20.81,
     38,
     '2020-09-15 00:00:00',
     4,
@@ -7359,6 +8093,7 @@ values
     'Tea - Black Currant',
     'sagittis sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam vel augue',
     87.59,
+    87.59,
     82,
     '2021-03-25 00:00:00',
     5,
@@ -7369,6 +8104,7 @@ values
     'Chicken - Whole Fryers',
     'eros vestibulum ac est lacinia nisi venenatis tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl ut',
     92.72,
+    92.72,
     44,
     '2020-08-23 00:00:00',
     6,
@@ -7379,6 +8115,7 @@ values
     'Iced Tea - Lemon, 460 Ml',
     'cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam vel augue vestibulum',
     10.87,
+    10.87,
     93,
     '2020-11-11 00:00:00',
     6,
@@ -7389,6 +8126,7 @@ values
     'Anchovy Paste - 56 G Tube',
     'lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum id luctus nec molestie sed',
     91.27,
+    91.27,
     73,
     '2021-03-02 00:00:00',
     6,
@@ -7399,6 +8137,7 @@ values
     'Spice - Chili Powder Mexican',
     'nulla eget eros elementum pellentesque quisque porta volutpat erat quisque',
     81.19,
+    81.19,
     46,
     '2021-01-15 00:00:00',
     5,
@@ -7409,6 +8148,7 @@ values
     'Milk - Buttermilk',
     'ligula pellentesque ultrices phasellus id sapien in sapien iaculis congue vivamus metus arcu',
     51.96,
+    51.96,
     46,
     '2020-07-09 00:00:00',
     4,
@@ -7419,6 +8159,7 @@ values
     'Teriyaki Sauce',
     'in hac habitasse platea dictumst aliquam augue quam sollicitudin vitae consectetuer eget rutrum at lorem',
     74.90,
+    74.90,
     6,
     '2021-01-19 00:00:00',
     6,
@@ -7429,6 +8170,7 @@ values
     'Mcgillicuddy Vanilla Schnap',
     'posuere felis sed lacus morbi sem mauris laoreet ut rhoncus aliquet pulvinar sed nisl nunc rhoncus dui vel sem sed',
     6.59,
+    6.59,
     8,
     '2021-04-25 00:00:00',
     6,
@@ -7439,6 +8181,7 @@ values
     'Syrup - Monin - Blue Curacao',
     'elementum nullam varius nulla facilisi cras non velit nec nisi vulputate nonummy maecenas tincidunt lacus at velit vivamus vel nulla',
     4.21,
+    4.21,
     0,
     '2020-10-24 00:00:00',
     5,
@@ -7449,6 +8192,7 @@ values
     'Bagels Poppyseed',
     'praesent lectus vestibulum quam sapien varius ut blandit non interdum in ante',
     41.27,
+    41.27,
     46,
     '2020-07-05 00:00:00',
     6,
@@ -7459,6 +8203,7 @@ values
     'Bread - Focaccia Quarter',
     'odio curabitur convallis duis consequat dui nec nisi volutpat eleifend donec ut',
     97.63,
+    97.63,
     63,
     '2020-10-21 00:00:00',
     5,
@@ -7469,6 +8214,7 @@ values
     'Quinoa',
     'consequat lectus in est risus auctor sed tristique in tempus sit amet sem fusce consequat nulla',
     98.74,
+    98.74,
     75,
     '2020-06-20 00:00:00',
     4,
@@ -7479,6 +8225,7 @@ values
     'Eggplant - Regular',
     'sed accumsan felis ut at dolor quis odio consequat varius integer ac leo',
     17.56,
+    17.56,
     26,
     '2020-12-02 00:00:00',
     6,
@@ -7489,6 +8236,7 @@ values
     'Bagels Poppyseed',
     'sit amet consectetuer adipiscing elit proin risus praesent lectus vestibulum quam sapien varius ut blandit non interdum in ante',
     53.78,
+    53.78,
     22,
     '2020-08-26 00:00:00',
     6,
@@ -7499,6 +8247,7 @@ values
     'Bread - Hamburger Buns',
     'ultrices phasellus id sapien in sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at vulputate vitae',
     23.54,
+    23.54,
     93,
     '2020-09-13 00:00:00',
     6,
@@ -7509,6 +8258,7 @@ values
     'Bread - Roll, Calabrese',
     'ante nulla justo aliquam quis turpis eget elit sodales scelerisque mauris sit amet eros',
     85.75,
+    85.75,
     49,
     '2021-04-09 00:00:00',
     5,
@@ -7519,6 +8269,7 @@ values
     'Apricots - Dried',
     'ipsum dolor sit amet consectetuer adipiscing elit proin interdum mauris non ligula pellentesque ultrices phasellus id sapien in sapien iaculis',
     38.67,
+    38.67,
     81,
     '2021-02-06 00:00:00',
     3,
@@ -7529,6 +8280,7 @@ values
     'Tea - Mint',
     'hac habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla ut erat id mauris vulputate elementum nullam',
     24.54,
+    24.54,
     17,
     '2020-12-27 00:00:00',
     3,
@@ -7539,6 +8291,7 @@ values
     'Beef - Shank',
     'ut mauris eget massa tempor convallis nulla neque libero convallis eget eleifend luctus ultricies',
     34.42,
+    34.42,
     24,
     '2021-04-20 00:00:00',
     4,
@@ -7549,6 +8302,7 @@ values
     'Soup - Beef, Base Mix',
     'tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl ut',
     42.17,
+    42.17,
     81,
     '2020-11-25 00:00:00',
     4,
@@ -7559,6 +8313,7 @@ values
     'Horseradish - Prepared',
     'at velit eu est congue elementum in hac habitasse platea dictumst morbi vestibulum velit id',
     58.71,
+    58.71,
     3,
     '2020-07-23 00:00:00',
     5,
@@ -7569,6 +8324,7 @@ values
     'Snapple Raspberry Tea',
     'odio curabitur convallis duis consequat dui nec nisi volutpat eleifend donec ut',
     53.58,
+    53.58,
     53,
     '2020-12-12 00:00:00',
     5,
@@ -7579,6 +8335,7 @@ values
     'Pastry - Apple Muffins - Mini',
     'sapien a libero nam dui proin leo odio porttitor id consequat in consequat ut nulla sed accumsan felis',
     39.85,
+    39.85,
     93,
     '2021-05-06 00:00:00',
     3,
@@ -7589,6 +8346,7 @@ values
     'Cheese - Cheddar, Old White',
     'libero nam dui proin leo odio porttitor id consequat in consequat ut nulla sed accumsan felis',
     89.36,
+    89.36,
     78,
     '2020-08-03 00:00:00',
     6,
@@ -7599,6 +8357,7 @@ values
     'Syrup - Monin - Granny Smith',
     'id mauris vulputate elementum nullam varius nulla facilisi cras non velit nec nisi vulputate nonummy maecenas tincidunt lacus at velit',
     8.14,
+    8.14,
     3,
     '2020-10-04 00:00:00',
     5,
@@ -7609,6 +8368,7 @@ values
     'Cinnamon Rolls',
     'tortor duis mattis egestas metus aenean fermentum donec ut mauris',
     62.92,
+    62.92,
     78,
     '2021-02-19 00:00:00',
     4,
@@ -7619,6 +8379,7 @@ values
     'Sparkling Wine - Rose, Freixenet',
     'mauris eget massa tempor convallis nulla neque libero convallis eget eleifend luctus ultricies eu nibh quisque id justo sit amet',
     67.78,
+    67.78,
     32,
     '2020-06-25 00:00:00',
     5,
@@ -7629,6 +8390,7 @@ values
     'Sultanas',
     'erat id mauris vulputate elementum nullam varius nulla facilisi cras non velit',
     7.33,
+    7.33,
     1,
     '2020-10-26 00:00:00',
     6,
@@ -7639,6 +8401,7 @@ values
     'Pepper - Green',
     'in eleifend quam a odio in hac habitasse platea dictumst maecenas ut massa quis augue luctus',
     97.54,
+    97.54,
     5,
     '2021-04-24 00:00:00',
     3,
@@ -7649,6 +8412,7 @@ values
     'Cheese - Ricotta',
     'eros vestibulum ac est lacinia nisi venenatis tristique fusce congue diam id ornare imperdiet',
     25.22,
+    25.22,
     35,
     '2021-01-27 00:00:00',
     4,
@@ -7659,6 +8423,7 @@ values
     'Hot Choc Vending',
     'et eros vestibulum ac est lacinia nisi venenatis tristique fusce congue diam id ornare imperdiet sapien urna pretium',
     82.25,
+    82.25,
     74,
     '2021-06-01 00:00:00',
     6,
@@ -7669,6 +8434,7 @@ values
     'Tomato - Tricolor Cherry',
     'eu interdum eu tincidunt in leo maecenas pulvinar lobortis est phasellus sit amet erat nulla tempus vivamus',
     21.61,
+    21.61,
     34,
     '2020-11-17 00:00:00',
     3,
@@ -7679,6 +8445,7 @@ values
     'Cookie Double Choco',
     'leo rhoncus sed vestibulum sit amet cursus id turpis integer aliquet massa',
     72.75,
+    72.75,
     90,
     '2021-05-26 00:00:00',
     4,
@@ -7689,6 +8456,7 @@ values
     'Frangelico',
     'orci nullam molestie nibh in lectus pellentesque at nulla suspendisse potenti cras in purus eu magna vulputate luctus',
     59.70,
+    59.70,
     81,
     '2021-05-18 00:00:00',
     4,
@@ -7699,6 +8467,7 @@ values
     'Wine - Muscadet Sur Lie',
     'turpis adipiscing lorem vitae mattis nibh ligula nec sem duis aliquam',
     22.25,
+    22.25,
     89,
     '2020-07-21 00:00:00',
     5,
@@ -7709,6 +8478,7 @@ values
     'Steel Wool',
     'mauris eget massa tempor convallis nulla neque libero convallis eget eleifend luctus ultricies eu nibh',
     20.32,
+    20.32,
     55,
     '2021-01-27 00:00:00',
     5,
@@ -7719,6 +8489,7 @@ values
     'Olives - Morracan Dired',
     'consequat dui nec nisi volutpat eleifend donec ut dolor morbi vel lectus in quam',
     32.72,
+    32.72,
     10,
     '2021-02-28 00:00:00',
     4,
@@ -7729,6 +8500,7 @@ values
     'Tomato Puree',
     'adipiscing elit proin risus praesent lectus vestibulum quam sapien varius ut blandit non interdum in',
     55.37,
+    55.37,
     37,
     '2020-10-27 00:00:00',
     3,
@@ -7739,6 +8511,7 @@ values
     'Sobe - Orange Carrot',
     'sit amet nunc viverra dapibus nulla suscipit ligula in lacus curabitur at',
     84.76,
+    84.76,
     80,
     '2021-01-08 00:00:00',
     5,
@@ -7749,6 +8522,7 @@ values
     'Beef Wellington',
     'amet lobortis sapien sapien non mi integer ac neque duis bibendum morbi non quam nec',
     20.72,
+    20.72,
     18,
     '2020-08-09 00:00:00',
     4,
@@ -7759,6 +8533,7 @@ values
     'Table Cloth 90x90 Colour',
     'placerat praesent blandit nam nulla integer pede justo lacinia eget tincidunt eget',
     70.40,
+    70.40,
     12,
     '2021-01-13 00:00:00',
     3,
@@ -7769,6 +8544,7 @@ values
     'Flour - Semolina',
     'fusce consequat nulla nisl nunc nisl duis bibendum felis sed interdum venenatis turpis enim blandit mi in porttitor pede',
     40.01,
+    40.01,
     63,
     '2020-12-07 00:00:00',
     6,
@@ -7779,6 +8555,7 @@ values
     'Sobe - Berry Energy',
     'consequat dui nec nisi volutpat eleifend donec ut dolor morbi',
     14.85,
+    14.85,
     70,
     '2021-01-10 00:00:00',
     4,
@@ -7789,6 +8566,7 @@ values
     'Mcguinness - Blue Curacao',
     'ultrices enim lorem ipsum dolor sit amet consectetuer adipiscing elit proin interdum mauris non ligula pellentesque',
     94.68,
+    94.68,
     60,
     '2020-06-13 00:00:00',
     4,
@@ -7799,6 +8577,7 @@ values
     'Bag Stand',
     'nisi at nibh in hac habitasse platea dictumst aliquam augue quam sollicitudin vitae consectetuer eget rutrum at lorem integer',
     63.02,
+    63.02,
     22,
     '2021-01-18 00:00:00',
     4,
@@ -7809,6 +8588,7 @@ values
     'Waffle Stix',
     'vel pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est risus auctor',
     88.15,
+    88.15,
     18,
     '2020-12-13 00:00:00',
     3,
@@ -7819,6 +8599,7 @@ values
     'Bread - Frozen Basket Variety',
     'nec molestie sed justo pellentesque viverra pede ac diam cras pellentesque volutpat dui maecenas tristique est et',
     89.47,
+    89.47,
     2,
     '2020-12-25 00:00:00',
     6,
@@ -7829,6 +8610,7 @@ values
     'Wine - Shiraz South Eastern',
     'sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at vulputate vitae nisl aenean lectus pellentesque',
     62.23,
+    62.23,
     47,
     '2021-01-16 00:00:00',
     6,
@@ -7839,6 +8621,7 @@ values
     'Wine - Jaboulet Cotes Du Rhone',
     'eleifend pede libero quis orci nullam molestie nibh in lectus pellentesque at',
     84.37,
+    84.37,
     43,
     '2021-06-07 00:00:00',
     5,
@@ -7849,6 +8632,7 @@ values
     'Bandage - Finger Cots',
     'ultrices enim lorem ipsum dolor sit amet consectetuer adipiscing elit proin interdum mauris non ligula pellentesque ultrices',
     28.05,
+    28.05,
     64,
     '2021-03-20 00:00:00',
     4,
@@ -7859,6 +8643,7 @@ values
     'Bread Ww Cluster',
     'nulla elit ac nulla sed vel enim sit amet nunc viverra dapibus',
     24.96,
+    24.96,
     71,
     '2020-11-28 00:00:00',
     5,
@@ -7869,6 +8654,7 @@ values
     'Sauce - Plum',
     'adipiscing elit proin risus praesent lectus vestibulum quam sapien varius ut blandit non interdum in ante vestibulum ante ipsum primis',
     4.87,
+    4.87,
     26,
     '2020-10-15 00:00:00',
     5,
@@ -7879,6 +8665,7 @@ values
     'Salmon - Atlantic, Skin On',
     'quisque porta volutpat erat quisque erat eros viverra eget congue eget semper rutrum nulla nunc purus phasellus in',
     40.60,
+    40.60,
     57,
     '2020-11-03 00:00:00',
     4,
@@ -7889,6 +8676,7 @@ values
     'Tea - Decaf Lipton',
     'in hac habitasse platea dictumst maecenas ut massa quis augue luctus tincidunt nulla mollis molestie lorem',
     99.45,
+    99.45,
     87,
     '2020-11-30 00:00:00',
     5,
@@ -7899,6 +8687,7 @@ values
     'Cake - Cake Sheet Macaroon',
     'lobortis ligula sit amet eleifend pede libero quis orci nullam molestie nibh in lectus pellentesque',
     25.66,
+    25.66,
     63,
     '2021-05-25 00:00:00',
     6,
@@ -7909,6 +8698,7 @@ values
     'Wine - Magnotta, Merlot Sr Vqa',
     'mus vivamus vestibulum sagittis sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam vel augue',
     95.54,
+    95.54,
     61,
     '2021-04-21 00:00:00',
     4,
@@ -7919,6 +8709,7 @@ values
     'Apples - Spartan',
     'in quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio',
     40.39,
+    40.39,
     47,
     '2020-09-02 00:00:00',
     6,
@@ -7929,6 +8720,7 @@ values
     'Pie Box - Cello Window 2.5',
     'donec vitae nisi nam ultrices libero non mattis pulvinar nulla pede ullamcorper augue a suscipit nulla elit ac',
     84.34,
+    84.34,
     68,
     '2020-09-12 00:00:00',
     3,
@@ -7939,6 +8731,7 @@ values
     'Spice - Peppercorn Melange',
     'at turpis a pede posuere nonummy integer non velit donec',
     63.42,
+    63.42,
     53,
     '2021-04-23 00:00:00',
     6,
@@ -7949,6 +8742,7 @@ values
     'Cherries - Bing, Canned',
     'nunc commodo placerat praesent blandit nam nulla integer pede justo lacinia eget tincidunt eget',
     7.50,
+    7.50,
     74,
     '2021-05-20 00:00:00',
     6,
@@ -7959,6 +8753,7 @@ values
     'Bread - English Muffin',
     'platea dictumst maecenas ut massa quis augue luctus tincidunt nulla mollis',
     20.67,
+    20.67,
     70,
     '2020-09-26 00:00:00',
     6,
@@ -7969,6 +8764,7 @@ values
     'Trueblue - Blueberry',
     'cubilia curae mauris viverra diam vitae quam suspendisse potenti nullam porttitor',
     93.86,
+    93.86,
     81,
     '2021-04-24 00:00:00',
     3,
@@ -7979,6 +8775,7 @@ values
     'Longos - Penne With Pesto',
     'turpis integer aliquet massa id lobortis convallis tortor risus dapibus',
     95.72,
+    95.72,
     53,
     '2020-10-24 00:00:00',
     5,
@@ -7989,6 +8786,7 @@ values
     'Lamb - Loin, Trimmed, Boneless',
     'eget semper rutrum nulla nunc purus phasellus in felis donec semper sapien a',
     38.98,
+    38.98,
     97,
     '2020-09-04 00:00:00',
     6,
@@ -7999,6 +8797,7 @@ values
     'Wine - Rioja Campo Viejo',
     'nulla ut erat id mauris vulputate elementum nullam varius nulla facilisi cras non velit nec nisi',
     95.76,
+    95.76,
     84,
     '2021-02-17 00:00:00',
     3,
@@ -8009,6 +8808,7 @@ values
     'Loquat',
     'eu est congue elementum in hac habitasse platea dictumst morbi vestibulum velit id pretium',
     26.98,
+    26.98,
     66,
     '2020-09-15 00:00:00',
     3,
@@ -8019,6 +8819,7 @@ values
     'Hold Up Tool Storage Rack',
     'nulla nisl nunc nisl duis bibendum felis sed interdum venenatis turpis enim blandit mi in',
     4.35,
+    4.35,
     89,
     '2020-10-28 00:00:00',
     3,
@@ -8029,6 +8830,7 @@ values
     'Parsley - Dried',
     'morbi odio odio elementum eu interdum eu tincidunt in leo maecenas pulvinar',
     4.62,
+    4.62,
     61,
     '2020-07-25 00:00:00',
     4,
@@ -8039,6 +8841,7 @@ values
     'Plasticforkblack',
     'nullam orci pede venenatis non sodales sed tincidunt eu felis fusce posuere felis sed',
     50.81,
+    50.81,
     58,
     '2020-12-23 00:00:00',
     6,
@@ -8049,6 +8852,7 @@ values
     'Potato - Sweet',
     'a odio in hac habitasse platea dictumst maecenas ut massa quis augue luctus tincidunt nulla',
     63.85,
+    63.85,
     59,
     '2020-12-09 00:00:00',
     4,
@@ -8059,6 +8863,7 @@ values
     'Coffee - Cafe Moreno',
     'ut massa volutpat convallis morbi odio odio elementum eu interdum eu tincidunt in leo',
     15.59,
+    15.59,
     91,
     '2021-01-02 00:00:00',
     6,
@@ -8069,6 +8874,7 @@ values
     'Wine - Red, Colio Cabernet',
     'lacinia nisi venenatis tristique fusce congue diam id ornare imperdiet sapien urna pretium',
     96.99,
+    96.99,
     59,
     '2021-03-23 00:00:00',
     3,
@@ -8079,6 +8885,7 @@ values
     'Ostrich - Fan Fillet',
     'orci luctus et ultrices posuere cubilia curae nulla dapibus dolor vel est donec odio',
     60.59,
+    60.59,
     23,
     '2020-11-23 00:00:00',
     4,
@@ -8089,6 +8896,7 @@ values
     'Green Tea Refresher',
     'sed accumsan felis ut at dolor quis odio consequat varius integer ac leo pellentesque ultrices mattis odio donec vitae',
     57.25,
+    57.25,
     90,
     '2021-05-04 00:00:00',
     3,
@@ -8099,6 +8907,7 @@ values
     'Flour - Rye',
     'lacinia eget tincidunt eget tempus vel pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est risus auctor',
     88.01,
+    88.01,
     18,
     '2021-02-03 00:00:00',
     6,
@@ -8109,6 +8918,7 @@ values
     'Sugar Thermometer',
     'eu orci mauris lacinia sapien quis libero nullam sit amet',
     97.85,
+    97.85,
     81,
     '2020-09-11 00:00:00',
     6,
@@ -8119,6 +8929,7 @@ values
     'Wine - Tio Pepe Sherry Fino',
     'molestie hendrerit at vulputate vitae nisl aenean lectus pellentesque eget nunc donec quis orci eget',
     47.11,
+    47.11,
     67,
     '2021-02-20 00:00:00',
     3,
@@ -8129,6 +8940,7 @@ values
     'Cassis',
     'ultrices posuere cubilia curae nulla dapibus dolor vel est donec odio justo sollicitudin ut suscipit a feugiat et',
     94.98,
+    94.98,
     96,
     '2021-01-17 00:00:00',
     3,
@@ -8139,6 +8951,7 @@ values
     'Ice Cream - Super Sandwich',
     'tempor convallis nulla neque libero convallis eget eleifend luctus ultricies eu nibh quisque id justo sit amet sapien',
     15.08,
+    15.08,
     84,
     '2021-01-19 00:00:00',
     6,
@@ -8149,6 +8962,7 @@ values
     'Sauce - Salsa',
     'lobortis ligula sit amet eleifend pede libero quis orci nullam molestie nibh in lectus pellentesque at nulla suspendisse potenti cras',
     88.19,
+    88.19,
     73,
     '2021-05-26 00:00:00',
     3,
@@ -8159,6 +8973,7 @@ values
     'Jerusalem Artichoke',
     'faucibus cursus urna ut tellus nulla ut erat id mauris vulputate',
     60.16,
+    60.16,
     87,
     '2021-03-05 00:00:00',
     3,
@@ -8169,6 +8984,7 @@ values
     'Juice - Prune',
     'luctus ultricies eu nibh quisque id justo sit amet sapien dignissim vestibulum vestibulum ante ipsum primis in faucibus',
     70.29,
+    70.29,
     45,
     '2020-06-22 00:00:00',
     6,
@@ -8179,6 +8995,7 @@ values
     'Lamb - Sausage Casings',
     'justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum id luctus nec',
     52.51,
+    52.51,
     89,
     '2020-09-05 00:00:00',
     5,
@@ -8189,6 +9006,7 @@ values
     'Cleaner - Lime Away',
     'nulla integer pede justo lacinia eget tincidunt eget tempus vel pede morbi porttitor lorem id ligula suspendisse',
     24.67,
+    24.67,
     39,
     '2021-02-14 00:00:00',
     4,
@@ -8199,6 +9017,7 @@ values
     'Flour Dark Rye',
     'ut dolor morbi vel lectus in quam fringilla rhoncus mauris enim leo rhoncus sed',
     99.45,
+    99.45,
     93,
     '2020-08-20 00:00:00',
     4,
@@ -8209,6 +9028,7 @@ values
     'Chef Hat 20cm',
     'justo sit amet sapien dignissim vestibulum vestibulum ante ipsum primis in faucibus',
     53.60,
+    53.60,
     55,
     '2021-01-16 00:00:00',
     3,
@@ -8219,6 +9039,7 @@ values
     'Pork - Sausage, Medium',
     'in congue etiam justo etiam pretium iaculis justo in hac habitasse platea dictumst etiam faucibus',
     56.86,
+    56.86,
     26,
     '2021-02-25 00:00:00',
     4,
@@ -8229,6 +9050,7 @@ values
     'Iced Tea - Lemon, 460 Ml',
     'tortor risus dapibus augue vel accumsan tellus nisi eu orci mauris lacinia',
     3.29,
+    3.29,
     68,
     '2021-03-20 00:00:00',
     5,
@@ -8239,6 +9061,7 @@ values
     'Lobak',
     'dictumst aliquam augue quam sollicitudin vitae consectetuer eget rutrum at lorem integer tincidunt ante vel ipsum praesent blandit lacinia',
     82.45,
+    82.45,
     27,
     '2021-01-28 00:00:00',
     5,
@@ -8249,6 +9072,7 @@ values
     'Juice - Apple, 500 Ml',
     'ut suscipit a feugiat et eros vestibulum ac est lacinia nisi venenatis tristique fusce',
     47.96,
+    47.96,
     50,
     '2021-04-02 00:00:00',
     3,
@@ -8259,6 +9083,7 @@ values
     'Cheese - La Sauvagine',
     'amet sapien dignissim vestibulum vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae nulla dapibus',
     76.15,
+    76.15,
     61,
     '2021-01-17 00:00:00',
     4,
@@ -8269,6 +9094,7 @@ values
     'Plasticknivesblack',
     'nibh in quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio',
     46.41,
+    46.41,
     62,
     '2020-07-28 00:00:00',
     5,
@@ -8279,6 +9105,7 @@ values
     'Broom - Push',
     'morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum id luctus nec molestie sed justo pellentesque viverra',
     65.92,
+    65.92,
     65,
     '2020-10-29 00:00:00',
     3,
@@ -8289,6 +9116,7 @@ values
     'Cookies - Assorted',
     'diam in magna bibendum imperdiet nullam orci pede venenatis non sodales sed tincidunt eu felis fusce posuere felis sed lacus',
     2.58,
+    2.58,
     66,
     '2020-06-30 00:00:00',
     6,
@@ -8299,6 +9127,7 @@ values
     'Shrimp - 150 - 250',
     'sit amet cursus id turpis integer aliquet massa id lobortis convallis tortor risus dapibus',
     72.34,
+    72.34,
     29,
     '2021-04-27 00:00:00',
     5,
@@ -8309,6 +9138,7 @@ values
     'Toamtoes 6x7 Select',
     'est lacinia nisi venenatis tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu',
     74.25,
+    74.25,
     44,
     '2020-11-05 00:00:00',
     6,
@@ -8319,6 +9149,7 @@ values
     'Duck - Breast',
     'consequat ut nulla sed accumsan felis ut at dolor quis odio',
     93.37,
+    93.37,
     100,
     '2020-10-04 00:00:00',
     5,
@@ -8329,6 +9160,7 @@ values
     'Spice - Chili Powder Mexican',
     'sapien a libero nam dui proin leo odio porttitor id',
     7.24,
+    7.24,
     68,
     '2020-07-25 00:00:00',
     3,
@@ -8339,6 +9171,7 @@ values
     'Mushroom - Chanterelle Frozen',
     'justo etiam pretium iaculis justo in hac habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla ut',
     9.80,
+    9.80,
     27,
     '2020-10-01 00:00:00',
     5,
@@ -8349,6 +9182,7 @@ values
     'Wine - Red, Gallo, Merlot',
     'pede libero quis orci nullam molestie nibh in lectus pellentesque at nulla suspendisse potenti cras in purus',
     49.76,
+    49.76,
     31,
     '2021-05-31 00:00:00',
     6,
@@ -8359,6 +9193,7 @@ values
     'Wine - Puligny Montrachet A.',
     'nulla ut erat id mauris vulputate elementum nullam varius nulla',
     88.48,
+    88.48,
     10,
     '2020-11-18 00:00:00',
     3,
@@ -8369,6 +9204,7 @@ values
     'Sole - Dover, Whole, Fresh',
     'in faucibus orci luctus et ultrices posuere cubilia curae mauris viverra diam vitae quam suspendisse potenti',
     54.55,
+    54.55,
     42,
     '2020-07-22 00:00:00',
     5,
@@ -8379,6 +9215,7 @@ values
     'Pork Ham Prager',
     'adipiscing elit proin risus praesent lectus vestibulum quam sapien varius ut blandit',
     35.20,
+    35.20,
     15,
     '2021-02-16 00:00:00',
     6,
@@ -8389,6 +9226,7 @@ values
     'Beef - Sushi Flat Iron Steak',
     'pellentesque volutpat dui maecenas tristique est et tempus semper est quam pharetra magna ac consequat metus sapien ut nunc',
     24.61,
+    24.61,
     9,
     '2020-12-17 00:00:00',
     6,
@@ -8399,6 +9237,7 @@ values
     'General Purpose Trigger',
     'lacus morbi quis tortor id nulla ultrices aliquet maecenas leo odio condimentum id luctus',
     57.76,
+    57.76,
     89,
     '2020-07-24 00:00:00',
     4,
@@ -8409,6 +9248,7 @@ values
     'Chicken - White Meat With Tender',
     'tortor quis turpis sed ante vivamus tortor duis mattis egestas metus aenean fermentum donec',
     43.96,
+    43.96,
     64,
     '2020-11-13 00:00:00',
     6,
@@ -8419,6 +9259,7 @@ values
     'Veal - Osso Bucco',
     'tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat',
     47.20,
+    47.20,
     48,
     '2020-11-23 00:00:00',
     4,
@@ -8429,6 +9270,7 @@ values
     'Soup - Beef Conomme, Dry',
     'lorem integer tincidunt ante vel ipsum praesent blandit lacinia erat vestibulum sed magna at nunc commodo placerat praesent blandit nam',
     81.56,
+    81.56,
     86,
     '2020-07-17 00:00:00',
     5,
@@ -8439,6 +9281,7 @@ values
     'Aromat Spice / Seasoning',
     'nulla facilisi cras non velit nec nisi vulputate nonummy maecenas tincidunt lacus',
     53.24,
+    53.24,
     43,
     '2021-01-16 00:00:00',
     5,
@@ -8449,6 +9292,7 @@ values
     'Veal - Loin',
     'fringilla rhoncus mauris enim leo rhoncus sed vestibulum sit amet cursus id turpis',
     15.52,
+    15.52,
     66,
     '2021-04-07 00:00:00',
     3,
@@ -8459,6 +9303,7 @@ values
     'Beef - Cooked, Corned',
     'dictumst aliquam augue quam sollicitudin vitae consectetuer eget rutrum at lorem integer tincidunt',
     62.21,
+    62.21,
     56,
     '2021-04-29 00:00:00',
     5,
@@ -8469,6 +9314,7 @@ values
     'Crawfish',
     'malesuada in imperdiet et commodo vulputate justo in blandit ultrices enim lorem ipsum dolor sit amet',
     8.68,
+    8.68,
     26,
     '2020-09-06 00:00:00',
     6,
@@ -8479,6 +9325,7 @@ values
     'Pastry - Mini French Pastries',
     'amet cursus id turpis integer aliquet massa id lobortis convallis tortor risus dapibus augue vel accumsan tellus nisi',
     30.74,
+    30.74,
     66,
     '2021-01-12 00:00:00',
     3,
@@ -8489,6 +9336,7 @@ values
     'Food Colouring - Green',
     'quis turpis eget elit sodales scelerisque mauris sit amet eros suspendisse',
     64.27,
+    64.27,
     12,
     '2020-12-22 00:00:00',
     3,
@@ -8499,6 +9347,7 @@ values
     'Chicken - Breast, 5 - 7 Oz',
     'vulputate ut ultrices vel augue vestibulum ante ipsum primis in faucibus orci luctus et ultrices',
     32.82,
+    32.82,
     72,
     '2021-03-25 00:00:00',
     6,
@@ -8509,6 +9358,7 @@ values
     'Brownies - Two Bite, Chocolate',
     'ultrices libero non mattis pulvinar nulla pede ullamcorper augue a',
     69.04,
+    69.04,
     69,
     '2021-05-03 00:00:00',
     6,
@@ -8519,6 +9369,7 @@ values
     'Peppercorns - Green',
     'vitae ipsum aliquam non mauris morbi non lectus aliquam sit amet diam in magna bibendum imperdiet',
     59.43,
+    59.43,
     11,
     '2020-07-11 00:00:00',
     6,
@@ -8529,6 +9380,7 @@ values
     'Beef Dry Aged Tenderloin Aaa',
     'morbi sem mauris laoreet ut rhoncus aliquet pulvinar sed nisl nunc rhoncus dui',
     55.63,
+    55.63,
     31,
     '2020-11-26 00:00:00',
     5,
@@ -8539,6 +9391,7 @@ values
     'Soup - Cream Of Potato / Leek',
     'ut nulla sed accumsan felis ut at dolor quis odio consequat varius integer ac leo',
     4.49,
+    4.49,
     52,
     '2020-10-27 00:00:00',
     4,
@@ -8549,6 +9402,7 @@ values
     'Corn - On The Cob',
     'ipsum ac tellus semper interdum mauris ullamcorper purus sit amet nulla quisque',
     98.90,
+    98.90,
     51,
     '2020-09-02 00:00:00',
     4,
@@ -8559,6 +9413,7 @@ values
     'Cream - 18%',
     'integer pede justo lacinia eget tincidunt eget tempus vel pede morbi porttitor',
     37.33,
+    37.33,
     74,
     '2021-05-03 00:00:00',
     5,
@@ -8569,6 +9424,7 @@ values
     'Lobster - Cooked',
     'interdum in ante vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia',
     9.93,
+    9.93,
     91,
     '2021-04-03 00:00:00',
     6,
@@ -8579,6 +9435,7 @@ values
     'Pork - Hock And Feet Attached',
     'ultrices enim lorem ipsum dolor sit amet consectetuer adipiscing elit proin interdum mauris non ligula pellentesque ultrices phasellus id',
     47.68,
+    47.68,
     26,
     '2021-06-07 00:00:00',
     3,
@@ -8589,6 +9446,7 @@ values
     'Wine - Red, Marechal Foch',
     'phasellus in felis donec semper sapien a libero nam dui proin leo odio porttitor id consequat in',
     78.94,
+    78.94,
     77,
     '2021-04-02 00:00:00',
     3,
@@ -8599,6 +9457,7 @@ values
     'Salmon Steak - Cohoe 8 Oz',
     'aliquet at feugiat non pretium quis lectus suspendisse potenti in eleifend quam a',
     3.38,
+    3.38,
     98,
     '2021-05-23 00:00:00',
     6,
@@ -8609,6 +9468,7 @@ values
     'Salmon Steak - Cohoe 8 Oz',
     'mi in porttitor pede justo eu massa donec dapibus duis at',
     61.72,
+    61.72,
     11,
     '2021-03-24 00:00:00',
     4,
@@ -8619,6 +9479,7 @@ values
     'Onions - Vidalia',
     'maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas',
     7.96,
+    7.96,
     24,
     '2020-07-21 00:00:00',
     6,
@@ -8629,6 +9490,7 @@ values
     'Cheese - Brick With Onion',
     'eleifend quam a odio in hac habitasse platea dictumst maecenas ut massa quis',
     83.98,
+    83.98,
     12,
     '2020-08-29 00:00:00',
     3,
@@ -8639,6 +9501,7 @@ values
     'Juice - Apple, 500 Ml',
     'ligula in lacus curabitur at ipsum ac tellus semper interdum',
     91.83,
+    91.83,
     41,
     '2020-06-20 00:00:00',
     6,
@@ -8649,6 +9512,7 @@ values
     'Coffee Cup 12oz 5342cd',
     'mauris ullamcorper purus sit amet nulla quisque arcu libero rutrum ac lobortis vel dapibus at diam nam tristique',
     91.88,
+    91.88,
     60,
     '2021-04-28 00:00:00',
     6,
@@ -8659,6 +9523,7 @@ values
     'Appetizer - Crab And Brie',
     'metus sapien ut nunc vestibulum ante ipsum primis in faucibus orci luctus et ultrices',
     77.29,
+    77.29,
     94,
     '2021-04-30 00:00:00',
     5,
@@ -8669,6 +9534,7 @@ values
     'Heavy Duty Dust Pan',
     'ligula nec sem duis aliquam convallis nunc proin at turpis a pede posuere nonummy integer non velit donec',
     97.70,
+    97.70,
     6,
     '2020-07-25 00:00:00',
     6,
@@ -8679,6 +9545,7 @@ values
     'Devonshire Cream',
     'mattis egestas metus aenean fermentum donec ut mauris eget massa tempor convallis',
     28.21,
+    28.21,
     6,
     '2021-01-04 00:00:00',
     4,
@@ -8689,6 +9556,7 @@ values
     'Soup - Chicken And Wild Rice',
     'urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat in congue etiam justo etiam pretium iaculis justo',
     36.20,
+    36.20,
     74,
     '2020-07-29 00:00:00',
     5,
@@ -8699,6 +9567,7 @@ values
     'Lamb - Ground',
     'nulla sed vel enim sit amet nunc viverra dapibus nulla suscipit ligula in lacus curabitur at',
     67.34,
+    67.34,
     34,
     '2021-05-09 00:00:00',
     5,
@@ -8709,6 +9578,7 @@ values
     'Nut - Walnut, Pieces',
     'praesent lectus vestibulum quam sapien varius ut blandit non interdum in ante vestibulum ante',
     90.88,
+    90.88,
     63,
     '2021-02-24 00:00:00',
     4,
@@ -8719,6 +9589,7 @@ values
     'Pail With Metal Handle 16l White',
     'diam cras pellentesque volutpat dui maecenas tristique est et tempus semper',
     67.41,
+    67.41,
     96,
     '2020-10-12 00:00:00',
     4,
@@ -8729,6 +9600,7 @@ values
     'Cheese - Stilton',
     'porta volutpat erat quisque erat eros viverra eget congue eget semper rutrum nulla nunc purus phasellus in felis',
     54.74,
+    54.74,
     84,
     '2021-05-24 00:00:00',
     3,
@@ -8739,6 +9611,7 @@ values
     'Edible Flower - Mixed',
     'massa quis augue luctus tincidunt nulla mollis molestie lorem quisque ut erat',
     17.58,
+    17.58,
     50,
     '2020-12-08 00:00:00',
     3,
@@ -8749,6 +9622,7 @@ values
     'Vinegar - Rice',
     'volutpat eleifend donec ut dolor morbi vel lectus in quam fringilla rhoncus mauris enim leo rhoncus',
     13.34,
+    13.34,
     60,
     '2021-01-25 00:00:00',
     4,
@@ -8759,6 +9633,7 @@ values
     'Jameson - Irish Whiskey',
     'ipsum integer a nibh in quis justo maecenas rhoncus aliquam lacus morbi quis tortor',
     70.75,
+    70.75,
     42,
     '2021-04-23 00:00:00',
     4,
@@ -8769,6 +9644,7 @@ values
     'Milk - Condensed',
     'nec sem duis aliquam convallis nunc proin at turpis a pede posuere nonummy',
     72.56,
+    72.56,
     57,
     '2020-06-30 00:00:00',
     3,
@@ -8779,6 +9655,7 @@ values
     'Coffee - Beans, Whole',
     'cras in purus eu magna vulputate luctus cum sociis natoque penatibus et magnis dis parturient',
     38.07,
+    38.07,
     31,
     '2021-05-06 00:00:00',
     5,
@@ -8789,6 +9666,7 @@ values
     'Tea - Honey Green Tea',
     'hac habitasse platea dictumst aliquam augue quam sollicitudin vitae consectetuer eget',
     34.94,
+    34.94,
     59,
     '2020-07-15 00:00:00',
     4,
@@ -8799,6 +9677,7 @@ values
     'Mountain Dew',
     'sollicitudin ut suscipit a feugiat et eros vestibulum ac est lacinia nisi venenatis tristique fusce',
     72.29,
+    72.29,
     78,
     '2020-06-18 00:00:00',
     3,
@@ -8809,6 +9688,7 @@ values
     'Dehydrated Kelp Kombo',
     'posuere felis sed lacus morbi sem mauris laoreet ut rhoncus aliquet pulvinar sed nisl',
     19.22,
+    19.22,
     42,
     '2020-11-24 00:00:00',
     4,
@@ -8819,6 +9699,7 @@ values
     'Ham - Cooked Italian',
     'porttitor lacus at turpis donec posuere metus vitae ipsum aliquam non mauris morbi non lectus aliquam',
     69.17,
+    69.17,
     36,
     '2020-09-03 00:00:00',
     4,
@@ -8829,6 +9710,7 @@ values
     'Pasta - Penne, Rigate, Dry',
     'sed vel enim sit amet nunc viverra dapibus nulla suscipit ligula in lacus curabitur at ipsum ac tellus semper',
     68.17,
+    68.17,
     14,
     '2020-07-24 00:00:00',
     3,
@@ -8839,6 +9721,7 @@ values
     'Vinegar - White Wine',
     'ultrices aliquet maecenas leo odio condimentum id luctus nec molestie sed justo pellentesque viverra pede ac diam',
     1.41,
+    1.41,
     95,
     '2021-01-02 00:00:00',
     4,
@@ -8849,6 +9732,7 @@ values
     'Chicken - Leg / Back Attach',
     'sed augue aliquam erat volutpat in congue etiam justo etiam pretium',
     62.32,
+    62.32,
     8,
     '2020-12-06 00:00:00',
     3,
@@ -8859,6 +9743,7 @@ values
     'Dc Hikiage Hira Huba',
     'duis bibendum felis sed interdum venenatis turpis enim blandit mi in porttitor pede justo eu massa donec dapibus duis',
     86.10,
+    86.10,
     88,
     '2020-12-31 00:00:00',
     3,
@@ -8869,6 +9754,7 @@ values
     'Beets',
     'morbi odio odio elementum eu interdum eu tincidunt in leo maecenas pulvinar lobortis est',
     4.77,
+    4.77,
     79,
     '2020-09-19 00:00:00',
     5,
@@ -8879,6 +9765,7 @@ values
     'Cinnamon Buns Sticky',
     'neque sapien placerat ante nulla justo aliquam quis turpis eget elit sodales scelerisque mauris sit amet eros suspendisse accumsan',
     84.08,
+    84.08,
     81,
     '2020-09-06 00:00:00',
     4,
@@ -8889,6 +9776,7 @@ values
     'Bagels Poppyseed',
     'massa id nisl venenatis lacinia aenean sit amet justo morbi ut odio cras mi pede malesuada in imperdiet et commodo',
     24.20,
+    24.20,
     32,
     '2021-03-19 00:00:00',
     6,
@@ -8899,6 +9787,7 @@ values
     'Pork - Loin, Boneless',
     'aliquet pulvinar sed nisl nunc rhoncus dui vel sem sed sagittis nam',
     30.54,
+    30.54,
     31,
     '2021-01-31 00:00:00',
     3,
@@ -8909,6 +9798,7 @@ values
     'Broom And Broom Rack White',
     'aenean fermentum donec ut mauris eget massa tempor convallis nulla neque libero convallis eget eleifend luctus ultricies eu nibh quisque',
     65.63,
+    65.63,
     63,
     '2020-07-16 00:00:00',
     5,
@@ -8919,6 +9809,7 @@ values
     'Filo Dough',
     'amet cursus id turpis integer aliquet massa id lobortis convallis tortor risus dapibus augue vel accumsan',
     29.75,
+    29.75,
     8,
     '2021-01-31 00:00:00',
     4,
@@ -8929,6 +9820,7 @@ values
     'Mushroom - Morels, Dry',
     'tellus nulla ut erat id mauris vulputate elementum nullam varius',
     93.01,
+    93.01,
     99,
     '2021-05-05 00:00:00',
     5,
@@ -8939,6 +9831,7 @@ values
     'Milkettes - 2%',
     'ut erat id mauris vulputate elementum nullam varius nulla facilisi cras non velit nec nisi vulputate nonummy maecenas tincidunt',
     39.56,
+    39.56,
     27,
     '2021-01-25 00:00:00',
     6,
@@ -8949,6 +9842,7 @@ values
     'Flour - Buckwheat, Dark',
     'pellentesque at nulla suspendisse potenti cras in purus eu magna vulputate luctus cum sociis natoque penatibus et magnis dis parturient',
     63.49,
+    63.49,
     73,
     '2021-02-23 00:00:00',
     5,
@@ -8959,6 +9853,7 @@ values
     'Lemonade - Island Tea, 591 Ml',
     'massa id lobortis convallis tortor risus dapibus augue vel accumsan',
     87.53,
+    87.53,
     17,
     '2020-07-29 00:00:00',
     5,
@@ -8969,6 +9864,7 @@ values
     'Cup - 8oz Coffee Perforated',
     'integer non velit donec diam neque vestibulum eget vulputate ut ultrices vel augue vestibulum',
     4.99,
+    4.99,
     51,
     '2021-03-24 00:00:00',
     5,
@@ -8979,6 +9875,7 @@ values
     'Wine - Periguita Fonseca',
     'in felis donec semper sapien a libero nam dui proin leo odio porttitor id consequat in consequat ut nulla',
     28.30,
+    28.30,
     60,
     '2021-01-09 00:00:00',
     5,
@@ -8989,6 +9886,7 @@ values
     'Sour Puss - Tangerine',
     'nisi venenatis tristique fusce congue diam id ornare imperdiet sapien urna pretium nisl ut volutpat sapien arcu sed augue',
     2.28,
+    2.28,
     23,
     '2021-03-14 00:00:00',
     4,
@@ -8999,6 +9897,7 @@ values
     'Pie Shells 10',
     'dui nec nisi volutpat eleifend donec ut dolor morbi vel lectus in quam fringilla rhoncus mauris enim leo rhoncus sed',
     93.69,
+    93.69,
     5,
     '2020-07-03 00:00:00',
     4,
@@ -9009,6 +9908,7 @@ values
     'Steampan Lid',
     'accumsan odio curabitur convallis duis consequat dui nec nisi volutpat eleifend donec ut dolor morbi',
     74.10,
+    74.10,
     70,
     '2020-09-23 00:00:00',
     6,
@@ -9019,6 +9919,7 @@ values
     'Flower - Leather Leaf Fern',
     'elementum eu interdum eu tincidunt in leo maecenas pulvinar lobortis est',
     74.87,
+    74.87,
     40,
     '2020-11-21 00:00:00',
     4,
@@ -9029,6 +9930,7 @@ values
     'Tea - Grapefruit Green Tea',
     'mauris viverra diam vitae quam suspendisse potenti nullam porttitor lacus at turpis donec posuere metus vitae',
     55.42,
+    55.42,
     40,
     '2021-03-10 00:00:00',
     5,
@@ -9039,6 +9941,7 @@ values
     'Nacho Chips',
     'pharetra magna ac consequat metus sapien ut nunc vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia',
     8.37,
+    8.37,
     22,
     '2020-12-20 00:00:00',
     5,
@@ -9049,6 +9952,7 @@ values
     'Apples - Spartan',
     'dignissim vestibulum vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere',
     45.92,
+    45.92,
     93,
     '2021-02-24 00:00:00',
     3,
@@ -9059,6 +9963,7 @@ values
     'Salami - Genova',
     'mauris non ligula pellentesque ultrices phasellus id sapien in sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at vulputate',
     13.74,
+    13.74,
     97,
     '2020-07-16 00:00:00',
     4,
@@ -9069,6 +9974,7 @@ values
     'Absolut Citron',
     'dapibus dolor vel est donec odio justo sollicitudin ut suscipit a feugiat et eros',
     88.20,
+    88.20,
     32,
     '2020-10-23 00:00:00',
     4,
@@ -9079,6 +9985,7 @@ values
     'Lumpfish Black',
     'tincidunt ante vel ipsum praesent blandit lacinia erat vestibulum sed magna at nunc commodo',
     56.77,
+    56.77,
     62,
     '2020-07-17 00:00:00',
     5,
@@ -9089,6 +9996,7 @@ values
     'Lamb - Whole, Frozen',
     'duis aliquam convallis nunc proin at turpis a pede posuere nonummy integer non velit',
     16.64,
+    16.64,
     39,
     '2020-11-10 00:00:00',
     5,
@@ -9099,6 +10007,7 @@ values
     'Soup - Campbells',
     'sagittis dui vel nisl duis ac nibh fusce lacus purus aliquet at feugiat non pretium quis',
     58.28,
+    58.28,
     78,
     '2020-12-13 00:00:00',
     4,
@@ -9109,6 +10018,7 @@ values
     'Bread - Mini Hamburger Bun',
     'eget tempus vel pede morbi porttitor lorem id ligula suspendisse ornare consequat lectus in est risus auctor sed tristique',
     3.98,
+    3.98,
     56,
     '2021-05-10 00:00:00',
     4,
@@ -9119,6 +10029,7 @@ values
     'Beef - Top Butt Aaa',
     'ut suscipit a feugiat et eros vestibulum ac est lacinia nisi',
     70.60,
+    70.60,
     93,
     '2020-10-23 00:00:00',
     5,
@@ -9129,6 +10040,7 @@ values
     'The Pop Shoppe - Root Beer',
     'vestibulum sagittis sapien cum sociis natoque penatibus et magnis dis parturient montes nascetur ridiculus mus etiam',
     81.50,
+    81.50,
     97,
     '2020-11-28 00:00:00',
     3,
@@ -9139,6 +10051,7 @@ values
     'Wine - Niagara Peninsula Vqa',
     'erat quisque erat eros viverra eget congue eget semper rutrum nulla nunc purus phasellus in felis donec semper',
     77.05,
+    77.05,
     87,
     '2021-03-31 00:00:00',
     6,
@@ -9149,6 +10062,7 @@ values
     'Wine - Red, Mouton Cadet',
     'nec sem duis aliquam convallis nunc proin at turpis a pede posuere nonummy',
     16.96,
+    16.96,
     32,
     '2020-12-05 00:00:00',
     5,
@@ -9159,6 +10073,7 @@ values
     'Longos - Chicken Cordon Bleu',
     'interdum eu tincidunt in leo maecenas pulvinar lobortis est phasellus sit amet erat',
     64.01,
+    64.01,
     90,
     '2020-06-21 00:00:00',
     4,
@@ -9169,6 +10084,7 @@ values
     'Lamb - Ground',
     'metus aenean fermentum donec ut mauris eget massa tempor convallis nulla',
     73.04,
+    73.04,
     92,
     '2020-11-07 00:00:00',
     3,
@@ -9179,6 +10095,7 @@ values
     'Sour Puss Sour Apple',
     'nonummy maecenas tincidunt lacus at velit vivamus vel nulla eget eros elementum pellentesque quisque porta volutpat erat quisque erat eros',
     59.71,
+    59.71,
     1,
     '2021-05-21 00:00:00',
     4,
@@ -9189,6 +10106,7 @@ values
     'Gingerale - Diet - Schweppes',
     'enim sit amet nunc viverra dapibus nulla suscipit ligula in lacus curabitur at ipsum ac tellus semper',
     80.01,
+    80.01,
     96,
     '2020-12-21 00:00:00',
     4,
@@ -9199,6 +10117,7 @@ values
     'Soup - Base Broth Chix',
     'nulla suscipit ligula in lacus curabitur at ipsum ac tellus semper interdum mauris ullamcorper purus',
     1.82,
+    1.82,
     45,
     '2020-08-03 00:00:00',
     4,
@@ -9209,6 +10128,7 @@ values
     'Bread - French Stick',
     'mauris viverra diam vitae quam suspendisse potenti nullam porttitor lacus at turpis donec posuere metus vitae',
     62.49,
+    62.49,
     73,
     '2020-09-18 00:00:00',
     4,
@@ -9219,6 +10139,7 @@ values
     'Turnip - White, Organic',
     'nisi vulputate nonummy maecenas tincidunt lacus at velit vivamus vel nulla eget eros elementum pellentesque quisque porta',
     43.91,
+    43.91,
     63,
     '2021-05-30 00:00:00',
     5,
@@ -9229,6 +10150,7 @@ values
     'Flour - Semolina',
     'accumsan felis ut at dolor quis odio consequat varius integer ac leo pellentesque ultrices mattis odio donec',
     25.44,
+    25.44,
     16,
     '2020-12-17 00:00:00',
     5,
@@ -9239,6 +10161,7 @@ values
     'Snapple Lemon Tea',
     'nec nisi volutpat eleifend donec ut dolor morbi vel lectus in quam fringilla rhoncus',
     92.30,
+    92.30,
     49,
     '2020-12-06 00:00:00',
     6,
@@ -9249,6 +10172,7 @@ values
     'Chocolate - Semi Sweet',
     'justo etiam pretium iaculis justo in hac habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla ut',
     93.91,
+    93.91,
     46,
     '2020-11-12 00:00:00',
     3,
@@ -9259,6 +10183,7 @@ values
     'Apple - Fuji',
     'ut tellus nulla ut erat id mauris vulputate elementum nullam varius',
     82.27,
+    82.27,
     22,
     '2020-12-08 00:00:00',
     6,
@@ -9269,6 +10194,7 @@ values
     'Oil - Grapeseed Oil',
     'luctus et ultrices posuere cubilia curae duis faucibus accumsan odio',
     11.68,
+    11.68,
     87,
     '2020-09-05 00:00:00',
     5,
@@ -9279,6 +10205,7 @@ values
     'Ham - Cooked',
     'orci mauris lacinia sapien quis libero nullam sit amet turpis elementum ligula vehicula consequat morbi a ipsum',
     57.01,
+    57.01,
     16,
     '2021-02-10 00:00:00',
     4,
@@ -9289,6 +10216,7 @@ values
     'Blackberries',
     'aenean lectus pellentesque eget nunc donec quis orci eget orci vehicula condimentum curabitur in libero ut massa volutpat convallis morbi',
     22.24,
+    22.24,
     17,
     '2020-07-21 00:00:00',
     4,
@@ -9299,6 +10227,7 @@ values
     'Onions - Spanish',
     'tortor duis mattis egestas metus aenean fermentum donec ut mauris eget massa tempor convallis nulla neque',
     99.83,
+    99.83,
     15,
     '2021-06-09 00:00:00',
     3,
@@ -9309,6 +10238,7 @@ values
     'Wheat - Soft Kernal Of Wheat',
     'non velit donec diam neque vestibulum eget vulputate ut ultrices vel',
     38.36,
+    38.36,
     28,
     '2020-08-18 00:00:00',
     5,
@@ -9319,6 +10249,7 @@ values
     'Tandoori Curry Paste',
     'sed tristique in tempus sit amet sem fusce consequat nulla nisl nunc nisl duis bibendum',
     15.51,
+    15.51,
     7,
     '2021-04-03 00:00:00',
     4,
@@ -9329,6 +10260,7 @@ values
     'Ice Cream Bar - Oreo Sandwich',
     'eget vulputate ut ultrices vel augue vestibulum ante ipsum primis in faucibus',
     29.51,
+    29.51,
     43,
     '2020-09-09 00:00:00',
     4,
@@ -9339,6 +10271,7 @@ values
     'Instant Coffee',
     'adipiscing elit proin interdum mauris non ligula pellentesque ultrices phasellus id sapien in sapien iaculis congue vivamus',
     67.65,
+    67.65,
     26,
     '2021-03-16 00:00:00',
     4,
@@ -9349,6 +10282,7 @@ values
     'Yogurt - Blueberry, 175 Gr',
     'tincidunt eu felis fusce posuere felis sed lacus morbi sem mauris laoreet ut rhoncus aliquet',
     93.57,
+    93.57,
     8,
     '2020-09-07 00:00:00',
     5,
@@ -9359,6 +10293,7 @@ values
     'Juice - Orange 1.89l',
     'habitasse platea dictumst morbi vestibulum velit id pretium iaculis diam erat fermentum justo nec condimentum neque sapien placerat ante nulla',
     24.33,
+    24.33,
     63,
     '2020-07-20 00:00:00',
     4,
@@ -9369,6 +10304,7 @@ values
     'Clams - Littleneck, Whole',
     'ut dolor morbi vel lectus in quam fringilla rhoncus mauris',
     80.37,
+    80.37,
     45,
     '2020-08-19 00:00:00',
     4,
@@ -9379,6 +10315,7 @@ values
     'Chicken - Whole Fryers',
     'ut rhoncus aliquet pulvinar sed nisl nunc rhoncus dui vel sem sed sagittis nam congue risus semper porta volutpat quam',
     59.14,
+    59.14,
     59,
     '2021-01-09 00:00:00',
     3,
@@ -9389,6 +10326,7 @@ values
     'Tart - Lemon',
     'sem fusce consequat nulla nisl nunc nisl duis bibendum felis',
     56.34,
+    56.34,
     88,
     '2020-10-06 00:00:00',
     6,
@@ -9399,6 +10337,7 @@ values
     'Pesto - Primerba, Paste',
     'lectus pellentesque eget nunc donec quis orci eget orci vehicula condimentum curabitur in libero ut massa volutpat',
     85.67,
+    85.67,
     27,
     '2021-01-16 00:00:00',
     6,
@@ -9409,6 +10348,7 @@ values
     'Apple - Granny Smith',
     'convallis nunc proin at turpis a pede posuere nonummy integer non',
     77.92,
+    77.92,
     68,
     '2020-09-30 00:00:00',
     4,
@@ -9419,6 +10359,7 @@ values
     'Cranberries - Dry',
     'pellentesque volutpat dui maecenas tristique est et tempus semper est',
     50.45,
+    50.45,
     87,
     '2020-08-14 00:00:00',
     5,
@@ -9429,6 +10370,7 @@ values
     'Sponge Cake Mix - Chocolate',
     'eros suspendisse accumsan tortor quis turpis sed ante vivamus tortor duis mattis egestas metus aenean fermentum',
     72.18,
+    72.18,
     84,
     '2021-03-04 00:00:00',
     5,
@@ -9439,6 +10381,7 @@ values
     'Daikon Radish',
     'a ipsum integer a nibh in quis justo maecenas rhoncus aliquam lacus morbi quis',
     12.90,
+    12.90,
     47,
     '2021-05-30 00:00:00',
     6,
@@ -9449,6 +10392,7 @@ values
     'Bread - Roll, Whole Wheat',
     'orci luctus et ultrices posuere cubilia curae donec pharetra magna vestibulum',
     85.47,
+    85.47,
     95,
     '2020-09-05 00:00:00',
     6,
@@ -9459,6 +10403,7 @@ values
     'Wine - White, French Cross',
     'convallis nulla neque libero convallis eget eleifend luctus ultricies eu',
     19.88,
+    19.88,
     88,
     '2021-01-06 00:00:00',
     3,
@@ -9469,6 +10414,7 @@ values
     'Numi - Assorted Teas',
     'hendrerit at vulputate vitae nisl aenean lectus pellentesque eget nunc',
     29.59,
+    29.59,
     7,
     '2020-12-22 00:00:00',
     3,
@@ -9479,6 +10425,7 @@ values
     'Longos - Chicken Cordon Bleu',
     'vitae consectetuer eget rutrum at lorem integer tincidunt ante vel ipsum praesent blandit lacinia erat vestibulum sed magna at nunc',
     46.23,
+    46.23,
     46,
     '2021-05-26 00:00:00',
     5,
@@ -9489,6 +10436,7 @@ values
     'Spice - Pepper Portions',
     'nunc proin at turpis a pede posuere nonummy integer non',
     7.48,
+    7.48,
     100,
     '2020-08-29 00:00:00',
     4,
@@ -9499,6 +10447,7 @@ values
     'Pastry - Cheese Baked Scones',
     'rutrum at lorem integer tincidunt ante vel ipsum praesent blandit lacinia erat vestibulum sed magna at nunc commodo placerat',
     48.37,
+    48.37,
     3,
     '2020-08-19 00:00:00',
     3,
@@ -9509,6 +10458,7 @@ values
     'Sprouts - Pea',
     'urna pretium nisl ut volutpat sapien arcu sed augue aliquam erat volutpat in congue etiam justo etiam pretium',
     76.76,
+    76.76,
     82,
     '2021-02-02 00:00:00',
     3,
@@ -9519,6 +10469,7 @@ values
     'Yoghurt Tubes',
     'sapien sapien non mi integer ac neque duis bibendum morbi non',
     97.98,
+    97.98,
     34,
     '2020-10-01 00:00:00',
     4,
@@ -9529,6 +10480,7 @@ values
     'Ginger - Pickled',
     'cras in purus eu magna vulputate luctus cum sociis natoque penatibus et magnis dis parturient',
     49.31,
+    49.31,
     56,
     '2020-06-28 00:00:00',
     4,
@@ -9539,6 +10491,7 @@ values
     'Salmon Steak - Cohoe 6 Oz',
     'vel accumsan tellus nisi eu orci mauris lacinia sapien quis libero nullam',
     16.26,
+    16.26,
     35,
     '2020-06-18 00:00:00',
     3,
@@ -9549,6 +10502,7 @@ values
     'Loaf Pan - 2 Lb, Foil',
     'in quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices',
     31.72,
+    31.72,
     85,
     '2020-08-29 00:00:00',
     5,
@@ -9559,6 +10513,7 @@ values
     'Pastry - Choclate Baked',
     'at turpis a pede posuere nonummy integer non velit donec diam neque vestibulum eget vulputate ut ultrices vel augue',
     64.81,
+    64.81,
     65,
     '2021-02-08 00:00:00',
     3,
@@ -9569,6 +10524,7 @@ values
     'Mustard - Seed',
     'pede posuere nonummy integer non velit donec diam neque vestibulum eget vulputate ut ultrices',
     21.70,
+    21.70,
     7,
     '2021-03-09 00:00:00',
     4,
@@ -9579,6 +10535,7 @@ values
     'Mushroom - Enoki, Fresh',
     'curae duis faucibus accumsan odio curabitur convallis duis consequat dui nec nisi volutpat eleifend',
     94.14,
+    94.14,
     36,
     '2021-06-03 00:00:00',
     6,
@@ -9589,6 +10546,7 @@ values
     'Coffee - Colombian, Portioned',
     'enim in tempor turpis nec euismod scelerisque quam turpis adipiscing lorem vitae mattis nibh',
     30.80,
+    30.80,
     88,
     '2020-11-29 00:00:00',
     4,
@@ -9599,6 +10557,7 @@ values
     'Juice - Ocean Spray Cranberry',
     'pellentesque quisque porta volutpat erat quisque erat eros viverra eget congue eget semper rutrum nulla nunc',
     33.25,
+    33.25,
     93,
     '2020-06-14 00:00:00',
     6,
@@ -9609,6 +10568,7 @@ values
     'Tomato Puree',
     'quis turpis sed ante vivamus tortor duis mattis egestas metus aenean fermentum donec ut mauris',
     87.22,
+    87.22,
     46,
     '2020-07-29 00:00:00',
     4,
@@ -9619,6 +10579,7 @@ values
     'Wine - Rosso Del Veronese Igt',
     'elit proin risus praesent lectus vestibulum quam sapien varius ut blandit non interdum in ante',
     78.05,
+    78.05,
     45,
     '2021-05-28 00:00:00',
     3,
@@ -9629,6 +10590,7 @@ values
     'Wine - Fume Blanc Fetzer',
     'aliquet ultrices erat tortor sollicitudin mi sit amet lobortis sapien sapien non mi integer ac',
     1.16,
+    1.16,
     46,
     '2020-10-25 00:00:00',
     4,
@@ -9639,6 +10601,7 @@ values
     'Goldschalger',
     'erat curabitur gravida nisi at nibh in hac habitasse platea dictumst aliquam',
     37.26,
+    37.26,
     91,
     '2021-03-16 00:00:00',
     4,
@@ -9649,6 +10612,7 @@ values
     'Wine - Manischewitz Concord',
     'id sapien in sapien iaculis congue vivamus metus arcu adipiscing',
     48.87,
+    48.87,
     53,
     '2021-04-20 00:00:00',
     4,
@@ -9659,6 +10623,7 @@ values
     'Beets - Golden',
     'integer a nibh in quis justo maecenas rhoncus aliquam lacus morbi quis tortor id nulla ultrices aliquet maecenas',
     42.69,
+    42.69,
     72,
     '2020-09-11 00:00:00',
     5,
@@ -9669,6 +10634,7 @@ values
     'Oysters - Smoked',
     'sapien in sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at vulputate vitae nisl aenean',
     41.69,
+    41.69,
     0,
     '2021-04-29 00:00:00',
     3,
@@ -9679,6 +10645,7 @@ values
     'Salmon Atl.whole 8 - 10 Lb',
     'dictumst maecenas ut massa quis augue luctus tincidunt nulla mollis molestie lorem quisque ut erat curabitur gravida',
     30.31,
+    30.31,
     74,
     '2021-01-03 00:00:00',
     6,
@@ -9689,6 +10656,7 @@ values
     'Rolled Oats',
     'quam a odio in hac habitasse platea dictumst maecenas ut massa quis augue',
     30.25,
+    30.25,
     62,
     '2020-09-07 00:00:00',
     4,
@@ -9699,6 +10667,7 @@ values
     'Monkfish - Fresh',
     'ultrices posuere cubilia curae donec pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis sapien sapien non',
     71.71,
+    71.71,
     98,
     '2020-10-16 00:00:00',
     6,
@@ -9709,6 +10678,7 @@ values
     'Carbonated Water - Blackcherry',
     'aliquet massa id lobortis convallis tortor risus dapibus augue vel accumsan tellus nisi eu orci mauris lacinia sapien',
     62.44,
+    62.44,
     94,
     '2021-04-21 00:00:00',
     5,
@@ -9719,6 +10689,7 @@ values
     'Pur Source',
     'maecenas ut massa quis augue luctus tincidunt nulla mollis molestie lorem',
     35.58,
+    35.58,
     28,
     '2020-08-21 00:00:00',
     3,
@@ -9729,6 +10700,7 @@ values
     'Pie Filling - Pumpkin',
     'tortor id nulla ultrices aliquet maecenas leo odio condimentum id luctus nec molestie sed justo pellentesque',
     1.38,
+    1.38,
     46,
     '2020-12-01 00:00:00',
     5,
@@ -9739,6 +10711,7 @@ values
     'Wonton Wrappers',
     'primis in faucibus orci luctus et ultrices posuere cubilia curae donec pharetra magna',
     61.63,
+    61.63,
     19,
     '2020-09-26 00:00:00',
     3,
@@ -9749,6 +10722,7 @@ values
     'Straw - Regular',
     'luctus rutrum nulla tellus in sagittis dui vel nisl duis ac nibh fusce lacus purus aliquet at feugiat non',
     14.67,
+    14.67,
     3,
     '2021-03-24 00:00:00',
     4,
@@ -9759,6 +10733,7 @@ values
     'Sparkling Wine - Rose, Freixenet',
     'congue elementum in hac habitasse platea dictumst morbi vestibulum velit id pretium iaculis diam erat fermentum',
     56.63,
+    56.63,
     66,
     '2020-08-07 00:00:00',
     3,
@@ -9769,6 +10744,7 @@ values
     'Galliano',
     'semper rutrum nulla nunc purus phasellus in felis donec semper sapien a libero',
     93.29,
+    93.29,
     90,
     '2021-01-29 00:00:00',
     5,
@@ -9779,6 +10755,7 @@ values
     'Passion Fruit',
     'habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla',
     64.48,
+    64.48,
     35,
     '2020-11-27 00:00:00',
     4,
@@ -9789,6 +10766,7 @@ values
     'Neckerchief Blck',
     'eu interdum eu tincidunt in leo maecenas pulvinar lobortis est phasellus sit amet erat nulla tempus',
     90.31,
+    90.31,
     100,
     '2020-07-14 00:00:00',
     6,
@@ -9799,6 +10777,7 @@ values
     'Sugar - Crumb',
     'eget rutrum at lorem integer tincidunt ante vel ipsum praesent',
     87.45,
+    87.45,
     0,
     '2021-02-17 00:00:00',
     6,
@@ -9809,6 +10788,7 @@ values
     'Oats Large Flake',
     'tellus semper interdum mauris ullamcorper purus sit amet nulla quisque arcu libero rutrum ac lobortis',
     53.35,
+    53.35,
     82,
     '2020-09-17 00:00:00',
     3,
@@ -9819,6 +10799,7 @@ values
     'Gelatine Leaves - Envelopes',
     'orci mauris lacinia sapien quis libero nullam sit amet turpis elementum ligula vehicula consequat',
     74.18,
+    74.18,
     91,
     '2020-11-19 00:00:00',
     5,
@@ -9829,6 +10810,7 @@ values
     'Chicken - Leg / Back Attach',
     'neque vestibulum eget vulputate ut ultrices vel augue vestibulum ante ipsum primis in faucibus orci',
     54.26,
+    54.26,
     65,
     '2020-08-12 00:00:00',
     3,
@@ -9839,6 +10821,7 @@ values
     'Cheese - Comte',
     'curabitur at ipsum ac tellus semper interdum mauris ullamcorper purus sit amet nulla quisque',
     75.97,
+    75.97,
     42,
     '2020-09-08 00:00:00',
     3,
@@ -9849,6 +10832,7 @@ values
     'Vinegar - Champagne',
     'nulla dapibus dolor vel est donec odio justo sollicitudin ut suscipit',
     86.92,
+    86.92,
     81,
     '2020-06-20 00:00:00',
     5,
@@ -9859,6 +10843,7 @@ values
     'Kiwi',
     'nascetur ridiculus mus etiam vel augue vestibulum rutrum rutrum neque aenean',
     79.46,
+    79.46,
     99,
     '2021-02-24 00:00:00',
     6,
@@ -9869,6 +10854,7 @@ values
     'Kohlrabi',
     'est congue elementum in hac habitasse platea dictumst morbi vestibulum velit id pretium',
     48.16,
+    48.16,
     77,
     '2021-03-12 00:00:00',
     3,
@@ -9879,6 +10865,7 @@ values
     'Brandy Cherry - Mcguinness',
     'ac nibh fusce lacus purus aliquet at feugiat non pretium quis lectus',
     9.64,
+    9.64,
     57,
     '2021-01-20 00:00:00',
     3,
@@ -9889,6 +10876,7 @@ values
     'Sultanas',
     'sed accumsan felis ut at dolor quis odio consequat varius integer ac leo pellentesque ultrices mattis odio donec',
     62.10,
+    62.10,
     1,
     '2020-06-20 00:00:00',
     3,
@@ -9899,6 +10887,7 @@ values
     'V8 - Berry Blend',
     'ipsum ac tellus semper interdum mauris ullamcorper purus sit amet nulla quisque arcu libero rutrum ac lobortis vel dapibus at',
     15.77,
+    15.77,
     64,
     '2020-07-16 00:00:00',
     5,
@@ -9909,6 +10898,7 @@ values
     'Soup - Campbells, Creamy',
     'pharetra magna vestibulum aliquet ultrices erat tortor sollicitudin mi sit amet lobortis sapien sapien non',
     22.70,
+    22.70,
     30,
     '2021-01-06 00:00:00',
     3,
@@ -9919,6 +10909,7 @@ values
     'Creamers - 10%',
     'suspendisse potenti in eleifend quam a odio in hac habitasse platea dictumst maecenas ut massa',
     71.17,
+    71.17,
     53,
     '2021-01-05 00:00:00',
     5,
@@ -9929,6 +10920,7 @@ values
     'Mushroom - Porcini, Dry',
     'turpis sed ante vivamus tortor duis mattis egestas metus aenean fermentum donec ut mauris eget massa tempor',
     41.43,
+    41.43,
     36,
     '2020-07-08 00:00:00',
     4,
@@ -9939,6 +10931,7 @@ values
     'Cake - Miini Cheesecake Cherry',
     'lacinia eget tincidunt eget tempus vel pede morbi porttitor lorem id ligula',
     53.99,
+    53.99,
     59,
     '2020-10-27 00:00:00',
     6,
@@ -9949,6 +10942,7 @@ values
     'Carbonated Water - Raspberry',
     'proin eu mi nulla ac enim in tempor turpis nec euismod scelerisque quam turpis adipiscing lorem vitae mattis',
     32.22,
+    32.22,
     51,
     '2021-04-20 00:00:00',
     3,
@@ -9959,6 +10953,7 @@ values
     'Cream Of Tartar',
     'sed sagittis nam congue risus semper porta volutpat quam pede lobortis ligula sit amet eleifend',
     35.22,
+    35.22,
     44,
     '2020-08-31 00:00:00',
     4,
@@ -9969,6 +10964,7 @@ values
     'Club Soda - Schweppes, 355 Ml',
     'sed tristique in tempus sit amet sem fusce consequat nulla nisl nunc nisl',
     8.32,
+    8.32,
     61,
     '2021-03-19 00:00:00',
     3,
@@ -9979,6 +10975,7 @@ values
     'Beef - Rib Roast, Capless',
     'sem sed sagittis nam congue risus semper porta volutpat quam pede lobortis ligula sit amet eleifend pede libero quis orci',
     52.90,
+    52.90,
     68,
     '2020-06-20 00:00:00',
     6,
@@ -9989,6 +10986,7 @@ values
     'Salt - Table',
     'etiam justo etiam pretium iaculis justo in hac habitasse platea dictumst etiam faucibus cursus urna ut tellus nulla ut erat',
     37.51,
+    37.51,
     7,
     '2021-05-02 00:00:00',
     6,
@@ -9999,6 +10997,7 @@ values
     'Muffin Hinge 117n',
     'mauris non ligula pellentesque ultrices phasellus id sapien in sapien iaculis congue vivamus metus arcu adipiscing molestie hendrerit at vulputate',
     59.84,
+    59.84,
     98,
     '2020-06-29 00:00:00',
     3,
@@ -10009,6 +11008,7 @@ values
     'Chicken - Wieners',
     'eget tempus vel pede morbi porttitor lorem id ligula suspendisse ornare',
     58.57,
+    58.57,
     5,
     '2020-08-16 00:00:00',
     6,
@@ -10019,6 +11019,7 @@ values
     'Dried Peach',
     'in faucibus orci luctus et ultrices posuere cubilia curae nulla dapibus dolor vel est donec odio justo sollicitudin',
     41.22,
+    41.22,
     39,
     '2020-12-12 00:00:00',
     4,
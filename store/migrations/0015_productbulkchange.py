@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_payment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductBulkChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('price_percent', 'Change price by percent'), ('price_amount', 'Change price by amount'), ('inventory_delta', 'Change inventory by')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('product_count', models.PositiveIntegerField()),
+                ('product_ids', models.JSONField()),
+                ('source', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
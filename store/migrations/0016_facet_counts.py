@@ -0,0 +1,61 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_productbulkchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_band', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PromotionFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_band', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['collection', 'unit_price'], name='store_produ_collect_5f8db0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['unit_price'], name='store_produ_unit_pr_d8cb6a_idx'),
+        ),
+        migrations.AddField(
+            model_name='facetcount',
+            name='collection',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.collection'),
+        ),
+        migrations.AddField(
+            model_name='promotionfacetcount',
+            name='collection',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.collection'),
+        ),
+        migrations.AddField(
+            model_name='promotionfacetcount',
+            name='promotion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.promotion'),
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(fields=('collection', 'price_band'), name='unique_facet_count'),
+        ),
+        migrations.AddConstraint(
+            model_name='promotionfacetcount',
+            constraint=models.UniqueConstraint(fields=('promotion', 'collection', 'price_band'), name='unique_promotion_facet_count'),
+        ),
+    ]
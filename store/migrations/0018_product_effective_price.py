@@ -0,0 +1,34 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def fill_effective_prices(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Product.objects.update(effective_price=F('unit_price'))
+    discounted = Product.promotions.through.objects.values('product_id') \
+        .annotate(best=Max('promotion__discount')).values_list('product_id', 'best')
+    for product_id, discount in discounted.iterator():
+        product = Product.objects.get(pk=product_id)
+        discount = min(max(Decimal(str(discount or 0)), Decimal(0)), Decimal(100))
+        product.effective_price = (product.unit_price * (100 - discount) / 100) \
+            .quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        product.save(update_fields=['effective_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=6),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_effective_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:42
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def count_reviews(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    counts = Review.objects.filter(product=OuterRef('pk')).order_by() \
+        .values('product').annotate(total=Count('id')).values('total')
+    Product.objects.filter(id__in=Review.objects.values('product_id')) \
+        .update(reviews_count=Subquery(counts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='ratings_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='ratings_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='rating',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'date', 'id'], name='store_revie_product_9c1f89_idx'),
+        ),
+        migrations.RunPython(count_reviews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('store', '0019_review_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('score', models.FloatField(default=0)),
+                ('collection', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.collection')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['content_type', '-score'], name='store_trend_content_ac88ed_idx'), models.Index(fields=['content_type', 'collection', '-score'], name='store_trend_content_c94099_idx')],
+                'constraints': [models.UniqueConstraint(fields=('content_type', 'object_id'), name='unique_trending_score')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_trending_scores'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='reserved',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+    ]
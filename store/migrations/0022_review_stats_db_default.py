@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-19 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_product_reserved_db_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='ratings_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='ratings_sum',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='reviews_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.conf import settings
-from django.core.validators import MinValueValidator
+from django.contrib.contenttypes.models import ContentType
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import F, Sum
 from uuid import uuid4
 
 
@@ -30,7 +32,16 @@ class Product(models.Model):
         max_digits=6,
         decimal_places=2,
         validators=[MinValueValidator(1)])
+    # unit_price after the best promotion; see store.pricing.
+    effective_price = models.DecimalField(
+        max_digits=6, decimal_places=2, editable=False)
     inventory = models.IntegerField(validators=[MinValueValidator(0)])
+    # Units held by cart reservations; see store.reservations.
+    reserved = models.PositiveIntegerField(default=0, db_default=0, editable=False)
+    # Review summary, kept up to date by store.reviews.
+    reviews_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)
+    ratings_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)
+    ratings_sum = models.PositiveIntegerField(default=0, db_default=0, editable=False)
     last_update = models.DateTimeField(auto_now=True)
     collection = models.ForeignKey(
         Collection, on_delete=models.PROTECT, related_name='products')
@@ -39,8 +50,105 @@ class Product(models.Model):
     def __str__(self) -> str:
         return self.title
 
+    # Only ever changed with F() updates, so saves must not write back a
+    # value loaded before the latest ones; see store.reservations and
+    # store.reviews.
+    UPDATE_ONLY_FIELDS = {'reserved', 'reviews_count', 'ratings_count', 'ratings_sum'}
+
+    @property
+    def available(self):
+        return self.inventory - self.reserved
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields
+                                 if not field.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields
+                                       if name not in self.UPDATE_ONLY_FIELDS]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['collection', 'unit_price']),
+            models.Index(fields=['unit_price']),
+        ]
+
+
+class FacetCount(models.Model):
+    """Number of products per collection and price band."""
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='+')
+    price_band = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['collection', 'price_band'],
+                                    name='unique_facet_count'),
+        ]
+
+
+class PromotionFacetCount(models.Model):
+    """Number of products per promotion, collection and price band."""
+    promotion = models.ForeignKey(Promotion, on_delete=models.CASCADE, related_name='+')
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='+')
+    price_band = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['promotion', 'collection', 'price_band'],
+                                    name='unique_promotion_facet_count'),
+        ]
+
+
+class TrendingScore(models.Model):
+    """
+    Time-decayed sales and likes of a product, kept by ``store.trending``.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    object_id = models.PositiveIntegerField()
+    collection = models.ForeignKey(
+        Collection, on_delete=models.SET_NULL, null=True, related_name='+')
+    score = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'],
+                                    name='unique_trending_score'),
+        ]
+        indexes = [
+            models.Index(fields=['content_type', '-score']),
+            models.Index(fields=['content_type', 'collection', '-score']),
+        ]
+
+
+class ProductBulkChange(models.Model):
+    KIND_PRICE_PERCENT = 'price_percent'
+    KIND_PRICE_AMOUNT = 'price_amount'
+    KIND_INVENTORY_DELTA = 'inventory_delta'
+    KIND_CHOICES = [
+        (KIND_PRICE_PERCENT, 'Change price by percent'),
+        (KIND_PRICE_AMOUNT, 'Change price by amount'),
+        (KIND_INVENTORY_DELTA, 'Change inventory by'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    product_count = models.PositiveIntegerField()
+    product_ids = models.JSONField()
+    source = models.CharField(max_length=255, blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f'{self.get_kind_display()} {self.amount} ({self.product_count} products)'
+
+    class Meta:
+        ordering = ['-created_at']
 
 
 class Customer(models.Model):
@@ -93,6 +201,11 @@ class Order(models.Model):
         max_length=1, choices=PAYMENT_STATUS_CHOICES, default=PAYMENT_STATUS_PENDING)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
 
+    @property
+    def total_price(self):
+        return self.items.aggregate(
+            total=Sum(F('quantity') * F('unit_price')))['total'] or 0
+
     class Meta:
         permissions = [
             ('cancel_order', 'Can cancel order')
@@ -131,13 +244,31 @@ class CartItem(models.Model):
         unique_together = [['cart', 'product']]
 
 
+class Reservation(models.Model):
+    """Stock held for a cart item until ``expires_at``."""
+    cart_item = models.OneToOneField(
+        CartItem, on_delete=models.CASCADE, related_name='reservation')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+
 class Review(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name='reviews')
     name = models.CharField(max_length=255)
     description = models.TextField()
+    rating = models.PositiveSmallIntegerField(
+        null=True, blank=True,
+        validators=[MinValueValidator(1), MaxValueValidator(5)])
     date = models.DateField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'date', 'id']),
+        ]
+
+
 class Payment(models.Model):
     PAYMENT_CHOICES= [
         ('credit_card', 'Credit Card'),
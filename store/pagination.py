@@ -1,4 +1,97 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class DefaultPagination(PageNumberPagination):
-  page_size = 10
\ No newline at end of file
+  page_size = 10
+
+
+class KeysetPagination(BasePagination):
+  """
+  Pages through a queryset by the values of the ``ordering`` fields of the
+  last row, so every page is one index range scan however deep it is.
+  ``ordering`` must end with a unique field. Rows may be model instances,
+  dicts or named tuples.
+  """
+  page_size = 20
+  max_page_size = 100
+  ordering = ('-date', '-id')
+  cursor_query_param = 'cursor'
+  page_size_query_param = 'page_size'
+  named_rows = True
+
+  def paginate_queryset(self, queryset, request, view=None):
+    self.request = request
+    fields = [field.lstrip('-') for field in self.ordering]
+    queryset = queryset.order_by(*self.ordering)
+    cursor = self.decode_cursor(request, queryset.model)
+    if cursor is not None:
+      queryset = queryset.filter(self.after(cursor))
+
+    page_size = self.get_page_size(request)
+    rows = list(queryset[:page_size + 1])
+    self.next_position = None
+    if len(rows) > page_size:
+      rows = rows[:page_size]
+      last = rows[-1]
+      self.next_position = [last[field] if isinstance(last, dict) else getattr(last, field)
+                            for field in fields]
+    return rows
+
+  def after(self, position):
+    # (a, b) after (x, y) in the ordering: a beyond x, or a = x and b beyond y.
+    condition = Q()
+    for index, field in enumerate(self.ordering):
+      name = field.lstrip('-')
+      lookup = 'lt' if field.startswith('-') else 'gt'
+      equal = {f.lstrip('-'): position[i] for i, f in enumerate(self.ordering[:index])}
+      condition |= Q(**equal, **{f'{name}__{lookup}': position[index]})
+    return condition
+
+  def get_page_size(self, request):
+    try:
+      page_size = int(request.query_params[self.page_size_query_param])
+    except (KeyError, ValueError):
+      return self.page_size
+    return max(1, min(page_size, self.max_page_size))
+
+  def decode_cursor(self, request, model):
+    encoded = request.query_params.get(self.cursor_query_param)
+    if not encoded:
+      return None
+    try:
+      position = json.loads(urlsafe_b64decode(encoded.encode()))
+    except (TypeError, ValueError):
+      raise NotFound('Invalid cursor')
+    if not isinstance(position, list) or len(position) != len(self.ordering):
+      raise NotFound('Invalid cursor')
+    # Each value is parsed as its field would parse it, so a tampered
+    # cursor is a 404 rather than an error from the query.
+    values = []
+    for field, value in zip(self.ordering, position):
+      try:
+        value = model._meta.get_field(field.lstrip('-')).to_python(value)
+      except (ValidationError, TypeError, ValueError):
+        raise NotFound('Invalid cursor')
+      if value is None:
+        raise NotFound('Invalid cursor')
+      values.append(value)
+    return values
+
+  def get_next_link(self):
+    if self.next_position is None:
+      return None
+    encoded = urlsafe_b64encode(
+      json.dumps(self.next_position, cls=DjangoJSONEncoder).encode()).decode()
+    return replace_query_param(
+      self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+  def get_paginated_response(self, data):
+    return Response({'next': self.get_next_link(), 'results': data})
@@ -0,0 +1,48 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Max
+
+from .models import Product
+
+CENT = Decimal('0.01')
+BATCH_SIZE = 1000
+
+Promotions = Product.promotions.through
+
+
+def effective_price(unit_price, discount):
+    """
+    The price after a promotion; ``discount`` is a percentage. A product in
+    several promotions gets the best one, promotions don't stack.
+    """
+    discount = min(max(Decimal(str(discount or 0)), Decimal(0)), Decimal(100))
+    return (unit_price * (100 - discount) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def best_discounts(product_ids):
+    return dict(Promotions.objects.filter(product_id__in=product_ids)
+                .values('product_id').annotate(best=Max('promotion__discount'))
+                .values_list('product_id', 'best'))
+
+
+def refresh_effective_prices(product_ids=None):
+    """
+    Recompute ``Product.effective_price`` for ``product_ids`` (every product
+    when None), writing only the prices that changed. Returns that number.
+    """
+    if product_ids is None:
+        product_ids = Product.objects.order_by('id').values_list('id', flat=True)
+    product_ids = list(product_ids)
+    changed = 0
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        batch = product_ids[start:start + BATCH_SIZE]
+        discounts = best_discounts(batch)
+        products = []
+        for pk, unit_price, current in Product.objects.filter(id__in=batch) \
+                .values_list('id', 'unit_price', 'effective_price'):
+            price = effective_price(unit_price, discounts.get(pk))
+            if price != current:
+                products.append(Product(id=pk, effective_price=price))
+        Product.objects.bulk_update(products, ['effective_price'])
+        changed += len(products)
+    return changed
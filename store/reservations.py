@@ -0,0 +1,117 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, Reservation
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id, available):
+        super().__init__(f'Only {available} of product {product_id} left in stock.')
+        self.product_id = product_id
+        self.available = available
+
+
+def _take(product_id, quantity):
+    # A conditional UPDATE checks and takes the stock in one statement, so
+    # concurrent carts can never reserve more than the inventory.
+    taken = Product.objects \
+        .filter(pk=product_id, inventory__gte=F('reserved') + quantity) \
+        .update(reserved=F('reserved') + quantity)
+    if not taken:
+        raise OutOfStock(product_id, available(product_id))
+
+
+def _give_back(rows):
+    """Return ``(product_id, quantity)`` holds to stock with one UPDATE."""
+    totals = Counter()
+    for product_id, quantity in rows:
+        totals[product_id] += quantity
+    if totals:
+        Product.objects.filter(id__in=totals).update(reserved=F('reserved') - Case(
+            *[When(id=product_id, then=Value(quantity)) for product_id, quantity in totals.items()],
+            default=Value(0)))
+
+
+def available(product_id):
+    """Units of a product that can still be added to carts."""
+    return Product.objects.filter(pk=product_id) \
+        .values_list(F('inventory') - F('reserved'), flat=True).first() or 0
+
+
+def hold(cart_item):
+    """
+    Reserve ``cart_item.quantity`` units for the item and restart its TTL.
+    Raises OutOfStock; call it inside the transaction that changes the item.
+    """
+    expires_at = timezone.now() + settings.CART_RESERVATION_TTL
+    reservation = Reservation.objects.select_for_update() \
+        .filter(cart_item=cart_item).first()
+    held = reservation.quantity if reservation else 0
+    if cart_item.quantity > held:
+        _take(cart_item.product_id, cart_item.quantity - held)
+    elif cart_item.quantity < held:
+        _give_back([(cart_item.product_id, held - cart_item.quantity)])
+
+    if reservation is None:
+        Reservation.objects.create(cart_item=cart_item, product_id=cart_item.product_id,
+                                   quantity=cart_item.quantity, expires_at=expires_at)
+    else:
+        Reservation.objects.filter(pk=reservation.pk).update(
+            quantity=cart_item.quantity, expires_at=expires_at)
+
+
+def release(reservations):
+    """Give the stock of ``reservations`` back and delete them."""
+    with transaction.atomic():
+        rows = list(reservations.select_for_update().order_by('id')
+                    .values_list('id', 'product_id', 'quantity'))
+        if rows:
+            _give_back([(product_id, quantity) for _, product_id, quantity in rows])
+            Reservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+    return len(rows)
+
+
+def release_expired(batch_size=1000):
+    """Release every expired reservation, a batch per transaction."""
+    now = timezone.now()
+    released = 0
+    while True:
+        ids = list(Reservation.objects.filter(expires_at__lte=now)
+                   .order_by('expires_at').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return released
+        released += release(Reservation.objects.filter(id__in=ids, expires_at__lte=now))
+
+
+def sell(cart_items):
+    """
+    Turn the holds of ``cart_items`` into inventory decrements. Items whose
+    hold expired take their stock now. Raises OutOfStock; call it inside
+    the checkout transaction.
+    """
+    held = dict(Reservation.objects.select_for_update()
+                .filter(cart_item__in=[item.id for item in cart_items])
+                .values_list('cart_item_id', 'quantity'))
+    # Lock products in a fixed order so concurrent checkouts can't deadlock.
+    for item in sorted(cart_items, key=lambda item: item.product_id):
+        reserved = held.get(item.id, 0)
+        sold = Product.objects \
+            .filter(pk=item.product_id,
+                    inventory__gte=F('reserved') + (item.quantity - reserved)) \
+            .update(inventory=F('inventory') - item.quantity,
+                    reserved=F('reserved') - reserved)
+        if not sold:
+            raise OutOfStock(item.product_id, available(item.product_id) + reserved)
+    Reservation.objects.filter(cart_item_id__in=held).delete()
+
+
+def recount():
+    """Recompute ``Product.reserved`` from the reservations table."""
+    totals = Reservation.objects.filter(product=OuterRef('pk')).order_by() \
+        .values('product').annotate(total=Sum('quantity')).values('total')
+    return Product.objects.update(reserved=Coalesce(Subquery(totals), 0))
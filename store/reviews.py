@@ -0,0 +1,36 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Product, Review
+
+
+def adjust(product_id, reviews=0, rating=None, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) a review from a product's summary."""
+    changes = {}
+    if reviews:
+        changes['reviews_count'] = F('reviews_count') + sign * reviews
+    if rating is not None:
+        changes['ratings_count'] = F('ratings_count') + sign
+        changes['ratings_sum'] = F('ratings_sum') + sign * rating
+    if changes:
+        Product.objects.filter(pk=product_id).update(**changes)
+
+
+def average_rating(ratings_sum, ratings_count):
+    if not ratings_count:
+        return None
+    return round(ratings_sum / ratings_count, 2)
+
+
+def rebuild_review_stats():
+    """Recount every product's review summary. Returns the number of products."""
+    def total(aggregate):
+        return Coalesce(Subquery(
+            Review.objects.filter(product=OuterRef('pk')).order_by()
+            .values('product').annotate(total=aggregate).values('total'),
+            output_field=IntegerField()), 0)
+
+    return Product.objects.update(
+        reviews_count=total(Count('id')),
+        ratings_count=total(Count('rating')),
+        ratings_sum=total(Sum('rating')))
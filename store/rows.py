@@ -0,0 +1,137 @@
+from collections import defaultdict
+
+from django.utils.functional import cached_property
+from rest_framework import serializers
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+
+
+class RowSerializer:
+    """
+    Serializes ``values_list()`` rows to exactly what ``serializer_class``
+    would produce, without building model instances.
+
+    The serializer's fields are compiled once into a list of columns and a
+    converter per column (the bound DRF field's own ``to_representation``),
+    so each row costs one tuple lookup and one call per field. Nested
+    serializers are read from the same row through ``__`` lookups, and
+    ``many=True`` nested serializers with one extra query per page.
+    SerializerMethodFields must be given in ``computed`` as
+    ``{name: (column, function)}``, or ``{name: ((column, ...), function)}``
+    to call ``function`` with several columns. Fields that can't be read
+    from the row at all are given in ``loaders`` as ``{name: function}``;
+    ``function(ids)`` is called once per page and returns a defaultdict
+    from id to value.
+    """
+
+    def __init__(self, serializer_class, computed=None, prefix='', loaders=None):
+        self.serializer_class = serializer_class
+        self.computed = computed or {}
+        self.prefix = prefix
+        self.loaders = loaders or {}
+
+    @cached_property
+    def model(self):
+        return self.serializer_class.Meta.model
+
+    @cached_property
+    def plan(self):
+        columns, steps, children = [], [], []
+        for name, field in self.serializer_class().fields.items():
+            if name in self.loaders:
+                continue
+            if name in self.computed:
+                column, convert = self.computed[name]
+                if isinstance(column, tuple):
+                    steps.append((name, slice(len(columns), len(columns) + len(column)),
+                                  lambda values, convert=convert: convert(*values)))
+                    columns.extend(self.prefix + c for c in column)
+                else:
+                    steps.append((name, len(columns), convert))
+                    columns.append(self.prefix + column)
+            elif isinstance(field, serializers.ListSerializer):
+                relation = self.model._meta.get_field(field.source)
+                child = RowSerializer(type(field.child))
+                children.append((name, relation.related_model, relation.field.attname, child))
+            elif isinstance(field, serializers.BaseSerializer):
+                nested = RowSerializer(type(field), prefix=f'{self.prefix}{field.source}__')
+                steps.append((name, slice(len(columns), len(columns) + len(nested.columns)),
+                              nested.to_representation))
+                columns.extend(nested.columns)
+            elif isinstance(field, serializers.RelatedField):
+                attname = self.model._meta.get_field(field.source).attname
+                steps.append((name, len(columns), None))
+                columns.append(self.prefix + attname)
+            else:
+                steps.append((name, len(columns), field.to_representation))
+                columns.append(self.prefix + field.source)
+        if (children or self.loaders) and 'id' not in columns:
+            raise ValueError(f'{self.serializer_class.__name__} needs an id field '
+                             'to load nested many=True fields.')
+        return columns, steps, children
+
+    @property
+    def columns(self):
+        return self.plan[0]
+
+    def values(self, queryset, named=False):
+        return queryset.values_list(*self.columns, named=named)
+
+    def to_representation(self, row):
+        data = {}
+        for name, index, convert in self.plan[1]:
+            if isinstance(index, slice):
+                data[name] = convert(row[index])
+                continue
+            value = row[index]
+            if value is None or convert is None:
+                data[name] = value
+            else:
+                data[name] = convert(value)
+        return data
+
+    def many(self, rows):
+        items = [self.to_representation(row) for row in rows]
+        for name, model, fk, child in self.plan[2]:
+            ids = [item['id'] for item in items]
+            grouped = defaultdict(list)
+            related = model.objects.filter(**{f'{fk}__in': ids}).order_by('pk')
+            for row in related.values_list(fk, *child.columns):
+                grouped[row[0]].append(row[1:])
+            for item in items:
+                item[name] = child.many(grouped[item['id']])
+        for name, loader in self.loaders.items():
+            loaded = loader([item['id'] for item in items])
+            for item in items:
+                item[name] = loaded[item['id']]
+        return items
+
+
+class RowReadMixin:
+    """
+    Serves list and retrieve through ``row_serializer``; writes still go
+    through the regular serializer classes. Object permissions are checked
+    on the model instance, loaded only for permission classes that
+    implement ``has_object_permission``.
+    """
+    row_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        # Keyset pagination reads the ordering columns of rows by name.
+        rows = self.row_serializer.values(
+            self.filter_queryset(self.get_queryset()),
+            named=getattr(self.paginator, 'named_rows', False))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.row_serializer.many(page))
+        return Response(self.row_serializer.many(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        rows = self.row_serializer.values(self.filter_queryset(self.get_queryset()))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(rows, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        if any(type(permission).has_object_permission is not BasePermission.has_object_permission
+               for permission in self.get_permissions()):
+            self.check_object_permissions(request, self.get_object())
+        return Response(self.row_serializer.many([row])[0])
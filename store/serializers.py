@@ -2,9 +2,22 @@ from decimal import Decimal
 from django.db import transaction
 from rest_framework import serializers
 from .signals import order_created
+from .reservations import OutOfStock, hold, sell
+from .reviews import average_rating
 from .models import Cart, CartItem, Customer, Order, OrderItem, Product, Collection, Review, Payment
 
 
+def price_with_tax(unit_price):
+    return unit_price * Decimal(1.1)
+
+
+def hold_stock(cart_item):
+    try:
+        hold(cart_item)
+    except OutOfStock as e:
+        raise serializers.ValidationError({'quantity': [str(e)]})
+
+
 class CollectionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Collection
@@ -17,19 +30,24 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'title', 'description', 'slug', 'inventory',
-                  'unit_price', 'price_with_tax', 'collection']
+                  'unit_price', 'effective_price', 'price_with_tax', 'collection',
+                  'reviews_count', 'average_rating']
 
     price_with_tax = serializers.SerializerMethodField(
         method_name='calculate_tax')
+    average_rating = serializers.SerializerMethodField()
 
     def calculate_tax(self, product: Product):
-        return product.unit_price * Decimal(1.1)
+        return price_with_tax(product.unit_price)
+
+    def get_average_rating(self, product: Product):
+        return average_rating(product.ratings_sum, product.ratings_count)
 
 
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
-        fields = ['id', 'date', 'name', 'description']
+        fields = ['id', 'date', 'name', 'rating', 'description']
 
     def create(self, validated_data):
         product_id = self.context['product_id']
@@ -39,7 +57,7 @@ class ReviewSerializer(serializers.ModelSerializer):
 class SimpleProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ['id', 'title', 'unit_price']
+        fields = ['id', 'title', 'unit_price', 'effective_price']
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -47,7 +65,7 @@ class CartItemSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
 
     def get_total_price(self, cart_item: CartItem):
-        return cart_item.quantity * cart_item.product.unit_price
+        return cart_item.quantity * cart_item.product.effective_price
 
     class Meta:
         model = CartItem
@@ -60,7 +78,7 @@ class CartSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
 
     def get_total_price(self, cart):
-        return sum([item.quantity * item.product.unit_price for item in cart.items.all()])
+        return sum([item.quantity * item.product.effective_price for item in cart.items.all()])
 
     class Meta:
         model = Cart
@@ -81,15 +99,17 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         product_id = self.validated_data['product_id']
         quantity = self.validated_data['quantity']
 
-        try:
-            cart_item = CartItem.objects.get(
-                cart_id=cart_id, product_id=product_id)
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            self.instance = CartItem.objects.create(
-                cart_id=cart_id, **self.validated_data)
+        with transaction.atomic():
+            try:
+                cart_item = CartItem.objects.get(
+                    cart_id=cart_id, product_id=product_id)
+                cart_item.quantity += quantity
+                cart_item.save()
+                self.instance = cart_item
+            except CartItem.DoesNotExist:
+                self.instance = CartItem.objects.create(
+                    cart_id=cart_id, **self.validated_data)
+            hold_stock(self.instance)
 
         return self.instance
 
@@ -99,6 +119,12 @@ class AddCartItemSerializer(serializers.ModelSerializer):
 
 
 class UpdateCartItemSerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            hold_stock(instance)
+        return instance
+
     class Meta:
         model = CartItem
         fields = ['quantity']
@@ -153,14 +179,19 @@ class CreateOrderSerializer(serializers.Serializer):
                 user_id=self.context['user_id'])
             order = Order.objects.create(customer=customer)
 
-            cart_items = CartItem.objects \
-                .select_related('product') \
-                .filter(cart_id=cart_id)
+            cart_items = list(CartItem.objects
+                              .select_related('product')
+                              .filter(cart_id=cart_id))
+            try:
+                sell(cart_items)
+            except OutOfStock as e:
+                raise serializers.ValidationError({'cart_id': [str(e)]})
+
             order_items = [
                 OrderItem(
                     order=order,
                     product=item.product,
-                    unit_price=item.product.unit_price,
+                    unit_price=item.product.effective_price,
                     quantity=item.quantity
                 ) for item in cart_items
             ]
@@ -168,7 +199,7 @@ class CreateOrderSerializer(serializers.Serializer):
 
             Cart.objects.filter(pk=cart_id).delete()
 
-            order_created.send_robust(self.__class__, order=order)
+            order_created.send_robust(self.__class__, order=order, items=order_items)
 
             return order
 
@@ -225,4 +256,14 @@ class PaymentReceiptSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = ['id', 'receipt_id', 'transaction_id', 'payment_method', 'amount', 
-                  'payment_date', 'status', 'customer_name', 'order_number']
\ No newline at end of file
+                  'payment_date', 'status', 'customer_name', 'order_number']
+
+class ProductImportSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    title = serializers.CharField(max_length=255)
+    slug = serializers.SlugField(required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+    unit_price = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=1)
+    inventory = serializers.IntegerField(min_value=0)
+    # Either a collection id or its title; resolved by the importer.
+    collection = serializers.CharField()
@@ -1,9 +1,159 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from store.models import Customer
+from likes.models import LikedItem
+from store import facets, pricing, reservations, reviews, trending
+from store.signals import order_created
+from store.models import Cart, CartItem, Customer, Product, Promotion, Reservation, Review
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_customer_for_new_user(sender, **kwargs):
   if kwargs['created']:
-    Customer.objects.create(user=kwargs['instance'])
\ No newline at end of file
+    Customer.objects.create(user=kwargs['instance'])
+
+@receiver(pre_save, sender=Product)
+def remember_facet_key(sender, instance, **kwargs):
+  instance._facet_previous = None
+  if instance.pk is not None:
+    instance._facet_previous = Product.objects.filter(pk=instance.pk) \
+      .values_list('collection_id', 'unit_price').first()
+
+
+@receiver(pre_save, sender=Product)
+def set_effective_price(sender, instance, **kwargs):
+  discount = None
+  if instance.pk is not None:
+    discount = pricing.best_discounts([instance.pk]).get(instance.pk)
+  instance.effective_price = pricing.effective_price(instance.unit_price, discount)
+
+
+@receiver(post_save, sender=Product)
+def update_facets_on_save(sender, instance, created, **kwargs):
+  current = (instance.collection_id, facets.price_band(instance.unit_price))
+  previous = getattr(instance, '_facet_previous', None)
+  if previous is not None:
+    previous = (previous[0], facets.price_band(previous[1]))
+  if previous == current:
+    return
+  promotions = [] if created else list(
+    facets.Promotions.objects.filter(product_id=instance.pk).values_list('promotion_id', flat=True))
+  if previous is not None:
+    facets.adjust([previous + (promotions,)], -1)
+  facets.adjust([current + (promotions,)], 1)
+
+
+@receiver(post_save, sender=Product)
+def move_trending_score(sender, instance, created, **kwargs):
+  previous = getattr(instance, '_facet_previous', None)
+  if previous is not None and previous[0] != instance.collection_id:
+    trending.move(instance.pk, instance.collection_id)
+
+
+@receiver(pre_delete, sender=Product)
+def update_facets_on_delete(sender, instance, **kwargs):
+  facets.adjust(facets.product_entries([instance.pk]), -1)
+
+
+@receiver(m2m_changed, sender=Product.promotions.through)
+def update_promotion_indexes(sender, instance, action, reverse, pk_set, **kwargs):
+  if action in ('pre_remove', 'pre_clear'):
+    # Only count memberships that actually exist before they go away.
+    memberships = sender.objects.filter(
+      **{'promotion_id' if reverse else 'product_id': instance.pk})
+    if pk_set is not None:
+      memberships = memberships.filter(**{'product_id__in' if reverse else 'promotion_id__in': pk_set})
+    instance._promotions_removed = list(memberships.values_list('product_id', 'promotion_id'))
+  elif action in ('post_remove', 'post_clear'):
+    pairs = getattr(instance, '_promotions_removed', [])
+    facets.adjust_promotions(pairs, -1)
+    pricing.refresh_effective_prices({product_id for product_id, _ in pairs})
+  elif action == 'post_add' and pk_set:
+    if reverse:
+      pairs = [(product_id, instance.pk) for product_id in pk_set]
+    else:
+      pairs = [(instance.pk, promotion_id) for promotion_id in pk_set]
+    facets.adjust_promotions(pairs, 1)
+    pricing.refresh_effective_prices({product_id for product_id, _ in pairs})
+
+
+@receiver(post_save, sender=Promotion)
+def update_prices_on_promotion_save(sender, instance, created, **kwargs):
+  if not created:
+    pricing.refresh_effective_prices(
+      Product.promotions.through.objects.filter(promotion=instance).values_list('product_id', flat=True))
+
+
+@receiver(pre_delete, sender=Promotion)
+def remember_promotion_products(sender, instance, **kwargs):
+  instance._promotion_products = list(
+    Product.promotions.through.objects.filter(promotion=instance).values_list('product_id', flat=True))
+
+
+@receiver(post_delete, sender=Promotion)
+def update_prices_on_promotion_delete(sender, instance, **kwargs):
+  pricing.refresh_effective_prices(getattr(instance, '_promotion_products', []))
+
+
+@receiver(pre_delete, sender=Cart)
+def release_cart_reservations(sender, instance, **kwargs):
+  reservations.release(Reservation.objects.filter(cart_item__cart=instance))
+
+
+@receiver(pre_delete, sender=CartItem)
+def release_cart_item_reservation(sender, instance, origin=None, **kwargs):
+  # Deleting a whole cart releases all of its items at once above.
+  if isinstance(origin, Cart) or getattr(origin, 'model', None) is Cart:
+    return
+  reservations.release(Reservation.objects.filter(cart_item=instance))
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+  instance._previous_rating = None
+  if instance.pk is not None:
+    instance._previous_rating = Review.objects.filter(pk=instance.pk) \
+      .values_list('product_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def update_review_stats_on_save(sender, instance, created, **kwargs):
+  previous = getattr(instance, '_previous_rating', None)
+  if created or previous is None:
+    reviews.adjust(instance.product_id, reviews=1, rating=instance.rating)
+    return
+  if previous == (instance.product_id, instance.rating):
+    return
+  moved = int(previous[0] != instance.product_id)
+  reviews.adjust(previous[0], reviews=moved, rating=previous[1], sign=-1)
+  reviews.adjust(instance.product_id, reviews=moved, rating=instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def update_review_stats_on_delete(sender, instance, **kwargs):
+  reviews.adjust(instance.product_id, reviews=1, rating=instance.rating, sign=-1)
+
+
+# Trending scores are counted on commit, so rolled back orders and likes
+# never reach them.
+
+@receiver(order_created)
+def count_trending_sales(sender, order, items=(), **kwargs):
+  sold = [(item.product_id, item.quantity) for item in items]
+  transaction.on_commit(lambda: trending.record_sales(order.placed_at, sold))
+
+
+@receiver(post_save, sender=LikedItem)
+def count_trending_like(sender, instance, created, **kwargs):
+  if created:
+    transaction.on_commit(lambda: trending.record_like(instance))
+
+
+@receiver(post_delete, sender=LikedItem)
+def uncount_trending_like(sender, instance, **kwargs):
+  transaction.on_commit(lambda: trending.record_like(instance, sign=-1))
+
+
+@receiver(post_delete, sender=Product)
+def forget_trending_score(sender, instance, **kwargs):
+  trending.forget(sender, instance.pk)
@@ -0,0 +1,121 @@
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+
+from .renderers import FastJSONRenderer
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+CONTENT_TYPES = {
+    CSV: 'text/csv',
+    NDJSON: 'application/x-ndjson',
+}
+
+
+class Echo:
+    """A file-like object whose write() hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(fields, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def ndjson_lines(rows):
+    # Encoded as the JSON API renders them, so prices are numbers in both.
+    renderer = FastJSONRenderer()
+    for row in rows:
+        yield renderer.encode(row) + '\n'
+
+
+def stream_rows(fields, rows, output, filename):
+    """A streaming CSV or NDJSON download of ``rows`` (an iterable of dicts)."""
+    if output == CSV:
+        content = csv_lines(fields, rows)
+    else:
+        content = ndjson_lines(rows)
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    return response
+
+
+class DecodedLines:
+    """
+    Byte lines decoded as UTF-8, with a byte order mark dropped. Lines that
+    aren't UTF-8 are decoded with replacement characters and counted in
+    ``invalid``, so the row they belong to can be rejected.
+    """
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.first = True
+        self.invalid = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self.lines)
+        if isinstance(line, str):
+            return line
+        encoding = 'utf-8-sig' if self.first else 'utf-8'
+        self.first = False
+        try:
+            return line.decode(encoding)
+        except UnicodeDecodeError:
+            self.invalid += 1
+            return line.decode(encoding, errors='replace')
+
+
+def read_rows(lines, output):
+    """
+    Parse an iterable of byte lines as CSV or NDJSON, one row at a time.
+
+    Yields ``(row, error)`` pairs so a malformed line doesn't stop the
+    rest of the feed from being read.
+    """
+    text = DecodedLines(lines)
+    if output == CSV:
+        reader = csv.DictReader(text)
+        while True:
+            invalid = text.invalid
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # The reader starts over at the next line.
+                yield None, f'Invalid CSV: {e}'
+                continue
+            if text.invalid != invalid:
+                yield None, 'Invalid UTF-8.'
+                continue
+            yield row, None
+    for line in text:
+        if not line.strip():
+            continue
+        if text.invalid:
+            text.invalid = 0
+            yield None, 'Invalid UTF-8.'
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield None, 'Expected a JSON object.'
+            continue
+        yield row, None
+
+
+def detect_format(name, content_type=''):
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in (content_type or ''):
+        return NDJSON
+    return CSV
@@ -1,3 +1,777 @@
-from django.test import TestCase
+import csv
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from base64 import urlsafe_b64encode
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.storage import media_storage
+from designs.models import Design, DesignBlob
+
+from . import bulk, facets, pricing, reservations, reviews, trending
+from .importers import export_rows
+from .renderers import FastJSONRenderer, StreamingJSONRenderer
+from .serializers import CollectionSerializer, OrderSerializer, ProductSerializer, ReviewSerializer
+from .models import (Cart, CartItem, Collection, Customer, Order, OrderItem, Payment, Product,
+                     ProductBulkChange, Promotion, Reservation, Review, TrendingScore)
+
+
+def make_product(collection, unit_price='20.00', inventory=10, title='Shirt'):
+    return Product.objects.create(title=title, slug='shirt', unit_price=Decimal(unit_price),
+                                  inventory=inventory, collection=collection)
+
+
+def make_user(username, **fields):
+    return get_user_model().objects.create_user(username, f'{username}@example.com', 'x', **fields)
+
+
+def content(response):
+    return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+def body(response):
+    """The parsed JSON of a response, streamed or not."""
+    return json.loads(content(response))
+
+
+class GenerateDataTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def generate(self, workers=2):
+        call_command('generate_data', collections=3, products=20, customers=5, orders=10,
+                     carts=4, designs=3, image_size=16, chunk_size=4, workers=workers,
+                     stdout=StringIO())
+
+    def test_volumes(self):
+        self.generate()
+        self.assertEqual([model.objects.count() for model in (Collection, Product, Customer, Order, Cart)],
+                         [3, 20, 5, 10, 4])
+        self.assertTrue(Order.objects.filter(items__isnull=False).exists())
+
+    def test_output_does_not_depend_on_the_workers(self):
+        def catalog(workers):
+            call_command('generate_data', collections=3, products=20, customers=0, orders=0,
+                         carts=0, designs=0, chunk_size=4, workers=workers, stdout=StringIO())
+            rows = list(Product.objects.order_by('id').values_list(
+                'title', 'unit_price', 'inventory', 'collection__title'))
+            Product.objects.all().delete()
+            Collection.objects.all().delete()
+            return rows
+
+        self.assertEqual(catalog(1), catalog(3))
+
+    def test_designs_are_stored_as_uploads_are(self):
+        self.generate()
+        self.generate()
+        self.assertEqual(Design.objects.count(), 6)
+        for design in Design.objects.select_related('blob'):
+            self.assertEqual(design.design_file.name, design.blob.file.name)
+            self.assertEqual(design.blob.ref_count, 1)
+            with media_storage().open(design.blob.file.name) as f:
+                self.assertEqual(len(f.read()), design.blob.size)
+        self.assertEqual(DesignBlob.objects.values('sha256').distinct().count(), 6)
+
+
+class ImportExportTests(TestCase):
+    fields = ['title', 'slug', 'description', 'unit_price', 'inventory', 'collection__title']
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('admin', is_staff=True))
+        self.tees = Collection.objects.create(title='Tees')
+        self.hoodies = Collection.objects.create(title='Hoodies')
+        for i, (collection, price) in enumerate([(self.tees, '9.99'), (self.tees, '25.00'),
+                                                 (self.hoodies, '120.50')]):
+            Product.objects.create(title=f'Product, "{i}"', slug=f'product-{i}',
+                                   description=f'Line one\nline {i}', unit_price=Decimal(price),
+                                   inventory=i * 7, collection=collection)
+
+    def catalog(self):
+        return sorted(Product.objects.values_list(*self.fields))
+
+    def import_feed(self, data, name, key='id'):
+        response = self.client.post(f'/store/products/import/?key={key}',
+                                    {'file': SimpleUploadedFile(name, data)}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_exports_import_back(self):
+        for output in ('csv', 'ndjson'):
+            with self.subTest(output=output):
+                before = self.catalog()
+                response = self.client.get('/store/products/export/', {'output': output})
+                self.assertEqual(response.status_code, 200)
+                feed = content(response)
+                Product.objects.all().delete()
+                result = self.import_feed(feed, f'products.{output}', key='slug')
+                self.assertEqual((result['created'], result['error_count']), (3, 0))
+                self.assertEqual(self.catalog(), before)
+                counts = facets.facet_counts()
+                facets.rebuild_facets()
+                self.assertEqual(counts, facets.facet_counts())
+
+    def test_commands_round_trip(self):
+        before = self.catalog()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'products.ndjson')
+        call_command('export_products', path)
+        Product.objects.update(unit_price=Decimal('1.00'), inventory=0)
+        out = StringIO()
+        call_command('import_products', path, stdout=out)
+        self.assertIn('3 rows: 0 created, 3 updated, 0 rejected', out.getvalue())
+        self.assertEqual(self.catalog(), before)
+        self.assertEqual(sorted(Product.objects.values_list('effective_price', flat=True)),
+                         [Decimal('9.99'), Decimal('25.00'), Decimal('120.50')])
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        product = Product.objects.order_by('id').first()
+        feed = '\n'.join([
+            'id,title,unit_price,inventory,collection',
+            f'{product.id},Renamed,11.00,5,Hoodies',
+            '999999,Ghost,10.00,1,Tees',
+            ',Cheap,0.10,1,Tees',
+            ',Lost,10.00,1,Nowhere',
+            ',New,10.00,1,Tees',
+        ]).encode()
+        result = self.import_feed(feed, 'feed.csv')
+        self.assertEqual((result['rows'], result['created'], result['updated'], result['error_count']),
+                         (5, 1, 1, 3))
+        self.assertEqual(sorted(error['row'] for error in result['errors']), [2, 3, 4])
+        product.refresh_from_db()
+        self.assertEqual((product.title, product.collection_id), ('Renamed', self.hoodies.id))
+        self.assertTrue(Product.objects.filter(title='New', slug='new').exists())
+
+    def test_only_staff_may_import_and_export(self):
+        client = APIClient()
+        client.force_authenticate(make_user('customer'))
+        self.assertEqual(client.get('/store/products/export/').status_code, 403)
+        self.assertEqual(client.post('/store/products/import/').status_code, 403)
+
+    def test_exports_page_by_id(self):
+        for i in range(3, 7):
+            make_product(self.tees, title=f'Product {i}')
+        with self.assertNumQueries(4):
+            rows = list(export_rows(Product.objects.all(), chunk_size=2))
+        self.assertEqual([row['id'] for row in rows], sorted(Product.objects.values_list('id', flat=True)))
+        self.assertEqual(set(rows[0]), {'id', 'title', 'slug', 'description', 'unit_price',
+                                        'inventory', 'collection'})
+
+
+class BulkChangeTests(TestCase):
+    changelist = '/admin/store/product/'
+    upload_url = '/admin/store/product/bulk-upload/'
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'x'))
+        collection = Collection.objects.create(title='Tees')
+        self.cheap = make_product(collection, '1.50', inventory=3, title='Cheap')
+        self.dear = make_product(collection, '9000.00', inventory=10, title='Dear')
+
+    def prices(self):
+        return list(Product.objects.order_by('id').values_list('unit_price', 'effective_price', 'inventory'))
+
+    def test_admin_action(self):
+        response = self.client.post(self.changelist, {
+            'action': 'bulk_change', '_selected_action': [self.cheap.id, self.dear.id],
+            'apply': '1', 'kind': 'price_percent', 'amount': '-50'})
+        self.assertEqual(response.status_code, 302)
+        # Prices are rounded and kept within the valid range.
+        self.assertEqual(self.prices(), [(Decimal('1.00'), Decimal('1.00'), 3),
+                                         (Decimal('4500.00'), Decimal('4500.00'), 10)])
+        change = ProductBulkChange.objects.get()
+        self.assertEqual((change.product_count, sorted(change.product_ids)),
+                         (2, [self.cheap.id, self.dear.id]))
+
+    def test_invalid_amounts_are_not_applied(self):
+        response = self.client.post(self.changelist, {
+            'action': 'bulk_change', '_selected_action': [self.cheap.id],
+            'apply': '1', 'kind': 'inventory_delta', 'amount': '1.5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'whole numbers')
+        self.assertFalse(ProductBulkChange.objects.exists())
+
+    def upload(self, rows, dry_run=False):
+        feed = '\n'.join(['product,price_amount,inventory_delta'] + rows).encode()
+        data = {'file': SimpleUploadedFile('changes.csv', feed)}
+        if dry_run:
+            data['dry_run'] = 'on'
+        return self.client.post(self.upload_url, data)
+
+    def test_upload_groups_rows_by_change(self):
+        rows = [f'{self.cheap.id},2.00,', f'{self.dear.id},2.00,5']
+        response = self.upload(rows, dry_run=True)
+        self.assertEqual([(row['amount'], row['count']) for row in response.context['preview']],
+                         [(Decimal('2.00'), 2), (Decimal('5'), 1)])
+        self.assertFalse(ProductBulkChange.objects.exists())
+
+        self.assertEqual(self.upload(rows).status_code, 302)
+        self.assertEqual(self.prices(), [(Decimal('3.50'), Decimal('3.50'), 3),
+                                         (Decimal('9002.00'), Decimal('9002.00'), 15)])
+        self.assertEqual(ProductBulkChange.objects.count(), 2)
+
+    def test_files_with_bad_rows_are_not_applied(self):
+        response = self.upload([f'{self.cheap.id},2.00,', 'x,1,', f'{self.dear.id},,0.5'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['errors']), 2)
+        self.assertEqual(self.prices()[0][0], Decimal('1.50'))
+
+    def test_uploads_apply_all_changes_or_none(self):
+        apply_change = bulk.apply_change
+
+        def fail_second(*args, **kwargs):
+            if ProductBulkChange.objects.exists():
+                raise DatabaseError('deadlock')
+            return apply_change(*args, **kwargs)
+
+        before = self.prices()
+        with mock.patch('store.admin.apply_change', side_effect=fail_second):
+            response = self.upload([f'{self.cheap.id},2.00,', f'{self.dear.id},,5'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['errors'], ['No changes were applied: deadlock'])
+        self.assertEqual(self.prices(), before)
+        self.assertFalse(ProductBulkChange.objects.exists())
+
+
+def serialized(serializer_class, instances):
+    """What ``serializer_class`` renders for ``instances``, parsed back."""
+    return json.loads(JSONRenderer().render(serializer_class(instances, many=True).data))
+
+
+class RowReadTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.tees = Collection.objects.create(title='Tees')
+        Collection.objects.create(title='Empty')
+        for i, price in enumerate(['19.99', '7.05', '120.00']):
+            product = make_product(self.tees, price, inventory=i, title=f'Shirt {i}')
+            Review.objects.create(product=product, name='Sam', rating=i + 2, description='')
+        Product.objects.get(title='Shirt 0').promotions.add(
+            Promotion.objects.create(description='Sale', discount=15))
+        Product.objects.filter(title='Shirt 2').update(description=None)
+
+        customer = Customer.objects.get(user=make_user('buyer'))
+        self.client.force_authenticate(customer.user)
+        for quantity in (1, 3):
+            order = Order.objects.create(customer=customer)
+            for product in Product.objects.all()[:quantity]:
+                OrderItem.objects.create(order=order, product=product, quantity=quantity,
+                                         unit_price=product.effective_price)
+        self.other_order = Order.objects.create(customer=Customer.objects.get(user=make_user('other')))
+
+    def test_products_read_as_the_serializer_writes_them(self):
+        products = Product.objects.order_by('id')
+        expected = serialized(ProductSerializer, products)
+        results = body(self.client.get('/store/products/'))['results']
+        self.assertEqual([{key: value for key, value in item.items() if key != 'tags'} for item in results],
+                         expected)
+        self.assertEqual(body(self.client.get(f'/store/products/{products[0].id}/'))['price_with_tax'],
+                         expected[0]['price_with_tax'])
+
+    def test_collections_and_reviews(self):
+        collections = Collection.objects.annotate(products_count=Count('products'))
+        self.assertEqual(body(self.client.get('/store/collections/')),
+                         serialized(CollectionSerializer, collections))
+        product = Product.objects.order_by('id').first()
+        self.assertEqual(body(self.client.get(f'/store/products/{product.id}/reviews/'))['results'],
+                         serialized(ReviewSerializer, product.reviews.order_by('-date', '-id')))
+
+    def test_orders_load_their_items_once_per_page(self):
+        orders = Order.objects.filter(customer__user__username='buyer').order_by('id')
+        with self.assertNumQueries(3):
+            response = self.client.get('/store/orders/')
+        self.assertEqual(body(response), serialized(OrderSerializer, orders))
+
+    def test_retrieves_are_scoped_like_lists(self):
+        self.assertEqual(self.client.get(f'/store/orders/{self.other_order.id}/').status_code, 404)
+        order = Order.objects.filter(customer__user__username='buyer').first()
+        self.assertEqual(body(self.client.get(f'/store/orders/{order.id}/')),
+                         serialized(OrderSerializer, [order])[0])
+        self.assertEqual(self.client.get('/store/products/999999/').status_code, 404)
+
+
+class FastJSONRendererTests(TestCase):
+    data = {
+        'price': Decimal('19.99'),
+        'whole': Decimal('20'),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'utc': datetime.datetime(2024, 5, 1, 12, 30, tzinfo=datetime.timezone.utc),
+        'local': datetime.datetime(2024, 5, 1, 12, 30, 0, 500,
+                                   tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+        'naive': datetime.datetime(2024, 5, 1, 12, 30),
+        'date': datetime.date(2024, 5, 1),
+        'time': datetime.time(8, 15),
+        'lazy': gettext_lazy('Shirt'),
+        'text': 'T\u00e9e \u2028 \u2029 "quoted"',
+        'nested': [{'a': None, 'b': True, 'c': 1.5}, (1, 2)],
+    }
+
+    def test_output_matches_drf(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(FastJSONRenderer().render([self.data] * 3), JSONRenderer().render([self.data] * 3))
+        context = {'indent': 2}
+        self.assertEqual(FastJSONRenderer().render(self.data, 'application/json', context),
+                         JSONRenderer().render(self.data, 'application/json', context))
+
+    def test_streamed_output_matches(self):
+        renderer = FastJSONRenderer()
+        renderer.chunk_size, renderer.batch_size = 100, 7
+        for data in ([self.data] * 30, {'count': 30, 'next': None, 'results': [self.data] * 30}, [], {}):
+            with self.subTest(data=type(data)):
+                chunks = list(renderer.iter_render(data))
+                self.assertEqual(b''.join(chunks), JSONRenderer().render(data))
+                if data:
+                    self.assertGreater(len(chunks), 2)
+
+    def test_large_lists_are_streamed(self):
+        product = make_product(Collection.objects.create(title='Tees'))
+        url = f'/store/products/{product.id}/reviews/'
+        Review.objects.bulk_create(Review(product=product, name=f'R{i}', rating=5, description='')
+                                   for i in range(6))
+        with mock.patch.object(StreamingJSONRenderer, 'stream_threshold', 5):
+            small = self.client.get(url, {'page_size': 4})
+            large = self.client.get(url, {'page_size': 6})
+        self.assertFalse(small.streaming)
+        self.assertTrue(large.streaming)
+        self.assertEqual(large['Content-Type'], 'application/json')
+        self.assertEqual(len(body(large)['results']), 6)
+
+
+class StaffExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('staff', is_staff=True))
+        customer = Customer.objects.get(user=make_user('buyer'))
+        product = make_product(Collection.objects.create(title='Tees'), '19.99')
+        self.paid = Order.objects.create(customer=customer, payment_status=Order.PAYMENT_STATUS_COMPLETE)
+        OrderItem.objects.create(order=self.paid, product=product, quantity=2, unit_price=Decimal('19.99'))
+        OrderItem.objects.create(order=self.paid, product=product, quantity=1, unit_price=Decimal('5.10'))
+        self.empty = Order.objects.create(customer=customer)
+        Payment.objects.create(payment_method='cod', order=self.paid, customer=customer,
+                               amount=Decimal('45.08'), status='completed', transaction_id='TXN-1')
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return content(response).decode()
+
+    def test_orders_as_ndjson(self):
+        lines = self.export('/store/orders/export/', output='ndjson').splitlines()
+        orders = [json.loads(line) for line in lines]
+        self.assertEqual([order['id'] for order in orders], [self.paid.id, self.empty.id])
+        self.assertEqual(orders[0]['total'], 45.08)
+        self.assertEqual(orders[1]['items'], [])
+        # Prices are numbers, as in the JSON API.
+        api = body(self.client.get(f'/store/orders/{self.paid.id}/'))
+        self.assertEqual([item['unit_price'] for item in orders[0]['items']],
+                         [item['unit_price'] for item in api['items']])
+        self.assertIsInstance(orders[0]['items'][0]['unit_price'], float)
+
+    def test_orders_as_csv_rows_per_item(self):
+        rows = list(csv.DictReader(StringIO(self.export('/store/orders/export/'))))
+        self.assertEqual([(row['order'], row['quantity']) for row in rows],
+                         [(str(self.paid.id), '2'), (str(self.paid.id), '1'), (str(self.empty.id), '')])
+        self.assertEqual(rows[0]['unit_price'], '19.99')
+
+    def test_filters(self):
+        lines = self.export('/store/orders/export/', output='ndjson', payment_status='C').splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.paid.id])
+        self.assertEqual(self.client.get('/store/orders/export/', {'placed_at__gte': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get('/store/orders/export/', {'output': 'xml'}).status_code, 400)
+
+    def test_payments(self):
+        payment, = [json.loads(line) for line in
+                    self.export('/store/payments/export/', output='ndjson').splitlines()]
+        self.assertEqual((payment['order'], payment['amount'], payment['transaction_id']),
+                         (self.paid.id, 45.08, 'TXN-1'))
+        self.assertEqual(self.export('/store/payments/export/', status='failed').splitlines(),
+                         [','.join(['id', 'order', 'customer', 'payment_method', 'status', 'amount',
+                                    'payment_date', 'transaction_id', 'receipt_id'])])
+
+    def test_only_staff(self):
+        client = APIClient()
+        client.force_authenticate(make_user('customer'))
+        self.assertEqual(client.get('/store/orders/export/').status_code, 403)
+        self.assertEqual(client.get('/store/payments/export/').status_code, 403)
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        self.tees = Collection.objects.create(title='Tees')
+        self.hoodies = Collection.objects.create(title='Hoodies')
+        self.promotion = Promotion.objects.create(description='Sale', discount=10)
+
+    def assertMatchesRebuild(self):
+        counts = facets.facet_counts()
+        facets.rebuild_facets()
+        self.assertEqual(counts, facets.facet_counts())
+
+    def test_counts_follow_catalog_changes(self):
+        cheap = make_product(self.tees, '5.00')
+        make_product(self.tees, '30.00')
+        pricey = make_product(self.hoodies, '300.00')
+        pricey.promotions.add(self.promotion)
+        self.assertMatchesRebuild()
+
+        cheap.unit_price = Decimal('60.00')
+        cheap.collection = self.hoodies
+        cheap.save()
+        self.assertMatchesRebuild()
+
+        pricey.promotions.remove(self.promotion)
+        self.promotion.product_set.add(cheap)
+        self.assertMatchesRebuild()
+
+        bulk.apply_change(Product.objects.filter(collection=self.tees), ProductBulkChange.KIND_PRICE_PERCENT,
+                          Decimal('900'))
+        self.assertMatchesRebuild()
+
+        cheap.delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(facets.facet_counts()['collections'],
+                         [{'id': self.tees.id, 'count': 1}, {'id': self.hoodies.id, 'count': 1}])
+
+    def test_product_list_returns_facets(self):
+        make_product(self.tees, '5.00')
+        make_product(self.tees, '30.00')
+        make_product(self.hoodies, '30.00')
+        response = APIClient().get('/store/products/', {'facets': 1, 'collection_id': self.tees.id})
+        self.assertEqual(response.status_code, 200)
+        data = body(response)
+        self.assertEqual(data['facets']['collections'], [{'id': self.tees.id, 'count': 2}])
+        self.assertEqual([band['count'] for band in data['facets']['price_bands']], [1, 1])
+
+    def test_other_filters_are_counted_live(self):
+        make_product(self.tees, '5.00', title='Vintage tee')
+        make_product(self.tees, '30.00')
+        response = APIClient().get('/store/products/', {'facets': 1, 'search': 'vintage'})
+        self.assertEqual(body(response)['facets']['collections'], [{'id': self.tees.id, 'count': 1}])
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.product = make_product(Collection.objects.create(title='Tees'), inventory=5)
+        self.cart = Cart.objects.create()
+
+    def add(self, quantity, cart=None):
+        return self.client.post(f'/store/carts/{(cart or self.cart).id}/items/',
+                                {'product_id': self.product.id, 'quantity': quantity})
+
+    def test_adding_to_a_cart_holds_stock(self):
+        self.assertEqual(self.add(3).status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 3)
+        self.assertEqual(reservations.available(self.product.id), 2)
+
+    def test_held_stock_cannot_be_added_to_another_cart(self):
+        self.add(4)
+        response = self.add(2, cart=Cart.objects.create())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.data)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 4)
+
+    def test_changing_the_quantity_changes_the_hold(self):
+        item_id = self.add(3).data['id']
+        response = self.client.patch(f'/store/carts/{self.cart.id}/items/{item_id}/', {'quantity': 1})
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 1)
+
+    def test_adding_the_same_product_again_adds_to_the_hold(self):
+        self.add(2)
+        self.assertEqual(self.add(2).status_code, 201)
+        self.assertEqual(Reservation.objects.get().quantity, 4)
+        self.assertEqual(self.add(2).status_code, 400)
+        self.assertEqual(CartItem.objects.get().quantity, 4)
+
+    def test_deleting_an_item_releases_its_hold(self):
+        item_id = self.add(3).data['id']
+        self.assertEqual(self.client.delete(f'/store/carts/{self.cart.id}/items/{item_id}/').status_code, 204)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+
+    def test_deleting_the_cart_releases_its_holds(self):
+        self.add(3)
+        self.assertEqual(self.client.delete(f'/store/carts/{self.cart.id}/').status_code, 204)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_expired_holds_are_released(self):
+        self.add(3)
+        Reservation.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(reservations.release_expired(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        # The item stays in the cart; only its hold is gone.
+        self.assertTrue(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_checkout_sells_held_and_expired_items(self):
+        self.add(3)
+        Reservation.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        reservations.release_expired()
+        self.client.force_authenticate(make_user('buyer'))
+        response = self.client.post('/store/orders/', {'cart_id': str(self.cart.id)})
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.inventory, self.product.reserved), (2, 0))
+
+    def test_checkout_fails_when_stock_ran_out(self):
+        self.add(3)
+        Reservation.objects.all().delete()
+        Product.objects.filter(pk=self.product.pk).update(inventory=2, reserved=0)
+        self.client.force_authenticate(make_user('buyer'))
+        response = self.client.post('/store/orders/', {'cart_id': str(self.cart.id)})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Cart.objects.filter(pk=self.cart.pk).exists())
+
+    def test_full_saves_keep_the_reserved_count(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.add(3)
+        stale.title = 'Renamed'
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.title, self.product.reserved), ('Renamed', 3))
+
+    def test_release_command(self):
+        self.add(3)
+        self.add(1, cart=Cart.objects.create())
+        Reservation.objects.filter(cart_item__cart=self.cart).update(
+            expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        Product.objects.filter(pk=self.product.pk).update(reserved=0)
+        out = StringIO()
+        call_command('release_reservations', recount=True, stdout=out)
+        self.assertIn('Released 1 reservations', out.getvalue())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 1)
+
+
+class EffectivePriceTests(TestCase):
+    def setUp(self):
+        self.product = make_product(Collection.objects.create(title='Tees'), '100.00')
+
+    def price(self):
+        self.product.refresh_from_db()
+        return self.product.effective_price
+
+    def test_effective_price(self):
+        self.assertEqual(pricing.effective_price(Decimal('19.99'), 15), Decimal('16.99'))
+        self.assertEqual(pricing.effective_price(Decimal('10.00'), None), Decimal('10.00'))
+        self.assertEqual(pricing.effective_price(Decimal('10.00'), 150), Decimal('0.00'))
+
+    def test_the_best_promotion_applies(self):
+        self.assertEqual(self.price(), Decimal('100.00'))
+        small = Promotion.objects.create(description='Small', discount=10)
+        large = Promotion.objects.create(description='Large', discount=25)
+        self.product.promotions.add(small)
+        self.assertEqual(self.price(), Decimal('90.00'))
+        self.product.promotions.add(large)
+        self.assertEqual(self.price(), Decimal('75.00'))
+
+        large.discount = 50
+        large.save()
+        self.assertEqual(self.price(), Decimal('50.00'))
+        large.delete()
+        self.assertEqual(self.price(), Decimal('90.00'))
+        self.product.promotions.clear()
+        self.assertEqual(self.price(), Decimal('100.00'))
+
+    def test_changing_the_unit_price_keeps_the_discount(self):
+        self.product.promotions.add(Promotion.objects.create(description='Sale', discount=20))
+        self.product.refresh_from_db()
+        self.product.unit_price = Decimal('50.00')
+        self.product.save()
+        self.assertEqual(self.price(), Decimal('40.00'))
+        self.assertEqual(pricing.refresh_effective_prices(), 0)
+
+    def test_carts_and_orders_charge_the_effective_price(self):
+        self.product.promotions.add(Promotion.objects.create(description='Sale', discount=20))
+        client = APIClient()
+        cart = Cart.objects.create()
+        client.post(f'/store/carts/{cart.id}/items/', {'product_id': self.product.id, 'quantity': 2})
+        self.assertEqual(client.get(f'/store/carts/{cart.id}/').data['total_price'], Decimal('160.00'))
+        client.force_authenticate(make_user('buyer'))
+        order = client.post('/store/orders/', {'cart_id': str(cart.id)}).data
+        self.assertEqual(order['items'][0]['unit_price'], Decimal('80.00'))
+
+
+class ReviewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.product = make_product(Collection.objects.create(title='Tees'))
+        self.url = f'/store/products/{self.product.id}/reviews/'
+
+    def review(self, rating, name='Sam'):
+        return self.client.post(self.url, {'name': name, 'rating': rating, 'description': 'Nice'})
+
+    def test_stats_follow_reviews(self):
+        first = self.review(4).data['id']
+        self.review(2)
+        data = body(self.client.get(f'/store/products/{self.product.id}/'))
+        self.assertEqual((data['reviews_count'], data['average_rating']), (2, 3.0))
+
+        Review.objects.get(pk=first).delete()
+        data = body(self.client.get(f'/store/products/{self.product.id}/'))
+        self.assertEqual((data['reviews_count'], data['average_rating']), (1, 2.0))
+
+    def test_moving_a_review_moves_its_rating(self):
+        other = make_product(self.product.collection)
+        review = Review.objects.get(pk=self.review(5).data['id'])
+        review.product = other
+        review.rating = 3
+        review.save()
+        self.product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.product.reviews_count, self.product.ratings_sum), (0, 0))
+        self.assertEqual((other.reviews_count, other.ratings_sum), (1, 3))
+
+    def test_rebuild_matches_the_counters(self):
+        for rating in (1, 4, 5):
+            self.review(rating)
+        before = Product.objects.values_list('reviews_count', 'ratings_count', 'ratings_sum').get()
+        reviews.rebuild_review_stats()
+        after = Product.objects.values_list('reviews_count', 'ratings_count', 'ratings_sum').get()
+        self.assertEqual(before, after)
+        self.assertEqual(after, (3, 3, 10))
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        product = make_product(Collection.objects.create(title='Tees'))
+        self.url = f'/store/products/{product.id}/reviews/'
+        Review.objects.bulk_create(
+            Review(product=product, name=f'Reviewer {i}', rating=i % 5 + 1, description='')
+            for i in range(25))
+
+    def test_pages_cover_every_review_once(self):
+        ids, url = [], f'{self.url}?page_size=10'
+        while url:
+            data = body(self.client.get(url))
+            ids += [review['id'] for review in data['results']]
+            url = data['next']
+        expected = list(Review.objects.order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_page_size_is_bounded(self):
+        data = body(self.client.get(self.url, {'page_size': 1000}))
+        self.assertEqual(len(data['results']), 25)
+        self.assertIsNone(data['next'])
+
+    def test_bad_cursors_are_not_found(self):
+        def cursor(value):
+            return urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+        for bad in ('not base64!', cursor({'a': 1}), cursor(['2024-01-01']),
+                    cursor(['not a date', 1]), cursor(['2024-01-01', 'x']),
+                    cursor(['2024-01-01', None])):
+            with self.subTest(cursor=bad):
+                self.assertEqual(self.client.get(self.url, {'cursor': bad}).status_code, 404)
+
+
+@override_settings(TRENDING_CACHE_TTL=0)
+class TrendingTests(TestCase):
+    url = '/store/products/trending/'
+
+    def setUp(self):
+        # Write scores through instead of buffering them for a background flush.
+        patcher = mock.patch.object(trending.scores, 'interval', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tees = Collection.objects.create(title='Tees')
+        self.hoodies = Collection.objects.create(title='Hoodies')
+        self.tee = make_product(self.tees, title='Tee')
+        self.other_tee = make_product(self.tees, title='Other tee')
+        self.hoodie = make_product(self.hoodies, title='Hoodie')
+        self.user = make_user('fan')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def order(self, *items):
+        cart = Cart.objects.create()
+        for product, quantity in items:
+            self.client.post(f'/store/carts/{cart.id}/items/',
+                             {'product_id': product.id, 'quantity': quantity})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/store/orders/', {'cart_id': str(cart.id)})
+
+    def like(self, url, object_id):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, {'object_id': object_id})
+
+    def shelf(self, **params):
+        return [(product['title'], product['trending_score'])
+                for product in self.client.get(self.url, params).data]
+
+    def test_sales_and_likes_rank_products(self):
+        self.order((self.hoodie, 2), (self.tee, 1))
+        self.like('/likes/store.product/', self.other_tee.id)
+        self.assertEqual([title for title, _ in self.shelf()], ['Hoodie', 'Tee', 'Other tee'])
+        self.assertEqual([title for title, _ in self.shelf(limit=1)], ['Hoodie'])
+        self.assertEqual([title for title, _ in self.shelf(collection_id=self.tees.id)],
+                         ['Tee', 'Other tee'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/likes/store.product/{self.other_tee.id}/')
+        self.assertEqual([title for title, _ in self.shelf()], ['Hoodie', 'Tee'])
+
+    def test_scores_halve_every_half_life(self):
+        now = timezone.now()
+        trending.record_sales(now, [(self.tee.id, 1)])
+        trending.record_sales(now - settings.TRENDING_HALF_LIFE, [(self.hoodie.id, 1)])
+        (_, tee), (_, hoodie) = trending.top(Product)
+        self.assertAlmostEqual(hoodie / tee, 0.5, places=3)
+
+    def test_moving_a_product_moves_its_score(self):
+        self.like('/likes/store.product/', self.tee.id)
+        self.tee.collection = self.hoodies
+        self.tee.save()
+        self.assertEqual([title for title, _ in self.shelf(collection_id=self.hoodies.id)], ['Tee'])
+        self.assertEqual(self.shelf(collection_id=self.tees.id), [])
+
+        self.tee.delete()
+        self.assertFalse(TrendingScore.objects.exists())
+
+    def test_scores_match_a_rebuild(self):
+        self.order((self.hoodie, 2), (self.tee, 1))
+        self.like('/likes/store.product/', self.other_tee.id)
+        before = self.shelf()
+        self.assertEqual(trending.rebuild_trending(), 3)
+        self.assertEqual(self.shelf(), before)
+
+    def test_designs_do_not_trend(self):
+        design = Design.objects.create(design_description='Cat',
+                                       customer=Customer.objects.get(user=self.user))
+        self.assertEqual(self.like('/likes/designs.design/', design.id).status_code, 201)
+        self.assertFalse(TrendingScore.objects.exists())
+        self.assertEqual(trending.rebuild_trending(), 0)
+        self.assertEqual(self.client.get('/designs/uploads/trending/').status_code, 404)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'limit': 'ten'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'collection_id': 'tees'}).status_code, 400)
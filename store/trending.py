@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from likes.counters import CounterBuffer
+from likes.models import LikedItem
+
+from .models import OrderItem, Product, TrendingScore
+
+BATCH_SIZE = 500
+# Events older than this many half-lives weigh under a millionth of a new
+# one; rebuilds leave them out.
+REBUILD_HALF_LIVES = 20
+# Longest list served, and how many lists each process keeps, least
+# recently used dropped first.
+MAX_LIMIT = 100
+CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def growth(when):
+    """
+    Scores are stored forward-decayed: an event of weight ``w`` at ``when``
+    adds ``w * growth(when)``, and a score is worth ``score / growth(now)``.
+    Old scores never have to be rewritten, and ordering by the stored score
+    is ordering by the decayed one.
+    """
+    return 2 ** ((when - settings.TRENDING_EPOCH) / settings.TRENDING_HALF_LIFE)
+
+
+def write_scores(deltas):
+    """Add ``{(content_type_id, object_id): delta}`` to the scores table."""
+    product_type = ContentType.objects.get_for_model(Product).pk
+    by_type = defaultdict(dict)
+    for (content_type_id, object_id), delta in deltas.items():
+        if delta:
+            by_type[content_type_id][object_id] = delta
+    with transaction.atomic():
+        for content_type_id, objects in by_type.items():
+            ids = sorted(objects)
+            for start in range(0, len(ids), BATCH_SIZE):
+                batch = ids[start:start + BATCH_SIZE]
+                collections = None
+                if content_type_id == product_type:
+                    collections = dict(Product.objects.filter(id__in=batch)
+                                       .values_list('id', 'collection_id'))
+                TrendingScore.objects.bulk_create(
+                    [TrendingScore(content_type_id=content_type_id, object_id=object_id,
+                                   collection_id=None if collections is None
+                                   else collections[object_id])
+                     for object_id in batch if collections is None or object_id in collections],
+                    ignore_conflicts=True)
+                TrendingScore.objects \
+                    .filter(content_type_id=content_type_id, object_id__in=batch) \
+                    .update(score=F('score') + Case(
+                        *[When(object_id=object_id, then=Value(objects[object_id]))
+                          for object_id in batch],
+                        default=Value(0.0)))
+    return sum(len(objects) for objects in by_type.values())
+
+
+scores = CounterBuffer(write_scores, settings.LIKES_FLUSH_INTERVAL, settings.LIKES_FLUSH_MAX_KEYS)
+
+
+def record_sales(placed_at, items):
+    """Count ``(product_id, quantity)`` sold at ``placed_at``."""
+    product_type = ContentType.objects.get_for_model(Product).pk
+    weight = settings.TRENDING_WEIGHTS['sale'] * growth(placed_at)
+    for product_id, quantity in items:
+        scores.add(product_type, product_id, weight * quantity)
+
+
+def record_like(liked_item, sign=1):
+    """Count (``sign=1``) or take back (``sign=-1``) a like of a product."""
+    if liked_item.content_type_id != ContentType.objects.get_for_model(Product).pk:
+        # Designs are private and only their owner can like them, so their
+        # likes say nothing about what is trending.
+        return
+    scores.add(liked_item.content_type_id, liked_item.object_id,
+               sign * settings.TRENDING_WEIGHTS['like'] * growth(liked_item.liked_at))
+
+
+def move(product_id, collection_id):
+    """Keep a product's score on its collection's shelf."""
+    TrendingScore.objects.filter(
+        content_type=ContentType.objects.get_for_model(Product), object_id=product_id) \
+        .update(collection_id=collection_id)
+
+
+def forget(model, object_id):
+    TrendingScore.objects.filter(
+        content_type=ContentType.objects.get_for_model(model), object_id=object_id).delete()
+
+
+def top(model, collection_id=None, limit=20):
+    """
+    The ``limit`` (at most MAX_LIMIT) highest scoring ``model`` objects,
+    optionally in one collection, as ``[(object_id, score)]`` with scores
+    decayed to now. Each list is read with one index range scan and then
+    served from memory for ``TRENDING_CACHE_TTL`` seconds.
+    """
+    limit = min(limit, MAX_LIMIT)
+    queryset = TrendingScore.objects.filter(
+        content_type=ContentType.objects.get_for_model(model), score__gt=0)
+    if collection_id is not None:
+        queryset = queryset.filter(collection_id=collection_id)
+
+    key = (model._meta.label_lower, collection_id)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] > now:
+            _cache.move_to_end(key)
+            return cached[1][:limit]
+
+    leaders = _leaders(queryset, MAX_LIMIT)
+    with _cache_lock:
+        _cache[key] = (now + settings.TRENDING_CACHE_TTL, leaders)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return leaders[:limit]
+
+
+def _leaders(queryset, limit):
+    decay = growth(timezone.now())
+    return [(object_id, score / decay) for object_id, score in
+            queryset.order_by('-score').values_list('object_id', 'score')[:limit]]
+
+
+def rebuild_trending():
+    """
+    Recompute every score from order and like history, for recovery after
+    lost buffered updates or a move of ``TRENDING_EPOCH``. Returns the
+    number of scores.
+    """
+    scores.flush()
+    since = timezone.now() - settings.TRENDING_HALF_LIFE * REBUILD_HALF_LIVES
+    weights = settings.TRENDING_WEIGHTS
+    product_type = ContentType.objects.get_for_model(Product).pk
+    totals = Counter()
+    for product_id, quantity, placed_at in OrderItem.objects \
+            .filter(order__placed_at__gte=since) \
+            .values_list('product_id', 'quantity', 'order__placed_at').iterator(chunk_size=2000):
+        totals[product_type, product_id] += weights['sale'] * quantity * growth(placed_at)
+    for content_type_id, object_id, liked_at in LikedItem.objects \
+            .filter(content_type_id=product_type, liked_at__gte=since) \
+            .values_list('content_type_id', 'object_id', 'liked_at').iterator(chunk_size=2000):
+        totals[content_type_id, object_id] += weights['like'] * growth(liked_at)
+
+    collections = dict(Product.objects.values_list('id', 'collection_id'))
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            [TrendingScore(content_type_id=content_type_id, object_id=object_id,
+                           collection_id=collections.get(object_id)
+                           if content_type_id == product_type else None,
+                           score=score)
+             for (content_type_id, object_id), score in totals.items()
+             if content_type_id != product_type or object_id in collections],
+            batch_size=BATCH_SIZE)
+    with _cache_lock:
+        _cache.clear()
+    return TrendingScore.objects.count()
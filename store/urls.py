@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import re_path
 from django.urls.conf import include
 from rest_framework_nested import routers
 from . import views
@@ -21,7 +21,10 @@ carts_router = routers.NestedDefaultRouter(router, 'carts', lookup='cart')
 carts_router.register('items', views.CartItemViewSet, basename='cart-items')
 
 # URLConf
-urlpatterns = router.urls + products_router.urls + carts_router.urls
-urlpatterns += [
-    path('payments/<str:receipt_id>/', PaymentReceiptView.as_view(), name='payment-receipt'),
+# Receipt ids must be matched before the router's payments/<pk>/ route,
+# which would otherwise swallow them.
+urlpatterns = [
+    re_path(r'^payments/(?P<receipt_id>RCPT-[0-9A-F]+)/$',
+            PaymentReceiptView.as_view(), name='payment-receipt'),
 ]
+urlpatterns += router.urls + products_router.urls + carts_router.urls
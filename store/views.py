@@ -1,11 +1,13 @@
 from store.permissions import FullDjangoModelPermissions, IsAdminOrReadOnly, ViewCustomerHistoryPermission
-from store.pagination import DefaultPagination
+from store.pagination import DefaultPagination, KeysetPagination
 from django.db.models.aggregates import Count
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action, permission_classes
 from rest_framework.generics import RetrieveAPIView
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.mixins import CreateModelMixin, DestroyModelMixin, RetrieveModelMixin, UpdateModelMixin
 from rest_framework.permissions import AllowAny, DjangoModelPermissions, DjangoModelPermissionsOrAnonReadOnly, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
@@ -14,7 +16,16 @@ from rest_framework import mixins
 from rest_framework import status
 import uuid
 import random
-from .filters import ProductFilter
+from .exports import (ORDER_EXPORT_FIELDS, ORDER_ITEM_EXPORT_FIELDS, PAYMENT_EXPORT_FIELDS,
+                      order_item_rows, order_rows, payment_rows)
+from .facets import facet_counts, live_facet_counts
+from . import trending
+from .filters import OrderExportFilter, PaymentExportFilter, ProductFilter
+from .renderers import FastJSONRenderer, StreamingJSONRenderer, StreamingRenderMixin
+from .reviews import average_rating
+from .rows import RowReadMixin, RowSerializer
+from .importers import PRODUCT_EXPORT_FIELDS, ProductImporter, export_rows
+from .streaming import CSV, NDJSON, detect_format, read_rows, stream_rows
 from .models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product, Review, Payment
 from .serializers import (AddCartItemSerializer,
                           CartItemSerializer,
@@ -23,22 +34,87 @@ from .serializers import (AddCartItemSerializer,
                           OrderSerializer, ProductSerializer, ReviewSerializer,
                           UpdateCartItemSerializer, UpdateOrderSerializer,
                           PaymentSerializer, PaymentInitiateSerializer,
-                          PaymentVerifySerializer,PaymentReceiptSerializer,)
+                          PaymentVerifySerializer,PaymentReceiptSerializer,
+                          price_with_tax)
 
 
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(RowReadMixin, ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    row_serializer = RowSerializer(ProductSerializer, computed={
+        'price_with_tax': ('unit_price', price_with_tax),
+        'average_rating': (('ratings_sum', 'ratings_count'), average_rating)})
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_class = ProductFilter
     pagination_class = DefaultPagination
     permission_classes = [IsAdminOrReadOnly]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
     search_fields = ['title', 'description']
     ordering_fields = ['unit_price', 'last_update']
 
     def get_serializer_context(self):
         return {'request': self.request}
 
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets') in ('1', 'true'):
+            response.data['facets'] = self.get_facets(request)
+        return response
+
+    def get_facets(self, request):
+        # Filtering by collection and price band only is answered from the
+        # facet tables; anything else is counted from the filtered queryset.
+        filters = {key for key, value in request.query_params.items()
+                   if value and key not in ('page', 'ordering', 'facets', 'format')}
+        if filters <= {'collection_id', 'price_band'}:
+            filterset = self.filterset_class(request.query_params, request=request)
+            filterset.is_valid()
+            data = filterset.form.cleaned_data
+            collection, band = data.get('collection_id'), data.get('price_band')
+            return facet_counts(
+                collection_id=None if collection is None else collection.pk,
+                band=None if band is None else int(band))
+        return live_facet_counts(self.filter_queryset(self.get_queryset()))
+
+    @action(detail=False)
+    def trending(self, request):
+        try:
+            collection_id = request.query_params.get('collection_id')
+            collection_id = None if collection_id is None else int(collection_id)
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), trending.MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'collection_id and limit must be numbers.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        leaders = trending.top(Product, collection_id, limit)
+        rows = self.row_serializer.values(Product.objects.filter(id__in=[pk for pk, _ in leaders]))
+        products = {item['id']: item for item in self.row_serializer.many(rows)}
+        return Response([dict(products[pk], trending_score=round(score, 4))
+                         for pk, score in leaders if pk in products])
+
+    @action(detail=False, methods=['post'], url_path='import',
+            permission_classes=[IsAdminUser], parser_classes=[MultiPartParser])
+    def import_products(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Upload the feed as a "file" field.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        key = request.query_params.get('key', 'id')
+        if key not in ('id', 'slug'):
+            return Response({'error': 'key must be id or slug.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        output = detect_format(upload.name, upload.content_type)
+        importer = ProductImporter(key=key)
+        return Response(importer.run(read_rows(upload, output)))
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        output = request.query_params.get('output', CSV)
+        if output not in (CSV, NDJSON):
+            return Response({'error': 'output must be csv or ndjson.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        rows = export_rows(self.filter_queryset(self.get_queryset()))
+        return stream_rows(PRODUCT_EXPORT_FIELDS, rows, output, 'products')
+
     def destroy(self, request, *args, **kwargs):
         if OrderItem.objects.filter(product_id=kwargs['pk']).count() > 0:
             return Response({'error': 'Product cannot be deleted because it is associated with an order item.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -46,11 +122,13 @@ class ProductViewSet(ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class CollectionViewSet(ModelViewSet):
+class CollectionViewSet(RowReadMixin, ModelViewSet):
     queryset = Collection.objects.annotate(
         products_count=Count('products')).all()
     serializer_class = CollectionSerializer
+    row_serializer = RowSerializer(CollectionSerializer)
     permission_classes = [IsAdminOrReadOnly]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
     def destroy(self, request, *args, **kwargs):
         if Product.objects.filter(collection_id=kwargs['pk']):
@@ -59,8 +137,11 @@ class CollectionViewSet(ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(StreamingRenderMixin, RowReadMixin, ModelViewSet):
     serializer_class = ReviewSerializer
+    row_serializer = RowSerializer(ReviewSerializer)
+    pagination_class = KeysetPagination
+    renderer_classes = [StreamingJSONRenderer, BrowsableAPIRenderer]
 
     def get_queryset(self):
         return Review.objects.filter(product_id=self.kwargs['product_pk'])
@@ -119,14 +200,30 @@ class CustomerViewSet(ModelViewSet):
             return Response(serializer.data)
 
 
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(StreamingRenderMixin, RowReadMixin, ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+    row_serializer = RowSerializer(OrderSerializer)
+    renderer_classes = [StreamingJSONRenderer, BrowsableAPIRenderer]
 
     def get_permissions(self):
-        if self.request.method in ['PATCH', 'DELETE']:
+        if self.action == 'export' or self.request.method in ['PATCH', 'DELETE']:
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        output = request.query_params.get('output', CSV)
+        if output not in (CSV, NDJSON):
+            return Response({'error': 'output must be csv or ndjson.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        filterset = OrderExportFilter(request.query_params, queryset=Order.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        rows = order_rows(filterset.qs)
+        if output == CSV:
+            return stream_rows(ORDER_ITEM_EXPORT_FIELDS, order_item_rows(rows), output, 'orders')
+        return stream_rows(ORDER_EXPORT_FIELDS, rows, output, 'orders')
+
     def create(self, request, *args, **kwargs):
         serializer = CreateOrderSerializer(
             data=request.data,
@@ -161,9 +258,21 @@ class PaymentViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericVi
     def get_queryset(self):
         return Payment.objects.filter(customer__user=self.request.user)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        output = request.query_params.get('output', CSV)
+        if output not in (CSV, NDJSON):
+            return Response({'error': 'output must be csv or ndjson.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        filterset = PaymentExportFilter(request.query_params, queryset=Payment.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        return stream_rows(PAYMENT_EXPORT_FIELDS, payment_rows(filterset.qs), output, 'payments')
+
     @action(detail=False, methods=['post'], url_path='initiate')
     def initiate_payment(self, request):
-        serializer = PaymentInitiateSerializer(data=request.data)
+        serializer = PaymentInitiateSerializer(
+            data=request.data, context={'request': request})
         if serializer.is_valid():
             order_id = serializer.validated_data['order_id']
             payment_method = serializer.validated_data['payment_method']
@@ -194,7 +303,7 @@ class PaymentViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericVi
             payment = Payment.objects.create(
                 payment_method=payment_method,
                 order=order,
-                user=request.user,
+                customer=order.customer,
                 status='processing',
                 amount=order.total_price,
                 transaction_id=transaction_id,
@@ -214,7 +323,7 @@ class PaymentViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericVi
                 payment.save()
 
                 # Update order status
-                order.status = 'processing'
+                order.payment_status = Order.PAYMENT_STATUS_COMPLETE
                 order.save()
 
                 return Response({
@@ -244,7 +353,8 @@ class PaymentViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericVi
             transaction_id = serializer.validated_data['transaction_id']
 
             try:
-                payment = Payment.objects.get(transaction_id=transaction_id, user=request.user)
+                payment = Payment.objects.get(
+                    transaction_id=transaction_id, customer__user=request.user)
 
                 return Response({
                     "status": payment.status,
@@ -268,6 +378,6 @@ class PaymentReceiptView(RetrieveAPIView):
 
     def get_queryset(self):
         return Payment.objects.filter(
-            user=self.request.user,
+            customer__user=self.request.user,
             status='completed'
         )
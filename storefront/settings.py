@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 
 # Load the .env file
 load_dotenv()
@@ -73,6 +73,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.TrafficCaptureMiddleware',
 ]
 
 
@@ -149,6 +150,32 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.2/howto/static-files/
 
 STATIC_URL = '/static/'
+# Media is served by designs.views.MediaView, which checks who may read it.
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_URL = '/designs/media/'
+# Media and mockup image URLs handed out by the API are signed, so browsers
+# can load them without an Authorization header. A URL stays the same for
+# this many seconds and keeps working for at least as long after that.
+MEDIA_URL_TTL = 60 * 60
+
+# Uploaded media fields are stored by content in a hash-sharded tree; run
+# "manage.py migrate_media" to move files stored before.
+STORAGES = {
+    'default': {'BACKEND': 'core.storage.SignedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'media': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+}
+
+# Shared by every worker, so cached gallery pages are invalidated and
+# transcriptions reused across processes. The table is made by the
+# core.0002_cache_table migration; a Redis or Memcached backend also works.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'storefront_cache',
+        'OPTIONS': {'MAX_ENTRIES': 50_000},
+    }
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -171,6 +198,67 @@ DJOSER = {
     }
 }
 
+# Sampled API traffic capture, replayed with `manage.py replay_traffic`
+TRAFFIC_CAPTURE_ENABLED = os.getenv('TRAFFIC_CAPTURE_ENABLED') == '1'
+TRAFFIC_CAPTURE_PATH = BASE_DIR / 'traffic.jsonl'
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(os.getenv('TRAFFIC_CAPTURE_SAMPLE_RATE', '0.01'))
+TRAFFIC_CAPTURE_PATH_PREFIXES = ['/store/', '/designs/', '/auth/']
+TRAFFIC_CAPTURE_MAX_BODY = 64 * 1024
+
+# How long adding to a cart holds the stock, and how often
+# `manage.py release_reservations --loop` sweeps expired holds
+CART_RESERVATION_TTL = timedelta(minutes=15)
+CART_RESERVATION_SWEEP_INTERVAL = 60
+
+# Models that can be liked, and how like counts and trending scores are
+# written behind: every LIKES_FLUSH_INTERVAL seconds (0 writes through), or
+# as soon as LIKES_FLUSH_MAX_KEYS objects have unflushed updates
+LIKES_MODELS = ['store.product', 'designs.design']
+LIKES_FLUSH_INTERVAL = 5
+LIKES_FLUSH_MAX_KEYS = 1000
+
+# Trending shelves: what a unit sold and a like are worth, how fast that
+# halves, and how long a top-N list is served from memory. Scores double
+# every half-life after TRENDING_EPOCH; move it forward and run
+# `manage.py rebuild_trending` within ~1000 half-lives.
+TRENDING_WEIGHTS = {'sale': 3.0, 'like': 1.0}
+TRENDING_HALF_LIFE = timedelta(days=3)
+TRENDING_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+TRENDING_CACHE_TTL = 60
+
+# Design uploads larger than this are rejected while they stream in, and
+# images are checked against DESIGN_MAX_PIXELS from their header alone
+DESIGN_UPLOAD_MAX_BYTES = 25 * 1024 * 1024
+DESIGN_MAX_PIXELS = 60_000_000
+
+# Downscaled copies made of every design upload, by their longest edge in
+# pixels, and how many background threads make them
+DESIGN_VARIANTS = {'thumbnail': 256, 'preview': 1024, 'print': 4096}
+DESIGN_VARIANT_WORKERS = 2
+
+# Template gallery thumbnails (longest edge in pixels) and how long a
+# gallery page stays cached. Pages are dropped as soon as templates change.
+TEMPLATE_THUMBNAIL_SIZE = 320
+TEMPLATE_GALLERY_CACHE_TTL = 300
+
+# Mockup images rendered on demand are kept on local disk, least recently
+# used deleted first once they take more than this many bytes
+MOCKUP_CACHE_DIR = BASE_DIR / 'mockup_cache'
+MOCKUP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Hand media downloads to the front proxy once authorized instead of
+# streaming them through a worker: 'x-accel-redirect' (nginx, with
+# "internal" locations aliasing MEDIA_ROOT and MOCKUP_CACHE_DIR at these
+# URLs) or 'x-sendfile' (Apache, lighttpd). None serves them from Django.
+MEDIA_OFFLOAD = None
+MEDIA_OFFLOAD_URL = '/internal/media/'
+MOCKUP_CACHE_OFFLOAD_URL = '/internal/mockup-cache/'
+
+# Audio prompts larger than this are rejected while they stream in, and
+# how long (in seconds) the transcription of a recording is cached
+AUDIO_UPLOAD_MAX_BYTES = 25 * 1024 * 1024
+TRANSCRIPTION_CACHE_TTL = 7 * 24 * 60 * 60
+
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('JWT',),
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1)
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tags', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tag',
+            name='label',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='taggeditem',
+            index=models.Index(fields=['content_type', 'object_id'], name='tags_tagged_content_eaa81e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taggeditem',
+            index=models.Index(fields=['tag', 'content_type', 'object_id'], name='tags_tagged_tag_id_78e941_idx'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from django.db import models
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -14,9 +16,27 @@ class TaggedItemManager(models.Manager):
                 object_id=obj_id
             )
 
+    def labels_for(self, obj_type, obj_ids):
+        """
+        The tag labels of many objects of one model with a single query, as
+        ``{object_id: [label, ...]}``. ContentType lookups are served from
+        Django's per-process ContentType cache.
+        """
+        content_type = ContentType.objects.get_for_model(obj_type)
+        labels = defaultdict(list)
+        for object_id, label in self.filter(content_type=content_type, object_id__in=obj_ids) \
+                .order_by('id').values_list('object_id', 'tag__label'):
+            labels[object_id].append(label)
+        return labels
+
+    def object_ids(self, obj_type, label):
+        """A subquery of the ids of ``obj_type`` objects tagged ``label``."""
+        content_type = ContentType.objects.get_for_model(obj_type)
+        return self.filter(content_type=content_type, tag__label=label).values('object_id')
+
 
 class Tag(models.Model):
-    label = models.CharField(max_length=255)
+    label = models.CharField(max_length=255, db_index=True)
 
     def __str__(self) -> str:
         return self.label
@@ -28,3 +48,10 @@ class TaggedItem(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'object_id']),
+            # Covers tag filters: the object ids are read from the index.
+            models.Index(fields=['tag', 'content_type', 'object_id']),
+        ]